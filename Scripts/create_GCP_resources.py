@@ -11,6 +11,7 @@ LOCATION = get_config_parameter(CONFIG_DIRECTORY, "gcp_location")
 buckets = [
     "fitbit-data-extract-credentials",
     "fitbit-data-extract-data-files",
+    "fitbit-data-extract-state",
     "fitbit-data-extract-deploy-staging",
 ]
 storage_client = storage.Client(project=PROJECT_ID)
@@ -1,61 +1,323 @@
+import ast
+import importlib.util
+import json
 import os
+import py_compile
+import re
 import shutil
+import subprocess
+import sys
 
-# FUNCTION_NAME = "FitbitExtract"
-# SOURCE_DIR = os.path.join("Source", FUNCTION_NAME)
-# DESTINATION_DIR = "packaged_zips"
+# Cloud function name and the entry point in main.py it runs
+FUNCTIONS = {
+    "FitbitExtract": "main_extract",
+    "FitbitTransformLoad": "main_transform_load",
+}
+
+# Maps third party imports to the package that provides them in requirements.txt
+IMPORT_REQUIREMENTS = {
+    "functions_framework": "functions-framework",
+    "requests": "requests",
+    "cryptography": "cryptography",
+    "google.api_core": "google-api-core",
+    "google.cloud.bigquery": "google-cloud-bigquery",
+    "google.cloud.pubsub_v1": "google-cloud-pubsub",
+    "google.cloud.secretmanager": "google-cloud-secret-manager",
+    "google.cloud.storage": "google-cloud-storage",
+    "pyarrow": "pyarrow",
+}
+
+
+def is_type_checking_block(node: ast.AST) -> bool:
+    """Checks if a node is an `if TYPE_CHECKING:` block, these imports are not needed at runtime"""
+    if not isinstance(node, ast.If):
+        return False
+    test = node.test
+    return (isinstance(test, ast.Name) and test.id == "TYPE_CHECKING") or (
+        isinstance(test, ast.Attribute) and test.attr == "TYPE_CHECKING"
+    )
+
+
+def is_optional_import_block(node: ast.AST) -> bool:
+    """Checks if a node is a `try:` block that handles ImportError, these imports are
+    optional and their packages are only added to the requirements if pinned"""
+    if not isinstance(node, ast.Try):
+        return False
+    for handler in node.handlers:
+        names = (
+            handler.type.elts if isinstance(handler.type, ast.Tuple) else [handler.type]
+        )
+        if any(
+            isinstance(name, ast.Name)
+            and name.id in ["ImportError", "ModuleNotFoundError"]
+            for name in names
+        ):
+            return True
+    return False
+
+
+def collect_imports(nodes: list[ast.AST], optional_imports: set = None) -> set[str]:
+    """Collects every module name imported in a list of ast nodes, including nested imports.
+    For `from x import y` both x and x.y are returned as y could be a module. Imports in
+    optional import blocks are added to optional_imports instead, if it is given"""
+    imports = set()
+    to_visit = list(nodes)
+    while to_visit:
+        node = to_visit.pop()
+        if is_type_checking_block(node):
+            continue
+        if is_optional_import_block(node):
+            if optional_imports is not None:
+                optional_imports.update(collect_imports(node.body, optional_imports))
+            to_visit.extend(node.handlers + node.orelse + node.finalbody)
+            continue
+        if isinstance(node, ast.Import):
+            imports.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            imports.add(node.module)
+            imports.update(f"{node.module}.{alias.name}" for alias in node.names)
+        to_visit.extend(ast.iter_child_nodes(node))
+    return imports
+
+
+def entry_point_imports(main_file: str, entry_point: str) -> set[str]:
+    """Returns the imports of main.py that are needed by a single entry point,
+    module level imports plus any imports made inside the entry point function"""
+    with open(main_file, "r", encoding="utf-8") as file:
+        tree = ast.parse(file.read(), main_file)
+
+    nodes = []
+    found = False
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            if node.name == entry_point:
+                nodes.append(node)
+                found = True
+        elif not isinstance(node, ast.ClassDef):
+            nodes.append(node)
+
+    if not found:
+        raise ValueError(f"Entry point {entry_point} not found in {main_file}")
+
+    return collect_imports(nodes)
+
+
+def local_module_path(module_name: str, source_dir: str) -> str | None:
+    """Returns the file for a module in the source directory or None if it is not local"""
+    base = os.path.join(source_dir, *module_name.split("."))
+    if os.path.isfile(f"{base}.py"):
+        return f"{base}.py"
+    if os.path.isfile(os.path.join(base, "__init__.py")):
+        return os.path.join(base, "__init__.py")
+    return None
+
+
+def find_module_files(
+    main_file: str, entry_point: str, source_dir: str
+) -> tuple[list[str], set[str], set[str]]:
+    """Walks the import graph from an entry point
+
+    Returns:
+        tuple[list[str], set[str], set[str]]: local files relative to source_dir, third
+            party imports and the imports of optional import blocks in the local files
+    """
+    to_visit = list(entry_point_imports(main_file, entry_point))
+    local_files = {main_file}
+    external_imports = set()
+    optional_imports = set()
+    seen = set()
+
+    while to_visit:
+        module_name = to_visit.pop()
+        if module_name in seen:
+            continue
+        seen.add(module_name)
+
+        module_file = local_module_path(module_name, source_dir)
+        if module_file is None:
+            # from x import y where y is a function rather than a module
+            parent_name = module_name.rpartition(".")[0]
+            if parent_name and local_module_path(parent_name, source_dir):
+                continue
+            external_imports.add(module_name)
+            continue
+
+        # Packages need every parent __init__ to be importable
+        parts = module_name.split(".")
+        for i in range(1, len(parts)):
+            init_file = local_module_path(".".join(parts[:i]), source_dir)
+            if init_file:
+                local_files.add(init_file)
+
+        if module_file in local_files:
+            continue
+        local_files.add(module_file)
+        with open(module_file, "r", encoding="utf-8") as file:
+            tree = ast.parse(file.read(), module_file)
+        to_visit.extend(collect_imports(tree.body, optional_imports))
+
+    relative_files = sorted(os.path.relpath(file, source_dir) for file in local_files)
+    return relative_files, external_imports, optional_imports
+
+
+def resolve_requirements(
+    external_imports: set[str],
+    requirements_file: str,
+    optional_imports: set[str] = None,
+) -> list[str]:
+    """Maps third party imports to pinned lines from the full requirements file. Optional
+    imports are only added when their package is pinned, eg pyarrow for parquet loads
+
+    Raises:
+        KeyError: If an import is not a standard library module and has no known requirement
+    """
+    with open(requirements_file, "r", encoding="utf-8") as file:
+        pinned = {}
+        for line in file:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                name = re.split(r"[=<>!~\[; ]", line, maxsplit=1)[0]
+                pinned[name.lower()] = line
+
+    requirements = set()
+    for module_name in external_imports:
+        top_level = module_name.split(".")[0]
+        if top_level in sys.stdlib_module_names or top_level == "__future__":
+            continue
+        matches = [
+            requirement
+            for import_name, requirement in IMPORT_REQUIREMENTS.items()
+            if module_name == import_name or module_name.startswith(f"{import_name}.")
+        ]
+        if not matches:
+            # Parent imports such as google.cloud are covered by their sub modules
+            if any(name.startswith(f"{module_name}.") for name in IMPORT_REQUIREMENTS):
+                continue
+            raise KeyError(f"No requirement found for import {module_name}")
+        requirements.update(matches)
+
+    for module_name in optional_imports or []:
+        requirements.update(
+            requirement
+            for import_name, requirement in IMPORT_REQUIREMENTS.items()
+            if (module_name == import_name or module_name.startswith(f"{import_name}."))
+            and requirement in pinned
+        )
+
+    return sorted(pinned[requirement] for requirement in requirements)
+
+
+def compile_files(temp_dir: str, files: list[str]) -> None:
+    """Precompiles the files into __pycache__ so they are not compiled on a cold start.
+    UNCHECKED_HASH pyc files are used without checking the source timestamps, which
+    are not kept when the zip is extracted"""
+    for file in files:
+        source = os.path.join(temp_dir, file)
+        py_compile.compile(
+            source,
+            cfile=importlib.util.cache_from_source(source),
+            doraise=True,
+            invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+        )
+
+
+def measure_import_time(temp_dir: str, files: list[str]) -> float | None:
+    """Imports every module in the artifact in a new interpreter and returns the seconds taken,
+    returns None if the modules could not be imported in this environment"""
+    module_names = [
+        file[: -len(".py")].replace(os.sep, ".").removesuffix(".__init__")
+        for file in files
+    ]
+    script = (
+        "import importlib, time\n"
+        "start = time.perf_counter()\n"
+        f"for name in {module_names!r}: importlib.import_module(name)\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True,
+        check=False,
+        cwd=temp_dir,
+        env={**os.environ, "PYTHONPATH": temp_dir},
+        text=True,
+    )
+    if result.returncode != 0:
+        print(
+            f"Could not measure import time: {result.stderr.strip().splitlines()[-1]}"
+        )
+        return None
+    return float(result.stdout.strip())
 
 
 def package_cloud_function(
-    function_name,
+    function_name: str,
+    entry_point: str,
     source_dir="Source/FitbitExtract",
     destination_dir="packaged_zips",
     config_file="config.json",
-) -> None:
-    def check_prefix(file_name: str) -> bool:
-        exclude_prefixes = ["__", "test", "local"]
-
-        check = [file_name.startswith(prefix) for prefix in exclude_prefixes]
-
-        return not any(check)
-
+) -> dict:
     # Clear and recreate temp directory
-    print('Creating Temporary directory...')
+    print(f"Packaging {function_name} ({entry_point})...")
     temp_dir = os.path.join(destination_dir, "temp")
     if os.path.exists(temp_dir):
         shutil.rmtree(temp_dir)
-    os.mkdir(temp_dir)
+    os.makedirs(temp_dir)
 
     # Copy Config to temp directory
-    print('Copying config to temporary directory...')
+    print("Copying config to temporary directory...")
     if os.path.exists(config_file):
-        config_destination = os.path.join(temp_dir, config_file)
+        config_destination = os.path.join(temp_dir, os.path.basename(config_file))
         shutil.copyfile(config_file, config_destination)
 
-    # Get all files. remove temp, local and testings files
-    files = os.listdir(source_dir)
-    files = [file for file in files if check_prefix(file)]
-    print('Copying files to temporary directory...')
-    # Copy files and folders to temp location
+    # Only copy the modules the entry point imports
+    main_file = os.path.join(source_dir, "main.py")
+    files, external_imports, optional_imports = find_module_files(
+        main_file, entry_point, source_dir
+    )
+    print(f"Copying {len(files)} files to temporary directory...")
     for file in files:
-        source = os.path.join(source_dir, file)
         destination = os.path.join(temp_dir, file)
-        if os.path.isdir(source):
-            shutil.copytree(source, destination)
-        else:
-            shutil.copyfile(source, destination)
-    print('Making Archive file...')
-    # Make an archive of the file
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.copyfile(os.path.join(source_dir, file), destination)
+
+    print("Writing requirements...")
+    requirements = resolve_requirements(
+        external_imports, os.path.join(source_dir, "requirements.txt"), optional_imports
+    )
+    with open(
+        os.path.join(temp_dir, "requirements.txt"), "w", encoding="utf-8"
+    ) as file:
+        file.write("\n".join(requirements) + "\n")
+
+    # The pyc files are only used if the runtime version matches this interpreter
+    print(f"Precompiling files for {sys.implementation.cache_tag}...")
+    compile_files(temp_dir, files)
+    import_time = measure_import_time(temp_dir, files)
+
+    print("Making Archive file...")
     archive_name = os.path.join(destination_dir, function_name)
-    if os.path.exists(archive_name):
-        os.remove(archive_name)
-    shutil.make_archive(archive_name, "zip", temp_dir)
+    if os.path.exists(f"{archive_name}.zip"):
+        os.remove(f"{archive_name}.zip")
+    archive_file = shutil.make_archive(archive_name, "zip", temp_dir)
     shutil.rmtree(temp_dir)
 
+    report = {
+        "function_name": function_name,
+        "entry_point": entry_point,
+        "files": files,
+        "requirements": requirements,
+        "size_bytes": os.path.getsize(archive_file),
+        "import_seconds": import_time,
+        "python": sys.implementation.cache_tag,
+    }
+    print(json.dumps(report, indent=4))
+    return report
+
 
 def main() -> None:
-    package_cloud_function("Fitbit")
-    # package_cloud_function("FitbitLoad")
+    for function_name, entry_point in FUNCTIONS.items():
+        package_cloud_function(function_name, entry_point)
 
 
 if __name__ == "__main__":
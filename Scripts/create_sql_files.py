@@ -9,7 +9,9 @@ CONFIG_DIRECTORY = "config.json"
 GCP_PROJECT_ID = get_config_parameter(CONFIG_DIRECTORY, "gcp_project")
 BQ_DATASET = get_config_parameter(CONFIG_DIRECTORY, "gcp_bq_dataset")
 TABLE_META_DATA = constants.TABLE_NAME_METADATA_MAPPING
+TABLE_LAYOUT = constants.TABLE_LAYOUT_MAPPING
 SAVE_FILE = "Source/BigQuerySQL/create_tables.sql"
+MIGRATION_SAVE_FILE = "Source/BigQuerySQL/migrate_tables.sql"
 REPLACE_OBJECTS = True
 
 # print(GCP_PROJECT_ID, BQ_DATASET)
@@ -28,22 +30,131 @@ def create_dataset_query() -> str:
     return query
 
 
-def create_table_query(table_name: str, metadata: dict):
-    if REPLACE_OBJECTS:
+def table_reference(table_name: str) -> str:
+    return f"`{GCP_PROJECT_ID}.{BQ_DATASET}.{table_name}`"
+
+
+def create_layout_clauses(table_name: str) -> str:
+    """Creates the partition, cluster and options clauses for a table from its layout"""
+    if table_name not in TABLE_LAYOUT:
+        return ""
+
+    layout = TABLE_LAYOUT[table_name]
+    clauses = ""
+    if "partition_field" in layout:
+        partition_field = layout["partition_field"]
+        granularity = layout.get("partition_granularity", "DAY")
+        if granularity == "DAY":
+            clauses += f"\tPARTITION BY {partition_field}\n"
+        else:
+            clauses += f"\tPARTITION BY DATE_TRUNC({partition_field}, {granularity})\n"
+
+    if "cluster_fields" in layout:
+        clauses += f"\tCLUSTER BY {', '.join(layout['cluster_fields'])}\n"
+
+    if "partition_expiration_days" in layout:
+        expiration_days = layout["partition_expiration_days"]
+        clauses += f"\tOPTIONS(partition_expiration_days={expiration_days})\n"
+
+    return clauses
+
+
+def create_table_query(table_name: str, metadata: dict, replace: bool = None):
+    if replace is None:
+        replace = REPLACE_OBJECTS
+    if replace:
         replace_text = " OR REPLACE"
         exists_text = ""
     else:
         replace_text = ""
         exists_text = " IF NOT EXISTS"
     query = create_heading(table_name, "table")
-    query += f"\tCREATE{replace_text} TABLE{exists_text} `{GCP_PROJECT_ID}.{BQ_DATASET}.{table_name}`(\n"
+    query += (
+        f"\tCREATE{replace_text} TABLE{exists_text} {table_reference(table_name)}(\n"
+    )
 
     for _, bq_metadata in metadata.items():
         bq_name = bq_metadata["bq_name"]
         bq_type = bq_metadata["bq_type"]
         line = f"\t\t{bq_name} {bq_type},\n"
         query += line
-    query += "\t);\n\n"
+    query += "\t)\n"
+    query += create_layout_clauses(table_name)
+    query = query.rstrip("\n") + ";\n\n"
+    return query
+
+
+def create_migration_query(table_name: str, metadata: dict) -> str:
+    """
+    Creates the statements to bring an existing table up to date with the metadata
+    without replacing it. Missing columns are added, an unpartitioned table is copied
+    into a partitioned and clustered table that is swapped in and the partition options
+    are updated
+    """
+    query = create_table_query(table_name, metadata, replace=False)
+    query = query.replace(create_heading(table_name, "table"), "")
+    query = create_heading(table_name, "migration") + query
+
+    add_columns = [
+        f"\t\tADD COLUMN IF NOT EXISTS {bq_metadata['bq_name']} {bq_metadata['bq_type']}"
+        for bq_metadata in metadata.values()
+    ]
+    query += f"\tALTER TABLE {table_reference(table_name)}\n"
+    query += ",\n".join(add_columns) + ";\n\n"
+
+    if table_name not in TABLE_LAYOUT:
+        return query
+
+    layout = TABLE_LAYOUT[table_name]
+    if "partition_field" in layout:
+        # Partitioning cannot be altered so copy the data into a new table and swap it in
+        temp_table_name = f"{table_name}_partitioned"
+        layout_clauses = create_layout_clauses(table_name)
+        query += (
+            f"\tIF NOT EXISTS (SELECT 1 FROM `{GCP_PROJECT_ID}.{BQ_DATASET}`.INFORMATION_SCHEMA.COLUMNS "
+            f"WHERE table_name = '{table_name}' AND is_partitioning_column = 'YES') THEN\n"
+        )
+        query += f"\tCREATE TABLE {table_reference(temp_table_name)}\n"
+        query += layout_clauses
+        query += f"\tAS SELECT * FROM {table_reference(table_name)};\n"
+        query += f"\tDROP TABLE {table_reference(table_name)};\n"
+        query += f"\tALTER TABLE {table_reference(temp_table_name)} RENAME TO {table_name};\n"
+        query += "\tEND IF;\n\n"
+
+    if "partition_expiration_days" in layout:
+        expiration_days = layout["partition_expiration_days"]
+        query += f"\tALTER TABLE {table_reference(table_name)}\n"
+        query += f"\tSET OPTIONS(partition_expiration_days={expiration_days});\n\n"
+
+    return query
+
+
+def create_ledger_history_query() -> str:
+    """
+    Copies the rows of the files_processed log that run_ledger replaced into
+    run_ledger as successful transform runs. Rows already copied are skipped so the
+    migration can be run again
+    """
+    query = create_heading("files_processed history", "migration")
+    query += (
+        f"\tIF EXISTS (SELECT 1 FROM `{GCP_PROJECT_ID}.{BQ_DATASET}`.INFORMATION_SCHEMA.TABLES "
+        "WHERE table_name = 'files_processed') THEN\n"
+    )
+    query += (
+        f"\tINSERT INTO {table_reference('run_ledger')} "
+        "(run_type, date, user_id, processed_date, api_endpoint, data_source, file_path, outcome)\n"
+    )
+    query += (
+        "\tSELECT 'transform', F.date, F.user_id, F.processed_date, F.api_endpoint, "
+        "F.data_source, F.file_processed, 'success'\n"
+    )
+    query += f"\tFROM {table_reference('files_processed')} AS F\n"
+    query += (
+        f"\tWHERE NOT EXISTS (SELECT 1 FROM {table_reference('run_ledger')} AS L "
+        "WHERE L.run_type = 'transform' AND L.file_path = F.file_processed "
+        "AND L.processed_date = F.processed_date);\n"
+    )
+    query += "\tEND IF;\n\n"
     return query
 
 
@@ -60,6 +171,19 @@ def main():
     with open(SAVE_FILE, "w", encoding="UTF-8") as file:
         file.write(query_main)
 
+    # Migration script for existing tables instead of destructive replace
+    query_migration = create_heading("migrate bigquery", "objects")
+    query_migration += "BEGIN \n"
+    query_migration += create_dataset_query()
+    for table_name, metadata in TABLE_META_DATA.items():
+        query_migration += create_migration_query(table_name, metadata)
+    query_migration += create_ledger_history_query()
+
+    query_migration += "END \n"
+
+    with open(MIGRATION_SAVE_FILE, "w", encoding="UTF-8") as file:
+        file.write(query_migration)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,43 @@
+"""
+Prints a summary of the profile reports written by profiled extract and transform runs.
+Download the reports first, eg gsutil cp -r gs://[file store bucket]/profiles local_data
+Run from the repository root with: python Scripts/summarize_profiles.py local_data/profiles
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.append("Source/FitbitExtract")
+from fitbit.profiling import format_report
+
+
+def find_reports(paths: list[str]) -> list[str]:
+    report_paths = []
+    for path in paths:
+        if os.path.isfile(path):
+            report_paths.append(path)
+            continue
+        for root, _, files in os.walk(path):
+            report_paths += [
+                os.path.join(root, file) for file in files if file.endswith(".json")
+            ]
+    return sorted(report_paths)
+
+
+def summarize_profiles():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("paths", nargs="+", help="profile reports or folders of them")
+    parser.add_argument("--limit", type=int, default=15, help="rows in each table")
+    args = parser.parse_args()
+
+    for report_path in find_reports(args.paths):
+        with open(report_path, "r", encoding="utf-8") as file:
+            report = json.load(file)
+        print(format_report(report, args.limit))
+        print()
+
+
+if __name__ == "__main__":
+    summarize_profiles()
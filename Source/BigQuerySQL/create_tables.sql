@@ -29,7 +29,9 @@ BEGIN
 		last_modified TIMESTAMP,
 		start_date DATE,
 		start_time TIME,
-	);
+	)
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id;
 
 -------------------
 --  GOALS TABLE  --
@@ -43,7 +45,9 @@ BEGIN
 		distance FLOAT64,
 		floors INT64,
 		steps INT64,
-	);
+	)
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id;
 
 ---------------------
 --  SUMMARY TABLE  --
@@ -73,7 +77,9 @@ BEGIN
 		lightly_active_distance FLOAT64,
 		sedentary_active_distance FLOAT64,
 		run_distance FLOAT64,
-	);
+	)
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id;
 
 ------------------------
 --  HEART_RATE TABLE  --
@@ -91,7 +97,9 @@ BEGIN
 		cardio_minutes INT64,
 		peak_calories FLOAT64,
 		peak_minutes INT64,
-	);
+	)
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id;
 
 --------------------
 --  WEIGHT TABLE  --
@@ -103,19 +111,37 @@ BEGIN
 		log_id INT,
 		bmi FLOAT64,
 		weight FLOAT64,
-	);
+	)
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id;
 
------------------------------
---  FILES_PROCESSED TABLE  --
------------------------------
-	CREATE OR REPLACE TABLE `fitbit-data-extract.fitbit.files_processed`(
+------------------------
+--  RUN_LEDGER TABLE  --
+------------------------
+	CREATE OR REPLACE TABLE `fitbit-data-extract.fitbit.run_ledger`(
+		run_type STRING,
 		date DATE,
 		user_id STRING,
 		processed_date TIMESTAMP,
 		api_endpoint STRING,
 		data_source STRING,
-		file_processed STRING,
-	);
+		file_path STRING,
+		outcome STRING,
+		error STRING,
+		duration_seconds FLOAT64,
+		request_seconds FLOAT64,
+		save_seconds FLOAT64,
+		extract_seconds FLOAT64,
+		transform_seconds FLOAT64,
+		load_seconds FLOAT64,
+		refresh_rollup_seconds FLOAT64,
+		publish_seconds FLOAT64,
+		bytes_read INT64,
+		retries INT64,
+		rows_written ARRAY<STRUCT<table_name STRING, row_count INT64>>,
+	)
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY run_type, user_id, api_endpoint;
 
 -------------------------
 --  CARDIOSCORE TABLE  --
@@ -125,7 +151,9 @@ BEGIN
 		date DATE,
 		processed_date TIMESTAMP,
 		vo2_max STRING,
-	);
+	)
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id;
 
 -------------------
 --  SLEEP TABLE  --
@@ -148,7 +176,9 @@ BEGIN
 		is_main_sleep BOOL,
 		log_type STRING,
 		type STRING,
-	);
+	)
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id;
 
 --------------------------
 --  SLEEP_DETAIL TABLE  --
@@ -160,7 +190,10 @@ BEGIN
 		type STRING,
 		level STRING,
 		seconds INT64,
-	);
+	)
+	PARTITION BY date
+	CLUSTER BY log_id, level
+	OPTIONS(partition_expiration_days=1095);
 
 -----------------------------
 --  ACTIVITY_DETAIL TABLE  --
@@ -183,6 +216,101 @@ BEGIN
 		longitude FLOAT64,
 		altitude_meters FLOAT64,
 		heart_rate_bpm INT64,
-	);
+	)
+	PARTITION BY date
+	CLUSTER BY user_id, log_id
+	OPTIONS(partition_expiration_days=1095);
+
+---------------------------------
+--  HEART_RATE_INTRADAY TABLE  --
+---------------------------------
+	CREATE OR REPLACE TABLE `fitbit-data-extract.fitbit.heart_rate_intraday`(
+		user_id STRING,
+		date DATE,
+		processed_date TIMESTAMP,
+		date_time TIMESTAMP,
+		heart_rate INT64,
+	)
+	PARTITION BY date
+	CLUSTER BY user_id
+	OPTIONS(partition_expiration_days=1095);
+
+----------------------------
+--  STEPS_INTRADAY TABLE  --
+----------------------------
+	CREATE OR REPLACE TABLE `fitbit-data-extract.fitbit.steps_intraday`(
+		user_id STRING,
+		date DATE,
+		processed_date TIMESTAMP,
+		date_time TIMESTAMP,
+		steps INT64,
+	)
+	PARTITION BY date
+	CLUSTER BY user_id
+	OPTIONS(partition_expiration_days=1095);
+
+---------------------------
+--  SPO2_INTRADAY TABLE  --
+---------------------------
+	CREATE OR REPLACE TABLE `fitbit-data-extract.fitbit.spo2_intraday`(
+		user_id STRING,
+		date DATE,
+		processed_date TIMESTAMP,
+		date_time TIMESTAMP,
+		spo2 FLOAT64,
+	)
+	PARTITION BY date
+	CLUSTER BY user_id
+	OPTIONS(partition_expiration_days=1095);
+
+-------------------------
+--  DAILY_SLEEP TABLE  --
+-------------------------
+	CREATE OR REPLACE TABLE `fitbit-data-extract.fitbit.daily_sleep`(
+		user_id STRING,
+		date DATE,
+		processed_date TIMESTAMP,
+		deep_minutes FLOAT64,
+		light_minutes FLOAT64,
+		rem_minutes FLOAT64,
+		wake_minutes FLOAT64,
+		total_minutes FLOAT64,
+	)
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id;
+
+----------------------------
+--  DAILY_ACTIVITY TABLE  --
+----------------------------
+	CREATE OR REPLACE TABLE `fitbit-data-extract.fitbit.daily_activity`(
+		user_id STRING,
+		date DATE,
+		processed_date TIMESTAMP,
+		activity_count INT64,
+		duration_minutes FLOAT64,
+		calories INT64,
+		steps INT64,
+	)
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id;
+
+-----------------------------------
+--  DAILY_ACTIVITY_DETAIL TABLE  --
+-----------------------------------
+	CREATE OR REPLACE TABLE `fitbit-data-extract.fitbit.daily_activity_detail`(
+		user_id STRING,
+		date DATE,
+		log_id INT64,
+		processed_date TIMESTAMP,
+		sport STRING,
+		point_count INT64,
+		duration_seconds INT64,
+		distance_meters FLOAT64,
+		avg_heart_rate_bpm FLOAT64,
+		min_heart_rate_bpm INT64,
+		max_heart_rate_bpm INT64,
+	)
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id, log_id;
 
 END 
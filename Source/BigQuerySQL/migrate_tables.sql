@@ -0,0 +1,695 @@
+--------------------------------
+--  MIGRATE BIGQUERY OBJECTS  --
+--------------------------------
+BEGIN 
+----------------------
+--  FITBIT DATASET  --
+----------------------
+	CREATE SCHEMA IF NOT EXISTS `fitbit-data-extract.fitbit`;
+
+--------------------------
+--  ACTIVITY MIGRATION  --
+--------------------------
+	CREATE TABLE IF NOT EXISTS `fitbit-data-extract.fitbit.activity`(
+		user_id STRING,
+		date DATE,
+		processed_date TIMESTAMP,
+		log_id INT64,
+		activity_id INT64,
+		activity_parent_id INT64,
+		activity_parent_name STRING,
+		name STRING,
+		description STRING,
+		calories INT64,
+		duration INT64,
+		steps INT64,
+		has_active_zone_minutes BOOL,
+		has_start_time BOOL,
+		is_favorite BOOL,
+		last_modified TIMESTAMP,
+		start_date DATE,
+		start_time TIME,
+	)
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id;
+
+	ALTER TABLE `fitbit-data-extract.fitbit.activity`
+		ADD COLUMN IF NOT EXISTS user_id STRING,
+		ADD COLUMN IF NOT EXISTS date DATE,
+		ADD COLUMN IF NOT EXISTS processed_date TIMESTAMP,
+		ADD COLUMN IF NOT EXISTS log_id INT64,
+		ADD COLUMN IF NOT EXISTS activity_id INT64,
+		ADD COLUMN IF NOT EXISTS activity_parent_id INT64,
+		ADD COLUMN IF NOT EXISTS activity_parent_name STRING,
+		ADD COLUMN IF NOT EXISTS name STRING,
+		ADD COLUMN IF NOT EXISTS description STRING,
+		ADD COLUMN IF NOT EXISTS calories INT64,
+		ADD COLUMN IF NOT EXISTS duration INT64,
+		ADD COLUMN IF NOT EXISTS steps INT64,
+		ADD COLUMN IF NOT EXISTS has_active_zone_minutes BOOL,
+		ADD COLUMN IF NOT EXISTS has_start_time BOOL,
+		ADD COLUMN IF NOT EXISTS is_favorite BOOL,
+		ADD COLUMN IF NOT EXISTS last_modified TIMESTAMP,
+		ADD COLUMN IF NOT EXISTS start_date DATE,
+		ADD COLUMN IF NOT EXISTS start_time TIME;
+
+	IF NOT EXISTS (SELECT 1 FROM `fitbit-data-extract.fitbit`.INFORMATION_SCHEMA.COLUMNS WHERE table_name = 'activity' AND is_partitioning_column = 'YES') THEN
+	CREATE TABLE `fitbit-data-extract.fitbit.activity_partitioned`
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id
+	AS SELECT * FROM `fitbit-data-extract.fitbit.activity`;
+	DROP TABLE `fitbit-data-extract.fitbit.activity`;
+	ALTER TABLE `fitbit-data-extract.fitbit.activity_partitioned` RENAME TO activity;
+	END IF;
+
+-----------------------
+--  GOALS MIGRATION  --
+-----------------------
+	CREATE TABLE IF NOT EXISTS `fitbit-data-extract.fitbit.goals`(
+		user_id STRING,
+		date DATE,
+		processed_date TIMESTAMP,
+		active_minutes INT64,
+		calories_out INT64,
+		distance FLOAT64,
+		floors INT64,
+		steps INT64,
+	)
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id;
+
+	ALTER TABLE `fitbit-data-extract.fitbit.goals`
+		ADD COLUMN IF NOT EXISTS user_id STRING,
+		ADD COLUMN IF NOT EXISTS date DATE,
+		ADD COLUMN IF NOT EXISTS processed_date TIMESTAMP,
+		ADD COLUMN IF NOT EXISTS active_minutes INT64,
+		ADD COLUMN IF NOT EXISTS calories_out INT64,
+		ADD COLUMN IF NOT EXISTS distance FLOAT64,
+		ADD COLUMN IF NOT EXISTS floors INT64,
+		ADD COLUMN IF NOT EXISTS steps INT64;
+
+	IF NOT EXISTS (SELECT 1 FROM `fitbit-data-extract.fitbit`.INFORMATION_SCHEMA.COLUMNS WHERE table_name = 'goals' AND is_partitioning_column = 'YES') THEN
+	CREATE TABLE `fitbit-data-extract.fitbit.goals_partitioned`
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id
+	AS SELECT * FROM `fitbit-data-extract.fitbit.goals`;
+	DROP TABLE `fitbit-data-extract.fitbit.goals`;
+	ALTER TABLE `fitbit-data-extract.fitbit.goals_partitioned` RENAME TO goals;
+	END IF;
+
+-------------------------
+--  SUMMARY MIGRATION  --
+-------------------------
+	CREATE TABLE IF NOT EXISTS `fitbit-data-extract.fitbit.summary`(
+		user_id STRING,
+		date DATE,
+		processed_date TIMESTAMP,
+		active_score INT64,
+		steps INT64,
+		floors INT64,
+		elevation FLOAT64,
+		resting_heart_rate STRING,
+		calories_out INT64,
+		marginal_calories INT64,
+		activity_calories INT64,
+		calories_bmr INT64,
+		sedentary_minutes INT64,
+		lightly_active_minutes INT64,
+		fairly_active_minutes INT64,
+		very_active_minutes INT64,
+		total_distance FLOAT64,
+		tracker_distance FLOAT64,
+		logged_activities_distance FLOAT64,
+		very_active_distance FLOAT64,
+		moderately_active_distance FLOAT64,
+		lightly_active_distance FLOAT64,
+		sedentary_active_distance FLOAT64,
+		run_distance FLOAT64,
+	)
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id;
+
+	ALTER TABLE `fitbit-data-extract.fitbit.summary`
+		ADD COLUMN IF NOT EXISTS user_id STRING,
+		ADD COLUMN IF NOT EXISTS date DATE,
+		ADD COLUMN IF NOT EXISTS processed_date TIMESTAMP,
+		ADD COLUMN IF NOT EXISTS active_score INT64,
+		ADD COLUMN IF NOT EXISTS steps INT64,
+		ADD COLUMN IF NOT EXISTS floors INT64,
+		ADD COLUMN IF NOT EXISTS elevation FLOAT64,
+		ADD COLUMN IF NOT EXISTS resting_heart_rate STRING,
+		ADD COLUMN IF NOT EXISTS calories_out INT64,
+		ADD COLUMN IF NOT EXISTS marginal_calories INT64,
+		ADD COLUMN IF NOT EXISTS activity_calories INT64,
+		ADD COLUMN IF NOT EXISTS calories_bmr INT64,
+		ADD COLUMN IF NOT EXISTS sedentary_minutes INT64,
+		ADD COLUMN IF NOT EXISTS lightly_active_minutes INT64,
+		ADD COLUMN IF NOT EXISTS fairly_active_minutes INT64,
+		ADD COLUMN IF NOT EXISTS very_active_minutes INT64,
+		ADD COLUMN IF NOT EXISTS total_distance FLOAT64,
+		ADD COLUMN IF NOT EXISTS tracker_distance FLOAT64,
+		ADD COLUMN IF NOT EXISTS logged_activities_distance FLOAT64,
+		ADD COLUMN IF NOT EXISTS very_active_distance FLOAT64,
+		ADD COLUMN IF NOT EXISTS moderately_active_distance FLOAT64,
+		ADD COLUMN IF NOT EXISTS lightly_active_distance FLOAT64,
+		ADD COLUMN IF NOT EXISTS sedentary_active_distance FLOAT64,
+		ADD COLUMN IF NOT EXISTS run_distance FLOAT64;
+
+	IF NOT EXISTS (SELECT 1 FROM `fitbit-data-extract.fitbit`.INFORMATION_SCHEMA.COLUMNS WHERE table_name = 'summary' AND is_partitioning_column = 'YES') THEN
+	CREATE TABLE `fitbit-data-extract.fitbit.summary_partitioned`
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id
+	AS SELECT * FROM `fitbit-data-extract.fitbit.summary`;
+	DROP TABLE `fitbit-data-extract.fitbit.summary`;
+	ALTER TABLE `fitbit-data-extract.fitbit.summary_partitioned` RENAME TO summary;
+	END IF;
+
+----------------------------
+--  HEART_RATE MIGRATION  --
+----------------------------
+	CREATE TABLE IF NOT EXISTS `fitbit-data-extract.fitbit.heart_rate`(
+		date DATE,
+		user_id STRING,
+		processed_date TIMESTAMP,
+		resting_heart_rate INT64,
+		out_of_range_calories FLOAT64,
+		out_of_range_minutes INT64,
+		fat_burn_calories FLOAT64,
+		fat_burn_minutes INT64,
+		cardio_calories FLOAT64,
+		cardio_minutes INT64,
+		peak_calories FLOAT64,
+		peak_minutes INT64,
+	)
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id;
+
+	ALTER TABLE `fitbit-data-extract.fitbit.heart_rate`
+		ADD COLUMN IF NOT EXISTS date DATE,
+		ADD COLUMN IF NOT EXISTS user_id STRING,
+		ADD COLUMN IF NOT EXISTS processed_date TIMESTAMP,
+		ADD COLUMN IF NOT EXISTS resting_heart_rate INT64,
+		ADD COLUMN IF NOT EXISTS out_of_range_calories FLOAT64,
+		ADD COLUMN IF NOT EXISTS out_of_range_minutes INT64,
+		ADD COLUMN IF NOT EXISTS fat_burn_calories FLOAT64,
+		ADD COLUMN IF NOT EXISTS fat_burn_minutes INT64,
+		ADD COLUMN IF NOT EXISTS cardio_calories FLOAT64,
+		ADD COLUMN IF NOT EXISTS cardio_minutes INT64,
+		ADD COLUMN IF NOT EXISTS peak_calories FLOAT64,
+		ADD COLUMN IF NOT EXISTS peak_minutes INT64;
+
+	IF NOT EXISTS (SELECT 1 FROM `fitbit-data-extract.fitbit`.INFORMATION_SCHEMA.COLUMNS WHERE table_name = 'heart_rate' AND is_partitioning_column = 'YES') THEN
+	CREATE TABLE `fitbit-data-extract.fitbit.heart_rate_partitioned`
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id
+	AS SELECT * FROM `fitbit-data-extract.fitbit.heart_rate`;
+	DROP TABLE `fitbit-data-extract.fitbit.heart_rate`;
+	ALTER TABLE `fitbit-data-extract.fitbit.heart_rate_partitioned` RENAME TO heart_rate;
+	END IF;
+
+------------------------
+--  WEIGHT MIGRATION  --
+------------------------
+	CREATE TABLE IF NOT EXISTS `fitbit-data-extract.fitbit.weight`(
+		user_id STRING,
+		date DATE,
+		processed_date TIMESTAMP,
+		log_id INT,
+		bmi FLOAT64,
+		weight FLOAT64,
+	)
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id;
+
+	ALTER TABLE `fitbit-data-extract.fitbit.weight`
+		ADD COLUMN IF NOT EXISTS user_id STRING,
+		ADD COLUMN IF NOT EXISTS date DATE,
+		ADD COLUMN IF NOT EXISTS processed_date TIMESTAMP,
+		ADD COLUMN IF NOT EXISTS log_id INT,
+		ADD COLUMN IF NOT EXISTS bmi FLOAT64,
+		ADD COLUMN IF NOT EXISTS weight FLOAT64;
+
+	IF NOT EXISTS (SELECT 1 FROM `fitbit-data-extract.fitbit`.INFORMATION_SCHEMA.COLUMNS WHERE table_name = 'weight' AND is_partitioning_column = 'YES') THEN
+	CREATE TABLE `fitbit-data-extract.fitbit.weight_partitioned`
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id
+	AS SELECT * FROM `fitbit-data-extract.fitbit.weight`;
+	DROP TABLE `fitbit-data-extract.fitbit.weight`;
+	ALTER TABLE `fitbit-data-extract.fitbit.weight_partitioned` RENAME TO weight;
+	END IF;
+
+----------------------------
+--  RUN_LEDGER MIGRATION  --
+----------------------------
+	CREATE TABLE IF NOT EXISTS `fitbit-data-extract.fitbit.run_ledger`(
+		run_type STRING,
+		date DATE,
+		user_id STRING,
+		processed_date TIMESTAMP,
+		api_endpoint STRING,
+		data_source STRING,
+		file_path STRING,
+		outcome STRING,
+		error STRING,
+		duration_seconds FLOAT64,
+		request_seconds FLOAT64,
+		save_seconds FLOAT64,
+		extract_seconds FLOAT64,
+		transform_seconds FLOAT64,
+		load_seconds FLOAT64,
+		refresh_rollup_seconds FLOAT64,
+		publish_seconds FLOAT64,
+		bytes_read INT64,
+		retries INT64,
+		rows_written ARRAY<STRUCT<table_name STRING, row_count INT64>>,
+	)
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY run_type, user_id, api_endpoint;
+
+	ALTER TABLE `fitbit-data-extract.fitbit.run_ledger`
+		ADD COLUMN IF NOT EXISTS run_type STRING,
+		ADD COLUMN IF NOT EXISTS date DATE,
+		ADD COLUMN IF NOT EXISTS user_id STRING,
+		ADD COLUMN IF NOT EXISTS processed_date TIMESTAMP,
+		ADD COLUMN IF NOT EXISTS api_endpoint STRING,
+		ADD COLUMN IF NOT EXISTS data_source STRING,
+		ADD COLUMN IF NOT EXISTS file_path STRING,
+		ADD COLUMN IF NOT EXISTS outcome STRING,
+		ADD COLUMN IF NOT EXISTS error STRING,
+		ADD COLUMN IF NOT EXISTS duration_seconds FLOAT64,
+		ADD COLUMN IF NOT EXISTS request_seconds FLOAT64,
+		ADD COLUMN IF NOT EXISTS save_seconds FLOAT64,
+		ADD COLUMN IF NOT EXISTS extract_seconds FLOAT64,
+		ADD COLUMN IF NOT EXISTS transform_seconds FLOAT64,
+		ADD COLUMN IF NOT EXISTS load_seconds FLOAT64,
+		ADD COLUMN IF NOT EXISTS refresh_rollup_seconds FLOAT64,
+		ADD COLUMN IF NOT EXISTS publish_seconds FLOAT64,
+		ADD COLUMN IF NOT EXISTS bytes_read INT64,
+		ADD COLUMN IF NOT EXISTS retries INT64,
+		ADD COLUMN IF NOT EXISTS rows_written ARRAY<STRUCT<table_name STRING, row_count INT64>>;
+
+	IF NOT EXISTS (SELECT 1 FROM `fitbit-data-extract.fitbit`.INFORMATION_SCHEMA.COLUMNS WHERE table_name = 'run_ledger' AND is_partitioning_column = 'YES') THEN
+	CREATE TABLE `fitbit-data-extract.fitbit.run_ledger_partitioned`
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY run_type, user_id, api_endpoint
+	AS SELECT * FROM `fitbit-data-extract.fitbit.run_ledger`;
+	DROP TABLE `fitbit-data-extract.fitbit.run_ledger`;
+	ALTER TABLE `fitbit-data-extract.fitbit.run_ledger_partitioned` RENAME TO run_ledger;
+	END IF;
+
+-----------------------------
+--  CARDIOSCORE MIGRATION  --
+-----------------------------
+	CREATE TABLE IF NOT EXISTS `fitbit-data-extract.fitbit.cardioscore`(
+		user_id STRING,
+		date DATE,
+		processed_date TIMESTAMP,
+		vo2_max STRING,
+	)
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id;
+
+	ALTER TABLE `fitbit-data-extract.fitbit.cardioscore`
+		ADD COLUMN IF NOT EXISTS user_id STRING,
+		ADD COLUMN IF NOT EXISTS date DATE,
+		ADD COLUMN IF NOT EXISTS processed_date TIMESTAMP,
+		ADD COLUMN IF NOT EXISTS vo2_max STRING;
+
+	IF NOT EXISTS (SELECT 1 FROM `fitbit-data-extract.fitbit`.INFORMATION_SCHEMA.COLUMNS WHERE table_name = 'cardioscore' AND is_partitioning_column = 'YES') THEN
+	CREATE TABLE `fitbit-data-extract.fitbit.cardioscore_partitioned`
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id
+	AS SELECT * FROM `fitbit-data-extract.fitbit.cardioscore`;
+	DROP TABLE `fitbit-data-extract.fitbit.cardioscore`;
+	ALTER TABLE `fitbit-data-extract.fitbit.cardioscore_partitioned` RENAME TO cardioscore;
+	END IF;
+
+-----------------------
+--  SLEEP MIGRATION  --
+-----------------------
+	CREATE TABLE IF NOT EXISTS `fitbit-data-extract.fitbit.sleep`(
+		user_id STRING,
+		date DATE,
+		processed_date TIMESTAMP,
+		log_id INT64,
+		efficiency STRING,
+		start_time TIMESTAMP,
+		end_time TIMESTAMP,
+		duration INT64,
+		minutes_after_wakeup INT64,
+		minutes_asleep INT64,
+		minutes_awake INT64,
+		minutes_to_fall_asleep INT64,
+		time_in_bed INT64,
+		info_code INT64,
+		is_main_sleep BOOL,
+		log_type STRING,
+		type STRING,
+	)
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id;
+
+	ALTER TABLE `fitbit-data-extract.fitbit.sleep`
+		ADD COLUMN IF NOT EXISTS user_id STRING,
+		ADD COLUMN IF NOT EXISTS date DATE,
+		ADD COLUMN IF NOT EXISTS processed_date TIMESTAMP,
+		ADD COLUMN IF NOT EXISTS log_id INT64,
+		ADD COLUMN IF NOT EXISTS efficiency STRING,
+		ADD COLUMN IF NOT EXISTS start_time TIMESTAMP,
+		ADD COLUMN IF NOT EXISTS end_time TIMESTAMP,
+		ADD COLUMN IF NOT EXISTS duration INT64,
+		ADD COLUMN IF NOT EXISTS minutes_after_wakeup INT64,
+		ADD COLUMN IF NOT EXISTS minutes_asleep INT64,
+		ADD COLUMN IF NOT EXISTS minutes_awake INT64,
+		ADD COLUMN IF NOT EXISTS minutes_to_fall_asleep INT64,
+		ADD COLUMN IF NOT EXISTS time_in_bed INT64,
+		ADD COLUMN IF NOT EXISTS info_code INT64,
+		ADD COLUMN IF NOT EXISTS is_main_sleep BOOL,
+		ADD COLUMN IF NOT EXISTS log_type STRING,
+		ADD COLUMN IF NOT EXISTS type STRING;
+
+	IF NOT EXISTS (SELECT 1 FROM `fitbit-data-extract.fitbit`.INFORMATION_SCHEMA.COLUMNS WHERE table_name = 'sleep' AND is_partitioning_column = 'YES') THEN
+	CREATE TABLE `fitbit-data-extract.fitbit.sleep_partitioned`
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id
+	AS SELECT * FROM `fitbit-data-extract.fitbit.sleep`;
+	DROP TABLE `fitbit-data-extract.fitbit.sleep`;
+	ALTER TABLE `fitbit-data-extract.fitbit.sleep_partitioned` RENAME TO sleep;
+	END IF;
+
+------------------------------
+--  SLEEP_DETAIL MIGRATION  --
+------------------------------
+	CREATE TABLE IF NOT EXISTS `fitbit-data-extract.fitbit.sleep_detail`(
+		log_id INT64,
+		date DATE,
+		date_time TIMESTAMP,
+		type STRING,
+		level STRING,
+		seconds INT64,
+	)
+	PARTITION BY date
+	CLUSTER BY log_id, level
+	OPTIONS(partition_expiration_days=1095);
+
+	ALTER TABLE `fitbit-data-extract.fitbit.sleep_detail`
+		ADD COLUMN IF NOT EXISTS log_id INT64,
+		ADD COLUMN IF NOT EXISTS date DATE,
+		ADD COLUMN IF NOT EXISTS date_time TIMESTAMP,
+		ADD COLUMN IF NOT EXISTS type STRING,
+		ADD COLUMN IF NOT EXISTS level STRING,
+		ADD COLUMN IF NOT EXISTS seconds INT64;
+
+	IF NOT EXISTS (SELECT 1 FROM `fitbit-data-extract.fitbit`.INFORMATION_SCHEMA.COLUMNS WHERE table_name = 'sleep_detail' AND is_partitioning_column = 'YES') THEN
+	CREATE TABLE `fitbit-data-extract.fitbit.sleep_detail_partitioned`
+	PARTITION BY date
+	CLUSTER BY log_id, level
+	OPTIONS(partition_expiration_days=1095)
+	AS SELECT * FROM `fitbit-data-extract.fitbit.sleep_detail`;
+	DROP TABLE `fitbit-data-extract.fitbit.sleep_detail`;
+	ALTER TABLE `fitbit-data-extract.fitbit.sleep_detail_partitioned` RENAME TO sleep_detail;
+	END IF;
+
+	ALTER TABLE `fitbit-data-extract.fitbit.sleep_detail`
+	SET OPTIONS(partition_expiration_days=1095);
+
+---------------------------------
+--  ACTIVITY_DETAIL MIGRATION  --
+---------------------------------
+	CREATE TABLE IF NOT EXISTS `fitbit-data-extract.fitbit.activity_detail`(
+		date DATE,
+		user_id STRING,
+		log_id INT,
+		processed_date TIMESTAMP,
+		date_time TIMESTAMP,
+		point_order INT,
+		sport STRING,
+		lap_number INT64,
+		total_time_seconds FLOAT64,
+		distance_meters FLOAT64,
+		calories INT64,
+		intensity STRING,
+		trigger_method STRING,
+		latitude FLOAT64,
+		longitude FLOAT64,
+		altitude_meters FLOAT64,
+		heart_rate_bpm INT64,
+	)
+	PARTITION BY date
+	CLUSTER BY user_id, log_id
+	OPTIONS(partition_expiration_days=1095);
+
+	ALTER TABLE `fitbit-data-extract.fitbit.activity_detail`
+		ADD COLUMN IF NOT EXISTS date DATE,
+		ADD COLUMN IF NOT EXISTS user_id STRING,
+		ADD COLUMN IF NOT EXISTS log_id INT,
+		ADD COLUMN IF NOT EXISTS processed_date TIMESTAMP,
+		ADD COLUMN IF NOT EXISTS date_time TIMESTAMP,
+		ADD COLUMN IF NOT EXISTS point_order INT,
+		ADD COLUMN IF NOT EXISTS sport STRING,
+		ADD COLUMN IF NOT EXISTS lap_number INT64,
+		ADD COLUMN IF NOT EXISTS total_time_seconds FLOAT64,
+		ADD COLUMN IF NOT EXISTS distance_meters FLOAT64,
+		ADD COLUMN IF NOT EXISTS calories INT64,
+		ADD COLUMN IF NOT EXISTS intensity STRING,
+		ADD COLUMN IF NOT EXISTS trigger_method STRING,
+		ADD COLUMN IF NOT EXISTS latitude FLOAT64,
+		ADD COLUMN IF NOT EXISTS longitude FLOAT64,
+		ADD COLUMN IF NOT EXISTS altitude_meters FLOAT64,
+		ADD COLUMN IF NOT EXISTS heart_rate_bpm INT64;
+
+	IF NOT EXISTS (SELECT 1 FROM `fitbit-data-extract.fitbit`.INFORMATION_SCHEMA.COLUMNS WHERE table_name = 'activity_detail' AND is_partitioning_column = 'YES') THEN
+	CREATE TABLE `fitbit-data-extract.fitbit.activity_detail_partitioned`
+	PARTITION BY date
+	CLUSTER BY user_id, log_id
+	OPTIONS(partition_expiration_days=1095)
+	AS SELECT * FROM `fitbit-data-extract.fitbit.activity_detail`;
+	DROP TABLE `fitbit-data-extract.fitbit.activity_detail`;
+	ALTER TABLE `fitbit-data-extract.fitbit.activity_detail_partitioned` RENAME TO activity_detail;
+	END IF;
+
+	ALTER TABLE `fitbit-data-extract.fitbit.activity_detail`
+	SET OPTIONS(partition_expiration_days=1095);
+
+-------------------------------------
+--  HEART_RATE_INTRADAY MIGRATION  --
+-------------------------------------
+	CREATE TABLE IF NOT EXISTS `fitbit-data-extract.fitbit.heart_rate_intraday`(
+		user_id STRING,
+		date DATE,
+		processed_date TIMESTAMP,
+		date_time TIMESTAMP,
+		heart_rate INT64,
+	)
+	PARTITION BY date
+	CLUSTER BY user_id
+	OPTIONS(partition_expiration_days=1095);
+
+	ALTER TABLE `fitbit-data-extract.fitbit.heart_rate_intraday`
+		ADD COLUMN IF NOT EXISTS user_id STRING,
+		ADD COLUMN IF NOT EXISTS date DATE,
+		ADD COLUMN IF NOT EXISTS processed_date TIMESTAMP,
+		ADD COLUMN IF NOT EXISTS date_time TIMESTAMP,
+		ADD COLUMN IF NOT EXISTS heart_rate INT64;
+
+	IF NOT EXISTS (SELECT 1 FROM `fitbit-data-extract.fitbit`.INFORMATION_SCHEMA.COLUMNS WHERE table_name = 'heart_rate_intraday' AND is_partitioning_column = 'YES') THEN
+	CREATE TABLE `fitbit-data-extract.fitbit.heart_rate_intraday_partitioned`
+	PARTITION BY date
+	CLUSTER BY user_id
+	OPTIONS(partition_expiration_days=1095)
+	AS SELECT * FROM `fitbit-data-extract.fitbit.heart_rate_intraday`;
+	DROP TABLE `fitbit-data-extract.fitbit.heart_rate_intraday`;
+	ALTER TABLE `fitbit-data-extract.fitbit.heart_rate_intraday_partitioned` RENAME TO heart_rate_intraday;
+	END IF;
+
+	ALTER TABLE `fitbit-data-extract.fitbit.heart_rate_intraday`
+	SET OPTIONS(partition_expiration_days=1095);
+
+--------------------------------
+--  STEPS_INTRADAY MIGRATION  --
+--------------------------------
+	CREATE TABLE IF NOT EXISTS `fitbit-data-extract.fitbit.steps_intraday`(
+		user_id STRING,
+		date DATE,
+		processed_date TIMESTAMP,
+		date_time TIMESTAMP,
+		steps INT64,
+	)
+	PARTITION BY date
+	CLUSTER BY user_id
+	OPTIONS(partition_expiration_days=1095);
+
+	ALTER TABLE `fitbit-data-extract.fitbit.steps_intraday`
+		ADD COLUMN IF NOT EXISTS user_id STRING,
+		ADD COLUMN IF NOT EXISTS date DATE,
+		ADD COLUMN IF NOT EXISTS processed_date TIMESTAMP,
+		ADD COLUMN IF NOT EXISTS date_time TIMESTAMP,
+		ADD COLUMN IF NOT EXISTS steps INT64;
+
+	IF NOT EXISTS (SELECT 1 FROM `fitbit-data-extract.fitbit`.INFORMATION_SCHEMA.COLUMNS WHERE table_name = 'steps_intraday' AND is_partitioning_column = 'YES') THEN
+	CREATE TABLE `fitbit-data-extract.fitbit.steps_intraday_partitioned`
+	PARTITION BY date
+	CLUSTER BY user_id
+	OPTIONS(partition_expiration_days=1095)
+	AS SELECT * FROM `fitbit-data-extract.fitbit.steps_intraday`;
+	DROP TABLE `fitbit-data-extract.fitbit.steps_intraday`;
+	ALTER TABLE `fitbit-data-extract.fitbit.steps_intraday_partitioned` RENAME TO steps_intraday;
+	END IF;
+
+	ALTER TABLE `fitbit-data-extract.fitbit.steps_intraday`
+	SET OPTIONS(partition_expiration_days=1095);
+
+-------------------------------
+--  SPO2_INTRADAY MIGRATION  --
+-------------------------------
+	CREATE TABLE IF NOT EXISTS `fitbit-data-extract.fitbit.spo2_intraday`(
+		user_id STRING,
+		date DATE,
+		processed_date TIMESTAMP,
+		date_time TIMESTAMP,
+		spo2 FLOAT64,
+	)
+	PARTITION BY date
+	CLUSTER BY user_id
+	OPTIONS(partition_expiration_days=1095);
+
+	ALTER TABLE `fitbit-data-extract.fitbit.spo2_intraday`
+		ADD COLUMN IF NOT EXISTS user_id STRING,
+		ADD COLUMN IF NOT EXISTS date DATE,
+		ADD COLUMN IF NOT EXISTS processed_date TIMESTAMP,
+		ADD COLUMN IF NOT EXISTS date_time TIMESTAMP,
+		ADD COLUMN IF NOT EXISTS spo2 FLOAT64;
+
+	IF NOT EXISTS (SELECT 1 FROM `fitbit-data-extract.fitbit`.INFORMATION_SCHEMA.COLUMNS WHERE table_name = 'spo2_intraday' AND is_partitioning_column = 'YES') THEN
+	CREATE TABLE `fitbit-data-extract.fitbit.spo2_intraday_partitioned`
+	PARTITION BY date
+	CLUSTER BY user_id
+	OPTIONS(partition_expiration_days=1095)
+	AS SELECT * FROM `fitbit-data-extract.fitbit.spo2_intraday`;
+	DROP TABLE `fitbit-data-extract.fitbit.spo2_intraday`;
+	ALTER TABLE `fitbit-data-extract.fitbit.spo2_intraday_partitioned` RENAME TO spo2_intraday;
+	END IF;
+
+	ALTER TABLE `fitbit-data-extract.fitbit.spo2_intraday`
+	SET OPTIONS(partition_expiration_days=1095);
+
+-----------------------------
+--  DAILY_SLEEP MIGRATION  --
+-----------------------------
+	CREATE TABLE IF NOT EXISTS `fitbit-data-extract.fitbit.daily_sleep`(
+		user_id STRING,
+		date DATE,
+		processed_date TIMESTAMP,
+		deep_minutes FLOAT64,
+		light_minutes FLOAT64,
+		rem_minutes FLOAT64,
+		wake_minutes FLOAT64,
+		total_minutes FLOAT64,
+	)
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id;
+
+	ALTER TABLE `fitbit-data-extract.fitbit.daily_sleep`
+		ADD COLUMN IF NOT EXISTS user_id STRING,
+		ADD COLUMN IF NOT EXISTS date DATE,
+		ADD COLUMN IF NOT EXISTS processed_date TIMESTAMP,
+		ADD COLUMN IF NOT EXISTS deep_minutes FLOAT64,
+		ADD COLUMN IF NOT EXISTS light_minutes FLOAT64,
+		ADD COLUMN IF NOT EXISTS rem_minutes FLOAT64,
+		ADD COLUMN IF NOT EXISTS wake_minutes FLOAT64,
+		ADD COLUMN IF NOT EXISTS total_minutes FLOAT64;
+
+	IF NOT EXISTS (SELECT 1 FROM `fitbit-data-extract.fitbit`.INFORMATION_SCHEMA.COLUMNS WHERE table_name = 'daily_sleep' AND is_partitioning_column = 'YES') THEN
+	CREATE TABLE `fitbit-data-extract.fitbit.daily_sleep_partitioned`
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id
+	AS SELECT * FROM `fitbit-data-extract.fitbit.daily_sleep`;
+	DROP TABLE `fitbit-data-extract.fitbit.daily_sleep`;
+	ALTER TABLE `fitbit-data-extract.fitbit.daily_sleep_partitioned` RENAME TO daily_sleep;
+	END IF;
+
+--------------------------------
+--  DAILY_ACTIVITY MIGRATION  --
+--------------------------------
+	CREATE TABLE IF NOT EXISTS `fitbit-data-extract.fitbit.daily_activity`(
+		user_id STRING,
+		date DATE,
+		processed_date TIMESTAMP,
+		activity_count INT64,
+		duration_minutes FLOAT64,
+		calories INT64,
+		steps INT64,
+	)
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id;
+
+	ALTER TABLE `fitbit-data-extract.fitbit.daily_activity`
+		ADD COLUMN IF NOT EXISTS user_id STRING,
+		ADD COLUMN IF NOT EXISTS date DATE,
+		ADD COLUMN IF NOT EXISTS processed_date TIMESTAMP,
+		ADD COLUMN IF NOT EXISTS activity_count INT64,
+		ADD COLUMN IF NOT EXISTS duration_minutes FLOAT64,
+		ADD COLUMN IF NOT EXISTS calories INT64,
+		ADD COLUMN IF NOT EXISTS steps INT64;
+
+	IF NOT EXISTS (SELECT 1 FROM `fitbit-data-extract.fitbit`.INFORMATION_SCHEMA.COLUMNS WHERE table_name = 'daily_activity' AND is_partitioning_column = 'YES') THEN
+	CREATE TABLE `fitbit-data-extract.fitbit.daily_activity_partitioned`
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id
+	AS SELECT * FROM `fitbit-data-extract.fitbit.daily_activity`;
+	DROP TABLE `fitbit-data-extract.fitbit.daily_activity`;
+	ALTER TABLE `fitbit-data-extract.fitbit.daily_activity_partitioned` RENAME TO daily_activity;
+	END IF;
+
+---------------------------------------
+--  DAILY_ACTIVITY_DETAIL MIGRATION  --
+---------------------------------------
+	CREATE TABLE IF NOT EXISTS `fitbit-data-extract.fitbit.daily_activity_detail`(
+		user_id STRING,
+		date DATE,
+		log_id INT64,
+		processed_date TIMESTAMP,
+		sport STRING,
+		point_count INT64,
+		duration_seconds INT64,
+		distance_meters FLOAT64,
+		avg_heart_rate_bpm FLOAT64,
+		min_heart_rate_bpm INT64,
+		max_heart_rate_bpm INT64,
+	)
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id, log_id;
+
+	ALTER TABLE `fitbit-data-extract.fitbit.daily_activity_detail`
+		ADD COLUMN IF NOT EXISTS user_id STRING,
+		ADD COLUMN IF NOT EXISTS date DATE,
+		ADD COLUMN IF NOT EXISTS log_id INT64,
+		ADD COLUMN IF NOT EXISTS processed_date TIMESTAMP,
+		ADD COLUMN IF NOT EXISTS sport STRING,
+		ADD COLUMN IF NOT EXISTS point_count INT64,
+		ADD COLUMN IF NOT EXISTS duration_seconds INT64,
+		ADD COLUMN IF NOT EXISTS distance_meters FLOAT64,
+		ADD COLUMN IF NOT EXISTS avg_heart_rate_bpm FLOAT64,
+		ADD COLUMN IF NOT EXISTS min_heart_rate_bpm INT64,
+		ADD COLUMN IF NOT EXISTS max_heart_rate_bpm INT64;
+
+	IF NOT EXISTS (SELECT 1 FROM `fitbit-data-extract.fitbit`.INFORMATION_SCHEMA.COLUMNS WHERE table_name = 'daily_activity_detail' AND is_partitioning_column = 'YES') THEN
+	CREATE TABLE `fitbit-data-extract.fitbit.daily_activity_detail_partitioned`
+	PARTITION BY DATE_TRUNC(date, MONTH)
+	CLUSTER BY user_id, log_id
+	AS SELECT * FROM `fitbit-data-extract.fitbit.daily_activity_detail`;
+	DROP TABLE `fitbit-data-extract.fitbit.daily_activity_detail`;
+	ALTER TABLE `fitbit-data-extract.fitbit.daily_activity_detail_partitioned` RENAME TO daily_activity_detail;
+	END IF;
+
+-----------------------------------------
+--  FILES_PROCESSED HISTORY MIGRATION  --
+-----------------------------------------
+	IF EXISTS (SELECT 1 FROM `fitbit-data-extract.fitbit`.INFORMATION_SCHEMA.TABLES WHERE table_name = 'files_processed') THEN
+	INSERT INTO `fitbit-data-extract.fitbit.run_ledger` (run_type, date, user_id, processed_date, api_endpoint, data_source, file_path, outcome)
+	SELECT 'transform', F.date, F.user_id, F.processed_date, F.api_endpoint, F.data_source, F.file_processed, 'success'
+	FROM `fitbit-data-extract.fitbit.files_processed` AS F
+	WHERE NOT EXISTS (SELECT 1 FROM `fitbit-data-extract.fitbit.run_ledger` AS L WHERE L.run_type = 'transform' AND L.file_path = F.file_processed AND L.processed_date = F.processed_date);
+	END IF;
+
+END 
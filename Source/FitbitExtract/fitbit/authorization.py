@@ -75,6 +75,7 @@ class LocalTokenManagerParameters:
     token_name: str = "token"
     make_directory: bool = True
     load_credentials: bool = False
+    token_url: str = TOKEN_URL
 
 
 class LocalTokenManager:
@@ -136,7 +137,7 @@ class LocalTokenManager:
         }
         headers = {"Content-type": "application/x-www-form-urlencoded"}
         response = requests.post(
-            TOKEN_URL,
+            self.parameters.token_url,
             headers=headers,
             data=body,
             timeout=600,
@@ -197,6 +198,7 @@ class CloudTokenManagerParameters:
     client_id_name: str = "fitbitapp_client_id"
     client_secret_name: str = "fitbitapp_client_secret"
     token_folder: str = "user_tokens"
+    token_url: str = TOKEN_URL
 
 
 class CloudTokenManager:
@@ -250,7 +252,7 @@ class CloudTokenManager:
         }
         headers = {"Content-type": "application/x-www-form-urlencoded"}
         response = requests.post(
-            TOKEN_URL,
+            self.parameters.token_url,
             headers=headers,
             data=body,
             timeout=600,
@@ -1,11 +1,37 @@
-from datetime import datetime
+from __future__ import annotations
+
+from datetime import datetime, timedelta
 from http import HTTPStatus
+from typing import TYPE_CHECKING
+import zlib
 
 from dataclasses import dataclass, field
-from fitbit.authorization import FitbitToken, TokenManager
-from fitbit.constants import WEB_API_URL
-from fitbit.savers import FitbitResponseSaver
-from fitbit.requesters import FitbitRequester
+from fitbit.constants import (
+    BUNDLE_ENDPOINT,
+    BUNDLE_FILE_FORMAT,
+    DATE_FORMAT,
+    DATETIME_FORMAT,
+    RUN_LEDGER_ENDPOINT,
+    RUN_LEDGER_FILE_FORMAT,
+    WEB_API_URL,
+)
+from fitbit.instrumentation import (
+    LedgerMetricsSink,
+    MultiMetricsSink,
+    NullMetricsSink,
+    timer,
+)
+from fitbit.serialization import default_serializer, write_ndjson
+
+# Only needed for type hints, importing them here would load the storage, secret manager
+# and requests libraries into the transform function which only needs EndpointParameters
+if TYPE_CHECKING:  # pragma: no cover
+    from fitbit.authorization import FitbitToken, TokenManager
+    from fitbit.instrumentation import MetricsSink
+    from fitbit.manifests import FetchManifest
+    from fitbit.savers import FitbitResponseSaver
+    from fitbit.requesters import FitbitRequester
+    from fitbit.serialization import Serializer
 
 
 @dataclass
@@ -27,11 +53,29 @@ class FitBitCaller:
         response_saver: FitbitResponseSaver,
         requester: FitbitRequester,
         token_manager: TokenManager,
+        stream_formats: list[str] = None,
+        bundle: bool = False,
+        web_api_url: str = WEB_API_URL,
+        metrics: MetricsSink = None,
+        ledger: bool = False,
+        serializer: Serializer = None,
     ) -> None:
         self.user_token = user_token
         self.response_saver = response_saver
         self.requester = requester
         self.token_manager = token_manager
+        # Response formats that are streamed straight to storage instead of read into memory
+        self.stream_formats = stream_formats or []
+        # Save all the responses from a run as one object so they are transformed in
+        # a single invocation, streaming is not used when bundling
+        self.bundle = bundle
+        # Base url of the api, can be pointed at a stand in server for testing
+        self.web_api_url = web_api_url
+        self.metrics = metrics or NullMetricsSink()
+        # Save a run ledger row for each endpoint requested, see save_ledger
+        self.ledger = ledger
+        # Serializer for the json of the ledger and bundle objects and device responses
+        self.serializer = serializer or default_serializer()
         self.registered_endpoints = []
         self.available_endpoints = {
             "get_heart_rate_by_date": self.create_url_heart_rate,
@@ -42,6 +86,9 @@ class FitBitCaller:
             "get_heart_rate_variablity_by_date": self.create_url_heart_rate_variablity,
             "get_cardio_score_by_date": self.create_url_cardio_score,
             "get_sleep_by_date": self.create_url_sleep,
+            "get_heart_rate_intraday_by_date": self.create_url_heart_rate_intraday,
+            "get_steps_intraday_by_date": self.create_url_steps_intraday,
+            "get_spo2_intraday_by_date": self.create_url_spo2_intraday,
         }
 
     def refresh_access_token(self) -> None:
@@ -50,6 +97,7 @@ class FitBitCaller:
         """
         self.user_token = self.token_manager.refresh_token(self.user_token)
         self.token_manager.save_token(self.user_token)
+        self.metrics.increment("token_refreshes")
 
     def register_multiple_endpoints(self, endpoints: list[EndpointParameters]) -> None:
         """
@@ -89,49 +137,362 @@ class FitBitCaller:
             ValueError: If retries are negative
             Exception: If calling the endpoint does not work after the specified number of retries
         """
-        data_str = date.strftime("%Y%m%d")
+        if len(self.registered_endpoints) < 1:
+            raise Exception("No endpoints have been registered")
+
+        if retries < 0:
+            raise ValueError("Retries cannot be less than 0")
+
+        if not self.user_token.access_token_isvalid:
+            self.refresh_access_token()
+
+        self._make_requests_for_date(self.registered_endpoints, date, retries)
+
+    def make_registered_requests_incremental(
+        self, sync_state: FetchManifest, max_days: int = 7, retries: int = 5
+    ) -> dict:
+        """Makes the requests for the registered APIs only for the dates with new data. The
+        last device sync time is stored as a high-water mark for each user and endpoint,
+        each run requests the dates from the previous sync through to the latest sync
+
+        Args:
+            sync_state (FetchManifest): manifest the high-water marks are stored in
+            max_days (int, optional): Most days to request for an endpoint. Defaults to 7.
+            retries (int, optional): Number of retries for each request. Defaults to 5.
+
+        Raises:
+            Exception: If no endpoints have been registered
+            ValueError: If retries are negative or max_days is less than 1
 
+        Returns:
+            dict: the dates requested with the names of the endpoints requested for each
+        """
         if len(self.registered_endpoints) < 1:
             raise Exception("No endpoints have been registered")
 
         if retries < 0:
             raise ValueError("Retries cannot be less than 0")
 
+        if max_days < 1:
+            raise ValueError("max_days cannot be less than 1")
+
         if not self.user_token.access_token_isvalid:
             self.refresh_access_token()
+
+        last_sync_time = self.get_last_sync_time(retries)
+        if last_sync_time is None:
+            print(f"No synced devices found for {self.user_token.user_id}")
+            return {}
+
+        last_sync_date = last_sync_time.date()
+        earliest_date = last_sync_date - timedelta(days=max_days - 1)
+        date_endpoints = {}
         for endpoint in self.registered_endpoints:
+            entry = sync_state.get(f"{self.user_token.user_id}_{endpoint.name}")
+            if entry is None:
+                start_date = last_sync_date
+            else:
+                previous_sync_time = datetime.strptime(
+                    entry["last_sync_time"], DATETIME_FORMAT
+                )
+                if previous_sync_time >= last_sync_time:
+                    continue
+                # The day of the previous sync is requested again as it was incomplete
+                start_date = max(previous_sync_time.date(), earliest_date)
+
+            for day in range((last_sync_date - start_date).days + 1):
+                request_date = start_date + timedelta(days=day)
+                date_endpoints.setdefault(request_date, []).append(endpoint)
+
+        for request_date in sorted(date_endpoints):
+            self._make_requests_for_date(
+                date_endpoints[request_date], request_date, retries
+            )
+
+        requested_endpoints = {
+            endpoint.name
+            for endpoints in date_endpoints.values()
+            for endpoint in endpoints
+        }
+        for endpoint_name in sorted(requested_endpoints):
+            sync_state.update(
+                f"{self.user_token.user_id}_{endpoint_name}",
+                {"last_sync_time": last_sync_time.strftime(DATETIME_FORMAT)},
+            )
+
+        return {
+            request_date: [endpoint.name for endpoint in endpoints]
+            for request_date, endpoints in sorted(date_endpoints.items())
+        }
+
+    def get_last_sync_time(self, retries: int = 5) -> datetime | None:
+        """Gets the most recent sync time of the user's devices
+
+        Args:
+            retries (int, optional): Number of retries for the request. Defaults to 5.
+
+        Raises:
+            Exception: If the request does not work after the specified number of retries
+
+        Returns:
+            datetime | None: latest device sync time or None if the user has no devices
+        """
+        url = f"{self.web_api_url}/1/user/{self.user_token.user_id}/devices.json"
+        tags = {"endpoint": "get_devices"}
+
+        for attempt_number in range(1, retries + 2):
+            if attempt_number > 1:
+                self.metrics.increment("retries", tags=tags)
+            headers = {"authorization": self.user_token.return_authorization()}
+            with timer(self.metrics, "request", tags):
+                data, httpcode = self.requester.make_request("GET", url, headers, {})
+
+            if httpcode == HTTPStatus.UNAUTHORIZED:
+                self.refresh_access_token()
+
+            if httpcode == HTTPStatus.FORBIDDEN:
+                raise Exception("Request is forbidden please check user scope")
+
+            if httpcode == HTTPStatus.OK:
+                break
+
+            if attempt_number == retries + 1:
+                raise Exception(f"Request failed after {retries} retries")
+
+        sync_times = [
+            datetime.strptime(device["lastSyncTime"][:19], "%Y-%m-%dT%H:%M:%S")
+            for device in self.serializer.loads(data)
+            if device.get("lastSyncTime")
+        ]
+        if not sync_times:
+            return None
+        return max(sync_times)
+
+    def _make_requests_for_date(
+        self, endpoints: list[EndpointParameters], date: datetime.date, retries: int
+    ) -> None:
+        """Requests and saves the endpoints for a date
+
+        Args:
+            endpoints (list[EndpointParameters]): endpoints to request
+            date (datetime.date): Date to run the API calls for
+            retries (int): Number of retries for each request
+
+        Raises:
+            Exception: If calling the endpoint does not work after the specified number of retries
+        """
+        data_str = date.strftime("%Y%m%d")
+        run_datetime = datetime.now().strftime(DATETIME_FORMAT)
+        bundle_records = []
+        ledger_rows = []
+        for endpoint in endpoints:
             # setup url
             url_func = self.available_endpoints[endpoint.name]
             url_kwargs = endpoint.url_kwargs
             url, instance_name = url_func(date, **url_kwargs)
-            # setup headers
-            headers = {"authorization": self.user_token.return_authorization()}
-            headers = {**headers, **endpoint.headers}
-            # setup body
-            body = {**endpoint.body}
             # Setup save parameters
             folder = f"{endpoint.name}/{data_str}"
             file_name = f"{instance_name}_{self.user_token.user_id}"
+            file_path = f"{folder}/{file_name}.{endpoint.response_format}"
 
-            for attempt_number in range(1, retries + 2):
-
-                data, httpcode = self.requester.make_request(
-                    endpoint.method, url, headers, body
+            ledger = LedgerMetricsSink()
+            metrics = MultiMetricsSink([self.metrics, ledger])
+            try:
+                outcome, data = self._request_endpoint(
+                    endpoint, url, folder, file_name, retries, metrics
+                )
+            except Exception as exc:
+                ledger_rows.append(
+                    self._create_ledger_row(
+                        ledger.ledger_row("failed", exc),
+                        endpoint.name,
+                        date,
+                        file_path,
+                        run_datetime,
+                    )
+                )
+                self.save_ledger(ledger_rows, date)
+                raise
+
+            if outcome == "bundled":
+                file_path = None
+                bundle_records.append(
+                    {
+                        "endpoint": endpoint.name,
+                        "instance": instance_name,
+                        "user_id": self.user_token.user_id,
+                        "date": date.strftime(DATE_FORMAT),
+                        "format": endpoint.response_format,
+                        "data": data,
+                    }
                 )
+            ledger_rows.append(
+                self._create_ledger_row(
+                    ledger.ledger_row(outcome),
+                    endpoint.name,
+                    date,
+                    file_path,
+                    run_datetime,
+                )
+            )
+
+        if bundle_records:
+            ledger = LedgerMetricsSink()
+            metrics = MultiMetricsSink([self.metrics, ledger])
+            with timer(metrics, "save", {"endpoint": BUNDLE_ENDPOINT}):
+                file_path, saved = self.save_bundle(bundle_records, date)
+            ledger_rows.append(
+                self._create_ledger_row(
+                    ledger.ledger_row("saved" if saved else "unchanged"),
+                    BUNDLE_ENDPOINT,
+                    date,
+                    file_path,
+                    run_datetime,
+                )
+            )
 
-                if httpcode == HTTPStatus.UNAUTHORIZED:
-                    self.refresh_access_token()
+        self.save_ledger(ledger_rows, date)
 
-                if httpcode == HTTPStatus.FORBIDDEN:
-                    raise Exception("Request is forbidden please check user scope")
+    def _request_endpoint(
+        self,
+        endpoint: EndpointParameters,
+        url: str,
+        folder: str,
+        file_name: str,
+        retries: int,
+        metrics: MetricsSink,
+    ) -> tuple[str, str | None]:
+        """Requests an endpoint retrying failed requests and saves the response, unless
+        bundling where the response is returned to be saved in the bundle
 
-                if httpcode == HTTPStatus.OK:
-                    self.response_saver.save(
+        Returns:
+            str: saved, unchanged if the saved response was the same, or bundled
+            str | None: the response when bundling
+
+        Raises:
+            Exception: If calling the endpoint does not work after the specified number of retries
+        """
+        # setup headers
+        headers = {"authorization": self.user_token.return_authorization()}
+        headers = {**headers, **endpoint.headers}
+        # setup body
+        body = {**endpoint.body}
+
+        stream = not self.bundle and endpoint.response_format in self.stream_formats
+        tags = {"endpoint": endpoint.name}
+
+        for attempt_number in range(1, retries + 2):
+            if attempt_number > 1:
+                metrics.increment("retries", tags=tags)
+
+            # Streamed bodies are downloaded while they are saved so their request
+            # time only covers the response headers
+            with timer(metrics, "request", tags):
+                if stream:
+                    data, httpcode = self.requester.make_stream_request(
+                        endpoint.method, url, headers, body
+                    )
+                else:
+                    data, httpcode = self.requester.make_request(
+                        endpoint.method, url, headers, body
+                    )
+
+            if httpcode == HTTPStatus.UNAUTHORIZED:
+                self.refresh_access_token()
+
+            if httpcode == HTTPStatus.FORBIDDEN:
+                raise Exception("Request is forbidden please check user scope")
+
+            if httpcode == HTTPStatus.OK and self.bundle:
+                metrics.increment("response_bytes", len(data.encode("utf-8")), tags)
+                return "bundled", data
+            if httpcode == HTTPStatus.OK and stream:
+                with timer(metrics, "save", tags):
+                    saved = self.response_saver.save_stream(
+                        self._count_chunks(data, metrics, tags),
+                        folder,
+                        file_name,
+                        endpoint.response_format,
+                    )
+                return "saved" if saved else "unchanged", None
+            if httpcode == HTTPStatus.OK:
+                metrics.increment("response_bytes", len(data.encode("utf-8")), tags)
+                with timer(metrics, "save", tags):
+                    saved = self.response_saver.save(
                         data, folder, file_name, endpoint.response_format
                     )
-                    break
-                if attempt_number == retries + 1:
-                    raise Exception(f"Request failed after {retries} retries")
+                return "saved" if saved else "unchanged", None
+            if attempt_number == retries + 1:
+                raise Exception(f"Request failed after {retries} retries")
+
+    def _count_chunks(self, chunks, metrics: MetricsSink, tags: dict):
+        """Passes through the chunks of a streamed response counting their bytes"""
+        byte_count = 0
+        for chunk in chunks:
+            byte_count += len(chunk)
+            yield chunk
+        metrics.increment("response_bytes", byte_count, tags)
+
+    def _create_ledger_row(
+        self,
+        measures: dict,
+        endpoint_name: str,
+        date: datetime.date,
+        file_path: str,
+        run_datetime: str,
+    ) -> dict:
+        """Creates the run ledger row of an endpoint request from its measures"""
+        return {
+            "run_type": "extract",
+            "date": date.strftime(DATE_FORMAT),
+            "user_id": self.user_token.user_id,
+            "processed_date": run_datetime,
+            "api_endpoint": endpoint_name,
+            "data_source": None,
+            "file_path": file_path,
+            **measures,
+        }
+
+    def save_ledger(self, rows: list[dict], date: datetime.date) -> None:
+        """Saves the run ledger rows of the requests made for a date as an ndjson object,
+        the transform function loads them into the run ledger table. The instance id is
+        the time of the save so each run is kept
+
+        Args:
+            rows (list[dict]): run ledger row for each endpoint requested
+            date (datetime.date): Date the API calls were run for
+        """
+        if not self.ledger or not rows:
+            return
+
+        instance_id = datetime.now().strftime("%Y%m%d%H%M%S%f")
+        folder = f"{RUN_LEDGER_ENDPOINT}/{date.strftime('%Y%m%d')}"
+        file_name = f"{instance_id}_{RUN_LEDGER_ENDPOINT}_{self.user_token.user_id}"
+        ledger = write_ndjson(rows, self.serializer).getvalue().decode("utf-8")
+
+        self.response_saver.save(ledger, folder, file_name, RUN_LEDGER_FILE_FORMAT)
+
+    def save_bundle(self, records: list[dict], date: datetime.date) -> tuple[str, bool]:
+        """Saves the responses of a run as a single ndjson object. The instance id is a
+        checksum of the endpoint instances so different sets of endpoints for the same
+        date do not overwrite each other
+
+        Args:
+            records (list[dict]): one record per response with the endpoint details and data
+            date (datetime.date): Date the API calls were run for
+
+        Returns:
+            str: path of the bundle relative to the saver location
+            bool: True if the bundle was saved, False if its content was unchanged
+        """
+        instances = "|".join(record["instance"] for record in records)
+        instance_id = zlib.crc32(instances.encode("utf-8"))
+        folder = f"{BUNDLE_ENDPOINT}/{date.strftime('%Y%m%d')}"
+        file_name = f"{instance_id}_{BUNDLE_ENDPOINT}_{self.user_token.user_id}"
+        bundle = write_ndjson(records, self.serializer).getvalue().decode("utf-8")
+
+        saved = self.response_saver.save(bundle, folder, file_name, BUNDLE_FILE_FORMAT)
+        return f"{folder}/{file_name}.{BUNDLE_FILE_FORMAT}", saved
 
     # Methods to generate the fitbit URLs for each endpoint
     def create_url_heart_rate(
@@ -154,7 +515,7 @@ class FitBitCaller:
             raise ValueError("Period is not one of the supported values")
 
         return (
-            f"{WEB_API_URL}/1/user/{self.user_token.user_id}/activities/heart/date/{date}/{period}.json",
+            f"{self.web_api_url}/1/user/{self.user_token.user_id}/activities/heart/date/{date}/{period}.json",
             "get_heart_rate_by_date",
         )
 
@@ -171,7 +532,7 @@ class FitBitCaller:
         """
 
         return (
-            f"{WEB_API_URL}/1/user/{self.user_token.user_id}/body/log/weight/date/{date}.json",
+            f"{self.web_api_url}/1/user/{self.user_token.user_id}/body/log/weight/date/{date}.json",
             "get_body_weight_by_date",
         )
 
@@ -187,7 +548,7 @@ class FitBitCaller:
             str: Instance file name for saving
         """
         return (
-            f"{WEB_API_URL}/1/user/{self.user_token.user_id}/activities/date/{date}.json",
+            f"{self.web_api_url}/1/user/{self.user_token.user_id}/activities/date/{date}.json",
             "get_activity_summary_by_date",
         )
 
@@ -204,7 +565,7 @@ class FitBitCaller:
             partialtcx_str = "false"
 
         return (
-            f"{WEB_API_URL}/1/user/{self.user_token.user_id}/activities/{log_id}.tcx?includePartialTCX={partialtcx_str}",
+            f"{self.web_api_url}/1/user/{self.user_token.user_id}/activities/{log_id}.tcx?includePartialTCX={partialtcx_str}",
             f"{log_id}_get_activity_tcx_by_id",
         )
 
@@ -216,27 +577,82 @@ class FitBitCaller:
             raise ValueError("log_id was not provided as a parameter")
 
         return (
-            f"{WEB_API_URL}/1/user/{self.user_token.user_id}/activities/{log_id}.json",
+            f"{self.web_api_url}/1/user/{self.user_token.user_id}/activities/{log_id}.json",
             f"{log_id}_get_activity_details_by_id",
         )
 
     def create_url_heart_rate_variablity(self, date: datetime.date) -> tuple[str, str]:
 
         return (
-            f"{WEB_API_URL}/1/user/{self.user_token.user_id}/hrv/date/{date}/all.json",
+            f"{self.web_api_url}/1/user/{self.user_token.user_id}/hrv/date/{date}/all.json",
             "get_heart_rate_variablity_by_date",
         )
 
     def create_url_cardio_score(self, date: datetime.date) -> tuple[str, str]:
 
         return (
-            f"{WEB_API_URL}/1/user/{self.user_token.user_id}/cardioscore/date/{date}.json",
+            f"{self.web_api_url}/1/user/{self.user_token.user_id}/cardioscore/date/{date}.json",
             "get_cardio_score_by_date",
         )
 
     def create_url_sleep(self, date: datetime.date) -> tuple[str, str]:
 
         return (
-            f"{WEB_API_URL}/1.2/user/{self.user_token.user_id}/sleep/date/{date}.json",
+            f"{self.web_api_url}/1.2/user/{self.user_token.user_id}/sleep/date/{date}.json",
             "get_sleep_by_date",
         )
+
+    def create_url_heart_rate_intraday(
+        self, date: datetime.date, detail_level: str = "1sec"
+    ) -> tuple[str, str]:
+        """Generates the URL for calling the intraday heart rate endpoint
+
+        Args:
+            date (date): The date in the format yyyy-MM-dd or today
+            detail_level (str, optional): Interval between data points. Defaults to "1sec".
+
+        Raises:
+            ValueError: errors if detail level is not in supported list
+
+        Returns:
+            str: Get request URL to call to retrieve the data
+            str: Instance file name for saving
+        """
+        if detail_level not in ["1sec", "1min", "5min", "15min"]:
+            raise ValueError("Detail level is not one of the supported values")
+
+        return (
+            f"{self.web_api_url}/1/user/{self.user_token.user_id}/activities/heart/date/{date}/1d/{detail_level}.json",
+            "get_heart_rate_intraday_by_date",
+        )
+
+    def create_url_steps_intraday(
+        self, date: datetime.date, detail_level: str = "1min"
+    ) -> tuple[str, str]:
+        """Generates the URL for calling the intraday steps endpoint
+
+        Args:
+            date (date): The date in the format yyyy-MM-dd or today
+            detail_level (str, optional): Interval between data points. Defaults to "1min".
+
+        Raises:
+            ValueError: errors if detail level is not in supported list
+
+        Returns:
+            str: Get request URL to call to retrieve the data
+            str: Instance file name for saving
+        """
+        if detail_level not in ["1min", "5min", "15min"]:
+            raise ValueError("Detail level is not one of the supported values")
+
+        return (
+            f"{self.web_api_url}/1/user/{self.user_token.user_id}/activities/steps/date/{date}/1d/{detail_level}.json",
+            "get_steps_intraday_by_date",
+        )
+
+    def create_url_spo2_intraday(self, date: datetime.date) -> tuple[str, str]:
+
+        return (
+            f"{self.web_api_url}/1/user/{self.user_token.user_id}/spo2/date/{date}/all.json",
+            "get_spo2_intraday_by_date",
+        )
@@ -0,0 +1,132 @@
+import gzip
+import io
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, TextIO
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+GZIP = "gzip"
+ZSTD = "zstd"
+COMPRESSION_EXTENSIONS = {GZIP: "gz", ZSTD: "zst"}
+
+
+def check_compression(compression: str | None) -> None:
+    """Checks a compression option is supported in this environment
+
+    Args:
+        compression (str | None): gzip, zstd or None for no compression
+
+    Raises:
+        ValueError: If the compression is not supported
+        ImportError: If zstd is used without the zstandard package installed
+    """
+    if compression is None:
+        return
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError(
+            f"Compression {compression} is not supported, use one of {list(COMPRESSION_EXTENSIONS)}"
+        )
+    if compression == ZSTD and zstandard is None:
+        raise ImportError("zstd compression requires the zstandard package")
+
+
+def compression_suffix(compression: str | None) -> str:
+    """Returns the extension added to a file name for a compression, eg .gz"""
+    if compression is None:
+        return ""
+    return f".{COMPRESSION_EXTENSIONS[compression]}"
+
+
+def storage_headers(compression: str | None) -> tuple[str | None, str | None]:
+    """Returns the content encoding and content type to store a compressed object with.
+    Storage only decompresses gzip content encoding for clients, so other compressions
+    are stored as their own content type without an encoding
+
+    Args:
+        compression (str | None): gzip, zstd or None for no compression
+
+    Returns:
+        tuple[str | None, str | None]: content encoding and content type, None for the
+            defaults of an uncompressed object
+    """
+    if compression is None:
+        return None, None
+    if compression == GZIP:
+        return GZIP, "application/octet-stream"
+    return None, f"application/{compression}"
+
+
+def split_compression(path: str) -> tuple[str, str | None]:
+    """Removes the compression extension from a path
+
+    Args:
+        path (str): file path, eg 20230118/get_sleep_by_date_ABC123.json.gz
+
+    Returns:
+        tuple[str, str | None]: path without the compression extension and the compression used
+    """
+    for compression, extension in COMPRESSION_EXTENSIONS.items():
+        if path.endswith(f".{extension}"):
+            return path[: -len(extension) - 1], compression
+    return path, None
+
+
+def compress(data: str, compression: str | None) -> bytes:
+    """Compresses text with the compression method, None returns the utf-8 bytes"""
+    encoded = data.encode("utf-8")
+    if compression is None:
+        return encoded
+    if compression == GZIP:
+        # Fixed mtime so the same response always produces the same bytes
+        return gzip.compress(encoded, mtime=0)
+    check_compression(compression)
+    return zstandard.ZstdCompressor().compress(encoded)
+
+
+def open_text(file_obj: BinaryIO, compression: str | None) -> TextIO:
+    """Wraps a binary file so it can be read as text, decompressing while it is read
+
+    Args:
+        file_obj (BinaryIO): binary file or stream of the stored data
+        compression (str | None): compression the data was stored with
+
+    Returns:
+        TextIO: utf-8 text stream of the decompressed data
+    """
+    if compression == GZIP:
+        file_obj = gzip.GzipFile(fileobj=file_obj, mode="rb")
+    elif compression == ZSTD:
+        check_compression(compression)
+        file_obj = zstandard.ZstdDecompressor().stream_reader(file_obj)
+    elif compression is not None:
+        check_compression(compression)
+    return io.TextIOWrapper(file_obj, encoding="utf-8")
+
+
+@contextmanager
+def compressed_writer(
+    file_obj: BinaryIO, compression: str | None
+) -> Iterator[BinaryIO]:
+    """Wraps a binary file so data written to it is compressed, the file is left open
+    when the writer is closed
+
+    Args:
+        file_obj (BinaryIO): binary file or stream to write the stored data to
+        compression (str | None): compression to store the data with
+
+    Yields:
+        BinaryIO: writer for the uncompressed data
+    """
+    if compression is None:
+        yield file_obj
+    elif compression == GZIP:
+        with gzip.GzipFile(fileobj=file_obj, mode="wb", mtime=0) as writer:
+            yield writer
+    else:
+        check_compression(compression)
+        compressor = zstandard.ZstdCompressor()
+        with compressor.stream_writer(file_obj, closefd=False) as writer:
+            yield writer
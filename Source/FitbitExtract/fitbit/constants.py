@@ -1,6 +1,9 @@
+import os
+
 # API CONSTANTS
-WEB_API_URL = "https://api.fitbit.com"
-TOKEN_URL = "https://api.fitbit.com/oauth2/token"
+# The api urls can be overridden with environment variables to point at a stand in server
+WEB_API_URL = os.environ.get("FITBIT_WEB_API_URL", "https://api.fitbit.com")
+TOKEN_URL = os.environ.get("FITBIT_TOKEN_URL", f"{WEB_API_URL}/oauth2/token")
 AUTHORIZATION_URL = "https://www.fitbit.com/oauth2/authorize"
 POSSIBLE_SCOPES = [
     "activity",
@@ -24,6 +27,41 @@ POSSIBLE_SCOPES = [
 DATE_FORMAT = "%Y-%m-%d"
 DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
 
+# Storage Constants
+# Folders of the objects that do not hold api responses. These are written to the state
+# bucket so they do not trigger the transform load function, which also ignores them in
+# the file store bucket
+MANIFEST_FOLDER = "manifests"
+PROFILES_FOLDER = "profiles"
+# Streamed responses are uploaded here first and only copied to their path if changed
+UPLOADS_FOLDER = "uploads"
+RESERVED_FOLDERS = [MANIFEST_FOLDER, PROFILES_FOLDER, UPLOADS_FOLDER]
+
+# Set to true to profile every extract and transform run, see fitbit.profiling
+PROFILE_ENV_VAR = "FITBIT_PROFILE"
+# Environment variable with the number of tables a transform loads at the same time
+LOAD_WORKERS_ENV_VAR = "FITBIT_LOAD_WORKERS"
+
+# Bundled responses, all the responses from one run saved as a single ndjson object
+# with one record per endpoint response
+BUNDLE_ENDPOINT = "get_bundle_by_date"
+BUNDLE_FILE_FORMAT = "ndjson"
+
+# Run ledger, a row per file transformed and per endpoint requested with the time taken
+# in each stage. Extract runs save their rows as an ndjson object that the transform
+# function loads, so the extract function does not need the bigquery client
+RUN_LEDGER_ENDPOINT = "get_run_ledger_by_date"
+RUN_LEDGER_FILE_FORMAT = "ndjson"
+RUN_LEDGER_STAGES = [
+    "request",
+    "save",
+    "extract",
+    "transform",
+    "load",
+    "refresh_rollup",
+    "publish",
+]
+
 
 # Transform Constants
 TABLE_NAME_MAPPING = {
@@ -32,10 +70,13 @@ TABLE_NAME_MAPPING = {
     "get_activity_summary_by_date": "summary",
     "get_heart_rate_by_date": "heart_rate",
     "get_body_weight_by_date": "weight",
-    "file_processing_log": "files_processed",
+    RUN_LEDGER_ENDPOINT: "run_ledger",
     "get_cardio_score_by_date": "cardioscore",
     "get_sleep_by_date": "sleep",
     "get_activity_tcx_by_id": "activity_detail",
+    "get_heart_rate_intraday_by_date": "heart_rate_intraday",
+    "get_steps_intraday_by_date": "steps_intraday",
+    "get_spo2_intraday_by_date": "spo2_intraday",
 }
 
 ACTIVITY_FIELDS = {
@@ -189,13 +230,122 @@ ACTIVITY_TCX_FIELDS = {
     "HeartRateBpm": {"bq_name": "heart_rate_bpm", "bq_type": "INT64"},
 }
 
-FILES_PROCESSED_FIELDS = {
+# Intraday tables are loaded as columns rather than row dicts, the keys are the fields
+# of each point in the api response
+HEART_RATE_INTRADAY_FIELDS = {
+    "user_id": {"bq_name": "user_id", "bq_type": "STRING"},
+    "date": {"bq_name": "date", "bq_type": "DATE"},
+    "processed_date": {"bq_name": "processed_date", "bq_type": "TIMESTAMP"},
+    "time": {"bq_name": "date_time", "bq_type": "TIMESTAMP"},
+    "value": {"bq_name": "heart_rate", "bq_type": "INT64"},
+}
+
+STEPS_INTRADAY_FIELDS = {
+    "user_id": {"bq_name": "user_id", "bq_type": "STRING"},
+    "date": {"bq_name": "date", "bq_type": "DATE"},
+    "processed_date": {"bq_name": "processed_date", "bq_type": "TIMESTAMP"},
+    "time": {"bq_name": "date_time", "bq_type": "TIMESTAMP"},
+    "value": {"bq_name": "steps", "bq_type": "INT64"},
+}
+
+SPO2_INTRADAY_FIELDS = {
+    "user_id": {"bq_name": "user_id", "bq_type": "STRING"},
+    "date": {"bq_name": "date", "bq_type": "DATE"},
+    "processed_date": {"bq_name": "processed_date", "bq_type": "TIMESTAMP"},
+    "minute": {"bq_name": "date_time", "bq_type": "TIMESTAMP"},
+    "value": {"bq_name": "spo2", "bq_type": "FLOAT64"},
+}
+
+RUN_LEDGER_FIELDS = {
+    "run_type": {"bq_name": "run_type", "bq_type": "STRING"},
     "date": {"bq_name": "date", "bq_type": "DATE"},
     "user_id": {"bq_name": "user_id", "bq_type": "STRING"},
     "processed_date": {"bq_name": "processed_date", "bq_type": "TIMESTAMP"},
     "api_endpoint": {"bq_name": "api_endpoint", "bq_type": "STRING"},
     "data_source": {"bq_name": "data_source", "bq_type": "STRING"},
-    "file_processed": {"bq_name": "file_processed", "bq_type": "STRING"},
+    "file_path": {"bq_name": "file_path", "bq_type": "STRING"},
+    "outcome": {"bq_name": "outcome", "bq_type": "STRING"},
+    "error": {"bq_name": "error", "bq_type": "STRING"},
+    "duration_seconds": {"bq_name": "duration_seconds", "bq_type": "FLOAT64"},
+    **{
+        f"{stage}_seconds": {"bq_name": f"{stage}_seconds", "bq_type": "FLOAT64"}
+        for stage in RUN_LEDGER_STAGES
+    },
+    "bytes_read": {"bq_name": "bytes_read", "bq_type": "INT64"},
+    "retries": {"bq_name": "retries", "bq_type": "INT64"},
+    "rows_written": {
+        "bq_name": "rows_written",
+        "bq_type": "ARRAY<STRUCT<table_name STRING, row_count INT64>>",
+    },
+}
+
+# Rollup table metadata, the keys are the aggregate expressions over the source tables
+DAILY_SLEEP_FIELDS = {
+    "sleep.user_id": {"bq_name": "user_id", "bq_type": "STRING"},
+    "detail.date": {"bq_name": "date", "bq_type": "DATE"},
+    "CURRENT_TIMESTAMP()": {"bq_name": "processed_date", "bq_type": "TIMESTAMP"},
+    "SUM(IF(detail.level = 'deep', detail.seconds, 0)) / 60": {
+        "bq_name": "deep_minutes",
+        "bq_type": "FLOAT64",
+    },
+    "SUM(IF(detail.level = 'light', detail.seconds, 0)) / 60": {
+        "bq_name": "light_minutes",
+        "bq_type": "FLOAT64",
+    },
+    "SUM(IF(detail.level = 'rem', detail.seconds, 0)) / 60": {
+        "bq_name": "rem_minutes",
+        "bq_type": "FLOAT64",
+    },
+    "SUM(IF(detail.level = 'wake', detail.seconds, 0)) / 60": {
+        "bq_name": "wake_minutes",
+        "bq_type": "FLOAT64",
+    },
+    "SUM(detail.seconds) / 60": {"bq_name": "total_minutes", "bq_type": "FLOAT64"},
+}
+
+DAILY_ACTIVITY_FIELDS = {
+    "activity.user_id": {"bq_name": "user_id", "bq_type": "STRING"},
+    "activity.date": {"bq_name": "date", "bq_type": "DATE"},
+    "CURRENT_TIMESTAMP()": {"bq_name": "processed_date", "bq_type": "TIMESTAMP"},
+    "COUNT(DISTINCT activity.log_id)": {
+        "bq_name": "activity_count",
+        "bq_type": "INT64",
+    },
+    "SUM(activity.duration) / 60000": {
+        "bq_name": "duration_minutes",
+        "bq_type": "FLOAT64",
+    },
+    "SUM(activity.calories)": {"bq_name": "calories", "bq_type": "INT64"},
+    "SUM(activity.steps)": {"bq_name": "steps", "bq_type": "INT64"},
+}
+
+DAILY_ACTIVITY_DETAIL_FIELDS = {
+    "detail.user_id": {"bq_name": "user_id", "bq_type": "STRING"},
+    "detail.date": {"bq_name": "date", "bq_type": "DATE"},
+    "detail.log_id": {"bq_name": "log_id", "bq_type": "INT64"},
+    "CURRENT_TIMESTAMP()": {"bq_name": "processed_date", "bq_type": "TIMESTAMP"},
+    "ANY_VALUE(detail.sport)": {"bq_name": "sport", "bq_type": "STRING"},
+    "COUNT(*)": {"bq_name": "point_count", "bq_type": "INT64"},
+    "TIMESTAMP_DIFF(MAX(detail.date_time), MIN(detail.date_time), SECOND)": {
+        "bq_name": "duration_seconds",
+        "bq_type": "INT64",
+    },
+    "MAX(detail.distance_meters)": {
+        "bq_name": "distance_meters",
+        "bq_type": "FLOAT64",
+    },
+    "AVG(detail.heart_rate_bpm)": {
+        "bq_name": "avg_heart_rate_bpm",
+        "bq_type": "FLOAT64",
+    },
+    "MIN(detail.heart_rate_bpm)": {
+        "bq_name": "min_heart_rate_bpm",
+        "bq_type": "INT64",
+    },
+    "MAX(detail.heart_rate_bpm)": {
+        "bq_name": "max_heart_rate_bpm",
+        "bq_type": "INT64",
+    },
 }
 
 TABLE_NAME_METADATA_MAPPING = {
@@ -204,9 +354,154 @@ TABLE_NAME_METADATA_MAPPING = {
     "summary": SUMMARY_FIELDS,
     "heart_rate": HEART_RATE_FIELDS,
     "weight": WEIGHT_FIELDS,
-    "files_processed": FILES_PROCESSED_FIELDS,
+    "run_ledger": RUN_LEDGER_FIELDS,
     "cardioscore": CARDIOSCORE_FIELDS,
     "sleep": SLEEP_FIELDS,
     "sleep_detail": SLEEP_DETAILS_FIELDS,
     "activity_detail": ACTIVITY_TCX_FIELDS,
+    "heart_rate_intraday": HEART_RATE_INTRADAY_FIELDS,
+    "steps_intraday": STEPS_INTRADAY_FIELDS,
+    "spo2_intraday": SPO2_INTRADAY_FIELDS,
+    "daily_sleep": DAILY_SLEEP_FIELDS,
+    "daily_activity": DAILY_ACTIVITY_FIELDS,
+    "daily_activity_detail": DAILY_ACTIVITY_DETAIL_FIELDS,
+}
+
+# Rollup tables are refreshed for the affected user and dates after each file is loaded.
+# The from clause placeholders are replaced with the deduplicated rows of that source
+# table for the affected user and dates
+ROLLUP_MAPPING = {
+    "daily_sleep": {
+        "sources": ["sleep_detail", "sleep"],
+        "from": "{sleep_detail} AS detail JOIN {sleep} AS sleep USING (log_id)",
+        "filter": "detail.type = 'data'",
+    },
+    "daily_activity": {
+        "sources": ["activity"],
+        "from": "{activity} AS activity",
+    },
+    "daily_activity_detail": {
+        "sources": ["activity_detail"],
+        "from": "{activity_detail} AS detail",
+    },
+}
+
+ROLLUP_TRIGGER_MAPPING = {
+    "get_sleep_by_date": ["daily_sleep"],
+    "get_activity_summary_by_date": ["daily_activity"],
+    "get_activity_tcx_by_id": ["daily_activity_detail"],
+}
+
+# Physical layout of the tables used when generating the table DDL. Daily tables have a
+# row per user per day so are partitioned by month to avoid many tiny partitions, the
+# detail tables hold a row per data point so are partitioned by day and the raw
+# partitions expire after the retention period
+TABLE_LAYOUT_MAPPING = {
+    "activity": {
+        "partition_field": "date",
+        "partition_granularity": "MONTH",
+        "cluster_fields": ["user_id"],
+    },
+    "goals": {
+        "partition_field": "date",
+        "partition_granularity": "MONTH",
+        "cluster_fields": ["user_id"],
+    },
+    "summary": {
+        "partition_field": "date",
+        "partition_granularity": "MONTH",
+        "cluster_fields": ["user_id"],
+    },
+    "heart_rate": {
+        "partition_field": "date",
+        "partition_granularity": "MONTH",
+        "cluster_fields": ["user_id"],
+    },
+    "weight": {
+        "partition_field": "date",
+        "partition_granularity": "MONTH",
+        "cluster_fields": ["user_id"],
+    },
+    "run_ledger": {
+        "partition_field": "date",
+        "partition_granularity": "MONTH",
+        "cluster_fields": ["run_type", "user_id", "api_endpoint"],
+    },
+    "cardioscore": {
+        "partition_field": "date",
+        "partition_granularity": "MONTH",
+        "cluster_fields": ["user_id"],
+    },
+    "sleep": {
+        "partition_field": "date",
+        "partition_granularity": "MONTH",
+        "cluster_fields": ["user_id"],
+    },
+    "sleep_detail": {
+        "partition_field": "date",
+        "partition_granularity": "DAY",
+        "cluster_fields": ["log_id", "level"],
+        "partition_expiration_days": 1095,
+    },
+    "activity_detail": {
+        "partition_field": "date",
+        "partition_granularity": "DAY",
+        "cluster_fields": ["user_id", "log_id"],
+        "partition_expiration_days": 1095,
+    },
+    "heart_rate_intraday": {
+        "partition_field": "date",
+        "partition_granularity": "DAY",
+        "cluster_fields": ["user_id"],
+        "partition_expiration_days": 1095,
+    },
+    "steps_intraday": {
+        "partition_field": "date",
+        "partition_granularity": "DAY",
+        "cluster_fields": ["user_id"],
+        "partition_expiration_days": 1095,
+    },
+    "spo2_intraday": {
+        "partition_field": "date",
+        "partition_granularity": "DAY",
+        "cluster_fields": ["user_id"],
+        "partition_expiration_days": 1095,
+    },
+    "daily_sleep": {
+        "partition_field": "date",
+        "partition_granularity": "MONTH",
+        "cluster_fields": ["user_id"],
+    },
+    "daily_activity": {
+        "partition_field": "date",
+        "partition_granularity": "MONTH",
+        "cluster_fields": ["user_id"],
+    },
+    "daily_activity_detail": {
+        "partition_field": "date",
+        "partition_granularity": "MONTH",
+        "cluster_fields": ["user_id", "log_id"],
+    },
+}
+
+# Fields that uniquely identify a row in each table. These are used as the streaming
+# insert ids and as the join keys when merging batch loads into the tables. The detail
+# tables include their partition date so a merge only scans the partitions loaded.
+# Tables without keys are append only
+TABLE_ROW_KEYS = {
+    "activity": ["user_id", "log_id"],
+    "goals": ["user_id", "date"],
+    "summary": ["user_id", "date"],
+    "heart_rate": ["user_id", "date"],
+    "weight": ["user_id", "log_id"],
+    "cardioscore": ["user_id", "date"],
+    "sleep": ["user_id", "log_id"],
+    "sleep_detail": ["date", "log_id", "type", "date_time"],
+    "activity_detail": ["date", "log_id", "lap_number", "point_order"],
+    "heart_rate_intraday": ["user_id", "date", "date_time"],
+    "steps_intraday": ["user_id", "date", "date_time"],
+    "spo2_intraday": ["user_id", "date", "date_time"],
+    "daily_sleep": ["user_id", "date"],
+    "daily_activity": ["user_id", "date"],
+    "daily_activity_detail": ["user_id", "date", "log_id"],
 }
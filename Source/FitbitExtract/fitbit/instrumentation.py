@@ -0,0 +1,232 @@
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Protocol, TextIO
+
+from fitbit.constants import RUN_LEDGER_STAGES
+
+# Counters of the bytes read by a run, the api response for extracts and the stored
+# object for transforms
+LEDGER_BYTE_COUNTERS = ["response_bytes", "bytes_read"]
+
+
+class MetricsSink(Protocol):
+    """
+    Interface protocol for a Metrics Sink. These classes receive the timings and counters
+    recorded around each stage of the pipeline, eg request, save, extract, transform,
+    load and publish
+
+    Methods
+    timing(str, float, dict) -> None: Record the seconds a stage took
+    increment(str, float, dict) -> None: Add to a counter, eg bytes, rows or retries
+    """
+
+    def timing(self, name: str, seconds: float, tags: dict = None) -> None:
+        """Record the seconds a stage took"""
+
+    def increment(self, name: str, value: float = 1, tags: dict = None) -> None:
+        """Add to a counter, eg bytes, rows or retries"""
+
+
+class NullMetricsSink:
+    """A metrics sink that discards everything, used when no sink is given"""
+
+    def timing(self, name: str, seconds: float, tags: dict = None) -> None:
+        pass
+
+    def increment(self, name: str, value: float = 1, tags: dict = None) -> None:
+        pass
+
+
+def metric_key(name: str, tags: dict = None) -> str:
+    """Creates a key for a metric and its tags, eg load[table=sleep]"""
+    if not tags:
+        return name
+    tag_str = ",".join(f"{key}={value}" for key, value in sorted(tags.items()))
+    return f"{name}[{tag_str}]"
+
+
+class LocalMetricsSink:
+    """A metrics sink that aggregates the metrics in memory, used for local runs and benchmarks"""
+
+    def __init__(self) -> None:
+        self.timings = {}
+        self.counters = {}
+        # Loads can run on several threads, see ConcurrentDataLoader
+        self.lock = threading.Lock()
+
+    def timing(self, name: str, seconds: float, tags: dict = None) -> None:
+        key = metric_key(name, tags)
+        with self.lock:
+            if key not in self.timings:
+                self.timings[key] = {
+                    "count": 0,
+                    "total": 0.0,
+                    "min": seconds,
+                    "max": 0.0,
+                }
+            timing = self.timings[key]
+            timing["count"] += 1
+            timing["total"] += seconds
+            timing["min"] = min(timing["min"], seconds)
+            timing["max"] = max(timing["max"], seconds)
+
+    def increment(self, name: str, value: float = 1, tags: dict = None) -> None:
+        key = metric_key(name, tags)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def summary(self) -> dict:
+        """Returns the aggregated timings and counters keyed by metric name and tags"""
+        return {
+            "timings": {key: dict(value) for key, value in self.timings.items()},
+            "counters": dict(self.counters),
+        }
+
+
+class JSONLogMetricsSink:
+    """
+    A metrics sink that writes each metric as a json line to stdout. Cloud Functions
+    parse json lines into structured log entries, so the fields can be filtered and
+    charted in Cloud Logging
+    """
+
+    def __init__(self, context: dict = None, stream: TextIO = None) -> None:
+        """
+        Args:
+            context (dict, optional): fields added to every entry, eg the function and user
+            stream (TextIO, optional): where to write the entries. Defaults to stdout.
+        """
+        self.context = context or {}
+        self.stream = stream
+
+    def _write(self, metric_type: str, name: str, value: float, tags: dict) -> None:
+        entry = {
+            "severity": "INFO",
+            "message": f"{metric_type} {metric_key(name, tags)} {value}",
+            "metric": name,
+            "metric_type": metric_type,
+            "value": value,
+            **self.context,
+            **(tags or {}),
+        }
+        stream = self.stream or sys.stdout
+        stream.write(json.dumps(entry, default=str) + "\n")
+
+    def timing(self, name: str, seconds: float, tags: dict = None) -> None:
+        self._write("timing", name, seconds, tags)
+
+    def increment(self, name: str, value: float = 1, tags: dict = None) -> None:
+        self._write("counter", name, value, tags)
+
+
+class MultiMetricsSink:
+    """A metrics sink that passes every metric on to each of a list of sinks"""
+
+    def __init__(self, sinks: list[MetricsSink]) -> None:
+        self.sinks = sinks
+
+    def timing(self, name: str, seconds: float, tags: dict = None) -> None:
+        for sink in self.sinks:
+            sink.timing(name, seconds, tags)
+
+    def increment(self, name: str, value: float = 1, tags: dict = None) -> None:
+        for sink in self.sinks:
+            sink.increment(name, value, tags)
+
+
+class LedgerMetricsSink:
+    """
+    A metrics sink that totals the metrics of a single run, eg one file transformed or
+    one endpoint requested, into the measures of a run ledger row
+    """
+
+    def __init__(self) -> None:
+        # Loads can run on several threads, see ConcurrentDataLoader
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Clears the totals and restarts the run duration"""
+        self.start = time.perf_counter()
+        self.seconds = {}
+        self.rows = {}
+        self.bytes_read = None
+        self.retries = 0
+
+    def timing(self, name: str, seconds: float, tags: dict = None) -> None:
+        with self.lock:
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def increment(self, name: str, value: float = 1, tags: dict = None) -> None:
+        with self.lock:
+            if name == "rows":
+                table_name = (tags or {}).get("table")
+                self.rows[table_name] = self.rows.get(table_name, 0) + value
+            elif name in LEDGER_BYTE_COUNTERS:
+                self.bytes_read = (self.bytes_read or 0) + value
+            elif name == "retries":
+                self.retries += value
+
+    def ledger_row(self, outcome: str, error: Exception = None) -> dict:
+        """Returns the outcome and measures of the run as run ledger fields
+
+        Args:
+            outcome (str): result of the run, eg success, saved or failed
+            error (Exception, optional): exception the run failed with
+
+        Returns:
+            dict: outcome, error, duration and seconds per stage, bytes, retries and rows
+        """
+        return {
+            "outcome": outcome,
+            "error": None if error is None else repr(error),
+            "duration_seconds": time.perf_counter() - self.start,
+            **{
+                f"{stage}_seconds": self.seconds.get(stage)
+                for stage in RUN_LEDGER_STAGES
+            },
+            "bytes_read": self.bytes_read,
+            "retries": self.retries,
+            "rows_written": [
+                {"table_name": table_name, "row_count": row_count}
+                for table_name, row_count in self.rows.items()
+            ],
+        }
+
+
+class TimedIterator:
+    """
+    Iterates over an iterable totalling the seconds spent producing its items and
+    counting them, so a consumer such as a stream load can take the time spent parsing
+    the rows off its own timing
+    """
+
+    def __init__(self, iterable: Iterable) -> None:
+        self.iterator = iter(iterable)
+        self.seconds = 0.0
+        self.count = 0
+
+    def __iter__(self) -> "TimedIterator":
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            item = next(self.iterator)
+        finally:
+            self.seconds += time.perf_counter() - start
+        self.count += 1
+        return item
+
+
+@contextmanager
+def timer(metrics: MetricsSink, name: str, tags: dict = None) -> Iterator[None]:
+    """Records the seconds taken by the block as a timing, including when it raises"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.timing(name, time.perf_counter() - start, tags)
@@ -1,41 +1,375 @@
-from typing import Protocol
+from concurrent import futures
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, Protocol
+import io
 import os
-import json
 import re
+import threading
+import time
+import uuid
 
 from google.cloud import storage
 from google.cloud import bigquery
 
+from fitbit.compression import open_text, split_compression
+from fitbit.instrumentation import MetricsSink, TimedIterator, timer
+from fitbit.serialization import Serializer, default_serializer, write_ndjson
+from fitbit.constants import (
+    ROLLUP_MAPPING,
+    TABLE_LAYOUT_MAPPING,
+    TABLE_NAME_METADATA_MAPPING,
+    TABLE_ROW_KEYS,
+)
+
+# Rows held in memory at once when loading a stream of rows, each chunk is one load
+LOAD_CHUNK_ROWS = 10000
+
+
+def create_row_ids(data: list[dict], key_fields: list[str]) -> list[str]:
+    """Creates a deterministic id for each row from the key fields of the table
+
+    Args:
+        data (list[dict]): rows to create ids for
+        key_fields (list[str]): names of the fields that uniquely identify a row
+
+    Returns:
+        list[str]: row ids in the same order as the data
+    """
+    return ["|".join(str(row.get(key)) for key in key_fields) for row in data]
+
+
+def _create_merge_actions(
+    key_fields: list[str], columns: list[str], target_filter: str = None
+) -> str:
+    """Creates the ON, UPDATE and INSERT clauses of a MERGE statement, the target filter
+    is added to the ON clause so only the matching partitions of the target are read"""
+    join_condition = " AND ".join(f"T.{key} = S.{key}" for key in key_fields)
+    if target_filter is not None:
+        join_condition += f" AND {target_filter}"
+    update_columns = ", ".join(f"{column} = S.{column}" for column in columns)
+    insert_columns = ", ".join(columns)
+    insert_values = ", ".join(f"S.{column}" for column in columns)
+
+    return (
+        f"ON {join_condition}\n"
+        f"WHEN MATCHED THEN UPDATE SET {update_columns}\n"
+        f"WHEN NOT MATCHED THEN INSERT ({insert_columns}) VALUES ({insert_values})"
+    )
+
+
+def create_merge_query(
+    target_table: str,
+    source_table: str,
+    key_fields: list[str],
+    columns: list[str],
+    partition_field: str = None,
+) -> str:
+    """Creates a MERGE statement that upserts the rows of the source table into the target
+
+    Args:
+        target_table (str): full name of the table to merge into
+        source_table (str): full name of the staging table with the new rows
+        key_fields (list[str]): names of the fields that uniquely identify a row
+        columns (list[str]): names of all the columns in the target table
+        partition_field (str, optional): partition column of the target, when it is one
+            of the keys only the partitions of the source rows are scanned. Defaults to
+            None.
+
+    Returns:
+        str: MERGE query
+    """
+    partition_keys = ", ".join(key_fields)
+    target_filter = None
+    if partition_field in key_fields:
+        target_filter = (
+            f"T.{partition_field} IN "
+            f"(SELECT DISTINCT {partition_field} FROM `{source_table}`)"
+        )
+
+    return (
+        f"MERGE `{target_table}` T\n"
+        f"USING (SELECT * FROM `{source_table}` WHERE TRUE "
+        f"QUALIFY ROW_NUMBER() OVER (PARTITION BY {partition_keys}) = 1) S\n"
+        + _create_merge_actions(key_fields, columns, target_filter)
+    )
+
+
+def create_rollup_source_query(dataset_reference: str, table_name: str) -> str:
+    """Creates a query of the latest version of each row of a table for the user and dates
+    of a rollup refresh, passed as the @user_id and @dates query parameters
+
+    Args:
+        dataset_reference (str): project and dataset of the table, eg project.dataset
+        table_name (str): name of the source table
+
+    Returns:
+        str: sub query of the source table rows
+    """
+    columns = [
+        field["bq_name"] for field in TABLE_NAME_METADATA_MAPPING[table_name].values()
+    ]
+    conditions = ["date IN UNNEST(@dates)"]
+    if "user_id" in columns:
+        conditions.append("user_id = @user_id")
+
+    query = f"(SELECT * FROM `{dataset_reference}.{table_name}` WHERE {' AND '.join(conditions)}"
+
+    if table_name in TABLE_ROW_KEYS:
+        partition_keys = ", ".join(TABLE_ROW_KEYS[table_name])
+        order_by = (
+            " ORDER BY processed_date DESC" if "processed_date" in columns else ""
+        )
+        query += (
+            f" QUALIFY ROW_NUMBER() OVER (PARTITION BY {partition_keys}{order_by}) = 1"
+        )
+
+    return query + ")"
+
+
+def create_rollup_query(dataset_reference: str, rollup_name: str) -> str:
+    """Creates a MERGE statement that recomputes a rollup table for the user and dates
+    passed as the @user_id and @dates query parameters, other dates are not touched
+
+    Args:
+        dataset_reference (str): project and dataset of the tables, eg project.dataset
+        rollup_name (str): name of the rollup table in the rollup mapping
+
+    Returns:
+        str: MERGE query
+    """
+    rollup = ROLLUP_MAPPING[rollup_name]
+    fields = TABLE_NAME_METADATA_MAPPING[rollup_name]
+    key_fields = TABLE_ROW_KEYS[rollup_name]
+    columns = [field["bq_name"] for field in fields.values()]
+
+    select_columns = ", ".join(
+        f"{expression} AS {field['bq_name']}" for expression, field in fields.items()
+    )
+    sources = {
+        table_name: create_rollup_source_query(dataset_reference, table_name)
+        for table_name in rollup["sources"]
+    }
+    source_query = f"SELECT {select_columns} FROM {rollup['from'].format(**sources)}"
+    if "filter" in rollup:
+        source_query += f" WHERE {rollup['filter']}"
+    source_query += f" GROUP BY {', '.join(key_fields)}"
+
+    return (
+        f"MERGE `{dataset_reference}.{rollup_name}` T\n"
+        f"USING ({source_query}) S\n"
+        + _create_merge_actions(key_fields, columns)
+        + "\nWHEN NOT MATCHED BY SOURCE AND T.user_id = @user_id "
+        "AND T.date IN UNNEST(@dates) THEN DELETE"
+    )
+
+
+def parse_ndjson(lines, serializer: Serializer = None) -> dict:
+    """Parses newline delimited json into a dict of records, blank lines are skipped"""
+    serializer = serializer or default_serializer()
+    return {"records": [serializer.loads(line) for line in lines if line.strip()]}
+
+
+def is_constant_column(values) -> bool:
+    """Checks if a column holds a single value shared by every row instead of a sequence"""
+    return isinstance(values, (str, int, float)) or values is None
+
+
+class ColumnBatch(dict):
+    """
+    A dict of columns built up a row at a time for tables with many rows that share most
+    of their values, eg the trackpoints of an activity. A column holds a single constant
+    value until a row has a different value for it, so the user, date and lap fields are
+    stored once per batch rather than once per row. Rows without a column are None in it.
+    The batch is loaded with load_columns and only expanded into rows when serialized
+    """
+
+    __slots__ = ("row_count",)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.row_count = 0
+
+    def append(self, row: dict) -> None:
+        """Adds a row to the batch, new columns keep the order they are first seen in"""
+        row_count = self.row_count
+        for name, value in row.items():
+            if name not in self:
+                if row_count == 0 and not is_constant_column(value):
+                    self[name] = []
+                else:
+                    self[name] = None if row_count else value
+
+        for name, values in self.items():
+            value = row.get(name)
+            if values.__class__ is list:
+                values.append(value)
+            elif value.__class__ is not values.__class__ or value != values:
+                self[name] = [values] * row_count + [value]
+        self.row_count = row_count + 1
+
+
+def iter_column_batches(
+    rows: Iterable[dict], chunk_rows: int = LOAD_CHUNK_ROWS
+) -> Iterator[ColumnBatch]:
+    """Collects a stream of rows into column batches of at most chunk_rows rows, so only
+    one chunk of the stream is held in memory at a time
+
+    Args:
+        rows (Iterable[dict]): rows to batch, eg from a parser generator
+        chunk_rows (int, optional): rows per batch. Defaults to LOAD_CHUNK_ROWS.
+
+    Yields:
+        ColumnBatch: the next chunk of rows, no empty batches are yielded
+    """
+    batch = ColumnBatch()
+    for row in rows:
+        batch.append(row)
+        if batch.row_count >= chunk_rows:
+            yield batch
+            batch = ColumnBatch()
+    if batch.row_count:
+        yield batch
+
+
+def column_row_count(columns: dict) -> int:
+    """Returns the number of rows in a dict of columns from the length of its sequences,
+    or the rows appended for a ColumnBatch as all of its columns can be constant
+
+    Raises:
+        ValueError: If the sequence columns have different lengths
+    """
+    if isinstance(columns, ColumnBatch):
+        return columns.row_count
+    lengths = {
+        len(values) for values in columns.values() if not is_constant_column(values)
+    }
+    if len(lengths) > 1:
+        raise ValueError(f"Columns have different lengths {sorted(lengths)}")
+    return lengths.pop() if lengths else 0
+
+
+def iter_column_rows(columns: dict):
+    """Yields a row dict for each position of the columns, constant columns are repeated
+    in every row. Rows are only built when written so the columns can stay as typed arrays
+
+    Args:
+        columns (dict): column name to a sequence of values or a single constant value
+
+    Yields:
+        dict: row with the columns in the same order as the dict
+    """
+    row_count = column_row_count(columns)
+    names = list(columns)
+    sequences = [
+        [values] * row_count if is_constant_column(values) else values
+        for values in columns.values()
+    ]
+    for values in zip(*sequences):
+        yield dict(zip(names, values))
+
+
+def columns_to_ndjson(columns: dict, serializer: Serializer = None) -> io.BytesIO:
+    """Writes the columns as newline delimited json for a batch load"""
+    return write_ndjson(iter_column_rows(columns), serializer)
+
+
+def columns_to_parquet(columns: dict, fields: dict) -> io.BytesIO | None:
+    """Writes the columns as a parquet file typed from the table metadata
+
+    Args:
+        columns (dict): column name to a sequence of values or a single constant value
+        fields (dict): table metadata from TABLE_NAME_METADATA_MAPPING
+
+    Returns:
+        io.BytesIO | None: parquet file or None if pyarrow is not installed
+    """
+    try:
+        import pyarrow  # pylint: disable=import-outside-toplevel
+        import pyarrow.parquet  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+
+    parquet_types = {
+        "STRING": pyarrow.string(),
+        "DATE": pyarrow.date32(),
+        "TIMESTAMP": pyarrow.timestamp("us"),
+        "INT": pyarrow.int64(),
+        "INT64": pyarrow.int64(),
+        "FLOAT64": pyarrow.float64(),
+    }
+    bq_types = {field["bq_name"]: field["bq_type"] for field in fields.values()}
+    row_count = column_row_count(columns)
+
+    arrays = []
+    for name, values in columns.items():
+        if is_constant_column(values):
+            values = pyarrow.repeat(values, row_count)
+        else:
+            values = pyarrow.array(values)
+        arrays.append(values.cast(parquet_types[bq_types[name]]))
+
+    file_obj = io.BytesIO()
+    pyarrow.parquet.write_table(
+        pyarrow.Table.from_arrays(arrays, names=list(columns)), file_obj
+    )
+    file_obj.seek(0)
+    return file_obj
+
 
 class DataLoader(Protocol):
     def extract(self, path: str) -> dict:
         """Extract method for DataLoader Protocol"""
 
+    def object_size(self, path: str) -> int:
+        """Object size method for DataLoader Protocol"""
+
     def load(self, data: list[dict], name: str) -> None:
         """Load method for DataLoader Protocol"""
 
+    def load_columns(self, columns: dict, name: str) -> None:
+        """Load columns method for DataLoader Protocol"""
+
+    def load_stream(
+        self, rows: Iterable[dict], name: str, chunk_rows: int = LOAD_CHUNK_ROWS
+    ) -> None:
+        """Load stream method for DataLoader Protocol"""
+
+    def refresh_rollup(self, name: str, user_id: str, dates: list[str]) -> None:
+        """Refresh rollup method for DataLoader Protocol"""
+
 
 class LocalDataLoader:
+    def __init__(self, serializer: Serializer = None) -> None:
+        self.serializer = serializer or default_serializer()
+
     def extract(self, path: str) -> dict:
-        _, file_extension = os.path.splitext(path)
+        uncompressed_path, compression = split_compression(path)
+        _, file_extension = os.path.splitext(uncompressed_path)
 
         if file_extension == ".json":
-            return self._extract_json(path)
+            return self._extract_json(path, compression)
+
+        if file_extension == ".ndjson":
+            with open_text(open(path, "rb"), compression) as file:
+                return parse_ndjson(file, self.serializer)
 
         if file_extension in [".xml", ".tcx"]:
-            return self._extract_xml(path)
+            return self._extract_xml(path, compression)
 
         raise ValueError(f"file type {file_extension} is not supported")
 
-    def _extract_xml(self, path: str):
-        with open(path, "r") as file:
+    def object_size(self, path: str) -> int:
+        return os.path.getsize(path)
+
+    def _extract_xml(self, path: str, compression: str = None):
+        with open_text(open(path, "rb"), compression) as file:
             data = file.read()
         return {"xml_data": data}
 
-    def _extract_json(self, path: str):
+    def _extract_json(self, path: str, compression: str = None):
 
-        with open(path, "r") as file:
-            data = json.load(file)
+        with open_text(open(path, "rb"), compression) as file:
+            data = self.serializer.loads(file.read())
 
         return data
 
@@ -44,43 +378,296 @@ class LocalDataLoader:
         for row in data:
             print(name, row)
 
+    def load_columns(self, columns: dict, name: str) -> None:
+
+        for row in iter_column_rows(columns):
+            print(name, row)
+
+    def load_stream(
+        self, rows: Iterable[dict], name: str, chunk_rows: int = LOAD_CHUNK_ROWS
+    ) -> None:
+        for batch in iter_column_batches(rows, chunk_rows):
+            self.load_columns(batch, name)
+
+    def refresh_rollup(self, name: str, user_id: str, dates: list[str]) -> None:
+
+        print(f"refresh rollup {name} for {user_id} on {dates}")
+
+
+class InstrumentedDataLoader:
+    """
+    Wraps a DataLoader recording the time taken by each extract, load and rollup
+    refresh, and the number of rows loaded into each table
+    """
+
+    def __init__(self, data_loader: DataLoader, metrics: MetricsSink) -> None:
+        self.data_loader = data_loader
+        self.metrics = metrics
+
+    def extract(self, path: str) -> dict:
+        with timer(self.metrics, "extract"):
+            data = self.data_loader.extract(path)
+        self.metrics.increment("bytes_read", self.data_loader.object_size(path))
+        return data
+
+    def object_size(self, path: str) -> int:
+        return self.data_loader.object_size(path)
+
+    def load(self, data: list[dict], name: str) -> None:
+        tags = {"table": name}
+        with timer(self.metrics, "load", tags):
+            self.data_loader.load(data, name)
+        self.metrics.increment("rows", len(data), tags)
+
+    def load_columns(self, columns: dict, name: str) -> None:
+        tags = {"table": name}
+        with timer(self.metrics, "load", tags):
+            self.data_loader.load_columns(columns, name)
+        self.metrics.increment("rows", column_row_count(columns), tags)
+
+    def load_stream(
+        self, rows: Iterable[dict], name: str, chunk_rows: int = LOAD_CHUNK_ROWS
+    ) -> None:
+        """Passes the stream on to the loader's load_stream so it stays a single load,
+        eg one MERGE for the GCP loader. The time spent producing the rows is recorded
+        as transform rather than load, so parsing is not counted as loading"""
+        tags = {"table": name}
+        timed_rows = TimedIterator(rows)
+        start = time.perf_counter()
+        try:
+            self.data_loader.load_stream(timed_rows, name, chunk_rows)
+        finally:
+            seconds = time.perf_counter() - start - timed_rows.seconds
+            self.metrics.timing("load", seconds, tags)
+            self.metrics.timing("transform", timed_rows.seconds, tags)
+        self.metrics.increment("rows", timed_rows.count, tags)
+
+    def refresh_rollup(self, name: str, user_id: str, dates: list[str]) -> None:
+        with timer(self.metrics, "refresh_rollup", {"table": name}):
+            self.data_loader.refresh_rollup(name, user_id, dates)
+
+
+class ConcurrentDataLoader:
+    """
+    A DataLoader that runs the loads of a file on a pool of threads, so the tables of a
+    file such as the activity summary are loaded at the same time rather than in turn.
+    No more loads than workers are running at once. Loads into the same table run in
+    turn, as BigQuery aborts MERGE statements that conflict with another on the table.
+    A stream of rows is a single load, so its rows are produced on the worker that
+    loads them. Once the loads of a file are
+    submitted wait must be called, it raises if any of the loads failed once all of
+    them have finished. Rollup refreshes wait for the pending loads first as they read
+    the loaded tables
+    """
+
+    def __init__(self, data_loader: DataLoader, workers: int = 1) -> None:
+        """
+        Args:
+            data_loader (DataLoader): loader the loads are passed on to
+            workers (int, optional): loads run at the same time, with 1 each load is run
+                when it is called. Defaults to 1.
+
+        Raises:
+            ValueError: If workers is less than 1
+        """
+        if workers < 1:
+            raise ValueError(f"Load workers should be at least 1, not {workers}")
+        self.data_loader = data_loader
+        self.workers = workers
+        self.executor = None
+        self.pending = []
+        # One lock per table so loads into the same table do not run at the same time
+        self.table_locks = {}
+        # Seconds the calling thread has spent running or waiting for loads, so the
+        # caller can take them off its own timing
+        self.blocked_seconds = 0.0
+        self.blocking = False
+
+    @contextmanager
+    def _blocking(self) -> Iterator[None]:
+        """Adds the time spent in the block to blocked_seconds, a block inside another
+        is only counted once"""
+        if self.blocking:
+            yield
+            return
+        self.blocking = True
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.blocking = False
+            self.blocked_seconds += time.perf_counter() - start
+
+    def _submit(self, name: str, function: Callable, *args) -> None:
+        with self._blocking():
+            self._submit_load(name, function, *args)
+
+    def _submit_load(self, name: str, function: Callable, *args) -> None:
+        if self.workers == 1:
+            function(*args)
+            return
+
+        if name not in self.table_locks:
+            self.table_locks[name] = threading.Lock()
+
+        if self.executor is None:
+            self.executor = futures.ThreadPoolExecutor(
+                self.workers, thread_name_prefix="load"
+            )
+        running = [future for future in self.pending if not future.done()]
+        if len(running) >= self.workers:
+            futures.wait(running, return_when=futures.FIRST_COMPLETED)
+        self.pending.append(
+            self.executor.submit(
+                self._run_locked, self.table_locks[name], function, *args
+            )
+        )
+
+    @staticmethod
+    def _run_locked(lock: threading.Lock, function: Callable, *args) -> None:
+        with lock:
+            function(*args)
+
+    def wait(self, raise_errors: bool = True) -> None:
+        """Waits for every pending load to finish and stops the worker threads
+
+        Args:
+            raise_errors (bool, optional): raise if any of the loads failed, a single
+                error is raised as it is. Defaults to True.
+
+        Raises:
+            ValueError: If more than one of the loads failed
+        """
+        with self._blocking():
+            self._wait(raise_errors)
+
+    def _wait(self, raise_errors: bool) -> None:
+        pending, self.pending = self.pending, []
+        errors = [future.exception() for future in pending]
+        errors = [error for error in errors if error is not None]
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+        if not errors or not raise_errors:
+            return
+        if len(errors) == 1:
+            raise errors[0]
+        raise ValueError(
+            f"{len(errors)} of {len(pending)} loads failed: {errors}"
+        ) from errors[0]
+
+    def extract(self, path: str) -> dict:
+        return self.data_loader.extract(path)
+
+    def object_size(self, path: str) -> int:
+        return self.data_loader.object_size(path)
+
+    def load(self, data: list[dict], name: str) -> None:
+        self._submit(name, self.data_loader.load, data, name)
+
+    def load_columns(self, columns: dict, name: str) -> None:
+        self._submit(name, self.data_loader.load_columns, columns, name)
+
+    def load_stream(
+        self, rows: Iterable[dict], name: str, chunk_rows: int = LOAD_CHUNK_ROWS
+    ) -> None:
+        """Submits the whole stream as one load so it is loaded by the loader's
+        load_stream, with more than one worker the rows are produced on the worker"""
+        self._submit(name, self.data_loader.load_stream, rows, name, chunk_rows)
+
+    def refresh_rollup(self, name: str, user_id: str, dates: list[str]) -> None:
+        with self._blocking():
+            self.wait()
+            self.data_loader.refresh_rollup(name, user_id, dates)
+
 
 class GCPDataLoader:
-    def __init__(self, project_id: str, bucket_name: str, dataset_name: str) -> None:
+    def __init__(
+        self,
+        project_id: str,
+        bucket_name: str,
+        dataset_name: str,
+        merge_loads: bool = False,
+        serializer: Serializer = None,
+    ) -> None:
+        """Loads data from Google Cloud Storage into BigQuery
+
+        Args:
+            project_id (str): GCP project id
+            bucket_name (str): bucket the api responses are stored in
+            dataset_name (str): BigQuery dataset of the tables
+            merge_loads (bool, optional): Upsert tables with row keys through a staging table
+                and MERGE instead of streaming inserts. Tables should be loaded using one
+                method as DML cannot update rows still in the streaming buffer. Tables
+                loaded with load_columns or load_stream are always merged as load jobs
+                cannot skip rows that were already loaded. Defaults to False.
+            serializer (Serializer, optional): json serializer for the objects read and
+                the batch load files written. Defaults to default_serializer().
+        """
         self.bucket_name = bucket_name
         self.project_id = project_id
         self.storage_client = storage.Client(project=project_id)
         self.bigquery_client = bigquery.Client(project=project_id)
         self.bucket = self.storage_client.get_bucket(bucket_name)
         self.dataset_name = dataset_name
+        self.merge_loads = merge_loads
+        self.serializer = serializer or default_serializer()
+        # Sizes of the objects read by extract so they do not need to be requested again
+        self.object_sizes = {}
 
         self.date_pattern = re.compile(
             "^20[0-9]{2}-((0[1-9])|(1[0-2]))-([0-2][1-9]|3[0-1])$"
         )
 
     def extract(self, path: str) -> dict:
-        _, file_extension = os.path.splitext(path)
+        uncompressed_path, compression = split_compression(path)
+        _, file_extension = os.path.splitext(uncompressed_path)
 
-        blob = self.bucket.blob(path)
-        assert blob.exists()
-        file_data = blob.download_as_text()
+        blob = self.bucket.get_blob(path)
+        assert blob is not None
+        self.object_sizes[path] = blob.size
+        if compression is not None:
+            # raw_download stops the library decoding the gzip content encoding itself,
+            # the object is decompressed while it is streamed
+            with open_text(blob.open("rb", raw_download=True), compression) as file:
+                file_data = file.read()
+        else:
+            file_data = blob.download_as_text()
         if file_extension == ".json":
-            # return ast.literal_eval(file_data)
-            return json.loads(file_data)
+            return self.serializer.loads(file_data)
+
+        if file_extension == ".ndjson":
+            return parse_ndjson(file_data.splitlines(), self.serializer)
 
         if file_extension in [".xml", ".tcx"]:
             return {"xml_data": file_data}
 
         raise ValueError(f"file type {file_extension} is not supported")
 
+    def object_size(self, path: str) -> int:
+        if path not in self.object_sizes:
+            self.object_sizes[path] = self.bucket.get_blob(path).size
+        return self.object_sizes[path]
+
     def load(self, data: list[dict], name: str) -> None:
 
         if not data or data == []:
             return None
 
         table_name = f"{self.project_id}.{self.dataset_name}.{name}"
+        key_fields = TABLE_ROW_KEYS.get(name)
 
-        errors = self.bigquery_client.insert_rows_json(table_name, data)
+        if self.merge_loads and key_fields is not None:
+            return self._merge_load(data, table_name, key_fields)
+
+        row_ids = None
+        if key_fields is not None:
+            row_ids = create_row_ids(data, key_fields)
+
+        errors = self.bigquery_client.insert_rows_json(
+            table_name, data, row_ids=row_ids
+        )
 
         if not errors:
             print(f"New rows have been added to table {table_name}")
@@ -88,3 +675,141 @@ class GCPDataLoader:
             raise ValueError(
                 f"Encountered errors while inserting rows into table: {name} \nErrors:\n {errors}"
             )
+
+    def load_columns(self, columns: dict, name: str) -> None:
+        """Batch loads a dict of columns without building a dict per row in memory. The
+        columns are written as parquet when pyarrow is installed, otherwise as newline
+        delimited json. Tables with row keys are merged through a staging table so
+        reprocessing a file does not duplicate their rows
+
+        Args:
+            columns (dict): column name to a sequence of values or a single constant value
+            name (str): name of the table to load
+        """
+        if column_row_count(columns) == 0:
+            return None
+
+        table_name = f"{self.project_id}.{self.dataset_name}.{name}"
+        load_file = self._create_columns_load(columns, name)
+
+        key_fields = TABLE_ROW_KEYS.get(name)
+        if key_fields is not None:
+            return self._merge_from_staging([load_file], table_name, key_fields)
+
+        job_config = bigquery.LoadJobConfig(
+            schema=self.bigquery_client.get_table(table_name).schema,
+            write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+        )
+        load_file(table_name, job_config).result()
+        print(f"New rows have been loaded to table {table_name}")
+
+    def load_stream(
+        self, rows: Iterable[dict], name: str, chunk_rows: int = LOAD_CHUNK_ROWS
+    ) -> None:
+        """Loads a stream of rows a chunk at a time, each chunk is loaded before the next
+        is read so the first load starts while the rest of the rows are still being
+        produced. Tables with row keys have every chunk loaded into one staging table
+        which is merged once, so a file is a single MERGE and a failure part way leaves
+        nothing in the table. Other tables have a load job per chunk
+
+        Args:
+            rows (Iterable[dict]): rows to load, eg from a parser generator
+            name (str): name of the table to load
+            chunk_rows (int, optional): rows per load. Defaults to LOAD_CHUNK_ROWS.
+        """
+        key_fields = TABLE_ROW_KEYS.get(name)
+        if key_fields is None:
+            for batch in iter_column_batches(rows, chunk_rows):
+                self.load_columns(batch, name)
+            return None
+
+        table_name = f"{self.project_id}.{self.dataset_name}.{name}"
+        loads = (
+            self._create_columns_load(batch, name)
+            for batch in iter_column_batches(rows, chunk_rows)
+        )
+        self._merge_from_staging(loads, table_name, key_fields)
+
+    def refresh_rollup(self, name: str, user_id: str, dates: list[str]) -> None:
+        """Recomputes the rows of a rollup table for a user on the given dates
+
+        Args:
+            name (str): name of the rollup table
+            user_id (str): user the data was loaded for
+            dates (list[str]): dates in the format YYYY-MM-DD that were loaded
+        """
+        query = create_rollup_query(f"{self.project_id}.{self.dataset_name}", name)
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
+                bigquery.ArrayQueryParameter("dates", "DATE", dates),
+            ]
+        )
+        self.bigquery_client.query(query, job_config=job_config).result()
+        print(f"Rollup {name} has been refreshed for {user_id} on {dates}")
+
+    def _create_columns_load(self, columns: dict, name: str):
+        """Returns a load_file(destination, job_config) function that loads the columns
+        as parquet when pyarrow is installed, otherwise as newline delimited json"""
+        file_obj = columns_to_parquet(columns, TABLE_NAME_METADATA_MAPPING[name])
+        source_format = bigquery.SourceFormat.PARQUET
+        if file_obj is None:
+            file_obj = columns_to_ndjson(columns, self.serializer)
+            source_format = bigquery.SourceFormat.NEWLINE_DELIMITED_JSON
+
+        def load_file(destination: str, job_config: bigquery.LoadJobConfig):
+            job_config.source_format = source_format
+            return self.bigquery_client.load_table_from_file(
+                file_obj, destination, job_config=job_config
+            )
+
+        return load_file
+
+    def _merge_load(
+        self, data: list[dict], table_name: str, key_fields: list[str]
+    ) -> None:
+        """Batch loads the data into a staging table then merges it into the target table
+        so reprocessing a file updates the existing rows instead of duplicating them"""
+
+        def load_json(destination: str, job_config: bigquery.LoadJobConfig):
+            job_config.source_format = bigquery.SourceFormat.NEWLINE_DELIMITED_JSON
+            return self.bigquery_client.load_table_from_file(
+                write_ndjson(data, self.serializer), destination, job_config=job_config
+            )
+
+        self._merge_from_staging([load_json], table_name, key_fields)
+
+    def _merge_from_staging(
+        self, load_stagings: Iterable, table_name: str, key_fields: list[str]
+    ) -> None:
+        """Loads a staging table with each load_staging(destination, job_config) function
+        then merges it into the target table once and deletes the staging table. The
+        load jobs are into the staging table so they do not use the target's quota"""
+        target_table = self.bigquery_client.get_table(table_name)
+        staging_table_name = f"{table_name}_staging_{uuid.uuid4().hex}"
+        try:
+            loaded = False
+            for load_staging in load_stagings:
+                job_config = bigquery.LoadJobConfig(
+                    schema=target_table.schema,
+                    write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+                )
+                load_staging(staging_table_name, job_config).result()
+                loaded = True
+            if not loaded:
+                return None
+
+            columns = [field.name for field in target_table.schema]
+            layout = TABLE_LAYOUT_MAPPING.get(table_name.split(".")[-1], {})
+            query = create_merge_query(
+                table_name,
+                staging_table_name,
+                key_fields,
+                columns,
+                layout.get("partition_field"),
+            )
+            self.bigquery_client.query(query).result()
+        finally:
+            self.bigquery_client.delete_table(staging_table_name, not_found_ok=True)
+
+        print(f"Rows have been merged into table {table_name}")
@@ -0,0 +1,326 @@
+import json
+import os
+import random
+import re
+import sqlite3
+import time
+from typing import Protocol
+
+from google.api_core.exceptions import (
+    PreconditionFailed,
+    ServiceUnavailable,
+    TooManyRequests,
+)
+from google.cloud import storage
+
+from fitbit.constants import MANIFEST_FOLDER
+
+INDEX_FOLDER = "index"
+INDEX_FIELDS = [
+    "content_hash",
+    "size",
+    "fetched_date",
+    "processed",
+    "processed_date",
+]
+
+
+class FetchManifest(Protocol):
+    """
+    Interface protocol for a Fetch Manifest. These classes record which objects have
+    already been fetched from the API so that follow up requests can be skipped
+
+    Methods
+    get(str) -> dict: Return the manifest entry for a key or None if not recorded
+    update(str, dict) -> None: Create or update the manifest entry for a key
+    """
+
+    def get(self, key: str) -> dict:
+        """Return the manifest entry for a key or None if not recorded"""
+
+    def update(self, key: str, entry: dict) -> None:
+        """Create or update the manifest entry for a key"""
+
+
+class LocalFetchManifest:
+    """A fetch manifest stored as a single json file on the local drive"""
+
+    def __init__(self, base_location: str, name: str, make_directory=True) -> None:
+        self.base_location = base_location
+        self.full_path = f"{base_location}/{name}.json"
+        self.make_directory = make_directory
+        self.entries = None
+
+    def _load_entries(self) -> dict:
+        if self.entries is None:
+            if os.path.exists(self.full_path):
+                with open(self.full_path, "r", encoding="utf-8") as file:
+                    self.entries = json.load(file)
+            else:
+                self.entries = {}
+        return self.entries
+
+    def get(self, key: str) -> dict:
+        """Return the manifest entry for a key or None if not recorded
+
+        Args:
+            key (str): manifest key, eg [user id]_[log id]
+
+        Returns:
+            dict: the manifest entry
+        """
+        return self._load_entries().get(key)
+
+    def update(self, key: str, entry: dict) -> None:
+        """Merge the entry into the manifest and save it back to the local drive
+
+        Args:
+            key (str): manifest key, eg [user id]_[log id]
+            entry (dict): values to set for the key
+        """
+        entries = self._load_entries()
+        entries[key] = {**entries.get(key, {}), **entry}
+
+        if not os.path.exists(self.base_location) and self.make_directory:
+            os.makedirs(self.base_location)
+
+        with open(self.full_path, "w", encoding="utf-8") as file:
+            json.dump(entries, file, indent=4)
+
+
+class GCPFetchManifest:
+    """
+    A fetch manifest stored in a Google Cloud Storage bucket as one small json object
+    per key, so concurrent cloud functions updating different keys never write the same
+    object. Updates use generation preconditions so concurrent updates of the same key
+    do not overwrite each other, and are retried when storage rate limits the writes
+    """
+
+    def __init__(
+        self,
+        bucket_name: str,
+        project_id: str,
+        name: str,
+        retries: int = 5,
+        bucket: storage.Bucket = None,
+    ) -> None:
+        self.bucket_name = bucket_name
+        if bucket is None:
+            storage_client = storage.Client(project=project_id)
+            bucket = storage_client.get_bucket(bucket_name)
+        self.bucket = bucket
+        self.folder = f"{MANIFEST_FOLDER}/{name}"
+        self.retries = retries
+        self.entries = {}
+        self.generations = {}
+
+    def _blob_name(self, key: str) -> str:
+        return f"{self.folder}/{key}.json"
+
+    def _load_entry(self, key: str) -> dict:
+        blob = self.bucket.get_blob(self._blob_name(key))
+        if blob is None:
+            self.entries[key] = None
+            # Generation 0 only matches if the object does not exist yet
+            self.generations[key] = 0
+        else:
+            self.entries[key] = json.loads(blob.download_as_bytes())
+            self.generations[key] = blob.generation
+        return self.entries[key]
+
+    def get(self, key: str) -> dict:
+        """Return the manifest entry for a key or None if not recorded
+
+        Args:
+            key (str): manifest key, eg [user id]_[log id]
+
+        Returns:
+            dict: the manifest entry
+        """
+        if key not in self.entries:
+            self._load_entry(key)
+        return self.entries[key]
+
+    def update(self, key: str, entry: dict) -> None:
+        """Merge the entry into the object of the key and save it back to the bucket
+
+        Args:
+            key (str): manifest key, eg [user id]_[log id]
+            entry (dict): values to set for the key
+
+        Raises:
+            Exception: If the manifest could not be saved after the specified number of retries
+        """
+        if key not in self.entries:
+            self._load_entry(key)
+
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                # Back off with jitter so concurrent functions do not collide again
+                time.sleep(random.uniform(0, 0.1 * 2**attempt))
+            new_entry = {**(self.entries[key] or {}), **entry}
+            blob = self.bucket.blob(self._blob_name(key))
+            try:
+                blob.upload_from_string(
+                    json.dumps(new_entry),
+                    content_type="application/json",
+                    if_generation_match=self.generations[key],
+                )
+            except PreconditionFailed:
+                # Another function updated the key, reload and apply again
+                self._load_entry(key)
+                continue
+            except (TooManyRequests, ServiceUnavailable) as exc:
+                print(f"Retrying manifest update of {key} after {exc!r}")
+                continue
+            self.entries[key] = new_entry
+            self.generations[key] = blob.generation
+            return
+
+        raise Exception(f"Could not update manifest after {self.retries} retries")
+
+
+class ObjectIndex(Protocol):
+    """
+    Interface protocol for an Object Index. These classes record each saved api response
+    with its content hash, size, fetch time and processed state so an object can be
+    looked up by its path without listing the bucket
+
+    Methods
+    get(str) -> dict: Return the index entry for an object path or None if not recorded
+    update(str, dict) -> None: Create or update the index entry for an object path
+    """
+
+    def get(self, path: str) -> dict:
+        """Return the index entry for an object path or None if not recorded"""
+
+    def update(self, path: str, entry: dict) -> None:
+        """Create or update the index entry for an object path"""
+
+
+class LocalObjectIndex:
+    """An object index stored in a local SQLite database"""
+
+    def __init__(self, database_path: str, make_directory=True) -> None:
+        directory = os.path.dirname(database_path)
+        if directory and not os.path.exists(directory) and make_directory:
+            os.makedirs(directory)
+
+        self.database_path = database_path
+        self.connection = sqlite3.connect(database_path)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS objects (
+                path TEXT PRIMARY KEY,
+                content_hash TEXT,
+                size INTEGER,
+                fetched_date TEXT,
+                processed INTEGER,
+                processed_date TEXT
+            )
+            """)
+        self.connection.commit()
+
+    def get(self, path: str) -> dict:
+        """Return the index entry for an object path or None if not recorded
+
+        Args:
+            path (str): path of the object as passed to the transform
+
+        Returns:
+            dict: the index entry
+        """
+        cursor = self.connection.execute(
+            f"SELECT {', '.join(INDEX_FIELDS)} FROM objects WHERE path = ?", (path,)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+
+        entry = {
+            field: value for field, value in zip(INDEX_FIELDS, row) if value is not None
+        }
+        if "processed" in entry:
+            entry["processed"] = bool(entry["processed"])
+        return entry
+
+    def update(self, path: str, entry: dict) -> None:
+        """Merge the entry into the index row for the object path
+
+        Args:
+            path (str): path of the object as passed to the transform
+            entry (dict): values to set, keys must be in INDEX_FIELDS
+
+        Raises:
+            KeyError: If the entry has a field that is not in the index
+        """
+        unknown_fields = set(entry) - set(INDEX_FIELDS)
+        if unknown_fields:
+            raise KeyError(f"{sorted(unknown_fields)} are not object index fields")
+
+        fields = list(entry)
+        columns = ", ".join(["path"] + fields)
+        placeholders = ", ".join(["?"] * (len(fields) + 1))
+        updates = ", ".join(f"{field} = excluded.{field}" for field in fields)
+        conflict = f"DO UPDATE SET {updates}" if fields else "DO NOTHING"
+
+        self.connection.execute(
+            f"INSERT INTO objects ({columns}) VALUES ({placeholders}) "
+            f"ON CONFLICT(path) {conflict}",
+            [path] + [entry[field] for field in fields],
+        )
+        self.connection.commit()
+
+
+class GCPObjectIndex:
+    """
+    An object index stored in a Google Cloud Storage bucket as one small manifest object
+    per indexed object, so saves and transforms of different objects never write the
+    same index object. The entries are under a folder for the month from the date
+    folder of their path, eg manifests/index/202301/[path].json, so a month can be
+    listed or compacted
+    """
+
+    def __init__(self, bucket_name: str, project_id: str, retries: int = 10) -> None:
+        self.bucket_name = bucket_name
+        self.project_id = project_id
+        self.storage_client = storage.Client(project=project_id)
+        self.bucket = self.storage_client.get_bucket(bucket_name)
+        self.retries = retries
+        self.manifest = GCPFetchManifest(
+            bucket_name, project_id, INDEX_FOLDER, retries, self.bucket
+        )
+
+    def get(self, path: str) -> dict:
+        """Return the index entry for an object path or None if not recorded
+
+        Args:
+            path (str): name of the object in the bucket
+
+        Returns:
+            dict: the index entry
+        """
+        return self.manifest.get(f"{index_month(path)}/{path}")
+
+    def update(self, path: str, entry: dict) -> None:
+        """Merge the entry into the index object of the path
+
+        Args:
+            path (str): name of the object in the bucket
+            entry (dict): values to set for the object
+        """
+        self.manifest.update(f"{index_month(path)}/{path}", entry)
+
+
+def index_month(path: str) -> str:
+    """Returns the YYYYMM month of an object from its [date]/[filename] path
+
+    Args:
+        path (str): path of the object, eg get_sleep_by_date/20230118/get_sleep_by_date_ABC.json
+
+    Returns:
+        str: month of the object or undated if the path has no date folder
+    """
+    folder_name = os.path.basename(os.path.dirname(path))
+    if re.fullmatch("[0-9]{8}", folder_name):
+        return folder_name[:6]
+    return "undated"
@@ -1,7 +1,7 @@
 from dataclasses import asdict
-import json
 from typing import Protocol
 from fitbit.caller import EndpointParameters
+from fitbit.serialization import Serializer, default_serializer
 from google.cloud import pubsub_v1
 
 
@@ -16,6 +16,9 @@ class Messenger(Protocol):
 
 
 class LocalMessenger:
+    def __init__(self, serializer: Serializer = None) -> None:
+        self.serializer = serializer or default_serializer()
+
     def prep_message(
         self, messages: list[EndpointParameters], user_id: str, date: str
     ) -> str:
@@ -34,7 +37,7 @@ class LocalMessenger:
         }
         if endpoint_messages == []:
             return None
-        return json.dumps(pubsub_message).encode("utf-8")
+        return self.serializer.dumps(pubsub_message)
 
     def send_message(self, message: str) -> str:
         if message is not None:
@@ -43,7 +46,10 @@ class LocalMessenger:
 
 
 class PubSubMessenger:
-    def __init__(self, project_id: str, topic_name: str) -> None:
+    def __init__(
+        self, project_id: str, topic_name: str, serializer: Serializer = None
+    ) -> None:
+        self.serializer = serializer or default_serializer()
         self.pubsub_client = pubsub_v1.PublisherClient()
         self.topic_name = self.pubsub_client.topic_path(project_id, topic_name)
         # self.topic = self.pubsub_client.get_topic(topic=self.topic_name)
@@ -66,7 +72,7 @@ class PubSubMessenger:
         }
         if endpoint_messages == []:
             return None
-        return json.dumps(pubsub_message).encode("utf-8")
+        return self.serializer.dumps(pubsub_message)
 
     def send_message(self, message: str) -> str:
         if message is not None:
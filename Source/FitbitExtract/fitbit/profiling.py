@@ -0,0 +1,233 @@
+from contextlib import contextmanager
+from datetime import datetime
+import cProfile
+import json
+import os
+import pstats
+import time
+import tracemalloc
+from typing import Iterator, Protocol
+
+from google.cloud import storage
+
+from fitbit.constants import DATETIME_FORMAT, PROFILE_ENV_VAR, PROFILES_FOLDER
+from fitbit.instrumentation import MetricsSink, NullMetricsSink, metric_key
+
+# Number of functions and allocation sites kept in a profile report
+TOP_FUNCTIONS = 50
+TOP_ALLOCATIONS = 25
+# Frames kept for each allocation site, enough to see which parser made the allocation
+ALLOCATION_FRAMES = 5
+
+
+def profiling_enabled(requested: bool = False) -> bool:
+    """Checks if a run should be profiled, either requested by the run or set with the
+    FITBIT_PROFILE environment variable
+
+    Args:
+        requested (bool, optional): profiling requested by the run, eg the message field
+
+    Returns:
+        bool: True if the run should be profiled
+    """
+    if requested:
+        return True
+    return os.environ.get(PROFILE_ENV_VAR, "").lower() in ["1", "true", "yes"]
+
+
+def profile_path(path: str, stage: str) -> str:
+    """Creates the path of the profile for a stage run on an object, placed under the
+    profiles folder so it sits next to the raw file without triggering a transform
+
+    Args:
+        path (str): path of the raw file, or any identifier of the run
+        stage (str): stage that was profiled, eg transform or extract
+
+    Returns:
+        str: path of the profile report, eg profiles/get_sleep_by_date/20230118/...json
+    """
+    return f"{PROFILES_FOLDER}/{path.lstrip('/')}.{stage}.json"
+
+
+def summarize_stats(profiler: cProfile.Profile, limit: int = TOP_FUNCTIONS) -> list:
+    """Returns the functions with the most cumulative time in a cpu profile"""
+    stats = pstats.Stats(profiler)
+    functions = []
+    for (file_name, line, function), values in stats.stats.items():
+        primitive_calls, calls, total_time, cumulative_time, _ = values
+        functions.append(
+            {
+                "function": f"{file_name}:{line}({function})",
+                "calls": calls,
+                "primitive_calls": primitive_calls,
+                "total_seconds": total_time,
+                "cumulative_seconds": cumulative_time,
+            }
+        )
+    functions.sort(key=lambda function: function["cumulative_seconds"], reverse=True)
+    return functions[:limit]
+
+
+def summarize_snapshot(
+    snapshot: tracemalloc.Snapshot, limit: int = TOP_ALLOCATIONS
+) -> list:
+    """Returns the allocation sites holding the most memory in a tracemalloc snapshot"""
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    return [
+        {
+            "traceback": [
+                f"{frame.filename}:{frame.lineno}" for frame in stat.traceback
+            ],
+            "size_bytes": stat.size,
+            "count": stat.count,
+        }
+        for stat in snapshot.statistics("traceback")[:limit]
+    ]
+
+
+class ProfileWriter(Protocol):
+    """
+    Interface protocol for a Profile Writer. These classes save the profile report of a
+    run to a location
+
+    Methods
+    write(dict, str) -> None: Write the report to the path
+    """
+
+    def write(self, report: dict, path: str) -> None:
+        """Write the report to the path"""
+
+
+class LocalProfileWriter:
+    def __init__(self, base_location: str) -> None:
+        self.base_location = base_location
+
+    def write(self, report: dict, path: str) -> None:
+        full_path = f"{self.base_location}/{path}"
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=4)
+
+
+class GCPProfileWriter:
+    def __init__(self, bucket_name: str, project_id: str) -> None:
+        self.bucket_name = bucket_name
+        self.project_id = project_id
+
+    def write(self, report: dict, path: str) -> None:
+        storage_client = storage.Client(project=self.project_id)
+        bucket = storage_client.bucket(self.bucket_name)
+        blob = bucket.blob(path)
+        blob.upload_from_string(
+            json.dumps(report, indent=4), content_type="application/json"
+        )
+
+
+class ProfilingMetricsSink:
+    """
+    A metrics sink that passes the metrics on to another sink and takes a tracemalloc
+    snapshot at the end of any stage where more memory is held than at the previous
+    snapshot. Stages end while their data is still referenced, so the snapshot shows the
+    allocation sites at the high water mark rather than after the data has been freed
+    """
+
+    def __init__(self, metrics: MetricsSink = None) -> None:
+        self.metrics = metrics or NullMetricsSink()
+        self.snapshot = None
+        self.snapshot_bytes = -1
+        self.snapshot_stage = None
+
+    def checkpoint(self, stage: str = None) -> None:
+        """Takes a snapshot if more memory is held than at the previous snapshot"""
+        if not tracemalloc.is_tracing():
+            return
+        current_bytes = tracemalloc.get_traced_memory()[0]
+        if current_bytes > self.snapshot_bytes:
+            self.snapshot = tracemalloc.take_snapshot()
+            self.snapshot_bytes = current_bytes
+            self.snapshot_stage = stage
+
+    def timing(self, name: str, seconds: float, tags: dict = None) -> None:
+        self.metrics.timing(name, seconds, tags)
+        self.checkpoint(metric_key(name, tags))
+
+    def increment(self, name: str, value: float = 1, tags: dict = None) -> None:
+        self.metrics.increment(name, value, tags)
+
+
+@contextmanager
+def profile(
+    writer: ProfileWriter, path: str, metrics: MetricsSink = None, enabled: bool = True
+) -> Iterator[MetricsSink]:
+    """Captures a cpu profile and the top allocation sites of the block and writes them
+    as a report to the path, including when the block raises. The yielded metrics sink
+    should be passed to the caller or FitbitETL run in the block so allocations are
+    captured at the end of each stage
+
+    Args:
+        writer (ProfileWriter): where to write the report
+        path (str): path of the report, see profile_path
+        metrics (MetricsSink, optional): sink the metrics are passed on to
+        enabled (bool, optional): if the block should be profiled. Defaults to True.
+
+    Yields:
+        MetricsSink: sink to record the metrics of the block with, the metrics sink given
+            if not enabled
+    """
+    if not enabled:
+        yield metrics
+        return
+
+    report = {"path": path, "started": datetime.now().strftime(DATETIME_FORMAT)}
+    profiling_metrics = ProfilingMetricsSink(metrics)
+    already_tracing = tracemalloc.is_tracing()
+    if not already_tracing:
+        tracemalloc.start(ALLOCATION_FRAMES)
+    tracemalloc.reset_peak()
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        yield profiling_metrics
+    except Exception as exc:
+        report["error"] = repr(exc)
+        raise
+    finally:
+        profiler.disable()
+        report["seconds"] = time.perf_counter() - start
+        report["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        profiling_metrics.checkpoint("end")
+        report["snapshot_bytes"] = profiling_metrics.snapshot_bytes
+        report["snapshot_stage"] = profiling_metrics.snapshot_stage
+        report["allocations"] = summarize_snapshot(profiling_metrics.snapshot)
+        if not already_tracing:
+            tracemalloc.stop()
+        report["functions"] = summarize_stats(profiler)
+        writer.write(report, path)
+
+
+def format_report(report: dict, limit: int = 15) -> str:
+    """Formats the slowest functions and largest allocation sites of a profile report"""
+    lines = [
+        f"{report['path']} started {report['started']}",
+        f"{report['seconds']:.3f}s, peak {report['peak_bytes'] / 1024 / 1024:.1f} MiB"
+        f", largest snapshot {report['snapshot_bytes'] / 1024 / 1024:.1f} MiB"
+        f" after {report['snapshot_stage']}",
+    ]
+    if "error" in report:
+        lines.append(f"failed with {report['error']}")
+
+    lines.append(f"{'cumulative s':>12} {'total s':>9} {'calls':>9}  function")
+    for function in report["functions"][:limit]:
+        lines.append(
+            f"{function['cumulative_seconds']:>12.3f} {function['total_seconds']:>9.3f}"
+            f" {function['calls']:>9}  {function['function']}"
+        )
+
+    lines.append(f"{'KiB':>12} {'blocks':>9}  allocated at")
+    for allocation in report["allocations"][:limit]:
+        lines.append(
+            f"{allocation['size_bytes'] / 1024:>12.1f} {allocation['count']:>9}"
+            f"  {' <- '.join(reversed(allocation['traceback']))}"
+        )
+    return "\n".join(lines)
@@ -1,7 +1,15 @@
-from typing import Protocol
+from collections import defaultdict
+from typing import Iterator, Protocol
+import gzip
+import json
+import time
 import requests
 from http import HTTPStatus
 
+# Ask for compressed transfer, requests decompresses the body as it is read
+DEFAULT_HEADERS = {"Accept-Encoding": "gzip"}
+STREAM_CHUNK_SIZE = 1024 * 1024
+
 
 class FitbitRequester(Protocol):
     """
@@ -10,6 +18,8 @@ class FitbitRequester(Protocol):
 
     Methods
     make_request(str, dict, dict) -> None: Save the response to the target location
+    make_stream_request(str, str, dict, dict) -> tuple[Iterator[bytes], int]: Make a
+        request returning the response body in chunks
     """
 
     def make_request(
@@ -17,6 +27,11 @@ class FitbitRequester(Protocol):
     ) -> tuple[str, int]:
         """Save the response to the target location"""
 
+    def make_stream_request(
+        self, method: str, url: str, headers: dict, body: dict
+    ) -> tuple[Iterator[bytes], int]:
+        """Make a request returning the response body in chunks"""
+
 
 class WebAPIRequester:
     """
@@ -32,8 +47,186 @@ class WebAPIRequester:
 
         raise ValueError("Invalid method")
 
+    def make_stream_request(  # pylint: disable=W0613
+        self, method: str, url: str, headers: dict, body: dict
+    ) -> tuple[Iterator[bytes], int]:
+        """Makes a request without reading the body into memory, used for large responses
+        that are written straight to storage
+
+        Args:
+            method (str): http method
+            url (str): url to request
+            headers (dict): request headers
+            body (dict): request body
+
+        Returns:
+            tuple[Iterator[bytes], int]: decompressed response body chunks and the status code
+        """
+        if method == "GET":
+            return self._make_get_stream_request(url, headers)
+
+        raise ValueError("Invalid method")
+
     def _make_get_request(self, url: str, headers: dict) -> tuple[str, int]:
+        headers = {**DEFAULT_HEADERS, **headers}
         response = requests.get(url, headers=headers, timeout=600)
         if response.status_code != HTTPStatus.OK:
             print(url, response.status_code, response.text)
         return response.text, response.status_code
+
+    def _make_get_stream_request(
+        self, url: str, headers: dict
+    ) -> tuple[Iterator[bytes], int]:
+        headers = {**DEFAULT_HEADERS, **headers}
+        response = requests.get(url, headers=headers, timeout=600, stream=True)
+        if response.status_code != HTTPStatus.OK:
+            print(url, response.status_code, response.text)
+            response.close()
+            return iter([]), response.status_code
+        return response.iter_content(STREAM_CHUNK_SIZE), response.status_code
+
+
+def scrub_text(text: str, scrub: dict) -> str:
+    """Replaces every key of the scrub dict in the text with its value, eg user ids"""
+    for original, replacement in scrub.items():
+        text = text.replace(original, replacement)
+    return text
+
+
+class RecordingRequester:
+    """
+    A Fitbit Requester that passes requests to another requester and records each
+    exchange to a cassette, a gzip compressed newline delimited json file that can be
+    replayed with the ReplayRequester. Authorization headers are never recorded and
+    values in the scrub dict, eg user ids, are replaced in the url, headers and body
+    """
+
+    def __init__(
+        self, requester: FitbitRequester, cassette_path: str, scrub: dict = None
+    ) -> None:
+        self.requester = requester
+        self.cassette_path = cassette_path
+        self.scrub = scrub or {}
+        self.file = gzip.open(cassette_path, "wt", encoding="utf-8")
+
+    def _record(
+        self,
+        method: str,
+        url: str,
+        headers: dict,
+        status: int,
+        body: str,
+        elapsed: float,
+    ) -> None:
+        recorded_headers = {
+            name: scrub_text(value, self.scrub)
+            for name, value in headers.items()
+            if name.lower() != "authorization"
+        }
+        exchange = {
+            "method": method,
+            "url": scrub_text(url, self.scrub),
+            "status": int(status),
+            "headers": recorded_headers,
+            "body": scrub_text(body, self.scrub),
+            "elapsed": elapsed,
+        }
+        self.file.write(json.dumps(exchange) + "\n")
+
+    def make_request(
+        self, method: str, url: str, headers: dict, body: dict
+    ) -> tuple[str, int]:
+        start = time.perf_counter()
+        data, status = self.requester.make_request(method, url, headers, body)
+        self._record(method, url, headers, status, data, time.perf_counter() - start)
+        return data, status
+
+    def make_stream_request(
+        self, method: str, url: str, headers: dict, body: dict
+    ) -> tuple[Iterator[bytes], int]:
+        """Streams the response, the exchange is recorded once the body has been read"""
+        start = time.perf_counter()
+        chunks, status = self.requester.make_stream_request(method, url, headers, body)
+
+        def record_chunks():
+            received = []
+            for chunk in chunks:
+                received.append(chunk)
+                yield chunk
+            data = b"".join(received).decode("utf-8")
+            self._record(
+                method, url, headers, status, data, time.perf_counter() - start
+            )
+
+        return record_chunks(), status
+
+    def close(self) -> None:
+        """Closes the cassette, it is not readable until closed"""
+        self.file.close()
+
+    def __enter__(self) -> "RecordingRequester":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class ReplayRequester:
+    """
+    A Fitbit Requester that replays the exchanges recorded in a cassette without any
+    network calls. Exchanges for the same method and url are returned in the order
+    they were recorded, so retried requests replay their failures first, then repeat
+    from the start once they have all been used
+    """
+
+    def __init__(self, cassette_path: str, timing: float = 0.0) -> None:
+        """Loads a cassette to replay
+
+        Args:
+            cassette_path (str): path of the cassette recorded by the RecordingRequester
+            timing (float, optional): multiple of the recorded response time to wait before
+                each response, 1.0 replays at the recorded speed. Defaults to 0.0.
+        """
+        self.cassette_path = cassette_path
+        self.timing = timing
+        self.exchanges = defaultdict(list)
+        self.positions = defaultdict(int)
+        with gzip.open(cassette_path, "rt", encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    exchange = json.loads(line)
+                    self.exchanges[(exchange["method"], exchange["url"])].append(
+                        exchange
+                    )
+
+    def _next_exchange(self, method: str, url: str) -> dict:
+        key = (method, url)
+        if key not in self.exchanges:
+            raise KeyError(f"No recorded response for {method} {url}")
+
+        exchanges = self.exchanges[key]
+        exchange = exchanges[self.positions[key] % len(exchanges)]
+        self.positions[key] += 1
+
+        if self.timing:
+            time.sleep(exchange["elapsed"] * self.timing)
+        return exchange
+
+    def make_request(  # pylint: disable=W0613
+        self, method: str, url: str, headers: dict, body: dict
+    ) -> tuple[str, int]:
+        exchange = self._next_exchange(method, url)
+        return exchange["body"], exchange["status"]
+
+    def make_stream_request(  # pylint: disable=W0613
+        self, method: str, url: str, headers: dict, body: dict
+    ) -> tuple[Iterator[bytes], int]:
+        exchange = self._next_exchange(method, url)
+        if exchange["status"] != HTTPStatus.OK:
+            return iter([]), exchange["status"]
+        data = exchange["body"].encode("utf-8")
+        chunks = (
+            data[start : start + STREAM_CHUNK_SIZE]
+            for start in range(0, len(data), STREAM_CHUNK_SIZE)
+        )
+        return chunks, exchange["status"]
@@ -1,7 +1,44 @@
+from __future__ import annotations
+
+from datetime import datetime
+import hashlib
 import os
-from typing import Protocol
+from typing import TYPE_CHECKING, Iterable, Protocol
+import uuid
+from google.api_core.exceptions import NotFound
 from google.cloud import storage
 
+from fitbit.compression import (
+    check_compression,
+    compress,
+    compressed_writer,
+    compression_suffix,
+    open_text,
+    storage_headers,
+)
+from fitbit.constants import DATETIME_FORMAT, UPLOADS_FOLDER
+
+if TYPE_CHECKING:  # pragma: no cover
+    from fitbit.manifests import ObjectIndex
+
+# Resumable upload chunk size, must be a multiple of 256 KiB
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def content_hash(response: str) -> str:
+    """Returns the sha256 hex digest of a response used to detect unchanged data"""
+    return hashlib.sha256(response.encode("utf-8")).hexdigest()
+
+
+def create_index_entry(response_hash: str, size: int) -> dict:
+    """Returns the object index entry for a newly saved response"""
+    return {
+        "content_hash": response_hash,
+        "size": size,
+        "fetched_date": datetime.now().strftime(DATETIME_FORMAT),
+        "processed": False,
+    }
+
 
 class FitbitResponseSaver(Protocol):
     """
@@ -9,23 +46,46 @@ class FitbitResponseSaver(Protocol):
     the different response to different locations
 
     Methods
-    save(str, str, str, str) -> None: Save the response to the target location
+    save(str, str, str, str) -> bool: Save the response to the target location
+    save_stream(Iterable[bytes], str, str, str) -> bool: Save a response from chunks
     """
 
     def save(
         self, response: str, folder: str, file_name: str, file_format: str
-    ) -> None:
-        """Save the response to the target location"""
+    ) -> bool:
+        """Save the response to the target location, returns False if it was unchanged"""
+
+    def save_stream(
+        self, chunks: Iterable[bytes], folder: str, file_name: str, file_format: str
+    ) -> bool:
+        """Save a response from chunks, returns False if it was unchanged"""
 
 
 class LocalResponseSaver:
-    def __init__(self, base_location, make_directory=True) -> None:
+    def __init__(
+        self,
+        base_location,
+        make_directory=True,
+        skip_unchanged=True,
+        compression=None,
+        object_index: ObjectIndex = None,
+    ) -> None:
+        check_compression(compression)
         self.base_location = base_location
         self.make_directory = make_directory
+        self.skip_unchanged = skip_unchanged
+        self.compression = compression
+        self.object_index = object_index
+
+    def _record_saved(self, full_path: str, response_hash: str) -> None:
+        """Adds the saved file to the object index, keyed by the path the loader reads"""
+        if self.object_index is not None:
+            entry = create_index_entry(response_hash, os.path.getsize(full_path))
+            self.object_index.update(full_path, entry)
 
     def save(
         self, response: str, folder: str, file_name: str, file_format: str
-    ) -> None:
+    ) -> bool:
         """Saves the response to a local directory
 
         Args:
@@ -33,36 +93,220 @@ class LocalResponseSaver:
             folder (str): folder location to save file to
             file_name (str): File name when saving
             file_format (str): File format extention
+
+        Returns:
+            bool: False if the existing file has the same content and was not rewritten
         """
         directory = f"{self.base_location}/{folder}"
-        full_path = f"{directory}/{file_name}.{file_format}"
+        suffix = compression_suffix(self.compression)
+        full_path = f"{directory}/{file_name}.{file_format}{suffix}"
+
+        if self.skip_unchanged and os.path.exists(full_path):
+            with open_text(open(full_path, "rb"), self.compression) as file:
+                existing_hash = content_hash(file.read())
+            if existing_hash == content_hash(response):
+                return False
 
         if not os.path.exists(directory) and self.make_directory:
             os.makedirs(directory)
 
-        with open(full_path, "w", encoding="utf-8") as file:
-            file.write(response)
+        with open(full_path, "wb") as file:
+            file.write(compress(response, self.compression))
+        self._record_saved(full_path, content_hash(response))
+        return True
+
+    def save_stream(
+        self, chunks: Iterable[bytes], folder: str, file_name: str, file_format: str
+    ) -> bool:
+        """Writes the response to a local directory as the chunks are received. The file is
+        written to a temporary path first so an unchanged response leaves the file untouched
+
+        Args:
+            chunks (Iterable[bytes]): response data in utf-8 encoded chunks
+            folder (str): folder location to save file to
+            file_name (str): File name when saving
+            file_format (str): File format extention
+
+        Returns:
+            bool: False if the existing file has the same content and was not rewritten
+        """
+        directory = f"{self.base_location}/{folder}"
+        suffix = compression_suffix(self.compression)
+        full_path = f"{directory}/{file_name}.{file_format}{suffix}"
+        temp_path = f"{full_path}.tmp"
+
+        if not os.path.exists(directory) and self.make_directory:
+            os.makedirs(directory)
+
+        response_hash = hashlib.sha256()
+        with open(temp_path, "wb") as file:
+            with compressed_writer(file, self.compression) as writer:
+                for chunk in chunks:
+                    response_hash.update(chunk)
+                    writer.write(chunk)
+
+        if self.skip_unchanged and os.path.exists(full_path):
+            with open_text(open(full_path, "rb"), self.compression) as file:
+                existing_hash = content_hash(file.read())
+            if existing_hash == response_hash.hexdigest():
+                os.remove(temp_path)
+                return False
+
+        os.replace(temp_path, full_path)
+        self._record_saved(full_path, response_hash.hexdigest())
+        return True
 
 
 class GCPResponseSaver:
-    def __init__(self, bucket_name, project_id) -> None:
+    def __init__(
+        self,
+        bucket_name,
+        project_id,
+        skip_unchanged=True,
+        compression=None,
+        object_index: ObjectIndex = None,
+        upload_bucket_name: str = None,
+    ) -> None:
+        """Saves responses to a Google Cloud Storage Bucket
+
+        Args:
+            bucket_name (str): bucket to save the responses to
+            project_id (str): GCP project id
+            skip_unchanged (bool, optional): Do not upload responses with the same content
+                hash as the existing object. Defaults to True.
+            compression (str, optional): gzip or zstd to compress the objects, the
+                compression extension is added to the object name. Defaults to None.
+            object_index (ObjectIndex, optional): index to record saved objects in.
+                Defaults to None.
+            upload_bucket_name (str, optional): bucket streamed responses are uploaded to
+                before being copied to their object, a bucket that does not trigger the
+                transform load function. Defaults to bucket_name.
+        """
+        check_compression(compression)
         self.bucket_name = bucket_name
         self.storage_client = storage.Client(project=project_id)
         self.bucket = self.storage_client.get_bucket(bucket_name)
+        self.skip_unchanged = skip_unchanged
+        self.compression = compression
+        self.object_index = object_index
+        self.upload_bucket = self.bucket
+        if upload_bucket_name is not None and upload_bucket_name != bucket_name:
+            self.upload_bucket = self.storage_client.get_bucket(upload_bucket_name)
+
+    def _record_saved(self, blob: storage.Blob, response_hash: str) -> None:
+        """Adds the uploaded object to the object index"""
+        if self.object_index is not None:
+            entry = create_index_entry(response_hash, blob.size)
+            self.object_index.update(blob.name, entry)
+
+    def _is_unchanged(self, blob_name: str, response_hash: str) -> bool:
+        """Checks if the existing object has the content hash in its metadata"""
+        if not self.skip_unchanged:
+            return False
+        existing_blob = self.bucket.get_blob(blob_name)
+        return (
+            existing_blob is not None
+            and existing_blob.metadata is not None
+            and existing_blob.metadata.get("content_hash") == response_hash
+        )
 
     def save(
         self, response: str, folder: str, file_name: str, file_format: str
-    ) -> None:
-        """Saves the response to a Google Cloud Storage Bucket
+    ) -> bool:
+        """Saves the response to a Google Cloud Storage Bucket. The content hash is
+        stored in the object metadata so an unchanged response is not uploaded again
+        and does not trigger the transform load function
 
         Args:
             response (str): response data in plain text format
             folder (str): folder location to save file to
             file_name (str): File name when saving
             file_format (str): File format extention
+
+        Returns:
+            bool: False if the existing object has the same content and was not uploaded
         """
-        blob_name = f"{folder}/{file_name}.{file_format}"
+        suffix = compression_suffix(self.compression)
+        blob_name = f"{folder}/{file_name}.{file_format}{suffix}"
+        response_hash = content_hash(response)
+
+        if self._is_unchanged(blob_name, response_hash):
+            print(f"Skipping upload of {blob_name} as the content is unchanged")
+            return False
 
         blob = self.bucket.blob(blob_name)
+        blob.metadata = {"content_hash": response_hash}
+
+        if self.compression is None:
+            blob.upload_from_string(response)
+        else:
+            content_encoding, content_type = storage_headers(self.compression)
+            if content_encoding is not None:
+                blob.content_encoding = content_encoding
+            blob.upload_from_string(
+                compress(response, self.compression), content_type=content_type
+            )
+        self._record_saved(blob, response_hash)
+        return True
+
+    def save_stream(
+        self, chunks: Iterable[bytes], folder: str, file_name: str, file_format: str
+    ) -> bool:
+        """Uploads the response to a Google Cloud Storage Bucket with a resumable upload as
+        the chunks are received. The upload is to a temporary object in the uploads
+        folder of the upload bucket as the content hash is only known once it is
+        complete. If the hash differs from the existing object the temporary object is
+        rewritten onto the object name, a copy within storage, so an unchanged response
+        does not replace the object or trigger the transform
+
+        Args:
+            chunks (Iterable[bytes]): response data in utf-8 encoded chunks
+            folder (str): folder location to save file to
+            file_name (str): File name when saving
+            file_format (str): File format extention
+
+        Returns:
+            bool: False if the existing object has the same content and was not replaced
+        """
+        suffix = compression_suffix(self.compression)
+        blob_name = f"{folder}/{file_name}.{file_format}{suffix}"
+        temp_blob = self.upload_bucket.blob(
+            f"{UPLOADS_FOLDER}/{blob_name}.{uuid.uuid4().hex}",
+            chunk_size=UPLOAD_CHUNK_SIZE,
+        )
+        content_encoding, content_type = storage_headers(self.compression)
+        if content_encoding is not None:
+            temp_blob.content_encoding = content_encoding
+
+        try:
+            response_hash = hashlib.sha256()
+            with temp_blob.open(
+                "wb", content_type=content_type, ignore_flush=True
+            ) as file:
+                with compressed_writer(file, self.compression) as writer:
+                    for chunk in chunks:
+                        response_hash.update(chunk)
+                        writer.write(chunk)
+
+            if self._is_unchanged(blob_name, response_hash.hexdigest()):
+                print(f"Skipping upload of {blob_name} as the content is unchanged")
+                return False
+
+            blob = self.bucket.blob(blob_name)
+            blob.metadata = {"content_hash": response_hash.hexdigest()}
+            if content_encoding is not None:
+                blob.content_encoding = content_encoding
+            if content_type is not None:
+                blob.content_type = content_type
+            # Large objects can take more than one call to copy between buckets
+            token, _, _ = blob.rewrite(temp_blob)
+            while token is not None:
+                token, _, _ = blob.rewrite(temp_blob, token=token)
+        finally:
+            try:
+                temp_blob.delete()
+            except NotFound:
+                pass
 
-        blob.upload_from_string(response)
+        self._record_saved(blob, response_hash.hexdigest())
+        return True
@@ -0,0 +1,90 @@
+import io
+import json
+from typing import Any, Iterable, Protocol
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class Serializer(Protocol):
+    """
+    Interface protocol for a Serializer. These classes convert the rows, messages and
+    records written by the loaders, caller and messengers to and from json
+
+    Methods
+    dumps(Any) -> bytes: Serialize the data to utf-8 encoded json
+    dumps_line(Any) -> bytes: Serialize the data as a newline terminated json line
+    loads(str | bytes) -> Any: Parse json text or utf-8 encoded bytes
+    """
+
+    def dumps(self, data: Any) -> bytes:
+        """Serialize the data to utf-8 encoded json"""
+
+    def dumps_line(self, data: Any) -> bytes:
+        """Serialize the data as a newline terminated json line"""
+
+    def loads(self, data: str | bytes) -> Any:
+        """Parse json text or utf-8 encoded bytes"""
+
+
+class StdlibSerializer:
+    """Serializes with the json module, the output matches json.dumps exactly"""
+
+    def dumps(self, data: Any) -> bytes:
+        return json.dumps(data).encode("utf-8")
+
+    def dumps_line(self, data: Any) -> bytes:
+        return (json.dumps(data) + "\n").encode("utf-8")
+
+    def loads(self, data: str | bytes) -> Any:
+        return json.loads(data)
+
+
+class OrjsonSerializer:
+    """
+    Serializes with orjson, which writes compact utf-8 bytes straight from the objects
+    rather than building a str first. The json is equivalent to the json module output
+    but is not byte for byte the same, eg there are no spaces after separators
+    """
+
+    def __init__(self) -> None:
+        if orjson is None:
+            raise ImportError("OrjsonSerializer requires the orjson package")
+
+    def dumps(self, data: Any) -> bytes:
+        return orjson.dumps(data)
+
+    def dumps_line(self, data: Any) -> bytes:
+        return orjson.dumps(data, option=orjson.OPT_APPEND_NEWLINE)
+
+    def loads(self, data: str | bytes) -> Any:
+        return orjson.loads(data)
+
+
+def default_serializer() -> Serializer:
+    """Returns the orjson serializer when orjson is installed, otherwise the json module"""
+    if orjson is None:
+        return StdlibSerializer()
+    return OrjsonSerializer()
+
+
+def write_ndjson(rows: Iterable[Any], serializer: Serializer = None) -> io.BytesIO:
+    """Writes the rows as newline delimited json into a byte buffer for a batch load
+
+    Args:
+        rows (Iterable[Any]): rows to write, eg dicts
+        serializer (Serializer, optional): Defaults to default_serializer().
+
+    Returns:
+        io.BytesIO: the buffer positioned at the start
+    """
+    serializer = serializer or default_serializer()
+    file_obj = io.BytesIO()
+    dumps_line = serializer.dumps_line
+    write = file_obj.write
+    for row in rows:
+        write(dumps_line(row))
+    file_obj.seek(0)
+    return file_obj
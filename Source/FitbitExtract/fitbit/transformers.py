@@ -1,13 +1,31 @@
+from array import array
 from datetime import datetime
 from collections.abc import MutableMapping
+from functools import lru_cache
+import json
 import os
 import re
-from fitbit.loaders import DataLoader
+import time
+from typing import Iterator
+from fitbit.compression import split_compression
+from fitbit.instrumentation import (
+    LedgerMetricsSink,
+    MetricsSink,
+    MultiMetricsSink,
+    timer,
+)
+from fitbit.loaders import ConcurrentDataLoader, DataLoader, InstrumentedDataLoader
+from fitbit.manifests import FetchManifest, ObjectIndex
 from fitbit.messengers import Messenger
 from fitbit.caller import EndpointParameters
+from fitbit.xmlparsing import XMLEngine, default_xml_engine
 import fitbit.constants as constants
 import xml.etree.ElementTree as ET
 
+# array typecodes used to hold intraday values by their BigQuery type
+INTRADAY_TYPECODES = {"INT64": "q", "FLOAT64": "d"}
+TCX_TAG_PREFIX = "{http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2}"
+
 
 def flattern_dictionary(dictionary, parent_key="", sep=".") -> dict:
     items = []
@@ -36,6 +54,12 @@ def clean_time(time_fields: list, data: dict) -> dict:
     return data
 
 
+@lru_cache(maxsize=256)
+def strip_tag_prefix(tag: str, tag_prefix: str) -> str:
+    """Removes the namespace prefix from a tag, cached as tcx files repeat a few tags"""
+    return tag.replace(tag_prefix, "")
+
+
 def convert_to_number(string_value: str):
     try:
         return int(string_value)
@@ -47,8 +71,25 @@ def convert_to_number(string_value: str):
 
 
 class FitbitETL:
-    def __init__(self, data_loader: DataLoader, messenger: Messenger, data_source:str = None) -> None:
-        self.data_loader = data_loader
+    def __init__(
+        self,
+        data_loader: DataLoader,
+        messenger: Messenger,
+        data_source: str = None,
+        fetch_manifest: FetchManifest = None,
+        object_index: ObjectIndex = None,
+        metrics: MetricsSink = None,
+        load_workers: int = 1,
+        xml_engine: XMLEngine = None,
+    ) -> None:
+        # Totals the metrics of each file processed for its run ledger row
+        self.ledger = LedgerMetricsSink()
+        sinks = [self.ledger] if metrics is None else [metrics, self.ledger]
+        self.metrics = MultiMetricsSink(sinks)
+        # The tables of a file are loaded at the same time with more than one worker
+        self.data_loader = ConcurrentDataLoader(
+            InstrumentedDataLoader(data_loader, self.metrics), load_workers
+        )
         self.available_endpoint_parsers = {
             "get_heart_rate_by_date": self._transform_load_heart_rate_data,
             "get_body_weight_by_date": self._transform_load_body_weight_data,
@@ -56,9 +97,15 @@ class FitbitETL:
             "get_sleep_by_date": self._transform_load_sleep_data,
             "get_cardio_score_by_date": self._transform_load_cardioscore_data,
             "get_activity_tcx_by_id": self._transform_load_activity_tcx_data,
+            "get_heart_rate_intraday_by_date": self._transform_load_heart_rate_intraday_data,
+            "get_steps_intraday_by_date": self._transform_load_steps_intraday_data,
+            "get_spo2_intraday_by_date": self._transform_load_spo2_intraday_data,
+            constants.BUNDLE_ENDPOINT: self._transform_load_bundle_data,
+            constants.RUN_LEDGER_ENDPOINT: self._transform_load_run_ledger_data,
         }
         self.processing_datetime = datetime.now().strftime(constants.DATETIME_FORMAT)
         self.additional_api_calls = []
+        self.activity_last_modified = {}
         self.user_id = None
         self.path = None
         self.endpoint = None
@@ -66,17 +113,36 @@ class FitbitETL:
         self.instance_id = None
         self.messenger = messenger
         self.data_source = data_source
+        self.fetch_manifest = fetch_manifest
+        self.object_index = object_index
+        self.xml_engine = xml_engine or default_xml_engine()
 
     def process(self, path: str) -> None:
-        self.get_details_from_path(path)
-        data = self.extract_data()
-        self.transform_load_data(data)
-        self.log_processing()
-        self.call_additional_endpoints()
+        self.ledger.reset()
+        try:
+            self.get_details_from_path(path)
+            data = self.extract_data()
+            self.transform_load_data(data)
+            self.refresh_rollups()
+            self.record_processed()
+            self.deduplicate_additional_endpoints()
+            self.call_additional_endpoints()
+        except Exception as exc:
+            try:
+                self.log_processing("failed", exc, path)
+            except Exception as log_exc:  # pylint: disable=W0703
+                print(f"Could not log the failed run of {path}: {log_exc}")
+            raise
+
+        try:
+            self.log_processing("success")
+        except Exception as exc:  # pylint: disable=W0703
+            print(f"Could not log the run of {path}: {exc}")
 
     def get_details_from_path(self, path: str) -> str:
 
-        file_name = os.path.basename(path)
+        uncompressed_path, _ = split_compression(path)
+        file_name = os.path.basename(uncompressed_path)
         endpoint_search = re.search(r".*(get.+)_(.+)\..+", file_name, re.IGNORECASE)
 
         if endpoint_search:
@@ -123,7 +189,70 @@ class FitbitETL:
         if self.date is None:
             raise ValueError("Set date variable before processing data")
 
-        self.available_endpoint_parsers[self.endpoint](input_data)
+        # The loads run by the parser are timed by the loader, so the time spent in them
+        # is taken off the transform timing. Streamed rows are timed as they are loaded
+        tags = {"endpoint": self.endpoint}
+        blocked_seconds = self.data_loader.blocked_seconds
+        start = time.perf_counter()
+        try:
+            self.available_endpoint_parsers[self.endpoint](input_data)
+        except Exception:
+            # The loads already submitted are finished so none outlive the failed run
+            self.data_loader.wait(raise_errors=False)
+            raise
+        finally:
+            blocked_seconds = self.data_loader.blocked_seconds - blocked_seconds
+            seconds = time.perf_counter() - start - blocked_seconds
+            self.metrics.timing("transform", seconds, tags)
+        # Every table is loaded before the rollups are refreshed and the run is logged
+        self.data_loader.wait()
+
+    def refresh_rollups(self) -> None:
+        """Refreshes the rollup tables built from the endpoint for the processed user and date"""
+        for rollup_name in constants.ROLLUP_TRIGGER_MAPPING.get(self.endpoint, []):
+            self.data_loader.refresh_rollup(
+                rollup_name, self.user_id, [self.date.strftime(constants.DATE_FORMAT)]
+            )
+
+    def deduplicate_additional_endpoints(self) -> None:
+        """
+        Removes activity tcx calls from the additional endpoints where the fetch manifest
+        shows the tcx has already been fetched and the activity has not been modified since
+        """
+        if self.fetch_manifest is None:
+            return
+
+        endpoints = []
+        for endpoint in self.additional_api_calls:
+            if endpoint.name != "get_activity_tcx_by_id":
+                endpoints.append(endpoint)
+                continue
+
+            log_id = endpoint.url_kwargs["log_id"]
+            manifest_key = f"{self.user_id}_{log_id}"
+            last_modified = self.activity_last_modified.get(log_id)
+            entry = self.fetch_manifest.get(manifest_key)
+
+            if (
+                entry is not None
+                and entry.get("fetched")
+                and entry.get("last_modified") == last_modified
+            ):
+                continue
+
+            # A tcx fetched before keeps its fetched state, if the modified activity has
+            # the same tcx the saver skips it and no transform would mark it again
+            self.fetch_manifest.update(
+                manifest_key,
+                {
+                    "last_modified": last_modified,
+                    "requested_date": self.processing_datetime,
+                    "fetched": entry is not None and bool(entry.get("fetched")),
+                },
+            )
+            endpoints.append(endpoint)
+
+        self.additional_api_calls = endpoints
 
     def call_additional_endpoints(self) -> None:
         message_data = self.messenger.prep_message(
@@ -132,26 +261,107 @@ class FitbitETL:
             self.date.strftime(constants.DATE_FORMAT),
         )
 
-        self.messenger.send_message(message_data)
+        with timer(self.metrics, "publish"):
+            self.messenger.send_message(message_data)
+
+    def record_processed(self) -> None:
+        """Marks the processed object as processed in the object index. The data is
+        already loaded so a failure is printed rather than failing the transform"""
+        if self.object_index is None:
+            return
 
-    def log_processing(self) -> None:
+        try:
+            self.object_index.update(
+                self.path,
+                {"processed": True, "processed_date": self.processing_datetime},
+            )
+        except Exception as exc:  # pylint: disable=W0703
+            print(f"Could not record {self.path} as processed: {exc}")
+
+    def log_processing(
+        self, outcome: str, error: Exception = None, path: str = None
+    ) -> None:
+        """Loads the run ledger row of the processed file with the time taken in each
+        stage, the bytes read and the rows loaded into each table. The ledger rows saved
+        by the extract function are not logged themselves
+
+        Args:
+            outcome (str): success or failed
+            error (Exception, optional): exception the processing failed with
+            path (str, optional): path of the file if the details could not be parsed
+        """
+        if self.endpoint == constants.RUN_LEDGER_ENDPOINT:
+            return
+
+        date = None
+        if self.date is not None:
+            date = self.date.strftime(constants.DATE_FORMAT)
 
         log_dict = {
-            "date": self.date.strftime(constants.DATE_FORMAT),
+            "run_type": "transform",
+            "date": date,
             "user_id": self.user_id,
             "processed_date": self.processing_datetime,
             "api_endpoint": self.endpoint,
             "data_source": self.data_source,
-            "file_processed": self.path,
+            "file_path": self.path or path,
+            **self.ledger.ledger_row(outcome, error),
         }
 
-        table_name = constants.TABLE_NAME_MAPPING["file_processing_log"]
+        table_name = constants.TABLE_NAME_MAPPING[constants.RUN_LEDGER_ENDPOINT]
         self.data_loader.load([log_dict], table_name)
+        self.data_loader.wait()
 
     ###########################################################
     # Methods for parsing individual endpoints or sub objects #
     ###########################################################
 
+    def _transform_load_bundle_data(self, input_data: dict) -> None:
+
+        if "records" not in input_data:
+            raise KeyError("Expected records to be in bundle data dictionary")
+
+        bundle_endpoint = self.endpoint
+        bundle_instance_id = self.instance_id
+
+        for record in input_data["records"]:
+            if record["endpoint"] not in self.available_endpoint_parsers:
+                raise ValueError(
+                    f"{record['endpoint']} is not in the available endpoint parsers"
+                )
+            if record["user_id"] != self.user_id:
+                raise ValueError(
+                    f"Bundle record for {record['user_id']} does not match {self.user_id}"
+                )
+
+            self.endpoint = record["endpoint"]
+            self.instance_id = None
+            instance_id_search = re.search("^([0-9]+)_get.+", record["instance"])
+            if instance_id_search:
+                self.instance_id = int(instance_id_search.group(1))
+
+            if record["format"] in ["xml", "tcx"]:
+                record_data = {"xml_data": record["data"]}
+            else:
+                record_data = json.loads(record["data"])
+
+            self.available_endpoint_parsers[self.endpoint](record_data)
+            # Streamed rows read the record details as they are produced, so the loads
+            # of the record finish before the next record replaces them
+            self.data_loader.wait()
+            self.refresh_rollups()
+
+        self.endpoint = bundle_endpoint
+        self.instance_id = bundle_instance_id
+
+    def _transform_load_run_ledger_data(self, input_data: dict) -> None:
+
+        if "records" not in input_data:
+            raise KeyError("Expected records to be in run ledger data dictionary")
+
+        table_name = constants.TABLE_NAME_MAPPING[constants.RUN_LEDGER_ENDPOINT]
+        self.data_loader.load(input_data["records"], table_name)
+
     def _transform_dict_from_metadata(
         self,
         data: dict,
@@ -161,6 +371,7 @@ class FitbitETL:
         append_user_id: bool = True,
         append_processed_date: bool = True,
         time_fields: list = None,
+        flattern: bool = True,
     ) -> dict:
 
         if datetime_fields is not None:
@@ -169,7 +380,8 @@ class FitbitETL:
         if time_fields is not None:
             data = clean_time(time_fields, data)
 
-        data = flattern_dictionary(data)
+        if flattern:
+            data = flattern_dictionary(data)
         temp_dict = {
             fields[key]["bq_name"]: value
             for key, value in data.items()
@@ -196,6 +408,9 @@ class FitbitETL:
                 "get_activity_tcx_by_id", "GET", "tcx", url_kwargs=url_kwargs
             )
             self.additional_api_calls.append(tcx_endpoint)
+            self.activity_last_modified[activity["logId"]] = activity.get(
+                "lastModified"
+            )
             temp_dict = self._transform_dict_from_metadata(
                 activity, constants.ACTIVITY_FIELDS, time_fields=["startTime"]
             )
@@ -277,9 +492,70 @@ class FitbitETL:
         table_name = constants.TABLE_NAME_MAPPING[self.endpoint]
         self.data_loader.load(output_data, table_name)
 
-    def _transform_sleep_detail(self, sleep_details: dict, log_id: int) -> list[dict]:
+    def _load_intraday_columns(
+        self, date_times: list[str], values: list, fields: dict
+    ) -> None:
+        """Loads an intraday series as columns, the values are stored in a typed array
+        and the user, date and processed date are stored once rather than on every row"""
+        value_field = fields["value"]
+        typecode = INTRADAY_TYPECODES[value_field["bq_type"]]
+
+        columns = {
+            "user_id": self.user_id,
+            "date": self.date.strftime(constants.DATE_FORMAT),
+            "processed_date": self.processing_datetime,
+            "date_time": date_times,
+            value_field["bq_name"]: array(typecode, values),
+        }
+        table_name = constants.TABLE_NAME_MAPPING[self.endpoint]
+        self.data_loader.load_columns(columns, table_name)
+
+    def _transform_load_intraday_activity_data(
+        self, input_data: dict, resource: str, fields: dict
+    ) -> None:
+
+        intraday_key = f"activities-{resource}-intraday"
+        if intraday_key not in input_data:
+            raise KeyError(
+                f"Expected {intraday_key} to be in {resource} intraday data dictionary"
+            )
+
+        dataset = input_data[intraday_key]["dataset"]
+        date_str = self.date.strftime(constants.DATE_FORMAT)
+
+        self._load_intraday_columns(
+            [f"{date_str} {point['time']}" for point in dataset],
+            [point["value"] for point in dataset],
+            fields,
+        )
+
+    def _transform_load_heart_rate_intraday_data(self, input_data: dict) -> None:
+
+        self._transform_load_intraday_activity_data(
+            input_data, "heart", constants.HEART_RATE_INTRADAY_FIELDS
+        )
+
+    def _transform_load_steps_intraday_data(self, input_data: dict) -> None:
+
+        self._transform_load_intraday_activity_data(
+            input_data, "steps", constants.STEPS_INTRADAY_FIELDS
+        )
+
+    def _transform_load_spo2_intraday_data(self, input_data: dict) -> None:
+
+        # Days without a reading return an empty dictionary
+        minutes = input_data.get("minutes", [])
+
+        self._load_intraday_columns(
+            [point["minute"].replace("T", " ") for point in minutes],
+            [point["value"] for point in minutes],
+            constants.SPO2_INTRADAY_FIELDS,
+        )
+
+    def _transform_sleep_detail(
+        self, sleep_details: dict, log_id: int
+    ) -> Iterator[dict]:
 
-        return_list = []
         if "data" in sleep_details:
             for row in sleep_details["data"]:
                 new_row = self._transform_dict_from_metadata(
@@ -287,16 +563,19 @@ class FitbitETL:
                 )
                 new_row["log_id"] = log_id
                 new_row["type"] = "data"
-                return_list.append(new_row)
-        if "shortData" in sleep_details:            
+                yield new_row
+        if "shortData" in sleep_details:
             for row in sleep_details["shortData"]:
                 new_row = self._transform_dict_from_metadata(
                     row, constants.SLEEP_DETAILS_FIELDS, ["dateTime"], True, False, False
                 )
                 new_row["log_id"] = log_id
                 new_row["type"] = "short_data"
-                return_list.append(new_row)
-        return return_list
+                yield new_row
+
+    def _iter_sleep_detail_rows(self, sleeps: list[dict]) -> Iterator[dict]:
+        for row in sleeps:
+            yield from self._transform_sleep_detail(row["levels"], row["logId"])
 
     def _transform_load_sleep_data(self, input_data: dict) -> None:
 
@@ -304,20 +583,19 @@ class FitbitETL:
             raise KeyError("Expected sleep to be in sleep data dictionary")
 
         output_data = []
-        output_data_details = []
 
         for row in input_data["sleep"]:
 
             temp_dict = self._transform_dict_from_metadata(row, constants.SLEEP_FIELDS)
             output_data.append(temp_dict)
 
-            details_list = self._transform_sleep_detail(row["levels"], row["logId"])
-            output_data_details.extend(details_list)
-
         table_name = constants.TABLE_NAME_MAPPING[self.endpoint]
 
         self.data_loader.load(output_data, table_name)
-        self.data_loader.load(output_data_details, f"{table_name}_detail")
+        # Detail rows are streamed to the loader which holds them as columns in chunks
+        self.data_loader.load_stream(
+            self._iter_sleep_detail_rows(input_data["sleep"]), f"{table_name}_detail"
+        )
 
     def _transform_load_cardioscore_data(self, input_data: dict) -> None:
         if "cardioScore" not in input_data:
@@ -339,60 +617,110 @@ class FitbitETL:
         if self.instance_id is None:
             raise ValueError("Instance Id is not instantiated")
 
-        output_data = []
-        root = ET.fromstring(input_data["xml_data"])
-        tag_prefix = "{http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2}"
-
-        for activity in root.iter(f"{tag_prefix}Activity"):
-            activity_attrib = activity.attrib
-            activity_attrib["log_id"] = self.instance_id
-            for lap_number, lap in enumerate(activity.iter(f"{tag_prefix}Lap")):
-                lap_list = self._transform_activity_lap(
-                    lap, lap_number, tag_prefix, activity_attrib
-                )
-                output_data += lap_list
-
+        # Trackpoints are streamed to the loader as they are parsed, so neither the
+        # document tree nor the rows of the whole activity are held in memory
         table_name = constants.TABLE_NAME_MAPPING[self.endpoint]
-        self.data_loader.load(output_data, table_name)
+        self.data_loader.load_stream(
+            self._iter_activity_tcx_rows(input_data["xml_data"]), table_name
+        )
+
+        if self.fetch_manifest is not None:
+            self.fetch_manifest.update(
+                f"{self.user_id}_{self.instance_id}",
+                {"fetched": True, "fetched_date": self.processing_datetime},
+            )
+
+    def _iter_activity_tcx_rows(self, xml_data: str) -> Iterator[dict]:
+        """Yields a row for each trackpoint of each lap of the activities in a TCX
+        document. The lap fields are read from the lap elements before each track when
+        the track starts, which is where the TCX schema places them, and each
+        trackpoint is removed from the tree once its row has been yielded. Only the
+        events of the activity, lap, track and trackpoint elements are asked for"""
+        tag_prefix = TCX_TAG_PREFIX
+        activity_tag = f"{tag_prefix}Activity"
+        lap_tag = f"{tag_prefix}Lap"
+        track_tag = f"{tag_prefix}Track"
+        track_point_tag = f"{tag_prefix}Trackpoint"
+        lap_field_tags = {
+            f"{tag_prefix}{field}": field for field in constants.ACTIVITY_TCX_FIELDS
+        }
+        tags = [activity_tag, lap_tag, track_tag, track_point_tag]
+        activity_attrib = None
+        lap_number = -1
+        lap_dict = None
+        point_number = 0
+
+        for event, element, parent in self.xml_engine.iter_events(xml_data, tags):
+            tag = element.tag
+            if event == "start":
+                if tag == activity_tag:
+                    activity_attrib = dict(element.attrib)
+                    activity_attrib["log_id"] = self.instance_id
+                    lap_number = -1
+                elif tag == lap_tag and activity_attrib is not None:
+                    lap_number += 1
+                    lap_dict = {"log_id": self.instance_id, "lap_number": lap_number}
+                    point_number = 0
+                elif tag == track_tag and lap_dict is not None:
+                    # The lap elements before the track are complete at its start
+                    for child in parent if parent.tag == lap_tag else []:
+                        if child is element:
+                            break
+                        field = lap_field_tags.get(child.tag)
+                        if field is not None:
+                            lap_dict[field] = convert_to_number(child.text)
+                continue
+
+            if tag == track_point_tag and lap_dict is not None:
+                yield self._transform_activity_lap_point(
+                    element, point_number, tag_prefix, activity_attrib, lap_dict
+                )
+                point_number += 1
+                parent.remove(element)
+            elif tag == lap_tag:
+                lap_dict = None
+                element.clear()
+            elif tag == activity_tag:
+                activity_attrib = None
+                element.clear()
 
     def _transform_activity_track_point(
         self, track_point: ET.Element, point_number: int, tag_prefix: str
     ) -> dict:
         track_point_dict = {"point_order": point_number}
+        position_tag = f"{tag_prefix}Position"
+        heart_rate_tag = f"{tag_prefix}HeartRateBpm"
         for child in track_point:
+            child_tag = child.tag
             # Handle positions and sub object
-            if child.tag == f"{tag_prefix}Position":
+            if child_tag == position_tag:
                 for position in child:
-                    tag = position.tag.replace(tag_prefix, "")
+                    tag = strip_tag_prefix(position.tag, tag_prefix)
                     track_point_dict[tag] = convert_to_number(position.text)
                 continue
             # Handle heart rate sub object
-            if child.tag == f"{tag_prefix}HeartRateBpm":
-                tag = child.tag.replace(tag_prefix, "")
+            if child_tag == heart_rate_tag:
+                tag = strip_tag_prefix(child_tag, tag_prefix)
                 track_point_dict[tag] = convert_to_number(child[0].text)
                 continue
             # All Others
-            tag = child.tag.replace(tag_prefix, "")
+            tag = strip_tag_prefix(child_tag, tag_prefix)
             track_point_dict[tag] = convert_to_number(child.text)
         return track_point_dict
 
-    def _transform_activity_lap(
-        self, lap: ET.Element, lap_number: int, tag_prefix: str, activity_attrib: dict
-    ) -> list:
-        return_list = []
-        lap_dict = {"log_id": self.instance_id, "lap_number": lap_number}
-        for lap_child in lap:
-            tag = lap_child.tag.replace(tag_prefix, "")
-            if tag != "Track":
-                lap_dict[tag] = convert_to_number(lap_child.text)
-
-        for point_number, track_point in enumerate(lap.iter(f"{tag_prefix}Trackpoint")):
-            track_point_dict = self._transform_activity_track_point(
-                track_point, point_number, tag_prefix
-            )
-            out_dict = activity_attrib | lap_dict | track_point_dict
-            out_dict = self._transform_dict_from_metadata(
-                out_dict, constants.ACTIVITY_TCX_FIELDS, ["Time"]
-            )
-            return_list.append(out_dict)
-        return return_list
+    def _transform_activity_lap_point(
+        self,
+        track_point: ET.Element,
+        point_number: int,
+        tag_prefix: str,
+        activity_attrib: dict,
+        lap_dict: dict,
+    ) -> dict:
+        track_point_dict = self._transform_activity_track_point(
+            track_point, point_number, tag_prefix
+        )
+        out_dict = activity_attrib | lap_dict | track_point_dict
+        # The tcx values are never nested so the row does not need to be flatterned
+        return self._transform_dict_from_metadata(
+            out_dict, constants.ACTIVITY_TCX_FIELDS, ["Time"], flattern=False
+        )
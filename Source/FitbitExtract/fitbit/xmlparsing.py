@@ -0,0 +1,105 @@
+from typing import Iterator, Protocol
+import xml.etree.ElementTree as ET
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:  # pragma: no cover
+    lxml_etree = None
+
+# Characters of a document given to the xml parser at a time
+XML_FEED_CHARS = 64 * 1024
+
+
+class XMLEngine(Protocol):
+    """
+    Interface protocol for an XML Engine. These classes parse a document a slice at a time
+    and report the start and end of the elements with the tags asked for, with the parent
+    of each element. Elements are complete at their end event and can be removed from
+    their parent once used so the tree of the whole document is never held in memory
+
+    Methods
+    iter_events(str, list[str]) -> Iterator[tuple[str, Element, Element]]: Yield the
+        start and end events of the elements with the tags
+    """
+
+    def iter_events(
+        self, xml_data: str, tags: list[str]
+    ) -> Iterator[tuple[str, ET.Element, ET.Element | None]]:
+        """Yield the event, element and parent for the start and end of each element
+        with one of the tags, tags include the namespace eg {namespace}Trackpoint"""
+
+
+def iter_xml_slices(xml_data: str) -> Iterator[str]:
+    """Yields the document in slices of XML_FEED_CHARS characters"""
+    for start in range(0, len(xml_data), XML_FEED_CHARS):
+        yield xml_data[start : start + XML_FEED_CHARS]
+
+
+class ElementTreeEngine:
+    """
+    Parses with the standard library ElementTree. Every element has its events read in
+    python, which tracks the open elements to find the parents
+    """
+
+    def iter_events(
+        self, xml_data: str, tags: list[str]
+    ) -> Iterator[tuple[str, ET.Element, ET.Element | None]]:
+        tags = set(tags)
+        open_elements = [None]
+        for event, element in self._iter_all_events(xml_data):
+            if event == "start":
+                if element.tag in tags:
+                    yield event, element, open_elements[-1]
+                open_elements.append(element)
+                continue
+
+            open_elements.pop()
+            if element.tag in tags:
+                yield event, element, open_elements[-1]
+
+    def _iter_all_events(self, xml_data: str) -> Iterator[tuple[str, ET.Element]]:
+        parser = ET.XMLPullParser(events=("start", "end"))
+        for xml_slice in iter_xml_slices(xml_data):
+            parser.feed(xml_slice)
+            yield from parser.read_events()
+        parser.close()
+        yield from parser.read_events()
+
+
+class LxmlEngine:
+    """
+    Parses with lxml, which only creates events for the elements with the tags asked
+    for so the rest of the document is parsed without returning to python. Comments and
+    processing instructions are dropped and entities are not resolved so the elements
+    have the same children and text as with ElementTree
+    """
+
+    def __init__(self) -> None:
+        if lxml_etree is None:
+            raise ImportError("LxmlEngine requires the lxml package")
+
+    def iter_events(
+        self, xml_data: str, tags: list[str]
+    ) -> Iterator[tuple[str, ET.Element, ET.Element | None]]:
+        parser = lxml_etree.XMLPullParser(
+            events=("start", "end"),
+            tag=list(tags),
+            remove_comments=True,
+            remove_pis=True,
+            resolve_entities=False,
+            no_network=True,
+        )
+        for xml_slice in iter_xml_slices(xml_data):
+            parser.feed(xml_slice)
+            for event, element in parser.read_events():
+                yield event, element, element.getparent()
+        parser.close()
+        for event, element in parser.read_events():
+            yield event, element, element.getparent()
+
+
+def default_xml_engine() -> XMLEngine:
+    """Returns the lxml engine when lxml is installed, otherwise ElementTree"""
+    if lxml_etree is None:
+        return ElementTreeEngine()
+    return LxmlEngine()
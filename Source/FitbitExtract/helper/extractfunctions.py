@@ -0,0 +1,104 @@
+from datetime import date
+
+from fitbit.authorization import CloudTokenManager
+from fitbit.requesters import WebAPIRequester
+from fitbit.savers import GCPResponseSaver
+from fitbit.manifests import GCPFetchManifest, GCPObjectIndex
+from fitbit.caller import FitBitCaller, EndpointParameters
+from fitbit.instrumentation import JSONLogMetricsSink, MetricsSink
+from fitbit.profiling import GCPProfileWriter, profile, profile_path, profiling_enabled
+
+
+def create_caller(
+    user_id: str,
+    endpoints: list[EndpointParameters],
+    project_id: str,
+    bucket_name_cred: str,
+    bucket_name_file: str,
+    bucket_name_state: str,
+    bundle: bool = False,
+    metrics: MetricsSink = None,
+) -> FitBitCaller:  # pragma: no cover
+
+    token_manager = CloudTokenManager(project_id, bucket_name_cred, user_id)
+    fitbit_requester = WebAPIRequester()
+    object_index = GCPObjectIndex(bucket_name_state, project_id)
+    response_saver = GCPResponseSaver(
+        bucket_name_file,
+        project_id,
+        object_index=object_index,
+        upload_bucket_name=bucket_name_state,
+    )
+    user_token = token_manager.load_token()
+    fit_bit_caller = FitBitCaller(
+        user_token,
+        response_saver,
+        fitbit_requester,
+        token_manager,
+        stream_formats=["tcx"],
+        bundle=bundle,
+        metrics=metrics,
+        ledger=True,
+    )
+    fit_bit_caller.register_multiple_endpoints(endpoints)
+    fit_bit_caller.refresh_access_token()
+    return fit_bit_caller
+
+
+def call_api(
+    date: date,
+    user_id: str,
+    endpoints: list[EndpointParameters],
+    project_id: str,
+    bucket_name_cred: str,
+    bucket_name_file: str,
+    bucket_name_state: str,
+    bundle: bool = False,
+    profile_run: bool = False,
+) -> None:  # pragma: no cover
+
+    metrics = JSONLogMetricsSink({"function": "extract", "user_id": user_id})
+    writer = GCPProfileWriter(bucket_name_state, project_id)
+    path = profile_path(f"{date.strftime('%Y%m%d')}/{user_id}", "extract")
+    with profile(writer, path, metrics, profiling_enabled(profile_run)) as metrics:
+        fit_bit_caller = create_caller(
+            user_id,
+            endpoints,
+            project_id,
+            bucket_name_cred,
+            bucket_name_file,
+            bucket_name_state,
+            bundle,
+            metrics,
+        )
+        fit_bit_caller.make_registered_requests_for_date(date)
+
+
+def call_api_incremental(
+    user_id: str,
+    endpoints: list[EndpointParameters],
+    project_id: str,
+    bucket_name_cred: str,
+    bucket_name_file: str,
+    bucket_name_state: str,
+    bundle: bool = False,
+    profile_run: bool = False,
+) -> None:  # pragma: no cover
+
+    metrics = JSONLogMetricsSink({"function": "extract", "user_id": user_id})
+    writer = GCPProfileWriter(bucket_name_state, project_id)
+    path = profile_path(f"{date.today().strftime('%Y%m%d')}/{user_id}", "incremental")
+    with profile(writer, path, metrics, profiling_enabled(profile_run)) as metrics:
+        fit_bit_caller = create_caller(
+            user_id,
+            endpoints,
+            project_id,
+            bucket_name_cred,
+            bucket_name_file,
+            bucket_name_state,
+            bundle,
+            metrics,
+        )
+        sync_state = GCPFetchManifest(bucket_name_state, project_id, "sync_state")
+        requested = fit_bit_caller.make_registered_requests_incremental(sync_state)
+    print(f"Incremental requests for {user_id}: {requested}")
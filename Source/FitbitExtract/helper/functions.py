@@ -1,46 +1,39 @@
 from datetime import datetime, timedelta, date
+from functools import lru_cache
 import base64
 import ast
 import os
 import json
 
-
-from fitbit.authorization import CloudTokenManager
-from fitbit.requesters import WebAPIRequester
-from fitbit.savers import GCPResponseSaver
-from fitbit.caller import FitBitCaller, EndpointParameters
-from fitbit.messengers import PubSubMessenger
-from fitbit.transformers import FitbitETL
-from fitbit.loaders import GCPDataLoader
+# Only light weight modules are imported here as this module is loaded by both cloud
+# functions. The api and cloud clients are imported by helper.extractfunctions and
+# helper.transformfunctions which are only loaded by the function that needs them
+from fitbit.caller import EndpointParameters
+from fitbit.constants import LOAD_WORKERS_ENV_VAR, RESERVED_FOLDERS
 from helper.constants import ENDPOINTS
 
-
-def call_api(
-    date: date,
-    user_id: str,
-    endpoints: list[EndpointParameters],
-    project_id: str,
-    bucket_name_cred: str,
-    bucket_name_file: str,
-) -> None:  # pragma: no cover
-
-    token_manager = CloudTokenManager(project_id, bucket_name_cred, user_id)
-    fitbit_requester = WebAPIRequester()
-    response_saver = GCPResponseSaver(bucket_name_file, project_id)
-    user_token = token_manager.load_token()
-    fit_bit_caller = FitBitCaller(
-        user_token, response_saver, fitbit_requester, token_manager
-    )
-    fit_bit_caller.register_multiple_endpoints(endpoints)
-    fit_bit_caller.refresh_access_token()
-    fit_bit_caller.make_registered_requests_for_date(date)
+ENDPOINT_FIELD_TYPES = {
+    "name": str,
+    "method": str,
+    "response_format": str,
+    "url_kwargs": dict,
+    "body": dict,
+    "headers": dict,
+}
 
 
 def decode_event_messages(message_data) -> dict:
     pubsub_message = base64.b64decode(message_data["message"]["data"])
     try:
         pubsub_message_decoded = pubsub_message.decode("UTF-8")
-        return ast.literal_eval(pubsub_message_decoded)
+        try:
+            parameters = json.loads(pubsub_message_decoded)
+        except json.JSONDecodeError:
+            # Older messages were written as python literals
+            parameters = ast.literal_eval(pubsub_message_decoded)
+        if not isinstance(parameters, dict):
+            raise TypeError(f"Expected a dict but got {type(parameters).__name__}")
+        return parameters
     except Exception as exc:
         print(exc)
         raise Exception(
@@ -58,6 +51,42 @@ def check_parameters(parameters: dict) -> None:
     if "endpoints" not in parameters:
         raise KeyError("endpoints was not provided in message body")
 
+    if not isinstance(parameters["user_id"], str):
+        raise ValueError("user_id should be a string")
+
+    if not isinstance(parameters["date"], str):
+        raise ValueError("date should be a string of current or YYYY-mm-dd")
+
+    if "bundle" in parameters and not isinstance(parameters["bundle"], bool):
+        raise ValueError("bundle should be true or false")
+
+    if "profile" in parameters and not isinstance(parameters["profile"], bool):
+        raise ValueError("profile should be true or false")
+
+    endpoints = parameters["endpoints"]
+    if not isinstance(endpoints, list):
+        raise ValueError("Endpoints should be passed as a list even for a single value")
+
+    if endpoints == ["all"]:
+        return
+
+    for endpoint in endpoints:
+        if not isinstance(endpoint, dict):
+            raise ValueError(
+                f"Endpoint {endpoint} should be a dict or the list ['all']"
+            )
+
+        if "name" not in endpoint:
+            raise ValueError(f"Endpoint {endpoint} does not have a name")
+
+        for field_name, field_type in ENDPOINT_FIELD_TYPES.items():
+            if field_name in endpoint and not isinstance(
+                endpoint[field_name], field_type
+            ):
+                raise ValueError(
+                    f"Endpoint {field_name} should be a {field_type.__name__}"
+                )
+
 
 def get_endpoints(run_parameters: dict) -> list[EndpointParameters]:
     if not type(run_parameters["endpoints"]) == list:
@@ -92,6 +121,11 @@ def get_endpoints(run_parameters: dict) -> list[EndpointParameters]:
     return endpoints_list
 
 
+def is_incremental(run_parameters: dict) -> bool:
+    """Checks if the run should only request the dates with new device data"""
+    return run_parameters["date"] == "incremental"
+
+
 def get_date(run_parameters: dict) -> date:
     if run_parameters["date"] == "current":
         return_date = date.today() - timedelta(days=1)
@@ -101,12 +135,25 @@ def get_date(run_parameters: dict) -> date:
     return return_date
 
 
-def get_config_parameter(config_directory: str, parameter_name: str) -> str:
+@lru_cache(maxsize=None)
+def load_config(config_directory: str) -> dict:
+    """Reads and parses the config file, the result is cached so the file is only read once
+
+    Args:
+        config_directory (str): path to the config json file
+
+    Returns:
+        dict: config parameters
+    """
     if not os.path.exists(config_directory):
         raise Exception(f"No config file found at {config_directory}")
 
     with open(config_directory, "r", encoding="utf-8") as config_file:
-        config_dictionary = json.load(config_file)
+        return json.load(config_file)
+
+
+def get_config_parameter(config_directory: str, parameter_name: str) -> str:
+    config_dictionary = load_config(config_directory)
 
     if parameter_name not in config_dictionary:
         raise KeyError(f"Please add to {parameter_name}")
@@ -121,15 +168,29 @@ def get_config_parameter(config_directory: str, parameter_name: str) -> str:
     return config_dictionary[parameter_name]
 
 
-def transform_load(
-    project_id: str,
-    file_bucket: str,
-    file_name: str,
-    topic_name: str,
-    dataset_name: str,
-) -> None:  # pragma: no cover
-    messenger = PubSubMessenger(project_id, topic_name)
-    loader = GCPDataLoader(project_id, file_bucket, dataset_name)
-    transformer = FitbitETL(loader, messenger, file_bucket)
+def is_reserved_path(path: str) -> bool:
+    """Checks if a storage path is in one of the folders that do not hold api responses
+
+    Args:
+        path (str): path of the object in the bucket
+
+    Returns:
+        bool: True if the path should not be transformed
+    """
+    top_folder = path.split("/", 1)[0]
+    return top_folder in RESERVED_FOLDERS
+
+
+def get_load_workers() -> int:
+    """Returns the number of tables a transform loads at the same time, set with the
+    FITBIT_LOAD_WORKERS environment variable. Defaults to 1, loading tables in turn
 
-    transformer.process(file_name)
+    Raises:
+        ValueError: If the variable is not a whole number of at least 1
+    """
+    value = os.environ.get(LOAD_WORKERS_ENV_VAR, "1")
+    if not value.isdigit() or int(value) < 1:
+        raise ValueError(
+            f"{LOAD_WORKERS_ENV_VAR} should be a whole number of at least 1, not {value}"
+        )
+    return int(value)
@@ -2,9 +2,10 @@ from datetime import date, datetime
 
 
 from fitbit.authorization import LocalTokenManager, CloudTokenManager
-from fitbit.requesters import WebAPIRequester
+from fitbit.requesters import RecordingRequester, WebAPIRequester
 from fitbit.savers import LocalResponseSaver
 from fitbit.caller import FitBitCaller, EndpointParameters
+from fitbit.profiling import LocalProfileWriter, profile, profile_path
 from helper import constants
 
 
@@ -14,6 +15,9 @@ def call_api_local(
     project_id: str,
     bucket_name: str,
     endpoints: list[EndpointParameters] = None,
+    cassette_path: str = None,
+    scrubbed_user_id: str = "USER1",
+    profile_run: bool = False,
 ) -> None:
 
     date = datetime.strptime(date, "%Y-%m-%d").date()
@@ -29,9 +33,20 @@ def call_api_local(
 
     response_saver = LocalResponseSaver("local_data/data")
     user_token = token_manager.load_token()
-    fit_bit_caller = FitBitCaller(
-        user_token, response_saver, fitbit_requester, token_manager
-    )
-    fit_bit_caller.register_multiple_endpoints(endpoints)
-    fit_bit_caller.refresh_access_token()
-    fit_bit_caller.make_registered_requests_for_date(date)
+    if cassette_path is not None:
+        # Record the responses so the run can be replayed offline with the user id removed
+        fitbit_requester = RecordingRequester(
+            fitbit_requester, cassette_path, {user_token.user_id: scrubbed_user_id}
+        )
+    writer = LocalProfileWriter("local_data/data")
+    path = profile_path(f"{date.strftime('%Y%m%d')}/{user_token.user_id}", "extract")
+    with profile(writer, path, enabled=profile_run) as metrics:
+        fit_bit_caller = FitBitCaller(
+            user_token, response_saver, fitbit_requester, token_manager, metrics=metrics
+        )
+        fit_bit_caller.register_multiple_endpoints(endpoints)
+        fit_bit_caller.refresh_access_token()
+        fit_bit_caller.make_registered_requests_for_date(date)
+
+    if cassette_path is not None:
+        fitbit_requester.close()
@@ -0,0 +1,41 @@
+from fitbit.messengers import PubSubMessenger
+from fitbit.transformers import FitbitETL
+from fitbit.loaders import GCPDataLoader
+from fitbit.manifests import GCPFetchManifest, GCPObjectIndex
+from fitbit.instrumentation import JSONLogMetricsSink
+from fitbit.profiling import GCPProfileWriter, profile, profile_path, profiling_enabled
+from helper.functions import get_load_workers, is_reserved_path
+
+
+def transform_load(
+    project_id: str,
+    file_bucket: str,
+    file_name: str,
+    topic_name: str,
+    dataset_name: str,
+    state_bucket: str,
+) -> None:  # pragma: no cover
+    if is_reserved_path(file_name):
+        print(f"Skipping {file_name} as it is not an api response")
+        return
+
+    messenger = PubSubMessenger(project_id, topic_name)
+    loader = GCPDataLoader(project_id, file_bucket, dataset_name)
+    fetch_manifest = GCPFetchManifest(state_bucket, project_id, "activity_tcx")
+    object_index = GCPObjectIndex(state_bucket, project_id)
+    metrics = JSONLogMetricsSink({"function": "transform", "file_name": file_name})
+    writer = GCPProfileWriter(state_bucket, project_id)
+    path = profile_path(file_name, "transform")
+    # Transforms are triggered by storage events so can only be profiled with the
+    # FITBIT_PROFILE environment variable
+    with profile(writer, path, metrics, profiling_enabled()) as metrics:
+        transformer = FitbitETL(
+            loader,
+            messenger,
+            file_bucket,
+            fetch_manifest,
+            object_index,
+            metrics,
+            get_load_workers(),
+        )
+        transformer.process(file_name)
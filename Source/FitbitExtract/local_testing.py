@@ -1,4 +1,5 @@
 import helper.functions as helper
+from helper.transformfunctions import transform_load
 from fitbit.transformers import FitbitETL
 from fitbit.loaders import LocalDataLoader
 import helper.localfunctions as localhelper
@@ -8,10 +9,12 @@ from fitbit import constants as fit_constants
 from fitbit.transformers import flattern_dictionary
 from fitbit.loaders import GCPDataLoader, LocalDataLoader
 from fitbit.messengers import PubSubMessenger, LocalMessenger
+from fitbit.manifests import LocalFetchManifest, LocalObjectIndex
 from fitbit import transformers, loaders
 
 PROJECT_ID = helper.get_config_parameter("config.json", "gcp_project")
 BUCKET_NAME = helper.get_config_parameter("config.json", "gcp_bucket_file_store")
+BUCKET_NAME_STATE = helper.get_config_parameter("config.json", "gcp_bucket_state")
 DATASET_NAME = helper.get_config_parameter("config.json", "gcp_bq_dataset")
 TOPIC_NAME = helper.get_config_parameter("config.json", "pub_sub_topic_name")
 
@@ -26,7 +29,14 @@ def testing() -> None:
     #     "local_data/data/get_sleep_by_date/20230118/get_sleep_by_date_8HQJ4D.json"
     # )
 
-    parser = FitbitETL(LocalDataLoader(), LocalMessenger())
+    fetch_manifest = LocalFetchManifest("local_data/manifests", "activity_tcx")
+    object_index = LocalObjectIndex("local_data/manifests/index.db")
+    parser = FitbitETL(
+        LocalDataLoader(),
+        LocalMessenger(),
+        fetch_manifest=fetch_manifest,
+        object_index=object_index,
+    )
     # parser.get_details_from_path(file_path)
 
     # # data = local_data_loader.load(file_path)
@@ -138,12 +148,13 @@ def testing_main_transform_load(cloud_event) -> None:
     data = cloud_event.data
     file_bucket = data["bucket"]
     file_name = data["name"]
-    helper.transform_load(
+    transform_load(
         PROJECT_ID,
         file_bucket,
         file_name,
         TOPIC_NAME,
         DATASET_NAME,
+        BUCKET_NAME_STATE,
     )
 
 
@@ -168,12 +179,15 @@ def testing_debug():
     transformer2.process(file2)
 
 
-def testing_delete_row():
-    loader = GCPDataLoader(PROJECT_ID, BUCKET_NAME, DATASET_NAME)
-    name = "summary"
-    table_name = f"{PROJECT_ID}.{DATASET_NAME}.{name}"
+def testing_merge_load():
+    # Reprocessing the same file with merge loads should update the rows not duplicate them
+    loader = GCPDataLoader(PROJECT_ID, BUCKET_NAME, DATASET_NAME, merge_loads=True)
+    parser = FitbitETL(loader, LocalMessenger())
+    file_path = (
+        "get_activity_summary_by_date/20230117/get_activity_summary_by_date_8HQJ4D.json"
+    )
 
-    loader._delete_rows(table_name, "2023-02-06")
+    parser.process(file_path)
 
 
 if __name__ == "__main__":
@@ -182,4 +196,4 @@ if __name__ == "__main__":
     # testing_pubsub_messenger()
     # testing_debug()
     # testing4()
-    testing_delete_row()
+    testing_merge_load()
@@ -5,6 +5,9 @@ CONFIG = "config.json"
 PROJECT_ID = helper.get_config_parameter(CONFIG, "gcp_project")
 BUCKET_NAME_CREDENTIALS = helper.get_config_parameter(CONFIG, "gcp_bucket_credentials")
 BUCKET_NAME_FILE_STORE = helper.get_config_parameter(CONFIG, "gcp_bucket_file_store")
+# Manifests, the object index, stream uploads and profiles are kept out of the file
+# store so writing them does not trigger the transform load function
+BUCKET_NAME_STATE = helper.get_config_parameter(CONFIG, "gcp_bucket_state")
 DATASET_NAME = helper.get_config_parameter(CONFIG, "gcp_bq_dataset")
 TOPIC_NAME = helper.get_config_parameter(CONFIG, "pub_sub_topic_name")
 
@@ -14,12 +17,18 @@ def main_transform_load(cloud_event) -> None:
     data = cloud_event.data
     file_bucket = data["bucket"]
     file_name = data["name"]
-    helper.transform_load(
+    # Imported here so the extract function does not load the bigquery and pubsub clients
+    from helper.transformfunctions import (  # pylint: disable=C0415
+        transform_load,
+    )
+
+    transform_load(
         PROJECT_ID,
         file_bucket,
         file_name,
         TOPIC_NAME,
         DATASET_NAME,
+        BUCKET_NAME_STATE,
     )
 
 
@@ -29,14 +38,38 @@ def main_extract(cloud_event) -> None:
     helper.check_parameters(run_parameters)
 
     user_id = run_parameters["user_id"]
-    date = helper.get_date(run_parameters)
     endpoints = helper.get_endpoints(run_parameters)
+    bundle = run_parameters.get("bundle", False)
+    profile_run = run_parameters.get("profile", False)
 
-    helper.call_api(
+    # Imported here so the transform function does not load the token and api clients
+    from helper.extractfunctions import (  # pylint: disable=C0415
+        call_api,
+        call_api_incremental,
+    )
+
+    if helper.is_incremental(run_parameters):
+        call_api_incremental(
+            user_id,
+            endpoints,
+            PROJECT_ID,
+            BUCKET_NAME_CREDENTIALS,
+            BUCKET_NAME_FILE_STORE,
+            BUCKET_NAME_STATE,
+            bundle,
+            profile_run,
+        )
+        return
+
+    date = helper.get_date(run_parameters)
+    call_api(
         date,
         user_id,
         endpoints,
         PROJECT_ID,
         BUCKET_NAME_CREDENTIALS,
         BUCKET_NAME_FILE_STORE,
+        BUCKET_NAME_STATE,
+        bundle,
+        profile_run,
     )
@@ -0,0 +1,109 @@
+"""
+Load tests the extract path against the fake Fitbit api with realistic network behaviour.
+Every endpoint is requested for a range of dates through the real requester, token
+manager and response saver, with the latency, error rate and payload sizes set below.
+Run from Source/FitbitExtract with: python -m tests.benchmarks.bench_extract
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from fitbit import authorization as auth
+from fitbit.caller import EndpointParameters, FitBitCaller
+from fitbit.requesters import WebAPIRequester
+from fitbit.savers import LocalResponseSaver
+from tests.fake_fitbit_api import FakeFitbitAPI, FakeFitbitAPIParameters
+
+ENDPOINTS = [
+    EndpointParameters("get_heart_rate_by_date"),
+    EndpointParameters("get_body_weight_by_date"),
+    EndpointParameters("get_activity_summary_by_date"),
+    EndpointParameters("get_sleep_by_date"),
+    EndpointParameters("get_cardio_score_by_date"),
+    EndpointParameters("get_heart_rate_intraday_by_date"),
+    EndpointParameters("get_activity_tcx_by_id", "GET", "tcx", {"log_id": 1234}),
+]
+
+
+def run_extract(
+    parameters: FakeFitbitAPIParameters, day_count: int, stream_tcx: bool = True
+) -> dict:
+    """Requests every endpoint for a number of days from a fake api
+
+    Returns:
+        dict: requests made, seconds taken, requests per second and bytes saved
+    """
+    start_date = datetime.strptime("2023-01-18", "%Y-%m-%d").date()
+    with FakeFitbitAPI(parameters, user_id="BENCHUSER") as fake_api:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            token_manager = auth.LocalTokenManager(
+                auth.LocalTokenManagerParameters(
+                    token_directory=f"{temp_dir}/tokens",
+                    token_url=fake_api.token_url,
+                ),
+                auth.FitbitAppCredentials("client_id", "client_secret"),
+            )
+            token = auth.FitbitToken("refresh", "access", "scope", "BENCHUSER")
+            caller = FitBitCaller(
+                token,
+                LocalResponseSaver(f"{temp_dir}/responses"),
+                WebAPIRequester(),
+                token_manager,
+                stream_formats=["tcx"] if stream_tcx else None,
+                web_api_url=fake_api.url,
+            )
+            caller.register_multiple_endpoints(ENDPOINTS)
+            caller.refresh_access_token()
+
+            start = time.perf_counter()
+            for day in range(day_count):
+                caller.make_registered_requests_for_date(
+                    start_date + timedelta(days=day)
+                )
+            seconds = time.perf_counter() - start
+
+            saved_bytes = sum(
+                os.path.getsize(os.path.join(root, file))
+                for root, _, files in os.walk(f"{temp_dir}/responses")
+                for file in files
+            )
+        request_count = len(fake_api.requests) - 1
+
+    return {
+        "requests": request_count,
+        "seconds": seconds,
+        "requests_per_second": request_count / seconds,
+        "saved_bytes": saved_bytes,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=7, help="dates to request")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds")
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--tcx-trackpoints", type=int, default=36000)
+    parser.add_argument("--intraday-points", type=int, default=86400)
+    args = parser.parse_args()
+
+    parameters = FakeFitbitAPIParameters(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        sizes={
+            "get_activity_tcx_by_id": args.tcx_trackpoints,
+            "get_heart_rate_intraday_by_date": args.intraday_points,
+        },
+    )
+    result = run_extract(parameters, args.days)
+    print(
+        f"{result['requests']} requests in {result['seconds']:.2f}s "
+        f"({result['requests_per_second']:.1f}/s), "
+        f"{result['saved_bytes'] / 1024 / 1024:.1f} MiB saved"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Compares decoding large pubsub messages as json and as python literals.
+Run from Source/FitbitExtract with: python -m tests.benchmarks.bench_messages
+"""
+
+import ast
+import base64
+import json
+import timeit
+import tracemalloc
+
+from helper.functions import decode_event_messages, check_parameters
+
+REPEATS = 20
+
+
+def create_message(endpoint_count: int) -> dict:
+    """Create a pubsub message like the activity transformer's tcx fan out"""
+    endpoints = [
+        {
+            "name": "get_activity_tcx_by_id",
+            "method": "GET",
+            "response_format": "tcx",
+            "url_kwargs": {"log_id": 50000000000 + i},
+            "body": {},
+            "headers": {},
+        }
+        for i in range(endpoint_count)
+    ]
+    message = {"user_id": "ABC123", "date": "2023-01-18", "endpoints": endpoints}
+    return {"message": {"data": base64.b64encode(json.dumps(message).encode("utf-8"))}}
+
+
+def measure(function, *args) -> tuple[float, int]:
+    """Returns the mean seconds per call and the peak memory of a single call"""
+    seconds = timeit.timeit(lambda: function(*args), number=REPEATS) / REPEATS
+    tracemalloc.start()
+    function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def decode_literal(message_data: dict) -> dict:
+    """The previous decoding path"""
+    pubsub_message = base64.b64decode(message_data["message"]["data"])
+    return ast.literal_eval(pubsub_message.decode("UTF-8"))
+
+
+def decode_and_check(message_data: dict) -> dict:
+    """The current decoding path including the parameter validation"""
+    parameters = decode_event_messages(message_data)
+    check_parameters(parameters)
+    return parameters
+
+
+def main() -> None:
+    print(f"{'endpoints':>10} {'path':>8} {'ms':>10} {'peak KiB':>10}")
+    for endpoint_count in [10, 100, 1000]:
+        message_data = create_message(endpoint_count)
+        for name, function in [("literal", decode_literal), ("json", decode_and_check)]:
+            seconds, peak = measure(function, message_data)
+            print(
+                f"{endpoint_count:>10} {name:>8} {seconds * 1000:>10.3f} {peak / 1024:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Replays a recorded cassette through the FitBitCaller, response saver and FitbitETL so the
+whole pipeline can be timed offline on real payloads. Record a cassette with
+helper.localfunctions.call_api_local(..., cassette_path="local_data/cassette.ndjson.gz"),
+the user id is replaced with USER1 in the recording.
+Run from Source/FitbitExtract with:
+python -m tests.benchmarks.bench_replay local_data/cassette.ndjson.gz
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import urlparse
+
+from fitbit import authorization as auth
+from fitbit.caller import EndpointParameters, FitBitCaller
+from fitbit.instrumentation import LocalMetricsSink
+from fitbit.requesters import ReplayRequester
+from fitbit.savers import LocalResponseSaver
+from fitbit.transformers import FitbitETL
+from tests.benchmarks.bench_transformers import CountingDataLoader
+from tests.fake_fitbit_api import COMPILED_ROUTES
+
+FORMATS = {"get_activity_tcx_by_id": "tcx"}
+
+
+class NoOpTokenManager:
+    """A token manager for replays, the recorded responses do not need a valid token"""
+
+    def refresh_token(self, token: auth.FitbitToken) -> auth.FitbitToken:
+        return token
+
+    def load_credentials(self) -> None:
+        pass
+
+    def load_token(self) -> auth.FitbitToken:
+        pass
+
+    def save_token(self, token: auth.FitbitToken) -> None:
+        pass
+
+
+def cassette_endpoints(replay: ReplayRequester) -> tuple[str, str, dict]:
+    """Finds the api url, user and the endpoints requested for each date in a cassette
+
+    Returns:
+        tuple[str, str, dict]: web api url, user id and date to list of EndpointParameters
+    """
+    web_api_url, user_id = None, None
+    date_endpoints = defaultdict(list)
+    for method, url in replay.exchanges:
+        parsed = urlparse(url)
+        for name, pattern in COMPILED_ROUTES:
+            match = pattern.match(parsed.path)
+            if match is None or name == "get_devices":
+                continue
+            web_api_url = f"{parsed.scheme}://{parsed.netloc}"
+            user_id = match.group("user_id")
+            groups = match.groupdict()
+            url_kwargs = {"log_id": groups["log_id"]} if "log_id" in groups else {}
+            date = groups.get("date") or "log"
+            date_endpoints[date].append(
+                EndpointParameters(name, method, FORMATS.get(name, "json"), url_kwargs)
+            )
+            break
+    return web_api_url, user_id, date_endpoints
+
+
+def replay_pipeline(cassette_path: str, timing: float = 0.0) -> dict:
+    """Replays every date in a cassette then transforms the saved responses
+
+    Returns:
+        dict: seconds spent requesting and saving, transforming, rows loaded per table
+            and the metrics recorded for each stage
+    """
+    metrics = LocalMetricsSink()
+    replay = ReplayRequester(cassette_path, timing)
+    web_api_url, user_id, date_endpoints = cassette_endpoints(replay)
+    token = auth.FitbitToken("refresh", "access", "scope", user_id, True)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        caller = FitBitCaller(
+            token,
+            LocalResponseSaver(temp_dir),
+            replay,
+            NoOpTokenManager(),
+            stream_formats=["tcx"],
+            web_api_url=web_api_url,
+            metrics=metrics,
+        )
+        start = time.perf_counter()
+        for date, endpoints in date_endpoints.items():
+            # Endpoints requested by id are not dated, any date creates the same url
+            request_date = "2000-01-01" if date == "log" else date
+            caller.registered_endpoints = []
+            caller.register_multiple_endpoints(endpoints)
+            caller.make_registered_requests_for_date(
+                datetime.strptime(request_date, "%Y-%m-%d").date()
+            )
+        request_seconds = time.perf_counter() - start
+
+        loader = CountingDataLoader()
+        start = time.perf_counter()
+        for root, _, files in os.walk(temp_dir):
+            for file in files:
+                transformer = FitbitETL(loader, None, metrics=metrics)
+                transformer.get_details_from_path(os.path.join(root, file))
+                transformer.transform_load_data(transformer.extract_data())
+        transform_seconds = time.perf_counter() - start
+
+    return {
+        "request_seconds": request_seconds,
+        "transform_seconds": transform_seconds,
+        "rows": loader.rows,
+        "metrics": metrics.summary(),
+    }
+
+
+def print_metrics(summary: dict) -> None:
+    """Prints the time spent in each stage and the counters of a LocalMetricsSink"""
+    print(f"{'stage':<52} {'count':>6} {'total s':>9} {'max s':>9}")
+    for key, timing in sorted(summary["timings"].items()):
+        print(
+            f"{key:<52} {timing['count']:>6} {timing['total']:>9.3f}"
+            f" {timing['max']:>9.3f}"
+        )
+    for key, value in sorted(summary["counters"].items()):
+        print(f"{key:<52} {value:>10}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("cassette", help="cassette recorded by the RecordingRequester")
+    parser.add_argument(
+        "--timing", type=float, default=0.0, help="multiple of the recorded latency"
+    )
+    args = parser.parse_args()
+
+    result = replay_pipeline(args.cassette, args.timing)
+    print(f"request and save: {result['request_seconds']:.3f}s")
+    print(f"transform: {result['transform_seconds']:.3f}s")
+    print_metrics(result["metrics"])
+
+
+if __name__ == "__main__":
+    main()
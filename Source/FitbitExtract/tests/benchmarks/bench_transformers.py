@@ -0,0 +1,200 @@
+"""
+Measures the throughput and peak memory of each FitbitETL parser on generated payloads.
+Results are merged into a json file keyed by the git commit so runs can be compared.
+Run from Source/FitbitExtract with: python -m tests.benchmarks.bench_transformers
+Use --compare [commit] to print the change against an earlier recorded commit.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+
+from fitbit import constants
+from fitbit.loaders import LocalDataLoader, column_row_count
+from fitbit.transformers import FitbitETL
+from tests.benchmarks.generators import GENERATORS
+
+RESULTS_FILE = "tests/benchmarks/results.json"
+USER_ID = "BENCHUSER"
+INSTANCE_ID = 53177087392
+
+# Payload sizes run for each parser
+SIZES = {
+    "get_heart_rate_by_date": [1, 30, 365],
+    "get_body_weight_by_date": [1, 10, 100],
+    "get_cardio_score_by_date": [1, 30, 365],
+    "get_activity_summary_by_date": [10, 100, 1000],
+    "get_sleep_by_date": [100, 1000, 10000],
+    "get_activity_tcx_by_id": [1000, 10000, 36000],
+    "get_heart_rate_intraday_by_date": [1440, 86400],
+    "get_steps_intraday_by_date": [1440],
+    "get_spo2_intraday_by_date": [480],
+}
+
+
+class CountingDataLoader(LocalDataLoader):
+    """A local DataLoader that counts the rows loaded into each table without storing them"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.rows = {}
+
+    def load(self, data: list[dict], name: str) -> None:
+        self.rows[name] = self.rows.get(name, 0) + len(data)
+
+    def load_columns(self, columns: dict, name: str) -> None:
+        self.rows[name] = self.rows.get(name, 0) + column_row_count(columns)
+
+    def refresh_rollup(self, name: str, user_id: str, dates: list[str]) -> None:
+        pass
+
+
+def create_transformer(endpoint: str, loader: CountingDataLoader) -> FitbitETL:
+    """Creates a FitbitETL set up as if it had read the details from a file path"""
+    transformer = FitbitETL(loader, None)
+    transformer.user_id = USER_ID
+    transformer.endpoint = endpoint
+    transformer.date = datetime.strptime("2023-01-18", constants.DATE_FORMAT).date()
+    transformer.instance_id = INSTANCE_ID if endpoint.endswith("_by_id") else None
+    return transformer
+
+
+def run_parser(endpoint: str, payload: dict) -> dict:
+    """Runs the parser for an endpoint once and returns the rows loaded per table"""
+    loader = CountingDataLoader()
+    transformer = create_transformer(endpoint, loader)
+    transformer.available_endpoint_parsers[endpoint](payload)
+    return loader.rows
+
+
+def benchmark_parser(endpoint: str, size: int, repeats: int = 3) -> dict:
+    """Times the parser on a generated payload and measures its peak memory
+
+    Args:
+        endpoint (str): endpoint of the parser
+        size (int): size of the generated payload, eg the number of trackpoints
+        repeats (int, optional): runs to time, the fastest is recorded. Defaults to 3.
+
+    Returns:
+        dict: rows loaded, fastest seconds, rows per second and peak traced bytes
+    """
+    generator, size_argument = GENERATORS[endpoint]
+    payload = generator(**{size_argument: size})
+
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        rows = run_parser(endpoint, payload)
+        timings.append(time.perf_counter() - start)
+
+    # Memory is measured on a separate run as tracing slows the parser down
+    tracemalloc.start()
+    run_parser(endpoint, payload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    row_count = sum(rows.values())
+    seconds = min(timings)
+    return {
+        "rows": row_count,
+        "seconds": seconds,
+        "rows_per_second": row_count / seconds if seconds else None,
+        "peak_bytes": peak,
+    }
+
+
+def current_commit() -> str:
+    """Returns the short hash of HEAD, marked as dirty if there are uncommitted changes"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if status else commit
+
+
+def save_results(results: dict, commit: str, results_file: str = RESULTS_FILE) -> dict:
+    """Merges the results for a commit into the results file and returns its contents"""
+    all_results = {}
+    if os.path.exists(results_file):
+        with open(results_file, "r", encoding="utf-8") as file:
+            all_results = json.load(file)
+
+    all_results[commit] = {
+        "recorded": datetime.now().strftime(constants.DATETIME_FORMAT),
+        "python": platform.python_version(),
+        "results": results,
+    }
+    with open(results_file, "w", encoding="utf-8") as file:
+        json.dump(all_results, file, indent=4)
+    return all_results
+
+
+def print_results(results: dict, baseline: dict = None) -> None:
+    """Prints a table of the results with the change against a baseline if given"""
+    header = f"{'case':<52} {'rows':>8} {'rows/s':>12} {'peak KiB':>10}"
+    if baseline is not None:
+        header += f" {'speed':>8} {'memory':>8}"
+    print(header)
+    for case, result in results.items():
+        line = (
+            f"{case:<52} {result['rows']:>8} {result['rows_per_second']:>12.0f}"
+            f" {result['peak_bytes'] / 1024:>10.1f}"
+        )
+        if baseline is not None and case in baseline:
+            base = baseline[case]
+            line += (
+                f" {result['rows_per_second'] / base['rows_per_second']:>7.2f}x"
+                f" {result['peak_bytes'] / base['peak_bytes']:>7.2f}x"
+            )
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--results", default=RESULTS_FILE, help="results json file")
+    parser.add_argument("--repeats", type=int, default=3, help="timed runs per case")
+    parser.add_argument(
+        "--endpoint", action="append", help="only run these endpoints, repeatable"
+    )
+    parser.add_argument("--compare", help="commit in the results file to compare to")
+    args = parser.parse_args()
+
+    results = {}
+    for endpoint, sizes in SIZES.items():
+        if args.endpoint and endpoint not in args.endpoint:
+            continue
+        for size in sizes:
+            size_argument = GENERATORS[endpoint][1]
+            case = f"{endpoint}[{size_argument}={size}]"
+            results[case] = benchmark_parser(endpoint, size, args.repeats)
+
+    commit = current_commit()
+    all_results = save_results(results, commit, args.results)
+
+    baseline = None
+    if args.compare is not None:
+        if args.compare not in all_results:
+            raise KeyError(f"No results recorded for commit {args.compare}")
+        baseline = all_results[args.compare]["results"]
+    print(f"Results for {commit} saved to {args.results}")
+    print_results(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
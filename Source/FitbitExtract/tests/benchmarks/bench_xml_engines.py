@@ -0,0 +1,103 @@
+"""
+Compares the tcx parser with each xml engine on generated tcx files and checks the rows
+of every engine are identical to the rows of ElementTree.
+Run from Source/FitbitExtract with: python -m tests.benchmarks.bench_xml_engines
+"""
+
+import argparse
+import time
+import tracemalloc
+from typing import Iterator
+
+from fitbit import xmlparsing
+from tests.benchmarks.bench_transformers import CountingDataLoader, create_transformer
+from tests.benchmarks.generators import generate_tcx
+
+ENDPOINT = "get_activity_tcx_by_id"
+# Trackpoints in the generated files, 36000 is a 10 hour activity
+SIZES = [3600, 36000, 100000]
+PROCESSING_DATETIME = "2023-02-03 12:31:38"
+
+
+def available_engines() -> dict:
+    """Returns the xml engines that can be created, lxml is skipped if not installed"""
+    engines = {"elementtree": xmlparsing.ElementTreeEngine()}
+    if xmlparsing.lxml_etree is not None:
+        engines["lxml"] = xmlparsing.LxmlEngine()
+    return engines
+
+
+def iter_rows(engine: xmlparsing.XMLEngine, xml_data: str) -> Iterator[dict]:
+    """Yields the rows of the tcx file parsed with the engine"""
+    transformer = create_transformer(ENDPOINT, CountingDataLoader())
+    transformer.xml_engine = engine
+    # Fixed so the rows of runs in different seconds can be compared
+    transformer.processing_datetime = PROCESSING_DATETIME
+    return transformer._iter_activity_tcx_rows(xml_data)
+
+
+def benchmark_engine(
+    engine: xmlparsing.XMLEngine, xml_data: str, repeats: int = 3
+) -> dict:
+    """Times the tcx parser with the engine and measures its peak memory
+
+    Args:
+        engine (XMLEngine): engine to parse with
+        xml_data (str): tcx file
+        repeats (int, optional): runs to time, the fastest is recorded. Defaults to 3.
+
+    Returns:
+        dict: rows, fastest seconds, rows per second and peak traced bytes
+    """
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        row_count = sum(1 for _ in iter_rows(engine, xml_data))
+        timings.append(time.perf_counter() - start)
+
+    # Rows are only counted so the peak is the parser rather than the list of rows
+    tracemalloc.start()
+    for _ in iter_rows(engine, xml_data):
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    seconds = min(timings)
+    return {
+        "rows": row_count,
+        "seconds": seconds,
+        "rows_per_second": row_count / seconds if seconds else None,
+        "peak_bytes": peak,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeats", type=int, default=3, help="timed runs per case")
+    parser.add_argument(
+        "--size", type=int, action="append", help="trackpoints to run, repeatable"
+    )
+    args = parser.parse_args()
+
+    engines = available_engines()
+    print(
+        f"{'trackpoints':>11} {'engine':>12} {'rows/s':>12} {'peak KiB':>10} {'speed':>8}"
+    )
+    for size in args.size or SIZES:
+        xml_data = generate_tcx(trackpoint_count=size)["xml_data"]
+        expected_rows = list(iter_rows(engines["elementtree"], xml_data))
+        base = None
+        for name, engine in engines.items():
+            if list(iter_rows(engine, xml_data)) != expected_rows:
+                raise ValueError(f"{name} rows differ from elementtree for {size}")
+            result = benchmark_engine(engine, xml_data, args.repeats)
+            base = base or result
+            print(
+                f"{size:>11} {name:>12} {result['rows_per_second']:>12.0f}"
+                f" {result['peak_bytes'] / 1024:>10.1f}"
+                f" {result['rows_per_second'] / base['rows_per_second']:>7.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
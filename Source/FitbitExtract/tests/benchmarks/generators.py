@@ -0,0 +1,374 @@
+"""
+Generates realistic api responses of any size for each FitbitETL parser.
+The payloads have the same shape as the responses in tests/testing_data_files and
+are returned as extracted by the DataLoader, a dict for json and {"xml_data": str} for tcx.
+Every generator is seeded so the same arguments always produce the same payload.
+"""
+
+import random
+from datetime import datetime, timedelta
+
+DATE = "2023-01-18"
+HEART_RATE_ZONES = [
+    ("Out of Range", 30, 113),
+    ("Fat Burn", 113, 138),
+    ("Cardio", 138, 169),
+    ("Peak", 169, 220),
+]
+SLEEP_LEVELS = ["wake", "light", "deep", "rem"]
+ACTIVITY_NAMES = ["Walk", "Run", "Bike", "Swim", "Weights", "Yoga"]
+TCX_NAMESPACE = "http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2"
+
+
+def _heart_rate_zones(rng: random.Random) -> list[dict]:
+    return [
+        {
+            "caloriesOut": round(rng.uniform(0, 2500), 5),
+            "max": zone_max,
+            "min": zone_min,
+            "minutes": rng.randint(0, 1400),
+            "name": name,
+        }
+        for name, zone_min, zone_max in HEART_RATE_ZONES
+    ]
+
+
+def generate_heart_rate(day_count: int = 1, seed: int = 0) -> dict:
+    """Heart rate summary response with a row per day, as returned for a 7d or 30d period"""
+    rng = random.Random(seed)
+    start = datetime.strptime(DATE, "%Y-%m-%d")
+    return {
+        "activities-heart": [
+            {
+                "dateTime": (start + timedelta(days=day)).strftime("%Y-%m-%d"),
+                "value": {
+                    "customHeartRateZones": [],
+                    "heartRateZones": _heart_rate_zones(rng),
+                    "restingHeartRate": rng.randint(50, 80),
+                },
+            }
+            for day in range(day_count)
+        ]
+    }
+
+
+def generate_body_weight(log_count: int = 1, seed: int = 0) -> dict:
+    """Body weight response with several weight logs on the day"""
+    rng = random.Random(seed)
+    return {
+        "weight": [
+            {
+                "bmi": round(rng.uniform(18, 30), 2),
+                "date": DATE,
+                "logId": 1673999999000 + i,
+                "source": "API",
+                "time": "23:59:59",
+                "weight": round(rng.uniform(50, 100), 1),
+            }
+            for i in range(log_count)
+        ]
+    }
+
+
+def generate_cardio_score(day_count: int = 1, seed: int = 0) -> dict:
+    """Cardio score response with a row per day"""
+    rng = random.Random(seed)
+    start = datetime.strptime(DATE, "%Y-%m-%d")
+    rows = []
+    for day in range(day_count):
+        low = rng.randint(35, 55)
+        rows.append(
+            {
+                "dateTime": (start + timedelta(days=day)).strftime("%Y-%m-%d"),
+                "value": {"vo2Max": f"{low}-{low + 4}"},
+            }
+        )
+    return {"cardioScore": rows}
+
+
+def generate_activity_summary(activity_count: int = 10, seed: int = 0) -> dict:
+    """Activity summary response with many logged activities on the day"""
+    rng = random.Random(seed)
+    activities = []
+    for i in range(activity_count):
+        name = rng.choice(ACTIVITY_NAMES)
+        activities.append(
+            {
+                "activityId": 90000 + i,
+                "activityParentId": 90000 + i,
+                "activityParentName": name,
+                "calories": rng.randint(10, 900),
+                "description": f"{name} activity",
+                "distance": round(rng.uniform(0, 20), 5),
+                "duration": rng.randint(60, 7200) * 1000,
+                "hasActiveZoneMinutes": True,
+                "hasStartTime": True,
+                "isFavorite": False,
+                "lastModified": "2023-01-17T21:14:42.000Z",
+                "logId": 53000000000 + i,
+                "name": name,
+                "startDate": DATE,
+                "startTime": f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}",
+                "steps": rng.randint(0, 20000),
+            }
+        )
+
+    distances = [
+        {"activity": activity, "distance": round(rng.uniform(0, 10), 5)}
+        for activity in [
+            "total",
+            "tracker",
+            "loggedActivities",
+            "veryActive",
+            "moderatelyActive",
+            "lightlyActive",
+            "sedentaryActive",
+        ]
+    ]
+    return {
+        "activities": activities,
+        "goals": {
+            "activeMinutes": 30,
+            "caloriesOut": 2675,
+            "distance": 8.05,
+            "floors": 10,
+            "steps": 10000,
+        },
+        "summary": {
+            "activeScore": -1,
+            "activityCalories": rng.randint(500, 2000),
+            "caloriesBMR": rng.randint(1400, 2000),
+            "caloriesOut": rng.randint(2000, 3500),
+            "distances": distances,
+            "elevation": round(rng.uniform(0, 100), 2),
+            "fairlyActiveMinutes": rng.randint(0, 60),
+            "floors": rng.randint(0, 40),
+            "heartRateZones": _heart_rate_zones(rng),
+            "lightlyActiveMinutes": rng.randint(0, 300),
+            "marginalCalories": rng.randint(0, 1000),
+            "restingHeartRate": rng.randint(50, 80),
+            "sedentaryMinutes": rng.randint(300, 900),
+            "steps": rng.randint(0, 30000),
+            "veryActiveMinutes": rng.randint(0, 120),
+        },
+    }
+
+
+def _sleep_levels(
+    rng: random.Random, start: datetime, count: int, max_seconds: int
+) -> list[dict]:
+    levels = []
+    current = start
+    for _ in range(count):
+        seconds = rng.randint(1, max_seconds // 30) * 30
+        levels.append(
+            {
+                "dateTime": current.strftime("%Y-%m-%dT%H:%M:%S.000"),
+                "level": rng.choice(SLEEP_LEVELS),
+                "seconds": seconds,
+            }
+        )
+        current += timedelta(seconds=seconds)
+    return levels
+
+
+def generate_sleep(
+    level_count: int = 100, short_level_count: int = None, seed: int = 0
+) -> dict:
+    """Sleep response with one stages log holding many level changes
+
+    Args:
+        level_count (int, optional): number of level rows. Defaults to 100.
+        short_level_count (int, optional): number of short wake rows. Defaults to a third
+            of the level count.
+        seed (int, optional): random seed. Defaults to 0.
+    """
+    rng = random.Random(seed)
+    if short_level_count is None:
+        short_level_count = level_count // 3
+
+    start = datetime.strptime(f"{DATE}T22:45:00", "%Y-%m-%dT%H:%M:%S") - timedelta(
+        days=1
+    )
+    data = _sleep_levels(rng, start, level_count, 1800)
+    end = datetime.strptime(data[-1]["dateTime"], "%Y-%m-%dT%H:%M:%S.000") + timedelta(
+        seconds=data[-1]["seconds"]
+    )
+    short_data = _sleep_levels(rng, start, short_level_count, 180)
+    minutes = {level: rng.randint(0, 200) for level in SLEEP_LEVELS}
+
+    return {
+        "sleep": [
+            {
+                "dateOfSleep": DATE,
+                "duration": int((end - start).total_seconds() * 1000),
+                "efficiency": rng.randint(60, 100),
+                "endTime": end.strftime("%Y-%m-%dT%H:%M:%S.000"),
+                "infoCode": 0,
+                "isMainSleep": True,
+                "levels": {
+                    "data": data,
+                    "shortData": short_data,
+                    "summary": {
+                        level: {
+                            "count": rng.randint(1, 40),
+                            "minutes": minutes[level],
+                            "thirtyDayAvgMinutes": rng.randint(0, 200),
+                        }
+                        for level in SLEEP_LEVELS
+                    },
+                },
+                "logId": 39842924697,
+                "logType": "auto_detected",
+                "minutesAfterWakeup": rng.randint(0, 10),
+                "minutesAsleep": sum(minutes.values()) - minutes["wake"],
+                "minutesAwake": minutes["wake"],
+                "minutesToFallAsleep": 0,
+                "startTime": start.strftime("%Y-%m-%dT%H:%M:%S.000"),
+                "timeInBed": int((end - start).total_seconds() // 60),
+                "type": "stages",
+            }
+        ],
+        "summary": {
+            "stages": {
+                level: minutes[level] for level in ["deep", "light", "rem", "wake"]
+            },
+            "totalMinutesAsleep": sum(minutes.values()) - minutes["wake"],
+            "totalSleepRecords": 1,
+            "totalTimeInBed": int((end - start).total_seconds() // 60),
+        },
+    }
+
+
+def generate_tcx(trackpoint_count: int = 3600, lap_count: int = None, seed=0) -> dict:
+    """Activity tcx with a trackpoint every second split evenly into laps
+
+    Args:
+        trackpoint_count (int, optional): total number of trackpoints. Defaults to 3600,
+            one hour of data.
+        lap_count (int, optional): number of laps. Defaults to a lap every 600 trackpoints.
+        seed (int, optional): random seed. Defaults to 0.
+    """
+    rng = random.Random(seed)
+    if lap_count is None:
+        lap_count = max(1, trackpoint_count // 600)
+
+    start = datetime.strptime(f"{DATE}T07:06:17", "%Y-%m-%dT%H:%M:%S")
+    latitude, longitude, altitude, distance = -33.89657, 151.19816, 43.58, 0.0
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>',
+        f'<TrainingCenterDatabase xmlns="{TCX_NAMESPACE}">',
+        "<Activities>",
+        '<Activity Sport="Running">',
+        f"<Id>{start.strftime('%Y-%m-%dT%H:%M:%S')}.000+11:00</Id>",
+    ]
+
+    point = 0
+    for lap in range(lap_count):
+        lap_points = trackpoint_count // lap_count + (
+            1 if lap < trackpoint_count % lap_count else 0
+        )
+        lap_start = start + timedelta(seconds=point)
+        lines += [
+            f'<Lap StartTime="{lap_start.strftime("%Y-%m-%dT%H:%M:%S")}.000+11:00">',
+            f"<TotalTimeSeconds>{float(lap_points)}</TotalTimeSeconds>",
+            f"<DistanceMeters>{round(lap_points * 2.8, 1)}</DistanceMeters>",
+            f"<Calories>{lap_points // 6}</Calories>",
+            "<Intensity>Active</Intensity>",
+            "<TriggerMethod>Manual</TriggerMethod>",
+            "<Track>",
+        ]
+        for _ in range(lap_points):
+            latitude += rng.uniform(-0.00002, 0.00003)
+            longitude += rng.uniform(-0.00002, 0.00003)
+            altitude += rng.uniform(-0.5, 0.5)
+            distance += rng.uniform(2.0, 3.5)
+            time = start + timedelta(seconds=point)
+            lines += [
+                "<Trackpoint>",
+                f"<Time>{time.strftime('%Y-%m-%dT%H:%M:%S')}.000+11:00</Time>",
+                "<Position>",
+                f"<LatitudeDegrees>{latitude}</LatitudeDegrees>",
+                f"<LongitudeDegrees>{longitude}</LongitudeDegrees>",
+                "</Position>",
+                f"<AltitudeMeters>{altitude}</AltitudeMeters>",
+                f"<DistanceMeters>{distance}</DistanceMeters>",
+                f"<HeartRateBpm><Value>{rng.randint(90, 180)}</Value></HeartRateBpm>",
+                "</Trackpoint>",
+            ]
+            point += 1
+        lines += ["</Track>", "</Lap>"]
+
+    lines += ["</Activity>", "</Activities>", "</TrainingCenterDatabase>"]
+    return {"xml_data": "\n".join(lines)}
+
+
+def _intraday_dataset(
+    rng: random.Random, point_count: int, interval_seconds: int, low: int, high: int
+) -> list[dict]:
+    start = datetime.strptime(DATE, "%Y-%m-%d")
+    return [
+        {
+            "time": (start + timedelta(seconds=i * interval_seconds)).strftime(
+                "%H:%M:%S"
+            ),
+            "value": rng.randint(low, high),
+        }
+        for i in range(point_count)
+    ]
+
+
+def generate_heart_rate_intraday(point_count: int = 86400, seed: int = 0) -> dict:
+    """Intraday heart rate response at 1 second detail, 86400 points is a full day"""
+    rng = random.Random(seed)
+    return {
+        "activities-heart": [{"dateTime": DATE, "value": {"heartRateZones": []}}],
+        "activities-heart-intraday": {
+            "dataset": _intraday_dataset(rng, point_count, 1, 45, 185),
+            "datasetInterval": 1,
+            "datasetType": "second",
+        },
+    }
+
+
+def generate_steps_intraday(point_count: int = 1440, seed: int = 0) -> dict:
+    """Intraday steps response at 1 minute detail, 1440 points is a full day"""
+    rng = random.Random(seed)
+    return {
+        "activities-steps": [{"dateTime": DATE, "value": "0"}],
+        "activities-steps-intraday": {
+            "dataset": _intraday_dataset(rng, point_count, 60, 0, 180),
+            "datasetInterval": 1,
+            "datasetType": "minute",
+        },
+    }
+
+
+def generate_spo2_intraday(point_count: int = 480, seed: int = 0) -> dict:
+    """Intraday SpO2 response with a reading per minute of sleep"""
+    rng = random.Random(seed)
+    start = datetime.strptime(f"{DATE}T00:00:00", "%Y-%m-%dT%H:%M:%S")
+    return {
+        "dateTime": DATE,
+        "minutes": [
+            {
+                "value": round(rng.uniform(90, 100), 1),
+                "minute": (start + timedelta(minutes=i)).strftime("%Y-%m-%dT%H:%M:%S"),
+            }
+            for i in range(point_count)
+        ],
+    }
+
+
+# Generator for each parser and the keyword argument that sets the payload size
+GENERATORS = {
+    "get_heart_rate_by_date": (generate_heart_rate, "day_count"),
+    "get_body_weight_by_date": (generate_body_weight, "log_count"),
+    "get_cardio_score_by_date": (generate_cardio_score, "day_count"),
+    "get_activity_summary_by_date": (generate_activity_summary, "activity_count"),
+    "get_sleep_by_date": (generate_sleep, "level_count"),
+    "get_activity_tcx_by_id": (generate_tcx, "trackpoint_count"),
+    "get_heart_rate_intraday_by_date": (generate_heart_rate_intraday, "point_count"),
+    "get_steps_intraday_by_date": (generate_steps_intraday, "point_count"),
+    "get_spo2_intraday_by_date": (generate_spo2_intraday, "point_count"),
+}
@@ -0,0 +1,367 @@
+"""
+A local stand in for the Fitbit web api and token endpoint used for end to end and load
+testing of the extract path. It serves every url shape produced by the FitBitCaller
+create_url methods with generated payloads and can add latency, inject errors and enforce
+a rate limit with the Fitbit-Rate-Limit headers.
+
+Point the extract at it by passing FakeFitbitAPI.url as the caller web_api_url and
+FakeFitbitAPI.token_url as the token manager token_url, or by setting the
+FITBIT_WEB_API_URL and FITBIT_TOKEN_URL environment variables before fitbit is imported.
+"""
+
+import gzip
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from tests.benchmarks import generators
+
+USER_PATTERN = r"^/(?:1|1\.2)/user/(?P<user_id>[^/]+)"
+DATE_PATTERN = r"(?P<date>\d{4}-\d{2}-\d{2}|today)"
+
+# Path pattern of each endpoint in the order they are matched
+ROUTES = [
+    ("get_devices", rf"{USER_PATTERN}/devices\.json$"),
+    (
+        "get_heart_rate_intraday_by_date",
+        rf"{USER_PATTERN}/activities/heart/date/{DATE_PATTERN}/1d/(?P<detail>1sec|1min|5min|15min)\.json$",
+    ),
+    (
+        "get_steps_intraday_by_date",
+        rf"{USER_PATTERN}/activities/steps/date/{DATE_PATTERN}/1d/(?P<detail>1min|5min|15min)\.json$",
+    ),
+    (
+        "get_heart_rate_by_date",
+        rf"{USER_PATTERN}/activities/heart/date/{DATE_PATTERN}/(?P<period>1d|7d|30d|1w|1m)\.json$",
+    ),
+    (
+        "get_body_weight_by_date",
+        rf"{USER_PATTERN}/body/log/weight/date/{DATE_PATTERN}\.json$",
+    ),
+    (
+        "get_activity_summary_by_date",
+        rf"{USER_PATTERN}/activities/date/{DATE_PATTERN}\.json$",
+    ),
+    ("get_activity_tcx_by_id", rf"{USER_PATTERN}/activities/(?P<log_id>\d+)\.tcx$"),
+    (
+        "get_activity_details_by_id",
+        rf"{USER_PATTERN}/activities/(?P<log_id>\d+)\.json$",
+    ),
+    (
+        "get_heart_rate_variablity_by_date",
+        rf"{USER_PATTERN}/hrv/date/{DATE_PATTERN}/all\.json$",
+    ),
+    (
+        "get_cardio_score_by_date",
+        rf"{USER_PATTERN}/cardioscore/date/{DATE_PATTERN}\.json$",
+    ),
+    ("get_sleep_by_date", rf"{USER_PATTERN}/sleep/date/{DATE_PATTERN}\.json$"),
+    (
+        "get_spo2_intraday_by_date",
+        rf"{USER_PATTERN}/spo2/date/{DATE_PATTERN}/all\.json$",
+    ),
+]
+COMPILED_ROUTES = [(name, re.compile(pattern)) for name, pattern in ROUTES]
+
+
+@dataclass
+class FakeFitbitAPIParameters:
+    """Behaviour of the fake api
+
+    Attributes:
+        latency (float): seconds to wait before each response
+        error_rate (float): fraction of requests answered with error_status
+        error_status (int): status code of injected errors
+        fail_paths (dict): path regex to a list of status codes returned in turn by the
+            first matching requests, eg {"sleep": [429, 500]} fails the first two sleep calls
+        rate_limit (int): requests allowed per rate limit window, None for no limit
+        rate_limit_window (int): seconds until the rate limit resets
+        sizes (dict): endpoint name to the size passed to its payload generator
+        compress (bool): gzip responses when the client accepts it
+        seed (int): random seed for error injection and payloads
+    """
+
+    latency: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = HTTPStatus.INTERNAL_SERVER_ERROR
+    fail_paths: dict = field(default_factory=dict)
+    rate_limit: int = None
+    rate_limit_window: int = 3600
+    sizes: dict = field(default_factory=dict)
+    compress: bool = True
+    seed: int = 0
+
+
+def create_payload(endpoint: str, match: re.Match, sizes: dict, seed: int) -> tuple:
+    """Creates the response body for an endpoint
+
+    Returns:
+        tuple[str, str]: response body and its content type
+    """
+    size = sizes.get(endpoint)
+    if endpoint in generators.GENERATORS:
+        generator, size_argument = generators.GENERATORS[endpoint]
+        kwargs = {"seed": seed}
+        if size is not None:
+            kwargs[size_argument] = size
+        payload = generator(**kwargs)
+        if endpoint == "get_activity_tcx_by_id":
+            return payload["xml_data"], "application/vnd.garmin.tcx+xml"
+        return json.dumps(payload), "application/json"
+
+    if endpoint == "get_devices":
+        devices = [
+            {
+                "battery": "High",
+                "deviceVersion": "Charge 5",
+                "id": "1234567890",
+                "lastSyncTime": "2023-01-18T07:42:57.000",
+                "type": "TRACKER",
+            }
+        ]
+        return json.dumps(devices), "application/json"
+
+    if endpoint == "get_activity_details_by_id":
+        activity = generators.generate_activity_summary(1, seed)["activities"][0]
+        activity["logId"] = int(match.group("log_id"))
+        return json.dumps({"activityLog": activity}), "application/json"
+
+    # get_heart_rate_variablity_by_date
+    date = match.group("date")
+    return (
+        json.dumps({"hrv": [{"dateTime": date, "value": {"dailyRmssd": 34.9}}]}),
+        "application/json",
+    )
+
+
+class FakeFitbitAPIHandler(BaseHTTPRequestHandler):
+    """Request handler for the FakeFitbitAPI, the server holds the shared state"""
+
+    server: "FakeFitbitAPIServer"
+
+    def log_message(self, format, *args) -> None:  # pylint: disable=W0622
+        """Requests are recorded on the server instead of logged to stderr"""
+
+    def _send(
+        self, status: int, body: str = "", content_type: str = "application/json"
+    ):
+        data = body.encode("utf-8")
+        headers = self.server.rate_limit_headers()
+        if self.server.parameters.compress and "gzip" in self.headers.get(
+            "Accept-Encoding", ""
+        ):
+            data = gzip.compress(data)
+            headers["Content-Encoding"] = "gzip"
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status: int, error_type: str, message: str) -> None:
+        body = {
+            "errors": [{"errorType": error_type, "message": message}],
+            "success": False,
+        }
+        self._send(status, json.dumps(body))
+
+    def _check_common(self) -> bool:
+        """Applies the latency, rate limit and injected errors to a request
+
+        Returns:
+            bool: True if an error response was sent
+        """
+        parameters = self.server.parameters
+        if parameters.latency:
+            time.sleep(parameters.latency)
+
+        if not self.server.consume_rate_limit():
+            self._send_error(
+                HTTPStatus.TOO_MANY_REQUESTS, "system", "Too Many Requests"
+            )
+            return True
+
+        status = self.server.next_failure(self.path)
+        if status is not None:
+            self._send_error(status, "system", "Injected error")
+            return True
+        return False
+
+    def do_POST(self) -> None:  # pylint: disable=C0103
+        self.server.record(self.command, self.path)
+        if self._check_common():
+            return
+
+        if urlparse(self.path).path != "/oauth2/token":
+            self._send_error(HTTPStatus.NOT_FOUND, "not_found", "Unknown path")
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        token = {
+            "access_token": f"fake_access_token_{self.server.request_count}",
+            "expires_in": 28800,
+            "refresh_token": f"fake_refresh_token_{self.server.request_count}",
+            "scope": "activity heartrate sleep weight",
+            "token_type": "Bearer",
+            "user_id": self.server.user_id,
+        }
+        self._send(HTTPStatus.OK, json.dumps(token))
+
+    def do_GET(self) -> None:  # pylint: disable=C0103
+        self.server.record(self.command, self.path)
+        if self._check_common():
+            return
+
+        if not self.headers.get("authorization", "").startswith("Bearer "):
+            self._send_error(
+                HTTPStatus.UNAUTHORIZED, "invalid_token", "Access token is invalid"
+            )
+            return
+
+        path = urlparse(self.path).path
+        for endpoint, pattern in COMPILED_ROUTES:
+            match = pattern.match(path)
+            if match:
+                body, content_type = create_payload(
+                    endpoint,
+                    match,
+                    self.server.parameters.sizes,
+                    self.server.parameters.seed,
+                )
+                self._send(HTTPStatus.OK, body, content_type)
+                return
+
+        self._send_error(HTTPStatus.NOT_FOUND, "not_found", "Unknown path")
+
+
+class FakeFitbitAPIServer(ThreadingHTTPServer):
+    """Threaded http server holding the state shared by the request handlers"""
+
+    daemon_threads = True
+
+    def __init__(self, parameters: FakeFitbitAPIParameters, user_id: str) -> None:
+        super().__init__(("127.0.0.1", 0), FakeFitbitAPIHandler)
+        self.parameters = parameters
+        self.user_id = user_id
+        self.requests = []
+        self.request_count = 0
+        self.lock = threading.Lock()
+        self.random = random.Random(parameters.seed)
+        self.rate_limit_used = 0
+        self.rate_limit_reset = time.monotonic() + parameters.rate_limit_window
+        self.fail_paths = {
+            re.compile(pattern): list(statuses)
+            for pattern, statuses in parameters.fail_paths.items()
+        }
+
+    def record(self, method: str, path: str) -> None:
+        with self.lock:
+            self.requests.append((method, path))
+            self.request_count += 1
+
+    def consume_rate_limit(self) -> bool:
+        """Counts a request against the rate limit, returns False if it is exceeded"""
+        with self.lock:
+            if time.monotonic() >= self.rate_limit_reset:
+                self.rate_limit_used = 0
+                self.rate_limit_reset = (
+                    time.monotonic() + self.parameters.rate_limit_window
+                )
+            if self.parameters.rate_limit is None:
+                return True
+            if self.rate_limit_used >= self.parameters.rate_limit:
+                return False
+            self.rate_limit_used += 1
+            return True
+
+    def rate_limit_headers(self) -> dict:
+        with self.lock:
+            limit = self.parameters.rate_limit or 150
+            reset = max(0, int(self.rate_limit_reset - time.monotonic()))
+            headers = {
+                "Fitbit-Rate-Limit-Limit": str(limit),
+                "Fitbit-Rate-Limit-Remaining": str(
+                    max(0, limit - self.rate_limit_used)
+                ),
+                "Fitbit-Rate-Limit-Reset": str(reset),
+            }
+            if self.parameters.rate_limit is not None and (
+                self.rate_limit_used >= self.parameters.rate_limit
+            ):
+                headers["Retry-After"] = str(reset)
+            return headers
+
+    def next_failure(self, path: str) -> int | None:
+        """Returns the status of an injected error for the request or None"""
+        with self.lock:
+            for pattern, statuses in self.fail_paths.items():
+                if statuses and pattern.search(path):
+                    return statuses.pop(0)
+            if self.parameters.error_rate and (
+                self.random.random() < self.parameters.error_rate
+            ):
+                return self.parameters.error_status
+        return None
+
+
+class FakeFitbitAPI:
+    """
+    Runs a FakeFitbitAPIServer on a free local port in a background thread,
+    use as a context manager or call start and stop
+    """
+
+    def __init__(
+        self, parameters: FakeFitbitAPIParameters = None, user_id: str = "TESTUSER"
+    ) -> None:
+        self.parameters = parameters or FakeFitbitAPIParameters()
+        self.user_id = user_id
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        """Base url to use as the web api url"""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def token_url(self) -> str:
+        """Url of the token endpoint"""
+        return f"{self.url}/oauth2/token"
+
+    @property
+    def requests(self) -> list[tuple[str, str]]:
+        """Method and path of every request received"""
+        return list(self.server.requests)
+
+    def start(self) -> "FakeFitbitAPI":
+        self.server = FakeFitbitAPIServer(self.parameters, self.user_id)
+        # A short poll interval so stopping the server does not slow the tests down
+        self.thread = threading.Thread(
+            target=self.server.serve_forever,
+            kwargs={"poll_interval": 0.05},
+            daemon=True,
+        )
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def __enter__(self) -> "FakeFitbitAPI":
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
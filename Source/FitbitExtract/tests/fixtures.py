@@ -7,6 +7,8 @@ import pytest
 
 from fitbit import authorization as auth
 from fitbit import caller, savers, requesters, loaders, messengers, transformers
+from fitbit import manifests, serialization
+from tests.fake_fitbit_api import FakeFitbitAPI
 
 
 ############################################
@@ -34,6 +36,15 @@ class TestingFitbitRequester:
 
         return self.response, self.http_status
 
+    def make_stream_request(
+        self, method: str, url: str, headers: dict, body: dict
+    ) -> tuple[list[bytes], HTTPStatus]:
+        """simulates make stream request method, returns the response in two chunks"""
+        response, http_status = self.make_request(method, url, headers, body)
+        encoded = response.encode("utf-8")
+        middle = len(encoded) // 2
+        return [encoded[:middle], encoded[middle:]], http_status
+
 
 class TestingTokenManager:
     """
@@ -122,7 +133,7 @@ def testing_token_manager(api_credentials) -> auth.TokenManager:
 
 
 @pytest.fixture()
-def local_response_saver(tmp_path) -> caller.FitbitResponseSaver:
+def local_response_saver(tmp_path) -> savers.FitbitResponseSaver:
     """
     A testing local repsonse saver using the tmp_path
     """
@@ -147,6 +158,33 @@ def fitbitcaller(
     )
 
 
+@pytest.fixture()
+def fake_fitbit_api() -> FakeFitbitAPI:
+    """A fake Fitbit api running on a local port, parameters can be changed during a test"""
+    with FakeFitbitAPI(user_id="test_user") as fake_api:
+        yield fake_api
+
+
+@pytest.fixture()
+def fake_api_caller(
+    tmp_path, fake_fitbit_api, api_token, api_credentials, local_response_saver
+) -> caller.FitBitCaller:
+    """A FitBitCaller using the real requester and token manager against the fake api"""
+    manager_parameters = auth.LocalTokenManagerParameters(
+        token_directory=f"{tmp_path}/tokens",
+        token_url=fake_fitbit_api.token_url,
+    )
+    token_manager = auth.LocalTokenManager(manager_parameters, api_credentials)
+
+    return caller.FitBitCaller(
+        api_token,
+        local_response_saver,
+        requesters.WebAPIRequester(),
+        token_manager,
+        web_api_url=fake_fitbit_api.url,
+    )
+
+
 @pytest.fixture()
 def requester() -> requesters.WebAPIRequester:
     """Requester fixture for testing"""
@@ -161,8 +199,21 @@ def loader() -> loaders.LocalDataLoader:
 
 @pytest.fixture()
 def messenger() -> messengers.LocalMessenger:
-    """Local Messenger fixture for Testing"""
-    return messengers.LocalMessenger()
+    """Local Messenger fixture for Testing, the json module is used so the message
+    bytes do not depend on the serializers installed"""
+    return messengers.LocalMessenger(serialization.StdlibSerializer())
+
+
+@pytest.fixture()
+def local_fetch_manifest(tmp_path) -> manifests.LocalFetchManifest:
+    """Local fetch manifest fixture for Testing"""
+    return manifests.LocalFetchManifest(f"{tmp_path}/manifests", "activity_tcx")
+
+
+@pytest.fixture()
+def local_object_index(tmp_path) -> manifests.LocalObjectIndex:
+    """Local object index fixture for Testing"""
+    return manifests.LocalObjectIndex(f"{tmp_path}/manifests/index.db")
 
 
 @pytest.fixture()
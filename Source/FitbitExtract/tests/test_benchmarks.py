@@ -0,0 +1,108 @@
+import json
+from datetime import datetime
+import pytest
+from tests.fixtures import fake_fitbit_api, fake_api_caller, local_response_saver
+from tests.fixtures import api_token, api_credentials
+from tests.benchmarks import generators, bench_transformers, bench_replay
+from tests.benchmarks import bench_xml_engines
+from fitbit.caller import EndpointParameters
+from fitbit.requesters import RecordingRequester
+
+
+@pytest.mark.parametrize(
+    "endpoint, size, expected_rows",
+    [
+        ("get_heart_rate_by_date", 3, {"heart_rate": 3}),
+        ("get_body_weight_by_date", 3, {"weight": 1}),
+        ("get_cardio_score_by_date", 3, {"cardioscore": 3}),
+        ("get_activity_summary_by_date", 3, {"activity": 3, "goals": 1, "summary": 1}),
+        ("get_sleep_by_date", 9, {"sleep": 1, "sleep_detail": 12}),
+        ("get_activity_tcx_by_id", 25, {"activity_detail": 25}),
+        ("get_heart_rate_intraday_by_date", 60, {"heart_rate_intraday": 60}),
+        ("get_steps_intraday_by_date", 60, {"steps_intraday": 60}),
+        ("get_spo2_intraday_by_date", 60, {"spo2_intraday": 60}),
+    ],
+)
+def test_generators_parse(endpoint, size, expected_rows) -> None:
+    """Test every generated payload can be parsed and loads the expected number of rows"""
+    generator, size_argument = generators.GENERATORS[endpoint]
+    payload = generator(**{size_argument: size})
+
+    assert bench_transformers.run_parser(endpoint, payload) == expected_rows
+
+
+def test_generators_deterministic() -> None:
+    """Test the generators return the same payload for the same seed"""
+    assert generators.generate_sleep(50, seed=1) == generators.generate_sleep(
+        50, seed=1
+    )
+    assert generators.generate_tcx(50, seed=1) != generators.generate_tcx(50, seed=2)
+
+
+def test_generate_tcx_laps() -> None:
+    """Test the tcx trackpoints are split across the laps"""
+    payload = generators.generate_tcx(trackpoint_count=10, lap_count=3)
+
+    assert payload["xml_data"].count("<Lap ") == 3
+    assert payload["xml_data"].count("<Trackpoint>") == 10
+
+
+def test_benchmark_parser() -> None:
+    """Test benchmark_parser records the rows, throughput and peak memory"""
+    result = bench_transformers.benchmark_parser("get_sleep_by_date", 30, repeats=1)
+
+    assert result["rows"] == 41
+    assert result["rows_per_second"] > 0
+    assert result["peak_bytes"] > 0
+
+
+def test_benchmark_xml_engine() -> None:
+    """Test benchmark_engine records the tcx rows with each available engine"""
+    xml_data = generators.generate_tcx(trackpoint_count=30, lap_count=2)["xml_data"]
+
+    for engine in bench_xml_engines.available_engines().values():
+        result = bench_xml_engines.benchmark_engine(engine, xml_data, repeats=1)
+
+        assert result["rows"] == 30
+        assert result["peak_bytes"] > 0
+
+
+def test_save_results(tmp_path) -> None:
+    """Test save_results keeps the results of earlier commits"""
+    results_file = str(tmp_path / "results.json")
+    bench_transformers.save_results({"case": {"rows": 1}}, "abc1234", results_file)
+    bench_transformers.save_results({"case": {"rows": 2}}, "def5678", results_file)
+
+    with open(results_file, "r", encoding="utf-8") as file:
+        all_results = json.load(file)
+
+    assert list(all_results) == ["abc1234", "def5678"]
+    assert all_results["abc1234"]["results"] == {"case": {"rows": 1}}
+
+
+def test_replay_pipeline(tmp_path, fake_api_caller, fake_fitbit_api) -> None:
+    """Test a recorded cassette is replayed through the caller, saver and transformer"""
+    fake_fitbit_api.parameters.sizes = {"get_activity_tcx_by_id": 20}
+    cassette = str(tmp_path / "cassette.ndjson.gz")
+    fake_api_caller.refresh_access_token()
+    fake_api_caller.requester = RecordingRequester(
+        fake_api_caller.requester, cassette, {"test_user": "USER1"}
+    )
+    fake_api_caller.register_multiple_endpoints(
+        [
+            EndpointParameters("get_heart_rate_by_date"),
+            EndpointParameters("get_activity_tcx_by_id", "GET", "tcx", {"log_id": 1}),
+        ]
+    )
+    fake_api_caller.make_registered_requests_for_date(
+        datetime.strptime("2023-01-18", "%Y-%m-%d").date()
+    )
+    fake_api_caller.requester.close()
+
+    result = bench_replay.replay_pipeline(cassette)
+
+    assert result["rows"] == {"heart_rate": 1, "activity_detail": 20}
+    assert result["metrics"]["counters"]["rows[table=activity_detail]"] == 20
+    assert result["metrics"]["timings"]["request[endpoint=get_heart_rate_by_date]"][
+        "count"
+    ] == 1
@@ -0,0 +1,74 @@
+import io
+import pytest
+
+from fitbit import compression
+
+
+@pytest.mark.parametrize(
+    "path,expected",
+    [
+        (
+            "20230118/get_sleep_by_date_TEST.json.gz",
+            ("20230118/get_sleep_by_date_TEST.json", "gzip"),
+        ),
+        (
+            "20230118/get_sleep_by_date_TEST.json.zst",
+            ("20230118/get_sleep_by_date_TEST.json", "zstd"),
+        ),
+        (
+            "20230118/get_sleep_by_date_TEST.json",
+            ("20230118/get_sleep_by_date_TEST.json", None),
+        ),
+    ],
+)
+def test_split_compression(path, expected) -> None:
+    """Test the compression extension is removed from a path"""
+    assert compression.split_compression(path) == expected
+
+
+def test_compression_suffix() -> None:
+    """Test the extension added for each compression"""
+    assert compression.compression_suffix(None) == ""
+    assert compression.compression_suffix("gzip") == ".gz"
+    assert compression.compression_suffix("zstd") == ".zst"
+
+
+def test_storage_headers() -> None:
+    """Test only gzip objects are stored with a content encoding"""
+    assert compression.storage_headers(None) == (None, None)
+    assert compression.storage_headers("gzip") == ("gzip", "application/octet-stream")
+    assert compression.storage_headers("zstd") == (None, "application/zstd")
+
+
+def test_compress_gzip_round_trip() -> None:
+    """Test gzip compressed data is read back as the same text"""
+    data = '{"field1": "value1", "field2": "é"}' * 100
+    compressed = compression.compress(data, "gzip")
+
+    assert len(compressed) < len(data)
+    assert compressed == compression.compress(data, "gzip")
+    with compression.open_text(io.BytesIO(compressed), "gzip") as file:
+        assert file.read() == data
+
+
+def test_compress_none() -> None:
+    """Test no compression returns the encoded text"""
+    data = "<xml></xml>"
+    assert compression.compress(data, None) == data.encode("utf-8")
+    with compression.open_text(io.BytesIO(data.encode("utf-8")), None) as file:
+        assert file.read() == data
+
+
+def test_compress_zstd_round_trip() -> None:
+    """Test zstd compressed data is read back as the same text"""
+    pytest.importorskip("zstandard")
+    data = '{"field1": "value1"}' * 100
+    compressed = compression.compress(data, "zstd")
+    with compression.open_text(io.BytesIO(compressed), "zstd") as file:
+        assert file.read() == data
+
+
+def test_check_compression_bad() -> None:
+    """Test an unsupported compression raises an error"""
+    with pytest.raises(ValueError, match="Compression bz2 is not supported"):
+        compression.check_compression("bz2")
@@ -0,0 +1,178 @@
+import os
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime
+from http import HTTPStatus
+import pytest
+import requests
+from tests.fixtures import fake_fitbit_api, fake_api_caller, local_response_saver
+from tests.fixtures import api_token, api_credentials
+from fitbit.caller import EndpointParameters
+
+DATE = datetime.strptime("2023-01-18", "%Y-%m-%d").date()
+SOURCE_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def create_endpoint(name: str) -> EndpointParameters:
+    if name.endswith("_by_id"):
+        response_format = "tcx" if "tcx" in name else "json"
+        return EndpointParameters(name, "GET", response_format, {"log_id": 1234})
+    return EndpointParameters(name)
+
+
+def saved_files(tmp_path) -> list[str]:
+    return sorted(
+        os.path.relpath(os.path.join(root, file), tmp_path)
+        for root, _, files in os.walk(tmp_path)
+        for file in files
+        if not root.startswith(str(tmp_path / "tokens"))
+    )
+
+
+def test_fake_api_serves_every_endpoint(fake_api_caller) -> None:
+    """Test the fake api returns data for every url the caller can create"""
+    fake_api_caller.refresh_access_token()
+    headers = {"authorization": fake_api_caller.user_token.return_authorization()}
+
+    for name, url_func in fake_api_caller.available_endpoints.items():
+        url, _ = url_func(DATE, **create_endpoint(name).url_kwargs)
+        response = requests.get(url, headers=headers, timeout=10)
+
+        assert response.status_code == HTTPStatus.OK, name
+        assert response.text
+
+
+def test_fake_api_unknown_path_and_token(fake_fitbit_api) -> None:
+    """Test the fake api rejects unknown paths and requests without a token"""
+    response = requests.get(
+        f"{fake_fitbit_api.url}/1/user/test_user/unknown.json",
+        headers={"authorization": "Bearer token"},
+        timeout=10,
+    )
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+    response = requests.get(
+        f"{fake_fitbit_api.url}/1/user/test_user/devices.json", timeout=10
+    )
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_fake_api_end_to_end(fake_api_caller, fake_fitbit_api, tmp_path) -> None:
+    """Test the caller refreshes its token and saves every response from the fake api"""
+    fake_api_caller.register_multiple_endpoints(
+        [
+            create_endpoint("get_heart_rate_by_date"),
+            create_endpoint("get_sleep_by_date"),
+            create_endpoint("get_activity_tcx_by_id"),
+        ]
+    )
+    fake_api_caller.refresh_access_token()
+    fake_api_caller.make_registered_requests_for_date(DATE)
+
+    assert saved_files(tmp_path) == [
+        "get_activity_tcx_by_id/20230118/1234_get_activity_tcx_by_id_test_user.tcx",
+        "get_heart_rate_by_date/20230118/get_heart_rate_by_date_test_user.json",
+        "get_sleep_by_date/20230118/get_sleep_by_date_test_user.json",
+    ]
+    assert [method for method, _ in fake_fitbit_api.requests] == [
+        "POST",
+        "GET",
+        "GET",
+        "GET",
+    ]
+
+
+def test_fake_api_injected_errors_are_retried(
+    fake_api_caller, fake_fitbit_api, tmp_path
+) -> None:
+    """Test injected rate limit and server errors are retried by the caller"""
+    fake_fitbit_api.server.fail_paths = {
+        re.compile("sleep"): [HTTPStatus.TOO_MANY_REQUESTS, 500]
+    }
+    fake_api_caller.register_endpoint(create_endpoint("get_sleep_by_date"))
+    fake_api_caller.refresh_access_token()
+    fake_api_caller.make_registered_requests_for_date(DATE)
+
+    sleep_requests = [path for _, path in fake_fitbit_api.requests if "sleep" in path]
+    assert len(sleep_requests) == 3
+    assert saved_files(tmp_path) == [
+        "get_sleep_by_date/20230118/get_sleep_by_date_test_user.json"
+    ]
+
+
+def test_fake_api_rate_limit(fake_api_caller, fake_fitbit_api) -> None:
+    """Test the rate limit headers count down and requests over the limit get a 429"""
+    fake_fitbit_api.parameters.rate_limit = 3
+    url = f"{fake_fitbit_api.url}/1/user/test_user/devices.json"
+    headers = {"authorization": "Bearer token"}
+
+    responses = [requests.get(url, headers=headers, timeout=10) for _ in range(4)]
+
+    assert [response.status_code for response in responses] == [200, 200, 200, 429]
+    assert [
+        response.headers["Fitbit-Rate-Limit-Remaining"] for response in responses
+    ] == ["2", "1", "0", "0"]
+    assert responses[0].headers["Fitbit-Rate-Limit-Limit"] == "3"
+    assert "Retry-After" in responses[3].headers
+
+    fake_api_caller.user_token.access_token_isvalid = True
+    with pytest.raises(Exception, match="Request failed after 2 retries"):
+        fake_api_caller.get_last_sync_time(retries=2)
+
+
+def test_fake_api_latency_and_sizes(fake_api_caller, fake_fitbit_api, tmp_path):
+    """Test the latency is added to each response and payload sizes are configurable"""
+    fake_fitbit_api.parameters.latency = 0.05
+    fake_fitbit_api.parameters.sizes = {"get_activity_tcx_by_id": 50}
+    fake_api_caller.register_endpoint(create_endpoint("get_activity_tcx_by_id"))
+    fake_api_caller.refresh_access_token()
+
+    start = time.perf_counter()
+    fake_api_caller.make_registered_requests_for_date(DATE)
+
+    assert time.perf_counter() - start >= 0.05
+    tcx_file = tmp_path / saved_files(tmp_path)[0]
+    assert tcx_file.read_text(encoding="utf-8").count("<Trackpoint>") == 50
+
+
+def test_fake_api_gzip(fake_fitbit_api) -> None:
+    """Test responses are gzip encoded when the client accepts it"""
+    response = requests.get(
+        f"{fake_fitbit_api.url}/1/user/test_user/devices.json",
+        headers={"authorization": "Bearer token", "Accept-Encoding": "gzip"},
+        timeout=10,
+    )
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.json()[0]["lastSyncTime"] == "2023-01-18T07:42:57.000"
+
+
+def test_api_urls_from_environment() -> None:
+    """Test the api urls can be overridden with environment variables"""
+    script = (
+        "from fitbit import constants, authorization\n"
+        "print(constants.WEB_API_URL, constants.TOKEN_URL, "
+        "authorization.LocalTokenManagerParameters().token_url)"
+    )
+    env = {
+        **os.environ,
+        "FITBIT_WEB_API_URL": "http://127.0.0.1:8080",
+        "PYTHONPATH": SOURCE_DIRECTORY,
+    }
+    env.pop("FITBIT_TOKEN_URL", None)
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True,
+        check=True,
+        cwd=SOURCE_DIRECTORY,
+        env=env,
+        text=True,
+    )
+
+    assert result.stdout.split() == [
+        "http://127.0.0.1:8080",
+        "http://127.0.0.1:8080/oauth2/token",
+        "http://127.0.0.1:8080/oauth2/token",
+    ]
@@ -1,10 +1,13 @@
-from datetime import datetime
+from datetime import date, datetime
 from http import HTTPStatus
+import json
 import os
+import zlib
 import pytest
 
 from fitbit.constants import WEB_API_URL
 from fitbit import caller
+from fitbit.instrumentation import LocalMetricsSink
 
 from tests.fixtures import (  # pylint: disable=W0611
     local_response_saver,
@@ -13,6 +16,7 @@ from tests.fixtures import (  # pylint: disable=W0611
     local_token_manager,
     api_credentials,
     testing_token_manager,
+    local_fetch_manifest,
 )
 
 
@@ -76,6 +80,27 @@ def test_make_registered_requests_for_date_single(tmp_path, fitbitcaller) -> Non
     assert os.path.exists(expected_file_path)
 
 
+def test_make_registered_requests_for_date_stream(tmp_path, fitbitcaller) -> None:
+    """Testing make_registered_requests method of FitBitCaller class streams the formats set"""
+    endpoint = caller.EndpointParameters(
+        "get_activity_tcx_by_id", "GET", "tcx", url_kwargs={"log_id": "1234"}
+    )
+    fitbitcaller.stream_formats = ["tcx"]
+    fitbitcaller.requester.response = "<TrainingCenterDatabase/>"
+
+    date = datetime.strptime("2023-01-17", "%Y-%m-%d").date()
+    expected_file_path = (
+        f"{tmp_path}/{endpoint.name}/20230117/"
+        f"1234_get_activity_tcx_by_id_{fitbitcaller.user_token.user_id}.tcx"
+    )
+
+    fitbitcaller.register_endpoint(endpoint)
+    fitbitcaller.make_registered_requests_for_date(date)
+
+    with open(expected_file_path, "r", encoding="utf-8") as file:
+        assert file.read() == "<TrainingCenterDatabase/>"
+
+
 def test_make_registered_requests_for_date_multiple(tmp_path, fitbitcaller) -> None:
     """Testing make_registered_requests method of FitBitCaller class"""
     endpoints = [
@@ -101,6 +126,147 @@ def test_make_registered_requests_for_date_multiple(tmp_path, fitbitcaller) -> N
         assert os.path.exists(expected_file_path)
 
 
+def test_make_registered_requests_for_date_bundle(tmp_path, fitbitcaller) -> None:
+    """Testing make_registered_requests method of FitBitCaller class saves one bundle"""
+    endpoints = [
+        caller.EndpointParameters("get_heart_rate_by_date", "GET", "json"),
+        caller.EndpointParameters(
+            "get_activity_tcx_by_id", "GET", "tcx", url_kwargs={"log_id": "1234"}
+        ),
+    ]
+    fitbitcaller.bundle = True
+    fitbitcaller.stream_formats = ["tcx"]
+    user_id = fitbitcaller.user_token.user_id
+
+    date = datetime.strptime("2023-01-17", "%Y-%m-%d").date()
+    fitbitcaller.register_multiple_endpoints(endpoints)
+    fitbitcaller.make_registered_requests_for_date(date)
+
+    instance_id = zlib.crc32(b"get_heart_rate_by_date|1234_get_activity_tcx_by_id")
+    folder = f"{tmp_path}/get_bundle_by_date/20230117"
+    file_name = f"{instance_id}_get_bundle_by_date_{user_id}.ndjson"
+    assert os.listdir(tmp_path) == ["get_bundle_by_date"]
+    assert os.listdir(folder) == [file_name]
+
+    with open(f"{folder}/{file_name}", "r", encoding="utf-8") as file:
+        records = [json.loads(line) for line in file]
+
+    assert records == [
+        {
+            "endpoint": "get_heart_rate_by_date",
+            "instance": "get_heart_rate_by_date",
+            "user_id": user_id,
+            "date": "2023-01-17",
+            "format": "json",
+            "data": fitbitcaller.requester.response,
+        },
+        {
+            "endpoint": "get_activity_tcx_by_id",
+            "instance": "1234_get_activity_tcx_by_id",
+            "user_id": user_id,
+            "date": "2023-01-17",
+            "format": "tcx",
+            "data": fitbitcaller.requester.response,
+        },
+    ]
+
+
+DEVICES_RESPONSE = json.dumps(
+    [
+        {"id": "1", "lastSyncTime": "2023-01-18T07:42:57.000"},
+        {"id": "2", "lastSyncTime": "2023-01-17T21:00:00.000"},
+    ]
+)
+
+
+def test_get_last_sync_time(fitbitcaller) -> None:
+    """Testing get_last_sync_time method of FitBitCaller class returns the latest device"""
+    fitbitcaller.requester.response = DEVICES_RESPONSE
+    fitbitcaller.refresh_access_token()
+
+    assert fitbitcaller.get_last_sync_time() == datetime(2023, 1, 18, 7, 42, 57)
+
+
+def test_get_last_sync_time_no_devices(fitbitcaller) -> None:
+    """Testing get_last_sync_time method of FitBitCaller class with no devices"""
+    fitbitcaller.requester.response = "[]"
+    fitbitcaller.refresh_access_token()
+
+    assert fitbitcaller.get_last_sync_time() is None
+
+
+def test_make_registered_requests_incremental_first_run(
+    tmp_path, fitbitcaller, local_fetch_manifest
+) -> None:
+    """Testing the first incremental run only requests the last sync date"""
+    fitbitcaller.requester.response = DEVICES_RESPONSE
+    fitbitcaller.register_endpoint(caller.EndpointParameters("get_sleep_by_date"))
+    user_id = fitbitcaller.user_token.user_id
+
+    requested = fitbitcaller.make_registered_requests_incremental(local_fetch_manifest)
+
+    assert requested == {date(2023, 1, 18): ["get_sleep_by_date"]}
+    assert os.listdir(f"{tmp_path}/get_sleep_by_date") == ["20230118"]
+    assert local_fetch_manifest.get(f"{user_id}_get_sleep_by_date") == {
+        "last_sync_time": "2023-01-18 07:42:57"
+    }
+
+
+def test_make_registered_requests_incremental(fitbitcaller, local_fetch_manifest):
+    """Testing an incremental run requests the dates since the previous sync"""
+    fitbitcaller.requester.response = DEVICES_RESPONSE
+    fitbitcaller.register_multiple_endpoints(
+        [
+            caller.EndpointParameters("get_sleep_by_date"),
+            caller.EndpointParameters("get_heart_rate_by_date"),
+            caller.EndpointParameters("get_cardio_score_by_date"),
+        ]
+    )
+    user_id = fitbitcaller.user_token.user_id
+    local_fetch_manifest.update(
+        f"{user_id}_get_sleep_by_date", {"last_sync_time": "2023-01-16 22:00:00"}
+    )
+    local_fetch_manifest.update(
+        f"{user_id}_get_heart_rate_by_date", {"last_sync_time": "2023-01-18 07:42:57"}
+    )
+    local_fetch_manifest.update(
+        f"{user_id}_get_cardio_score_by_date", {"last_sync_time": "2022-12-01 10:00:00"}
+    )
+
+    requested = fitbitcaller.make_registered_requests_incremental(
+        local_fetch_manifest, max_days=2
+    )
+
+    assert requested == {
+        date(2023, 1, 17): ["get_sleep_by_date", "get_cardio_score_by_date"],
+        date(2023, 1, 18): ["get_sleep_by_date", "get_cardio_score_by_date"],
+    }
+    assert local_fetch_manifest.get(f"{user_id}_get_cardio_score_by_date") == {
+        "last_sync_time": "2023-01-18 07:42:57"
+    }
+
+
+def test_make_registered_requests_incremental_no_devices(
+    capsys, fitbitcaller, local_fetch_manifest
+) -> None:
+    """Testing an incremental run does nothing when the user has no synced devices"""
+    fitbitcaller.requester.response = "[]"
+    fitbitcaller.register_endpoint(caller.EndpointParameters("get_sleep_by_date"))
+
+    assert fitbitcaller.make_registered_requests_incremental(local_fetch_manifest) == {}
+    assert "No synced devices found" in capsys.readouterr().out
+
+
+def test_make_registered_requests_incremental_bad_max_days(
+    fitbitcaller, local_fetch_manifest
+) -> None:
+    """Testing an incremental run with a bad max_days value"""
+    fitbitcaller.register_endpoint(caller.EndpointParameters("get_sleep_by_date"))
+
+    with pytest.raises(ValueError, match="max_days cannot be less than 1"):
+        fitbitcaller.make_registered_requests_incremental(local_fetch_manifest, 0)
+
+
 def test_make_registered_requests_for_date_unauthorized(tmp_path, fitbitcaller) -> None:
     """Testing make_registered_requests method of FitBitCaller class when Unauthorized"""
     endpoint = caller.EndpointParameters("get_heart_rate_by_date", "GET", "json")
@@ -311,3 +477,200 @@ def test_create_url_sleep(fitbitcaller, api_token) -> None:
 
     assert url == expected_url
     assert save_name == "get_sleep_by_date"
+
+
+def test_create_url_heart_rate_intraday(fitbitcaller, api_token) -> None:
+    """Testing create_url_heart_rate_intraday method of FitBitCaller class with default parameters"""
+    date = datetime.strptime("2014-01-04", "%Y-%m-%d").date()
+    expected_url = f"{WEB_API_URL}/1/user/{api_token.user_id}/activities/heart/date/{date}/1d/1sec.json"
+    url, save_name = fitbitcaller.create_url_heart_rate_intraday(date)
+
+    assert url == expected_url
+    assert save_name == "get_heart_rate_intraday_by_date"
+
+
+def test_create_url_heart_rate_intraday_bad_detail_level(fitbitcaller) -> None:
+    """Testing create_url_heart_rate_intraday method of FitBitCaller class when detail level is not valid"""
+    date = datetime.strptime("2014-01-04", "%Y-%m-%d").date()
+
+    with pytest.raises(
+        ValueError, match="Detail level is not one of the supported values"
+    ):
+        fitbitcaller.create_url_heart_rate_intraday(date, detail_level="2min")
+
+
+def test_create_url_steps_intraday(fitbitcaller, api_token) -> None:
+    """Testing create_url_steps_intraday method of FitBitCaller class with detail level specified"""
+    date = datetime.strptime("2014-01-04", "%Y-%m-%d").date()
+    expected_url = f"{WEB_API_URL}/1/user/{api_token.user_id}/activities/steps/date/{date}/1d/15min.json"
+    url, save_name = fitbitcaller.create_url_steps_intraday(date, detail_level="15min")
+
+    assert url == expected_url
+    assert save_name == "get_steps_intraday_by_date"
+
+    with pytest.raises(
+        ValueError, match="Detail level is not one of the supported values"
+    ):
+        fitbitcaller.create_url_steps_intraday(date, detail_level="1sec")
+
+
+def test_create_url_spo2_intraday(fitbitcaller, api_token) -> None:
+    """Testing create_url_spo2_intraday method of FitBitCaller class with default parameters"""
+    date = datetime.strptime("2014-01-04", "%Y-%m-%d").date()
+    expected_url = f"{WEB_API_URL}/1/user/{api_token.user_id}/spo2/date/{date}/all.json"
+    url, save_name = fitbitcaller.create_url_spo2_intraday(date)
+
+    assert url == expected_url
+    assert save_name == "get_spo2_intraday_by_date"
+
+
+def test_make_registered_requests_metrics(fitbitcaller) -> None:
+    """Testing the FitBitCaller records request timings, retries and response bytes"""
+    metrics = LocalMetricsSink()
+    fitbitcaller.metrics = metrics
+    fitbitcaller.stream_formats = ["tcx"]
+    fitbitcaller.requester.http_status = HTTPStatus.BAD_GATEWAY
+    fitbitcaller.requester.ok_after = 2
+    fitbitcaller.register_multiple_endpoints(
+        [
+            caller.EndpointParameters("get_heart_rate_by_date", "GET", "json"),
+            caller.EndpointParameters(
+                "get_activity_tcx_by_id", "GET", "tcx", url_kwargs={"log_id": "1234"}
+            ),
+        ]
+    )
+    response_bytes = len(fitbitcaller.requester.response.encode("utf-8"))
+
+    date = datetime.strptime("2023-01-17", "%Y-%m-%d").date()
+    fitbitcaller.make_registered_requests_for_date(date)
+    fitbitcaller.refresh_access_token()
+
+    assert metrics.counters == {
+        "retries[endpoint=get_heart_rate_by_date]": 2,
+        "response_bytes[endpoint=get_heart_rate_by_date]": response_bytes,
+        "response_bytes[endpoint=get_activity_tcx_by_id]": response_bytes,
+        "token_refreshes": 2,
+    }
+    assert metrics.timings["request[endpoint=get_heart_rate_by_date]"]["count"] == 3
+    assert metrics.timings["save[endpoint=get_activity_tcx_by_id]"]["count"] == 1
+
+
+def read_ledger_rows(tmp_path) -> list[dict]:
+    """Reads the run ledger rows saved by a FitBitCaller"""
+    (ledger_path,) = (tmp_path / "get_run_ledger_by_date").glob("*/*.ndjson")
+    with open(ledger_path, "r", encoding="utf-8") as file:
+        return [json.loads(line) for line in file]
+
+
+def test_make_registered_requests_ledger(tmp_path, fitbitcaller) -> None:
+    """Testing the FitBitCaller saves a run ledger row for each endpoint requested"""
+    fitbitcaller.ledger = True
+    fitbitcaller.requester.http_status = HTTPStatus.BAD_GATEWAY
+    fitbitcaller.register_endpoint(
+        caller.EndpointParameters("get_heart_rate_by_date", "GET", "json")
+    )
+    date = datetime.strptime("2023-01-17", "%Y-%m-%d").date()
+    fitbitcaller.make_registered_requests_for_date(date)
+    fitbitcaller.make_registered_requests_for_date(date)
+
+    (ledger_directory,) = (tmp_path / "get_run_ledger_by_date").iterdir()
+    ledger_paths = sorted(ledger_directory.iterdir())
+    assert ledger_directory.name == "20230117"
+    assert len(ledger_paths) == 2
+    user_id = fitbitcaller.user_token.user_id
+    assert ledger_paths[0].name.endswith(f"_get_run_ledger_by_date_{user_id}.ndjson")
+
+    rows = []
+    for ledger_path in ledger_paths:
+        with open(ledger_path, "r", encoding="utf-8") as file:
+            rows += [json.loads(line) for line in file]
+    assert [row["outcome"] for row in rows] == ["saved", "unchanged"]
+    assert [row["retries"] for row in rows] == [1, 0]
+    assert rows[0]["file_path"] == (
+        f"get_heart_rate_by_date/20230117/get_heart_rate_by_date_{user_id}.json"
+    )
+    assert rows[0]["run_type"] == "extract"
+    assert rows[0]["date"] == "2023-01-17"
+    assert rows[0]["bytes_read"] == len(fitbitcaller.requester.response)
+    assert rows[0]["request_seconds"] > 0
+    assert rows[0]["save_seconds"] > 0
+    assert rows[0]["transform_seconds"] is None
+
+
+def test_make_registered_requests_ledger_failed(tmp_path, fitbitcaller) -> None:
+    """Testing the run ledger is saved with the failed request before it is raised"""
+    fitbitcaller.ledger = True
+    fitbitcaller.register_multiple_endpoints(
+        [
+            caller.EndpointParameters("get_heart_rate_by_date", "GET", "json"),
+            caller.EndpointParameters("get_sleep_by_date", "GET", "json"),
+        ]
+    )
+    fitbitcaller.requester.ok_after = 1
+    date = datetime.strptime("2023-01-17", "%Y-%m-%d").date()
+
+    def fail_sleep(method, url, headers, body):
+        if "sleep" in url:
+            return "", HTTPStatus.BAD_GATEWAY
+        return fitbitcaller.requester.response, HTTPStatus.OK
+
+    fitbitcaller.requester.make_request = fail_sleep
+    with pytest.raises(Exception, match="Request failed after 1 retries"):
+        fitbitcaller.make_registered_requests_for_date(date, 1)
+
+    rows = read_ledger_rows(tmp_path)
+    assert [row["api_endpoint"] for row in rows] == [
+        "get_heart_rate_by_date",
+        "get_sleep_by_date",
+    ]
+    assert rows[1]["outcome"] == "failed"
+    assert rows[1]["error"] == "Exception('Request failed after 1 retries')"
+    assert rows[1]["retries"] == 1
+
+
+def test_make_registered_requests_ledger_bundle(tmp_path, fitbitcaller) -> None:
+    """Testing bundled requests have a ledger row each and one for the saved bundle"""
+    fitbitcaller.ledger = True
+    fitbitcaller.bundle = True
+    fitbitcaller.register_multiple_endpoints(
+        [
+            caller.EndpointParameters("get_heart_rate_by_date", "GET", "json"),
+            caller.EndpointParameters("get_sleep_by_date", "GET", "json"),
+        ]
+    )
+    date = datetime.strptime("2023-01-17", "%Y-%m-%d").date()
+    fitbitcaller.make_registered_requests_for_date(date)
+
+    rows = read_ledger_rows(tmp_path)
+    assert [(row["api_endpoint"], row["outcome"]) for row in rows] == [
+        ("get_heart_rate_by_date", "bundled"),
+        ("get_sleep_by_date", "bundled"),
+        ("get_bundle_by_date", "saved"),
+    ]
+    assert rows[2]["file_path"].startswith("get_bundle_by_date/20230117/")
+    assert rows[2]["save_seconds"] > 0
+
+
+def test_make_registered_requests_ledger_bundle_unchanged(
+    tmp_path, fitbitcaller
+) -> None:
+    """Testing the bundle ledger row records the bundle as unchanged when not rewritten"""
+    fitbitcaller.ledger = True
+    fitbitcaller.bundle = True
+    fitbitcaller.register_endpoint(
+        caller.EndpointParameters("get_heart_rate_by_date", "GET", "json")
+    )
+    date = datetime.strptime("2023-01-17", "%Y-%m-%d").date()
+    fitbitcaller.make_registered_requests_for_date(date)
+    fitbitcaller.make_registered_requests_for_date(date)
+
+    rows = []
+    for ledger_path in sorted((tmp_path / "get_run_ledger_by_date").glob("*/*")):
+        with open(ledger_path, "r", encoding="utf-8") as file:
+            rows += [json.loads(line) for line in file]
+    assert [(row["api_endpoint"], row["outcome"]) for row in rows] == [
+        ("get_heart_rate_by_date", "bundled"),
+        ("get_bundle_by_date", "saved"),
+        ("get_heart_rate_by_date", "bundled"),
+        ("get_bundle_by_date", "unchanged"),
+    ]
@@ -1,7 +1,13 @@
 import pytest
+import gzip
 import os
 
-from tests.fixtures import local_response_saver  # pylint: disable=W0611
+from fitbit import savers
+
+from tests.fixtures import (  # pylint: disable=W0611
+    local_response_saver,
+    local_object_index,
+)
 
 
 #####################################
@@ -72,3 +78,124 @@ def test_local_response_saver_bad_directory(local_response_saver) -> None:
         FileNotFoundError, match="\\[Errno 2\\] No such file or directory:.*"
     ):
         local_response_saver.save(fake_json_data, folder, file_name, file_format)
+
+
+def test_local_response_saver_unchanged(tmp_path, local_response_saver) -> None:
+    """Test the local save object skips writing a file with the same content"""
+    fake_json_data = '{"field1": "value1", "field2": 2, "field3": "value3"}'
+    folder = "data"
+    file_format = "json"
+    file_name = "test_save_file"
+    full_path = f"{tmp_path}/{folder}/{file_name}.{file_format}"
+
+    assert local_response_saver.save(fake_json_data, folder, file_name, file_format)
+    modified_time = os.path.getmtime(full_path)
+
+    assert not local_response_saver.save(fake_json_data, folder, file_name, file_format)
+    assert os.path.getmtime(full_path) == modified_time
+
+
+def test_local_response_saver_changed(tmp_path, local_response_saver) -> None:
+    """Test the local save object overwrites a file when the content has changed"""
+    folder = "data"
+    file_format = "json"
+    file_name = "test_save_file"
+    full_path = f"{tmp_path}/{folder}/{file_name}.{file_format}"
+
+    local_response_saver.save('{"field1": "value1"}', folder, file_name, file_format)
+    saved = local_response_saver.save(
+        '{"field1": "value2"}', folder, file_name, file_format
+    )
+
+    assert saved
+    with open(full_path, "r", encoding="utf-8") as file:
+        assert file.read() == '{"field1": "value2"}'
+
+
+def test_local_response_saver_skip_unchanged_disabled(local_response_saver) -> None:
+    """Test the local save object always writes when skip_unchanged is disabled"""
+    fake_json_data = '{"field1": "value1"}'
+    local_response_saver.skip_unchanged = False
+
+    local_response_saver.save(fake_json_data, "data", "test_save_file", "json")
+
+    assert local_response_saver.save(fake_json_data, "data", "test_save_file", "json")
+
+
+def test_local_response_saver_gzip(tmp_path) -> None:
+    """Test the local save object compresses the file and adds the extension"""
+    saver = savers.LocalResponseSaver(tmp_path, compression="gzip")
+    fake_json_data = '{"field1": "value1", "field2": 2, "field3": "value3"}'
+    full_path = f"{tmp_path}/data/test_save_file.json.gz"
+
+    assert saver.save(fake_json_data, "data", "test_save_file", "json")
+
+    with gzip.open(full_path, "rt", encoding="utf-8") as file:
+        assert file.read() == fake_json_data
+
+    assert not saver.save(fake_json_data, "data", "test_save_file", "json")
+
+
+def test_local_response_saver_bad_compression(tmp_path) -> None:
+    """Test the local save object rejects unknown compression"""
+    with pytest.raises(ValueError, match="Compression lz4 is not supported"):
+        savers.LocalResponseSaver(tmp_path, compression="lz4")
+
+
+def test_local_response_saver_stream(tmp_path, local_response_saver) -> None:
+    """Test the local save object writes a response from chunks"""
+    chunks = [b'{"field1": ', b'"value1"}']
+    full_path = f"{tmp_path}/data/test_save_file.json"
+
+    assert local_response_saver.save_stream(chunks, "data", "test_save_file", "json")
+
+    with open(full_path, "r", encoding="utf-8") as file:
+        assert file.read() == '{"field1": "value1"}'
+    assert not os.path.exists(f"{full_path}.tmp")
+
+
+def test_local_response_saver_stream_unchanged(tmp_path, local_response_saver) -> None:
+    """Test the local save object skips a streamed response with the same content"""
+    full_path = f"{tmp_path}/data/test_save_file.json"
+    local_response_saver.save('{"field1": "value1"}', "data", "test_save_file", "json")
+    modified_time = os.path.getmtime(full_path)
+
+    saved = local_response_saver.save_stream(
+        [b'{"field1": "value1"}'], "data", "test_save_file", "json"
+    )
+
+    assert not saved
+    assert os.path.getmtime(full_path) == modified_time
+    assert not os.path.exists(f"{full_path}.tmp")
+
+
+def test_local_response_saver_stream_gzip(tmp_path) -> None:
+    """Test the local save object compresses a streamed response"""
+    saver = savers.LocalResponseSaver(tmp_path, compression="gzip")
+    full_path = f"{tmp_path}/data/test_save_file.tcx.gz"
+
+    assert saver.save_stream([b"<xml>", b"</xml>"], "data", "test_save_file", "tcx")
+
+    with gzip.open(full_path, "rt", encoding="utf-8") as file:
+        assert file.read() == "<xml></xml>"
+
+
+def test_local_response_saver_object_index(tmp_path, local_object_index) -> None:
+    """Test the local save object records saved files in the object index"""
+    saver = savers.LocalResponseSaver(tmp_path, object_index=local_object_index)
+    fake_json_data = '{"field1": "value1"}'
+    full_path = f"{tmp_path}/data/test_save_file.json"
+
+    saver.save(fake_json_data, "data", "test_save_file", "json")
+    entry = local_object_index.get(full_path)
+
+    assert entry["content_hash"] == savers.content_hash(fake_json_data)
+    assert entry["size"] == len(fake_json_data)
+    assert entry["processed"] is False
+    assert "fetched_date" in entry
+
+    saver.save_stream([b'{"field1": "value2"}'], "data", "test_save_file", "json")
+
+    assert local_object_index.get(full_path)["content_hash"] == savers.content_hash(
+        '{"field1": "value2"}'
+    )
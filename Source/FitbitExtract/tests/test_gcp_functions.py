@@ -6,7 +6,7 @@ import re
 from google.cloud import storage, bigquery, secretmanager
 from helper.functions import get_config_parameter
 from fitbit.caller import EndpointParameters
-from fitbit import savers, messengers, loaders
+from fitbit import savers, messengers, loaders, manifests, constants
 from fitbit.authorization import CloudTokenManager, CloudTokenManagerParameters
 from http import HTTPStatus
 import dataclasses
@@ -146,6 +146,128 @@ def test_gcp_response_saver_json(gcp_response_saver) -> None:
     assert blob.exists
 
 
+def test_gcp_response_saver_unchanged(gcp_response_saver) -> None:
+    """Test the GCP save object skips uploading an object with the same content"""
+    fake_json_data = '{"field1": "value1", "field2": 2, "field3": "value3"}'
+    folder = "data"
+    file_format = "json"
+    file_name = "test_save_file_unchanged"
+
+    assert gcp_response_saver.save(fake_json_data, folder, file_name, file_format)
+    blob = gcp_response_saver.bucket.get_blob(f"{folder}/{file_name}.{file_format}")
+
+    assert not gcp_response_saver.save(fake_json_data, folder, file_name, file_format)
+    assert gcp_response_saver.save(
+        '{"field1": "value2"}', folder, file_name, file_format
+    )
+
+    new_blob = gcp_response_saver.bucket.get_blob(f"{folder}/{file_name}.{file_format}")
+    assert new_blob.generation != blob.generation
+
+
+def test_gcp_response_saver_stream(gcp_response_saver) -> None:
+    """Test the GCP save object uploads a response from chunks"""
+    folder = "data"
+    file_name = "test_save_file_stream"
+    chunks = [b'{"field1": ', b'"value1"}']
+
+    assert gcp_response_saver.save_stream(chunks, folder, file_name, "json")
+
+    blob = gcp_response_saver.bucket.get_blob(f"{folder}/{file_name}.json")
+    assert blob.download_as_text() == '{"field1": "value1"}'
+    assert not gcp_response_saver.save(
+        '{"field1": "value1"}', folder, file_name, "json"
+    )
+
+
+def test_gcp_response_saver_stream_unchanged(gcp_response_saver) -> None:
+    """Test the GCP save object does not replace an object streamed with the same content"""
+    folder = "data"
+    file_name = "test_save_file_stream_unchanged"
+    chunks = [b'{"field1": ', b'"value1"}']
+
+    assert gcp_response_saver.save_stream(chunks, folder, file_name, "json")
+    blob = gcp_response_saver.bucket.get_blob(f"{folder}/{file_name}.json")
+
+    assert not gcp_response_saver.save_stream(chunks, folder, file_name, "json")
+    unchanged_blob = gcp_response_saver.bucket.get_blob(f"{folder}/{file_name}.json")
+    assert unchanged_blob.generation == blob.generation
+
+    assert gcp_response_saver.save_stream([b'{"field1": 2}'], folder, file_name, "json")
+    new_blob = gcp_response_saver.bucket.get_blob(f"{folder}/{file_name}.json")
+    assert new_blob.generation != blob.generation
+    assert new_blob.download_as_text() == '{"field1": 2}'
+    assert not list(
+        gcp_response_saver.bucket.list_blobs(prefix=f"{constants.UPLOADS_FOLDER}/")
+    )
+
+
+def test_gcp_response_saver_stream_upload_bucket(
+    gcp_storage_client, gcp_response_saver
+) -> None:
+    """Test the GCP save object uploads streams to the upload bucket then copies them"""
+    upload_bucket_name = f"testing_bucket_{uuid.uuid1()}"
+    upload_bucket = gcp_storage_client.create_bucket(upload_bucket_name)
+    saver = savers.GCPResponseSaver(
+        gcp_response_saver.bucket_name,
+        GCP_PROJECT_ID,
+        upload_bucket_name=upload_bucket_name,
+    )
+    folder = "data"
+    file_name = "test_save_file_stream_upload_bucket"
+
+    try:
+        assert saver.save_stream([b'{"field1": 1}'], folder, file_name, "json")
+
+        blob = saver.bucket.get_blob(f"{folder}/{file_name}.json")
+        assert blob.download_as_text() == '{"field1": 1}'
+        assert not saver.save_stream([b'{"field1": 1}'], folder, file_name, "json")
+        assert not list(upload_bucket.list_blobs())
+        assert not list(
+            saver.bucket.list_blobs(prefix=f"{constants.UPLOADS_FOLDER}/")
+        )
+    finally:
+        upload_bucket.delete(force=True)
+
+
+####################################
+# Test the GCPFetchManifest Class #
+####################################
+
+
+def test_gcp_fetch_manifest_update(gcp_response_saver) -> None:
+    """Test the GCP fetch manifest saves entries that can be read by a new object"""
+    manifest = manifests.GCPFetchManifest(
+        gcp_response_saver.bucket_name, GCP_PROJECT_ID, "testing_manifest"
+    )
+    manifest.update("TESTUSER_1", {"last_modified": "a", "fetched": False})
+    manifest.update("TESTUSER_1", {"fetched": True})
+
+    new_manifest = manifests.GCPFetchManifest(
+        gcp_response_saver.bucket_name, GCP_PROJECT_ID, "testing_manifest"
+    )
+
+    assert new_manifest.get("TESTUSER_1") == {"last_modified": "a", "fetched": True}
+    assert new_manifest.get("TESTUSER_2") is None
+
+
+def test_gcp_fetch_manifest_concurrent_update(gcp_response_saver) -> None:
+    """Test the GCP fetch manifest keeps entries written by another object"""
+    manifest_1 = manifests.GCPFetchManifest(
+        gcp_response_saver.bucket_name, GCP_PROJECT_ID, "testing_manifest_concurrent"
+    )
+    manifest_2 = manifests.GCPFetchManifest(
+        gcp_response_saver.bucket_name, GCP_PROJECT_ID, "testing_manifest_concurrent"
+    )
+    manifest_1.get("TESTUSER_1")
+    manifest_2.get("TESTUSER_1")
+    manifest_1.update("TESTUSER_1", {"fetched": True})
+    manifest_2.update("TESTUSER_2", {"fetched": True})
+
+    assert manifest_2.get("TESTUSER_1") == {"fetched": True}
+    assert manifest_2.get("TESTUSER_2") == {"fetched": True}
+
+
 ################################
 # Test the GCPDataLoader Class #
 ################################
@@ -213,6 +335,41 @@ def test_gcp_loader_extract_tcx(gcp_response_saver, gcp_loader) -> None:
     assert results["xml_data"] == fake_tcx_data
 
 
+def test_gcp_loader_extract_gzip(gcp_response_saver, gcp_loader) -> None:
+    "Test the extract method of the GCPDataLoader class for a gzip compressed object"
+    loader, _ = gcp_loader
+    dictionary = {"field1": "value1", "field2": 2, "field3": "value3"}
+    folder = "loader"
+    file_name = "test_save_file_gzip"
+    saver = savers.GCPResponseSaver(
+        gcp_response_saver.bucket_name, GCP_PROJECT_ID, compression="gzip"
+    )
+    saver.save(json.dumps(dictionary), folder, file_name, "json")
+    blob_name = f"{folder}/{file_name}.json.gz"
+
+    assert saver.bucket.get_blob(blob_name).content_encoding == "gzip"
+    assert loader.extract(blob_name) == dictionary
+
+
+def test_gcp_loader_extract_zstd(gcp_response_saver, gcp_loader) -> None:
+    "Test the extract method of the GCPDataLoader class for a zstd compressed object"
+    pytest.importorskip("zstandard")
+    loader, _ = gcp_loader
+    dictionary = {"field1": "value1", "field2": 2, "field3": "value3"}
+    folder = "loader"
+    file_name = "test_save_file_zstd"
+    saver = savers.GCPResponseSaver(
+        gcp_response_saver.bucket_name, GCP_PROJECT_ID, compression="zstd"
+    )
+    saver.save(json.dumps(dictionary), folder, file_name, "json")
+    blob_name = f"{folder}/{file_name}.json.zst"
+
+    blob = saver.bucket.get_blob(blob_name)
+    assert blob.content_encoding is None
+    assert blob.content_type == "application/zstd"
+    assert loader.extract(blob_name) == dictionary
+
+
 def test_gcp_loader_extract_bad_format(gcp_response_saver, gcp_loader) -> None:
     "Test the extract method of the GCPDataLoader class for bad file format"
     loader, _ = gcp_loader
@@ -288,6 +445,100 @@ def test_gcp_loader_load_gcp_error(gcp_loader) -> None:
         loader.load(data, table_name)
 
 
+def test_gcp_loader_merge_load(gcp_loader) -> None:
+    "Test the _merge_load method of the GCPDataLoader class updates existing rows"
+    loader, table_name = gcp_loader
+    merge_table = f"{loader.project_id}.{loader.dataset_name}.{table_name}_merge"
+    schema = [
+        bigquery.SchemaField("test_string_column", "STRING"),
+        bigquery.SchemaField("test_int_column", "INTEGER"),
+    ]
+    loader.bigquery_client.create_table(bigquery.Table(merge_table, schema=schema))
+    key_fields = ["test_string_column"]
+    data = [
+        {"test_string_column": "value1", "test_int_column": 10},
+        {"test_string_column": "value2", "test_int_column": 5},
+    ]
+    loader._merge_load(data, merge_table, key_fields)
+    data[0]["test_int_column"] = 11
+    loader._merge_load(data, merge_table, key_fields)
+
+    query = loader.bigquery_client.query(
+        f"SELECT * FROM `{merge_table}` ORDER BY test_string_column"
+    )
+    results = [dict(result) for result in query.result()]
+
+    assert data == results
+
+
+def test_gcp_loader_load_columns(gcp_loader) -> None:
+    "Test the load_columns method of the GCPDataLoader class batch loads every row"
+    loader, _ = gcp_loader
+    table_name = "heart_rate_intraday"
+    full_table_name = f"{loader.project_id}.{loader.dataset_name}.{table_name}"
+    schema = [
+        bigquery.SchemaField(field["bq_name"], field["bq_type"])
+        for field in constants.HEART_RATE_INTRADAY_FIELDS.values()
+    ]
+    loader.bigquery_client.create_table(
+        bigquery.Table(full_table_name, schema=schema), exists_ok=True
+    )
+    columns = {
+        "user_id": "TESTUSER",
+        "date": "2023-01-18",
+        "processed_date": "2023-02-03 12:31:38",
+        "date_time": ["2023-01-18 00:00:00", "2023-01-18 00:00:01"],
+        "heart_rate": [62, 63],
+    }
+    loader.load_columns(columns, table_name)
+
+    query = loader.bigquery_client.query(
+        f"SELECT heart_rate FROM `{full_table_name}` ORDER BY date_time"
+    )
+    results = [result["heart_rate"] for result in query.result()]
+
+    assert results == [62, 63]
+
+
+def test_gcp_loader_load_stream_twice(gcp_loader) -> None:
+    "Test loading the same tcx rows twice with load_stream leaves one copy of each row"
+    loader, _ = gcp_loader
+    table_name = "activity_detail"
+    full_table_name = f"{loader.project_id}.{loader.dataset_name}.{table_name}"
+    schema = [
+        bigquery.SchemaField(field["bq_name"], field["bq_type"])
+        for field in constants.ACTIVITY_TCX_FIELDS.values()
+    ]
+    loader.bigquery_client.create_table(
+        bigquery.Table(full_table_name, schema=schema), exists_ok=True
+    )
+    rows = [
+        {
+            "log_id": 53177087392,
+            "lap_number": point // 3,
+            "point_order": point % 3,
+            "date_time": f"2023-01-18 07:06:{10 + point}",
+            "heart_rate_bpm": 100 + point,
+            "date": "2023-01-18",
+            "user_id": "TESTUSER",
+            "processed_date": "2023-02-03 12:31:38",
+        }
+        for point in range(7)
+    ]
+    loader.load_stream(iter(rows), table_name, chunk_rows=3)
+    loader.load_stream(iter(rows), table_name, chunk_rows=3)
+
+    query = loader.bigquery_client.query(
+        f"SELECT lap_number, point_order, heart_rate_bpm FROM `{full_table_name}` "
+        "ORDER BY lap_number, point_order"
+    )
+    results = [tuple(result.values()) for result in query.result()]
+
+    assert results == [
+        (row["lap_number"], row["point_order"], row["heart_rate_bpm"]) for row in rows
+    ]
+
+
 ################################
 # Test the CloudTokenManager Class #
 ################################
@@ -396,3 +647,29 @@ def test_gcp_token_manager_save_load(api_token, cloud_token_manager) -> None:
 def test_gcp_token_manager_load_secret(cloud_token_manager):
     secret = cloud_token_manager._load_secret_from_gcp("dummy")
     assert secret == FERNET_KEY
+
+
+##################################
+# Test the GCPObjectIndex Class #
+##################################
+
+
+def test_gcp_object_index(gcp_response_saver) -> None:
+    """Test the GCP object index records each saved object in its own index object"""
+    object_index = manifests.GCPObjectIndex(
+        gcp_response_saver.bucket_name, GCP_PROJECT_ID
+    )
+    saver = savers.GCPResponseSaver(
+        gcp_response_saver.bucket_name, GCP_PROJECT_ID, object_index=object_index
+    )
+    saver.save('{"field1": "value1"}', "index/20230118", "test_save_file", "json")
+    path = "index/20230118/test_save_file.json"
+
+    new_index = manifests.GCPObjectIndex(gcp_response_saver.bucket_name, GCP_PROJECT_ID)
+    entry = new_index.get(path)
+
+    assert entry["size"] == 20
+    assert entry["processed"] is False
+    assert (
+        saver.bucket.get_blob(f"manifests/index/202301/{path}.json") is not None
+    )
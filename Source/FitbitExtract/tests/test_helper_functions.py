@@ -29,6 +29,32 @@ def test_decode_event_messages_bad_dict() -> None:
         helper.decode_event_messages(test_message_data)
 
 
+def test_decode_event_messages_json_values() -> None:
+    """Test json booleans and nulls are decoded"""
+    test_message = {"test_key": True, "test_key_2": None, "test_key_3": [1.5]}
+    test_message_encoded = json.dumps(test_message).encode("utf-8")
+    test_message_data = {"message": {"data": base64.b64encode(test_message_encoded)}}
+    assert test_message == helper.decode_event_messages(test_message_data)
+
+
+def test_decode_event_messages_literal() -> None:
+    """Test messages in the python literal format are still decoded"""
+    test_message = {"test_key": "test_value", "test_key_2": {"url_kwargs": {}}}
+    test_message_encoded = str(test_message).encode("utf-8")
+    test_message_data = {"message": {"data": base64.b64encode(test_message_encoded)}}
+    assert test_message == helper.decode_event_messages(test_message_data)
+
+
+def test_decode_event_messages_not_dict() -> None:
+    """Test messages that are not a dict are rejected"""
+    test_message_data = {"message": {"data": base64.b64encode(b"[1, 2]")}}
+
+    with pytest.raises(
+        Exception, match="Could not parse pubsub message: .* into a dict"
+    ):
+        helper.decode_event_messages(test_message_data)
+
+
 def test_check_parameters_date() -> None:
     """_summary_"""
     parameters = {"user_id": "test", "endpoints": "test"}
@@ -50,6 +76,69 @@ def test_check_parameters_endpoints() -> None:
         helper.check_parameters(parameters)
 
 
+def test_check_parameters_valid() -> None:
+    """Test valid parameters pass the check"""
+    parameters = {
+        "user_id": "test",
+        "date": "2023-01-18",
+        "endpoints": [
+            {"name": "get_sleep_by_date"},
+            {
+                "name": "get_activity_tcx_by_id",
+                "response_format": "tcx",
+                "url_kwargs": {"log_id": 1},
+                "headers": {},
+                "body": {},
+            },
+        ],
+    }
+    helper.check_parameters(parameters)
+    helper.check_parameters(
+        {"user_id": "test", "date": "current", "endpoints": ["all"]}
+    )
+
+
+@pytest.mark.parametrize(
+    "parameters,message",
+    [
+        ({"user_id": 1, "date": "current", "endpoints": ["all"]}, "user_id should be"),
+        ({"user_id": "test", "date": None, "endpoints": ["all"]}, "date should be"),
+        (
+            {"user_id": "test", "date": "current", "endpoints": ["all"], "bundle": 1},
+            "bundle should be true or false",
+        ),
+        (
+            {"user_id": "test", "date": "current", "endpoints": ["all"], "profile": 1},
+            "profile should be true or false",
+        ),
+        (
+            {"user_id": "test", "date": "current", "endpoints": "all"},
+            "Endpoints should be passed as a list",
+        ),
+        (
+            {"user_id": "test", "date": "current", "endpoints": ["all", "test"]},
+            "should be a dict",
+        ),
+        (
+            {"user_id": "test", "date": "current", "endpoints": [{"method": "GET"}]},
+            "does not have a name",
+        ),
+        (
+            {
+                "user_id": "test",
+                "date": "current",
+                "endpoints": [{"name": "test", "url_kwargs": "log_id"}],
+            },
+            "Endpoint url_kwargs should be a dict",
+        ),
+    ],
+)
+def test_check_parameters_bad_types(parameters, message) -> None:
+    """Test the structure and types of the parameters are checked"""
+    with pytest.raises(ValueError, match=message):
+        helper.check_parameters(parameters)
+
+
 def test_get_date_current() -> None:
     """_summary_"""
     parameters = {"date": "current"}
@@ -58,6 +147,12 @@ def test_get_date_current() -> None:
     assert expected_date == helper.get_date(parameters)
 
 
+def test_is_incremental() -> None:
+    """Test the incremental date option is detected"""
+    assert helper.is_incremental({"date": "incremental"})
+    assert not helper.is_incremental({"date": "current"})
+
+
 def test_get_date() -> None:
     """_summary_"""
     parameters = {"date": "2022-03-03"}
@@ -118,6 +213,21 @@ def test_get_config_parameter(config_file) -> None:
     assert value == expected_value
 
 
+def test_load_config_cached(tmp_path) -> None:
+    """Test the config file is only read once per path"""
+    config_path = str(tmp_path / "config.json")
+    with open(config_path, "w", encoding="utf-8") as file:
+        json.dump({"test_parameter": "first_value"}, file)
+
+    assert helper.get_config_parameter(config_path, "test_parameter") == "first_value"
+
+    with open(config_path, "w", encoding="utf-8") as file:
+        json.dump({"test_parameter": "second_value"}, file)
+
+    assert helper.get_config_parameter(config_path, "test_parameter") == "first_value"
+    assert helper.load_config(config_path) is helper.load_config(config_path)
+
+
 def test_get_config_parameter_bad_parameter_name(config_file) -> None:
     """Test the get_config_parameter help function when bad parameter"""
     parameter_name = "bad_parameter"
@@ -142,5 +252,33 @@ def test_get_config_parameter_bad_parameter_value(config_file) -> None:
         helper.get_config_parameter(config_file, parameter_name)
 
 
+def test_is_reserved_path() -> None:
+    """Test the is_reserved_path helper function"""
+    assert helper.is_reserved_path("manifests/activity_tcx.json")
+    assert helper.is_reserved_path(
+        "profiles/get_sleep_by_date/20230118/get_sleep_by_date_TESTUSER.json.transform.json"
+    )
+    assert helper.is_reserved_path(
+        "uploads/get_activity_tcx_by_id/20230118/TESTUSER_1234.tcx.0123abcd"
+    )
+    assert not helper.is_reserved_path(
+        "get_sleep_by_date/20230118/get_sleep_by_date_TESTUSER.json"
+    )
+
+
+def test_get_load_workers(monkeypatch) -> None:
+    """Test the get_load_workers helper function reads the environment variable"""
+    monkeypatch.delenv("FITBIT_LOAD_WORKERS", raising=False)
+    assert helper.get_load_workers() == 1
+
+    monkeypatch.setenv("FITBIT_LOAD_WORKERS", "3")
+    assert helper.get_load_workers() == 3
+
+    for value in ["0", "two", "-1"]:
+        monkeypatch.setenv("FITBIT_LOAD_WORKERS", value)
+        with pytest.raises(ValueError, match="should be a whole number"):
+            helper.get_load_workers()
+
+
 # def  test_() -> None:
 #     """_summary_"""
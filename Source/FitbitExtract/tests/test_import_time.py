@@ -0,0 +1,81 @@
+import json
+import os
+import subprocess
+import sys
+
+SOURCE_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG_TEMPLATE = os.path.join(
+    os.path.dirname(os.path.dirname(SOURCE_DIRECTORY)), "config_template.json"
+)
+
+# Checks the modules loaded rather than the import time, the time of a heavy library
+# being added back to a module loaded on every cold start is too small to catch
+CLOUD_CLIENT_MODULES = [
+    "google.cloud.bigquery",
+    "google.cloud.storage",
+    "google.cloud.pubsub_v1",
+]
+
+CHECK_MODULES = [
+    "google.cloud.bigquery",
+    "google.cloud.storage",
+    "google.cloud.pubsub_v1",
+    "google.cloud.secretmanager",
+    "cryptography",
+    "requests",
+    "fitbit.authorization",
+    "fitbit.requesters",
+]
+
+
+def import_in_subprocess(module_name: str, cwd: str = SOURCE_DIRECTORY) -> list:
+    """Import a module in a clean interpreter and report which heavy modules were loaded"""
+    script = (
+        "import json, sys\n"
+        f"import {module_name}\n"
+        f"loaded = [name for name in {CHECK_MODULES!r} if name in sys.modules]\n"
+        "print(json.dumps(loaded))\n"
+    )
+    environment = {**os.environ, "PYTHONPATH": SOURCE_DIRECTORY}
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True,
+        check=True,
+        cwd=cwd,
+        env=environment,
+        text=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_helper_functions() -> None:
+    """Test the shared helper module does not load any api or cloud clients"""
+    loaded = import_in_subprocess("helper.functions")
+    assert loaded == []
+
+
+def test_import_main(tmp_path) -> None:
+    """Test the cloud function entry module does not load any api or cloud clients"""
+    with open(CONFIG_TEMPLATE, encoding="UTF-8") as file:
+        config = {key: f"test_{value}" for key, value in json.load(file).items()}
+    with open(tmp_path / "config.json", "w", encoding="UTF-8") as file:
+        json.dump(config, file)
+
+    loaded = import_in_subprocess("main", cwd=str(tmp_path))
+    for module_name in CLOUD_CLIENT_MODULES:
+        assert module_name not in loaded
+
+
+def test_import_extract_functions() -> None:
+    """Test the extract path does not load the bigquery or pubsub clients"""
+    loaded = import_in_subprocess("helper.extractfunctions")
+    assert "google.cloud.bigquery" not in loaded
+    assert "google.cloud.pubsub_v1" not in loaded
+
+
+def test_import_transform_functions() -> None:
+    """Test the transform path does not load the token or api clients"""
+    loaded = import_in_subprocess("helper.transformfunctions")
+    assert "google.cloud.secretmanager" not in loaded
+    assert "fitbit.authorization" not in loaded
+    assert "fitbit.requesters" not in loaded
@@ -0,0 +1,133 @@
+import io
+import json
+import time
+import pytest
+from fitbit import instrumentation
+
+
+def test_metric_key() -> None:
+    """Test metric keys include the tags sorted by name"""
+    assert instrumentation.metric_key("extract") == "extract"
+    assert (
+        instrumentation.metric_key("load", {"table": "sleep", "attempt": 2})
+        == "load[attempt=2,table=sleep]"
+    )
+
+
+def test_local_metrics_sink() -> None:
+    """Test the local sink aggregates timings and counters by name and tags"""
+    metrics = instrumentation.LocalMetricsSink()
+    metrics.timing("load", 0.5, {"table": "sleep"})
+    metrics.timing("load", 0.25, {"table": "sleep"})
+    metrics.timing("load", 1.0, {"table": "heart_rate"})
+    metrics.increment("rows", 10, {"table": "sleep"})
+    metrics.increment("rows", 5, {"table": "sleep"})
+    metrics.increment("retries")
+
+    assert metrics.summary() == {
+        "timings": {
+            "load[table=sleep]": {"count": 2, "total": 0.75, "min": 0.25, "max": 0.5},
+            "load[table=heart_rate]": {
+                "count": 1,
+                "total": 1.0,
+                "min": 1.0,
+                "max": 1.0,
+            },
+        },
+        "counters": {"rows[table=sleep]": 15, "retries": 1},
+    }
+
+
+def test_json_log_metrics_sink() -> None:
+    """Test the json log sink writes a structured entry per metric with the context"""
+    stream = io.StringIO()
+    metrics = instrumentation.JSONLogMetricsSink({"function": "transform"}, stream)
+    metrics.increment("rows", 3, {"table": "sleep"})
+    metrics.timing("publish", 0.5)
+
+    entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    assert entries == [
+        {
+            "severity": "INFO",
+            "message": "counter rows[table=sleep] 3",
+            "metric": "rows",
+            "metric_type": "counter",
+            "value": 3,
+            "function": "transform",
+            "table": "sleep",
+        },
+        {
+            "severity": "INFO",
+            "message": "timing publish 0.5",
+            "metric": "publish",
+            "metric_type": "timing",
+            "value": 0.5,
+            "function": "transform",
+        },
+    ]
+
+
+def test_timer_records_when_raised() -> None:
+    """Test the timer records the time taken by a block that raises"""
+    metrics = instrumentation.LocalMetricsSink()
+
+    with pytest.raises(ValueError):
+        with instrumentation.timer(metrics, "transform", {"endpoint": "sleep"}):
+            raise ValueError("failed")
+
+    assert metrics.timings["transform[endpoint=sleep]"]["count"] == 1
+
+
+def test_ledger_metrics_sink() -> None:
+    """Test the ledger sink totals the metrics of a run into run ledger fields"""
+    ledger = instrumentation.LedgerMetricsSink()
+    local = instrumentation.LocalMetricsSink()
+    metrics = instrumentation.MultiMetricsSink([local, ledger])
+    metrics.timing("load", 0.25, {"table": "sleep"})
+    metrics.timing("load", 0.5, {"table": "sleep_detail"})
+    metrics.increment("rows", 2, {"table": "sleep"})
+    metrics.increment("rows", 30, {"table": "sleep_detail"})
+    metrics.increment("response_bytes", 100)
+    metrics.increment("retries")
+    metrics.increment("token_refreshes")
+
+    row = ledger.ledger_row("failed", ValueError("bad"))
+
+    assert row.pop("duration_seconds") > 0
+    assert row == {
+        "outcome": "failed",
+        "error": "ValueError('bad')",
+        "request_seconds": None,
+        "save_seconds": None,
+        "extract_seconds": None,
+        "transform_seconds": None,
+        "load_seconds": 0.75,
+        "refresh_rollup_seconds": None,
+        "publish_seconds": None,
+        "bytes_read": 100,
+        "retries": 1,
+        "rows_written": [
+            {"table_name": "sleep", "row_count": 2},
+            {"table_name": "sleep_detail", "row_count": 30},
+        ],
+    }
+    assert local.counters["token_refreshes"] == 1
+
+    ledger.reset()
+    assert ledger.ledger_row("success")["rows_written"] == []
+
+
+def test_timed_iterator() -> None:
+    """Test the TimedIterator counts the items and the time spent producing them"""
+
+    def slow_items():
+        for value in range(2):
+            time.sleep(0.05)
+            yield value
+
+    timed_items = instrumentation.TimedIterator(slow_items())
+
+    assert list(timed_items) == [0, 1]
+    assert timed_items.count == 2
+    assert timed_items.seconds >= 0.1
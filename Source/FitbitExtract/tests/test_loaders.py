@@ -1,5 +1,10 @@
+import json
+import threading
+import time
+from array import array
 import pytest
 from tests.fixtures import loader, test_data_path, test_data_path_tcx, session_temp
+from fitbit import loaders, constants, compression, instrumentation, serialization
 
 
 def test_extract(loader, test_data_path) -> None:
@@ -22,6 +27,39 @@ def test_extract_tcx(loader, test_data_path_tcx) -> None:
     assert results["xml_data"] == expected_results
 
 
+def test_extract_gzip(loader, tmp_path) -> None:
+    "Test the extract method of the LocalDataLoader class for a gzip compressed file"
+    data = {"field1": "value1", "field2": [1, 2]}
+    path = f"{tmp_path}/get_sleep_by_date_TEST.json.gz"
+    with open(path, "wb") as file:
+        file.write(compression.compress(json.dumps(data), "gzip"))
+
+    assert loader.extract(path) == data
+
+
+def test_extract_gzip_tcx(loader, tmp_path) -> None:
+    "Test the extract method of the LocalDataLoader class for a gzip compressed tcx file"
+    data = "<TrainingCenterDatabase></TrainingCenterDatabase>"
+    path = f"{tmp_path}/get_activity_tcx_by_id_TEST.tcx.gz"
+    with open(path, "wb") as file:
+        file.write(compression.compress(data, "gzip"))
+
+    assert loader.extract(path) == {"xml_data": data}
+
+
+def test_extract_ndjson(loader, tmp_path) -> None:
+    "Test the extract method of the LocalDataLoader class for a bundle file"
+    records = [
+        {"endpoint": "get_sleep_by_date"},
+        {"endpoint": "get_activity_tcx_by_id"},
+    ]
+    path = f"{tmp_path}/1_get_bundle_by_date_TEST.ndjson"
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("\n".join(json.dumps(record) for record in records) + "\n")
+
+    assert loader.extract(path) == {"records": records}
+
+
 def test_extract_bad_format(loader) -> None:
     "Test the extract method of the LocalDataLoader class for bad file format"
     file_extension = ".csv"
@@ -39,3 +77,399 @@ def test_load(loader, capsys) -> None:
     captured = capsys.readouterr()
     expected_value = "test_table {'name1': 'value1'}\ntest_table {'name2': 'value2'}\n"
     assert captured.out == expected_value
+
+
+def test_load_columns(loader, capsys) -> None:
+    """Test load_columns prints a row for each position with the constant columns repeated"""
+    columns = {"user_id": "ABC", "value": array("q", [1, 2])}
+
+    loader.load_columns(columns, "test_table")
+    captured = capsys.readouterr()
+    expected_value = "test_table {'user_id': 'ABC', 'value': 1}\ntest_table {'user_id': 'ABC', 'value': 2}\n"
+    assert captured.out == expected_value
+
+
+def test_load_stream(loader, capsys) -> None:
+    """Test load_stream loads a generator of rows in chunks of at most chunk_rows"""
+    loaded = []
+    loader.load_columns = lambda columns, name: loaded.append(columns.row_count)
+    rows = ({"user_id": "ABC", "value": value} for value in range(5))
+
+    loader.load_stream(rows, "test_table", chunk_rows=2)
+
+    assert loaded == [2, 2, 1]
+
+
+def test_iter_column_batches() -> None:
+    """Test iter_column_batches keeps the rows in order and yields no empty batches"""
+    rows = [{"value": value} for value in range(4)]
+
+    batches = list(loaders.iter_column_batches(rows, chunk_rows=2))
+
+    assert batches == [{"value": [0, 1]}, {"value": [2, 3]}]
+    assert list(loaders.iter_column_batches([], chunk_rows=2)) == []
+
+
+def test_column_row_count() -> None:
+    """Test the row count comes from the sequence columns and they must be the same length"""
+    assert loaders.column_row_count({"user_id": "ABC", "value": [1, 2, 3]}) == 3
+    assert loaders.column_row_count({"user_id": "ABC"}) == 0
+
+    with pytest.raises(ValueError, match="Columns have different lengths"):
+        loaders.column_row_count({"a": [1, 2], "b": [1]})
+
+
+def test_column_batch() -> None:
+    """Test a column batch keeps shared values as constants and the order of the rows"""
+    batch = loaders.ColumnBatch()
+    batch.append({"log_id": 1, "lap_number": 0, "heart_rate": 90, "user_id": "ABC"})
+    batch.append({"log_id": 1, "lap_number": 1, "heart_rate": 90, "user_id": "ABC"})
+    batch.append({"log_id": 1, "lap_number": 1, "user_id": "ABC", "altitude": 5.0})
+
+    assert batch == {
+        "log_id": 1,
+        "lap_number": [0, 1, 1],
+        "heart_rate": [90, 90, None],
+        "user_id": "ABC",
+        "altitude": [None, None, 5.0],
+    }
+    assert loaders.column_row_count(batch) == 3
+    assert list(loaders.iter_column_rows(batch))[2] == {
+        "log_id": 1,
+        "lap_number": 1,
+        "heart_rate": None,
+        "user_id": "ABC",
+        "altitude": 5.0,
+    }
+
+
+def test_column_batch_constants() -> None:
+    """Test a batch of identical rows is counted and values of another type are kept"""
+    batch = loaders.ColumnBatch()
+    assert loaders.column_row_count(batch) == 0
+
+    batch.append({"user_id": "ABC", "distance": 1, "tags": ["a"]})
+    batch.append({"user_id": "ABC", "distance": 1.0, "tags": ["a"]})
+
+    assert batch == {"user_id": "ABC", "distance": [1, 1.0], "tags": [["a"], ["a"]]}
+    assert isinstance(batch["distance"][1], float)
+
+    batch = loaders.ColumnBatch()
+    batch.append({"user_id": "ABC"})
+    batch.append({"user_id": "ABC"})
+    assert list(loaders.iter_column_rows(batch)) == [{"user_id": "ABC"}] * 2
+
+
+def test_columns_to_ndjson() -> None:
+    """Test columns_to_ndjson writes a json line per row"""
+    columns = {"user_id": "ABC", "value": array("d", [95.5, 96.0])}
+
+    file_obj = loaders.columns_to_ndjson(columns, serialization.StdlibSerializer())
+
+    assert file_obj.read() == (
+        b'{"user_id": "ABC", "value": 95.5}\n{"user_id": "ABC", "value": 96.0}\n'
+    )
+
+
+def test_columns_to_parquet() -> None:
+    """Test columns_to_parquet types the columns from the table metadata"""
+    pyarrow_parquet = pytest.importorskip("pyarrow.parquet")
+    columns = {
+        "user_id": "ABC",
+        "date": "2023-01-18",
+        "processed_date": "2023-02-03 12:31:38",
+        "date_time": ["2023-01-18 00:00:00", "2023-01-18 00:00:01"],
+        "heart_rate": array("q", [62, 63]),
+    }
+
+    file_obj = loaders.columns_to_parquet(columns, constants.HEART_RATE_INTRADAY_FIELDS)
+    table = pyarrow_parquet.read_table(file_obj)
+
+    assert table.column_names == list(columns)
+    assert str(table.schema.field("date").type) == "date32[day]"
+    assert str(table.schema.field("date_time").type) == "timestamp[us]"
+    assert table.column("heart_rate").to_pylist() == [62, 63]
+    assert table.column("user_id").to_pylist() == ["ABC", "ABC"]
+
+
+def test_create_row_ids() -> None:
+    """Test the create_row_ids function builds an id from the key fields"""
+    data = [
+        {"log_id": 1, "lap_number": 0, "point_order": 0, "value": "a"},
+        {"log_id": 1, "lap_number": 1, "point_order": 0, "value": "b"},
+    ]
+    row_ids = loaders.create_row_ids(data, ["log_id", "lap_number", "point_order"])
+
+    assert row_ids == ["1|0|0", "1|1|0"]
+
+
+def test_create_merge_query() -> None:
+    """Test the create_merge_query function"""
+    query = loaders.create_merge_query(
+        "project.dataset.summary",
+        "project.dataset.summary_staging",
+        ["user_id", "date"],
+        ["user_id", "date", "steps"],
+    )
+    expected_query = (
+        "MERGE `project.dataset.summary` T\n"
+        "USING (SELECT * FROM `project.dataset.summary_staging` WHERE TRUE "
+        "QUALIFY ROW_NUMBER() OVER (PARTITION BY user_id, date) = 1) S\n"
+        "ON T.user_id = S.user_id AND T.date = S.date\n"
+        "WHEN MATCHED THEN UPDATE SET user_id = S.user_id, date = S.date, steps = S.steps\n"
+        "WHEN NOT MATCHED THEN INSERT (user_id, date, steps) VALUES (S.user_id, S.date, S.steps)"
+    )
+
+    assert query == expected_query
+
+
+def test_create_merge_query_partition() -> None:
+    """Test the create_merge_query function only scans the partitions of the staging rows"""
+    query = loaders.create_merge_query(
+        "project.dataset.steps_intraday",
+        "project.dataset.steps_intraday_staging",
+        ["user_id", "date", "date_time"],
+        ["user_id", "date", "date_time", "steps"],
+        "date",
+    )
+
+    assert (
+        "ON T.user_id = S.user_id AND T.date = S.date AND T.date_time = S.date_time "
+        "AND T.date IN (SELECT DISTINCT date FROM "
+        "`project.dataset.steps_intraday_staging`)\n"
+    ) in query
+
+    query = loaders.create_merge_query(
+        "project.dataset.sleep",
+        "project.dataset.sleep_staging",
+        ["user_id", "log_id"],
+        ["user_id", "log_id", "date"],
+        "date",
+    )
+    assert "ON T.user_id = S.user_id AND T.log_id = S.log_id\n" in query
+
+
+def test_table_row_keys_partition() -> None:
+    """Test the keys of the detail tables include their partition field"""
+    for table_name in [
+        "sleep_detail",
+        "activity_detail",
+        "heart_rate_intraday",
+        "steps_intraday",
+        "spo2_intraday",
+    ]:
+        partition_field = constants.TABLE_LAYOUT_MAPPING[table_name]["partition_field"]
+        assert partition_field in constants.TABLE_ROW_KEYS[table_name]
+
+
+def test_table_row_keys_in_metadata() -> None:
+    """Test every row key is a column of its table"""
+    for table_name, key_fields in constants.TABLE_ROW_KEYS.items():
+        columns = [
+            field["bq_name"]
+            for field in constants.TABLE_NAME_METADATA_MAPPING[table_name].values()
+        ]
+        for key in key_fields:
+            assert key in columns
+
+
+def test_refresh_rollup(loader, capsys) -> None:
+    """Test the refresh_rollup method of the LocalDataLoader class"""
+    loader.refresh_rollup("daily_sleep", "TESTUSER", ["2023-01-18"])
+    captured = capsys.readouterr()
+
+    assert captured.out == "refresh rollup daily_sleep for TESTUSER on ['2023-01-18']\n"
+
+
+def test_create_rollup_source_query() -> None:
+    """Test the create_rollup_source_query function for a table with and without user_id"""
+    query = loaders.create_rollup_source_query("project.dataset", "sleep")
+    expected_query = (
+        "(SELECT * FROM `project.dataset.sleep` WHERE date IN UNNEST(@dates) "
+        "AND user_id = @user_id QUALIFY ROW_NUMBER() OVER "
+        "(PARTITION BY user_id, log_id ORDER BY processed_date DESC) = 1)"
+    )
+    assert query == expected_query
+
+    query = loaders.create_rollup_source_query("project.dataset", "sleep_detail")
+    expected_query = (
+        "(SELECT * FROM `project.dataset.sleep_detail` WHERE date IN UNNEST(@dates) "
+        "QUALIFY ROW_NUMBER() OVER (PARTITION BY date, log_id, type, date_time) = 1)"
+    )
+    assert query == expected_query
+
+
+def test_create_rollup_query() -> None:
+    """Test the create_rollup_query function"""
+    query = loaders.create_rollup_query("project.dataset", "daily_activity")
+    source_query = loaders.create_rollup_source_query("project.dataset", "activity")
+    expected_query = (
+        "MERGE `project.dataset.daily_activity` T\n"
+        "USING (SELECT activity.user_id AS user_id, activity.date AS date, "
+        "CURRENT_TIMESTAMP() AS processed_date, "
+        "COUNT(DISTINCT activity.log_id) AS activity_count, "
+        "SUM(activity.duration) / 60000 AS duration_minutes, "
+        "SUM(activity.calories) AS calories, SUM(activity.steps) AS steps "
+        f"FROM {source_query} AS activity GROUP BY user_id, date) S\n"
+        "ON T.user_id = S.user_id AND T.date = S.date\n"
+        "WHEN MATCHED THEN UPDATE SET user_id = S.user_id, date = S.date, "
+        "processed_date = S.processed_date, activity_count = S.activity_count, "
+        "duration_minutes = S.duration_minutes, calories = S.calories, steps = S.steps\n"
+        "WHEN NOT MATCHED THEN INSERT (user_id, date, processed_date, activity_count, "
+        "duration_minutes, calories, steps) VALUES (S.user_id, S.date, S.processed_date, "
+        "S.activity_count, S.duration_minutes, S.calories, S.steps)\n"
+        "WHEN NOT MATCHED BY SOURCE AND T.user_id = @user_id "
+        "AND T.date IN UNNEST(@dates) THEN DELETE"
+    )
+
+    assert query == expected_query
+
+
+def test_create_rollup_query_filter() -> None:
+    """Test the create_rollup_query function for a rollup with a join and filter"""
+    query = loaders.create_rollup_query("project.dataset", "daily_sleep")
+
+    assert "AS detail JOIN (SELECT * FROM `project.dataset.sleep`" in query
+    assert "AS sleep USING (log_id) WHERE detail.type = 'data' GROUP BY" in query
+
+
+def test_instrumented_data_loader(loader, capsys) -> None:
+    "Test the InstrumentedDataLoader times each load and counts the rows per table"
+    metrics = instrumentation.LocalMetricsSink()
+    instrumented = loaders.InstrumentedDataLoader(loader, metrics)
+
+    instrumented.load([{"value": 1}, {"value": 2}], "sleep")
+    instrumented.load_columns({"value": array("q", [1, 2, 3])}, "steps_intraday")
+    instrumented.load_stream(
+        ({"value": value} for value in range(3)), "sleep_detail", chunk_rows=2
+    )
+    instrumented.refresh_rollup("daily_summary", "TESTUSER", ["2023-01-18"])
+
+    assert capsys.readouterr().out.count("\n") == 9
+    assert metrics.counters == {
+        "rows[table=sleep]": 2,
+        "rows[table=steps_intraday]": 3,
+        "rows[table=sleep_detail]": 3,
+    }
+    assert [key for key in metrics.timings] == [
+        "load[table=sleep]",
+        "load[table=steps_intraday]",
+        "load[table=sleep_detail]",
+        "transform[table=sleep_detail]",
+        "refresh_rollup[table=daily_summary]",
+    ]
+    assert metrics.timings["load[table=sleep_detail]"]["count"] == 1
+
+
+def test_instrumented_data_loader_stream(loader, capsys) -> None:
+    "Test the InstrumentedDataLoader passes a stream on whole timing the rows as transform"
+    metrics = instrumentation.LocalMetricsSink()
+    instrumented = loaders.InstrumentedDataLoader(loader, metrics)
+    streams = []
+    load_stream = loader.load_stream
+
+    def record_stream(rows, name: str, chunk_rows: int) -> None:
+        streams.append(name)
+        load_stream(rows, name, chunk_rows)
+
+    def slow_rows():
+        for value in range(3):
+            time.sleep(0.05)
+            yield {"value": value}
+
+    loader.load_stream = record_stream
+    instrumented.load_stream(slow_rows(), "sleep_detail", chunk_rows=2)
+
+    assert streams == ["sleep_detail"]
+    assert capsys.readouterr().out.count("\n") == 3
+    assert metrics.counters == {"rows[table=sleep_detail]": 3}
+    assert metrics.timings["load[table=sleep_detail]"]["total"] < 0.1
+    assert metrics.timings["transform[table=sleep_detail]"]["total"] >= 0.15
+
+
+def test_concurrent_data_loader(loader, capsys) -> None:
+    "Test the ConcurrentDataLoader runs the loads of a file at the same time"
+    # Each load waits for the other, so they time out if they are run in turn
+    barrier = threading.Barrier(2, timeout=5)
+    load = loader.load
+
+    def load_together(data: list[dict], name: str) -> None:
+        barrier.wait()
+        load(data, name)
+
+    loader.load = load_together
+    concurrent = loaders.ConcurrentDataLoader(loader, workers=2)
+    concurrent.load([{"value": 1}], "activity")
+    concurrent.load([{"value": 2}], "goals")
+    concurrent.wait()
+
+    assert sorted(capsys.readouterr().out.splitlines()) == [
+        "activity {'value': 1}",
+        "goals {'value': 2}",
+    ]
+    assert concurrent.executor is None
+
+
+def test_concurrent_data_loader_same_table(loader, capsys) -> None:
+    "Test the ConcurrentDataLoader runs the loads into the same table in turn"
+    running = []
+    overlaps = []
+
+    def load(data: list[dict], name: str) -> None:
+        running.append(name)
+        if running.count(name) > 1:
+            overlaps.append(name)
+        time.sleep(0.05)
+        running.remove(name)
+
+    loader.load = load
+    concurrent = loaders.ConcurrentDataLoader(loader, workers=3)
+    for name in ["activity_detail", "activity_detail", "activity_detail", "goals"]:
+        concurrent.load([{"value": 1}], name)
+    concurrent.wait()
+
+    assert overlaps == []
+
+
+def test_concurrent_data_loader_errors(loader, capsys) -> None:
+    "Test the ConcurrentDataLoader reports the failed loads once every load has finished"
+
+    def load(data: list[dict], name: str) -> None:
+        if name != "summary":
+            raise ValueError(f"{name} failed")
+        print(name, data)
+
+    loader.load = load
+    concurrent = loaders.ConcurrentDataLoader(loader, workers=2)
+    for name in ["activity", "goals", "summary"]:
+        concurrent.load([{"value": 1}], name)
+
+    with pytest.raises(ValueError, match="2 of 3 loads failed"):
+        concurrent.wait()
+    assert capsys.readouterr().out == "summary [{'value': 1}]\n"
+
+    concurrent.load([{"value": 1}], "activity")
+    with pytest.raises(ValueError, match="activity failed"):
+        concurrent.wait()
+
+    concurrent.load([{"value": 1}], "goals")
+    concurrent.wait(raise_errors=False)
+    assert concurrent.pending == []
+
+    with pytest.raises(ValueError, match="should be at least 1"):
+        loaders.ConcurrentDataLoader(loader, workers=0)
+
+
+def test_concurrent_data_loader_refresh_rollup(loader, capsys) -> None:
+    "Test the ConcurrentDataLoader finishes the loads before refreshing a rollup"
+    concurrent = loaders.ConcurrentDataLoader(loader, workers=3)
+    concurrent.load_stream(
+        ({"value": value} for value in range(5)), "sleep_detail", chunk_rows=2
+    )
+    concurrent.refresh_rollup("daily_sleep", "TESTUSER", ["2023-01-18"])
+
+    lines = capsys.readouterr().out.splitlines()
+    assert sorted(lines[:-1]) == [
+        f"sleep_detail {{'value': {value}}}" for value in range(5)
+    ]
+    assert lines[-1] == "refresh rollup daily_sleep for TESTUSER on ['2023-01-18']"
@@ -0,0 +1,197 @@
+import json
+import os
+
+from google.api_core.exceptions import PreconditionFailed, TooManyRequests
+import pytest
+
+from tests.fixtures import (  # pylint: disable=W0611
+    local_fetch_manifest,
+    local_object_index,
+)
+from fitbit import manifests
+
+
+class FakeBlob:
+    """A storage blob held in a FakeBucket, only the calls used by the manifests"""
+
+    def __init__(self, bucket, name: str) -> None:
+        self.bucket = bucket
+        self.name = name
+        self.generation = None
+
+    def download_as_bytes(self) -> bytes:
+        return self.bucket.objects[self.name][0]
+
+    def upload_from_string(
+        self, data: str, content_type: str, if_generation_match: int
+    ) -> None:
+        if self.bucket.errors:
+            raise self.bucket.errors.pop(0)
+        _, generation = self.bucket.objects.get(self.name, (None, 0))
+        if generation != if_generation_match:
+            raise PreconditionFailed("generation does not match")
+        self.generation = generation + 1
+        self.bucket.objects[self.name] = (data.encode("utf-8"), self.generation)
+
+
+class FakeBucket:
+    """An in memory storage bucket that raises the queued errors on upload"""
+
+    def __init__(self) -> None:
+        self.objects = {}
+        self.errors = []
+
+    def blob(self, name: str) -> FakeBlob:
+        return FakeBlob(self, name)
+
+    def get_blob(self, name: str) -> FakeBlob:
+        if name not in self.objects:
+            return None
+        blob = FakeBlob(self, name)
+        blob.generation = self.objects[name][1]
+        return blob
+
+
+######################################
+# Test the LocalFetchManifest Class #
+######################################
+def test_local_fetch_manifest_get_missing(local_fetch_manifest) -> None:
+    """Test the get method of LocalFetchManifest when the key has not been recorded"""
+    assert local_fetch_manifest.get("TESTUSER_1") is None
+
+
+def test_local_fetch_manifest_update(local_fetch_manifest) -> None:
+    """Test the update method of LocalFetchManifest saves the entry to file"""
+    entry = {"last_modified": "2023-01-17T21:14:42.000Z", "fetched": False}
+    local_fetch_manifest.update("TESTUSER_1", entry)
+
+    assert os.path.exists(local_fetch_manifest.full_path)
+    with open(local_fetch_manifest.full_path, "r", encoding="utf-8") as file:
+        saved_data = json.load(file)
+
+    assert saved_data == {"TESTUSER_1": entry}
+    assert local_fetch_manifest.get("TESTUSER_1") == entry
+
+
+def test_local_fetch_manifest_update_merges(local_fetch_manifest) -> None:
+    """Test the update method of LocalFetchManifest merges with the existing entry"""
+    local_fetch_manifest.update("TESTUSER_1", {"last_modified": "a", "fetched": False})
+    local_fetch_manifest.update("TESTUSER_1", {"fetched": True})
+
+    assert local_fetch_manifest.get("TESTUSER_1") == {
+        "last_modified": "a",
+        "fetched": True,
+    }
+
+
+def test_local_fetch_manifest_reload(local_fetch_manifest) -> None:
+    """Test a new LocalFetchManifest object reads entries saved by another"""
+    local_fetch_manifest.update("TESTUSER_1", {"fetched": True})
+
+    new_manifest = manifests.LocalFetchManifest(
+        local_fetch_manifest.base_location, "activity_tcx"
+    )
+
+    assert new_manifest.get("TESTUSER_1") == {"fetched": True}
+
+
+#####################################
+# Test the LocalObjectIndex Class #
+#####################################
+def test_local_object_index_get_missing(local_object_index) -> None:
+    """Test the get method of LocalObjectIndex when the path has not been recorded"""
+    assert local_object_index.get("20230118/get_sleep_by_date_TESTUSER.json") is None
+
+
+def test_local_object_index_update(local_object_index) -> None:
+    """Test the update method of LocalObjectIndex merges entries for a path"""
+    path = "20230118/get_sleep_by_date_TESTUSER.json"
+    local_object_index.update(
+        path,
+        {
+            "content_hash": "abc",
+            "size": 10,
+            "fetched_date": "2023-01-18 10:00:00",
+            "processed": False,
+        },
+    )
+    local_object_index.update(
+        path, {"processed": True, "processed_date": "2023-01-18 10:01:00"}
+    )
+
+    assert local_object_index.get(path) == {
+        "content_hash": "abc",
+        "size": 10,
+        "fetched_date": "2023-01-18 10:00:00",
+        "processed": True,
+        "processed_date": "2023-01-18 10:01:00",
+    }
+
+
+def test_local_object_index_reload(local_object_index) -> None:
+    """Test entries are read by a new LocalObjectIndex object"""
+    path = "20230118/get_sleep_by_date_TESTUSER.json"
+    local_object_index.update(path, {"processed": True})
+
+    new_index = manifests.LocalObjectIndex(local_object_index.database_path)
+
+    assert new_index.get(path) == {"processed": True}
+
+
+def test_local_object_index_bad_field(local_object_index) -> None:
+    """Test the update method of LocalObjectIndex rejects unknown fields"""
+    with pytest.raises(KeyError, match="are not object index fields"):
+        local_object_index.update("path", {"bad_field": 1})
+
+
+def test_index_month() -> None:
+    """Test the month partition of an object path"""
+    path = "get_sleep_by_date/20230118/get_sleep_by_date_TESTUSER.json"
+    assert manifests.index_month(path) == "202301"
+    assert manifests.index_month("get_sleep_by_date/file.json") == "undated"
+
+
+####################################
+# Test the GCPFetchManifest Class #
+####################################
+
+
+def test_gcp_fetch_manifest_object_per_key() -> None:
+    """Test the GCP fetch manifest stores each key in its own object"""
+    bucket = FakeBucket()
+    manifest = manifests.GCPFetchManifest(
+        "bucket", "project", "activity_tcx", 0, bucket
+    )
+    manifest.update("TESTUSER_1", {"fetched": False})
+    manifest.update("TESTUSER_1", {"fetched": True})
+    manifest.update("TESTUSER_2", {"fetched": True})
+
+    assert sorted(bucket.objects) == [
+        "manifests/activity_tcx/TESTUSER_1.json",
+        "manifests/activity_tcx/TESTUSER_2.json",
+    ]
+    new_manifest = manifests.GCPFetchManifest(
+        "bucket", "project", "activity_tcx", 0, bucket
+    )
+    assert new_manifest.get("TESTUSER_1") == {"fetched": True}
+    assert new_manifest.get("TESTUSER_3") is None
+
+
+def test_gcp_fetch_manifest_retries() -> None:
+    """Test the GCP fetch manifest retries rate limits and concurrent updates of a key"""
+    bucket = FakeBucket()
+    manifest = manifests.GCPFetchManifest("bucket", "project", "sync", 3, bucket)
+    other_manifest = manifests.GCPFetchManifest("bucket", "project", "sync", 3, bucket)
+    manifest.get("TESTUSER_1")
+    other_manifest.update("TESTUSER_1", {"last_modified": "a"})
+
+    bucket.errors = [TooManyRequests("rate limited")]
+    manifest.update("TESTUSER_1", {"fetched": True})
+
+    assert other_manifest._load_entry("TESTUSER_1") == {
+        "last_modified": "a",
+        "fetched": True,
+    }
+    bucket.errors = [TooManyRequests("rate limited")] * 4
+    with pytest.raises(Exception, match="Could not update manifest after 3 retries"):
+        manifest.update("TESTUSER_1", {"fetched": False})
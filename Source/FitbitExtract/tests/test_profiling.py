@@ -0,0 +1,81 @@
+import json
+from datetime import datetime
+import pytest
+from tests.fixtures import fitbitcaller, local_response_saver, api_token
+from tests.fixtures import testing_token_manager, api_credentials
+from tests.fixtures import loader, messenger, test_data_path, session_temp
+from fitbit import constants, profiling, transformers
+from fitbit.instrumentation import LocalMetricsSink
+
+
+def test_profiling_enabled(monkeypatch) -> None:
+    """Test profiling is enabled by the run or the environment variable"""
+    monkeypatch.delenv(constants.PROFILE_ENV_VAR, raising=False)
+    assert not profiling.profiling_enabled()
+    assert profiling.profiling_enabled(True)
+
+    monkeypatch.setenv(constants.PROFILE_ENV_VAR, "true")
+    assert profiling.profiling_enabled()
+
+
+def test_profile_path() -> None:
+    """Test profiles are placed under the reserved profiles folder"""
+    path = "get_sleep_by_date/20230118/get_sleep_by_date_TESTUSER.json"
+    assert (
+        profiling.profile_path(path, "transform") == f"profiles/{path}.transform.json"
+    )
+    assert constants.PROFILES_FOLDER in constants.RESERVED_FOLDERS
+
+
+def test_profile_disabled(tmp_path) -> None:
+    """Test nothing is written and the metrics sink is passed through when disabled"""
+    metrics = LocalMetricsSink()
+    writer = profiling.LocalProfileWriter(str(tmp_path))
+
+    with profiling.profile(writer, "profiles/test.json", metrics, False) as sink:
+        assert sink is metrics
+
+    assert not list(tmp_path.iterdir())
+
+
+def test_profile_transform(tmp_path, loader, messenger, capsys, test_data_path) -> None:
+    """Test a profiled transform writes its cpu profile and allocation sites"""
+    file_path, _ = test_data_path
+    metrics = LocalMetricsSink()
+    writer = profiling.LocalProfileWriter(str(tmp_path))
+    path = profiling.profile_path("get_cardio_score_by_date_TESTUSER.json", "transform")
+
+    with profiling.profile(writer, path, metrics) as sink:
+        transformer = transformers.FitbitETL(loader, messenger, metrics=sink)
+        transformer.process(file_path)
+    capsys.readouterr()
+
+    with open(tmp_path / path, "r", encoding="utf-8") as file:
+        report = json.load(file)
+
+    assert report["path"] == path
+    assert report["peak_bytes"] >= report["snapshot_bytes"] > 0
+    assert report["allocations"]
+    assert any("process" in function["function"] for function in report["functions"])
+    assert "rows[table=cardioscore]" in metrics.counters
+    limit = len(report["functions"])
+    assert "transform_load_data" in profiling.format_report(report, limit)
+
+
+def test_profile_caller_error(tmp_path, fitbitcaller) -> None:
+    """Test the profile of a failed caller run is written with the error"""
+    writer = profiling.LocalProfileWriter(str(tmp_path))
+    path = profiling.profile_path("20230117/TESTUSER", "extract")
+
+    with pytest.raises(Exception, match="No endpoints have been registered"):
+        with profiling.profile(writer, path) as sink:
+            fitbitcaller.metrics = sink
+            fitbitcaller.make_registered_requests_for_date(
+                datetime.strptime("2023-01-17", "%Y-%m-%d").date()
+            )
+
+    with open(tmp_path / path, "r", encoding="utf-8") as file:
+        report = json.load(file)
+
+    assert report["error"] == "Exception('No endpoints have been registered')"
+    assert "failed with" in profiling.format_report(report)
@@ -1,5 +1,14 @@
+import gzip
+import json
+import os
+from datetime import datetime
+from http import HTTPStatus
 import pytest
 from tests.fixtures import requester  # pylint: disable=W0611
+from tests import fixtures
+from tests.fixtures import fake_fitbit_api, fake_api_caller, local_response_saver
+from tests.fixtures import api_token, api_credentials, testing_token_manager
+from fitbit import caller, requesters, savers
 
 
 def test_make_request_get(requester) -> None:
@@ -24,3 +33,164 @@ def test_make_request_bad_status(capsys, requester) -> None:
     assert message == "403 Forbidden"
     assert code == 403
     assert "https://httpstat.us/403 403 403 Forbidden\n" == captured.out
+
+
+def test_make_request_accept_encoding(requests_mock, requester) -> None:
+    test_url = "https://api.fitbit.com/1/user/-/sleep/date/2023-01-18.json"
+    requests_mock.get(test_url, text='{"sleep": []}')
+
+    requester.make_request("GET", test_url, {"authorization": "Bearer token"}, {})
+
+    request_headers = requests_mock.last_request.headers
+    assert request_headers["Accept-Encoding"] == "gzip"
+    assert request_headers["authorization"] == "Bearer token"
+
+
+def test_make_stream_request(requests_mock, requester) -> None:
+    test_url = "https://api.fitbit.com/1/user/-/activities/1234.tcx"
+    requests_mock.get(test_url, content=b"<TrainingCenterDatabase/>")
+
+    chunks, code = requester.make_stream_request("GET", test_url, {}, {})
+
+    assert b"".join(chunks) == b"<TrainingCenterDatabase/>"
+    assert code == 200
+
+
+def test_make_stream_request_bad_status(capsys, requests_mock, requester) -> None:
+    test_url = "https://api.fitbit.com/1/user/-/activities/1234.tcx"
+    requests_mock.get(test_url, status_code=403, text="Forbidden")
+
+    chunks, code = requester.make_stream_request("GET", test_url, {}, {})
+
+    assert list(chunks) == []
+    assert code == 403
+    assert capsys.readouterr().out == f"{test_url} 403 Forbidden\n"
+
+
+def test_make_stream_request_bad_method(requester) -> None:
+    with pytest.raises(ValueError, match="Invalid method"):
+        requester.make_stream_request("BD_METHOD", "", {}, {})
+
+
+def test_recording_requester(tmp_path) -> None:
+    """Test the recording requester saves each exchange without the authorization header"""
+    cassette = str(tmp_path / "cassette.ndjson.gz")
+    inner = fixtures.TestingFitbitRequester()
+    inner.response = '{"user": "ABC123"}'
+    url = "https://api.fitbit.com/1/user/ABC123/sleep/date/2023-01-18.json"
+    headers = {"authorization": "Bearer secret", "Accept-Language": "en_AU"}
+
+    with requesters.RecordingRequester(inner, cassette, {"ABC123": "USER1"}) as rec:
+        data, status = rec.make_request("GET", url, headers, {})
+
+    assert (data, status) == ('{"user": "ABC123"}', HTTPStatus.OK)
+    with gzip.open(cassette, "rt", encoding="utf-8") as file:
+        exchanges = [json.loads(line) for line in file]
+    assert len(exchanges) == 1
+    assert exchanges[0]["url"] == (
+        "https://api.fitbit.com/1/user/USER1/sleep/date/2023-01-18.json"
+    )
+    assert exchanges[0]["headers"] == {"Accept-Language": "en_AU"}
+    assert exchanges[0]["body"] == '{"user": "USER1"}'
+    assert exchanges[0]["status"] == 200
+    assert exchanges[0]["elapsed"] >= 0
+
+
+def test_replay_requester(tmp_path) -> None:
+    """Test exchanges for a url are replayed in the recorded order then repeated"""
+    cassette = str(tmp_path / "cassette.ndjson.gz")
+    inner = fixtures.TestingFitbitRequester()
+    inner.http_status = HTTPStatus.TOO_MANY_REQUESTS
+    url = "https://api.fitbit.com/1/user/USER1/activities/1234.tcx"
+
+    with requesters.RecordingRequester(inner, cassette) as rec:
+        rec.make_request("GET", url, {}, {})
+        chunks, _ = rec.make_stream_request("GET", url, {}, {})
+        list(chunks)
+
+    replay = requesters.ReplayRequester(cassette)
+    assert replay.make_stream_request("GET", url, {}, {})[1] == 429
+    chunks, status = replay.make_stream_request("GET", url, {}, {})
+    assert (b"".join(chunks), status) == (inner.response.encode("utf-8"), 200)
+    assert replay.make_request("GET", url, {}, {})[1] == 429
+
+    with pytest.raises(KeyError, match="No recorded response for GET other"):
+        replay.make_request("GET", "other", {}, {})
+
+
+def test_replay_requester_timing(tmp_path, monkeypatch) -> None:
+    """Test the recorded response time is scaled by the timing multiple"""
+    cassette = str(tmp_path / "cassette.ndjson.gz")
+    exchange = {
+        "method": "GET",
+        "url": "url",
+        "status": 200,
+        "headers": {},
+        "body": "{}",
+        "elapsed": 0.5,
+    }
+    with gzip.open(cassette, "wt", encoding="utf-8") as file:
+        file.write(json.dumps(exchange) + "\n")
+    sleeps = []
+    monkeypatch.setattr(requesters.time, "sleep", sleeps.append)
+
+    requesters.ReplayRequester(cassette).make_request("GET", "url", {}, {})
+    requesters.ReplayRequester(cassette, timing=2.0).make_request("GET", "url", {}, {})
+
+    assert sleeps == [1.0]
+
+
+def test_record_replay_pipeline(
+    tmp_path, fake_api_caller, api_token, testing_token_manager
+) -> None:
+    """Test a run recorded from the fake api replays to the same saved responses"""
+    date = datetime.strptime("2023-01-18", "%Y-%m-%d").date()
+    endpoints = [
+        caller.EndpointParameters("get_sleep_by_date"),
+        caller.EndpointParameters(
+            "get_activity_tcx_by_id", "GET", "tcx", {"log_id": 1}
+        ),
+    ]
+    cassette = str(tmp_path / "cassette.ndjson.gz")
+    fake_api_caller.refresh_access_token()
+    fake_api_caller.requester = requesters.RecordingRequester(
+        fake_api_caller.requester, cassette, {"test_user": "USER1"}
+    )
+    fake_api_caller.stream_formats = ["tcx"]
+    fake_api_caller.register_multiple_endpoints(endpoints)
+    fake_api_caller.make_registered_requests_for_date(date)
+    fake_api_caller.requester.close()
+
+    api_token.user_id = "USER1"
+    api_token.access_token_isvalid = True
+    replay_saver = savers.LocalResponseSaver(str(tmp_path / "replay"))
+    replay_caller = caller.FitBitCaller(
+        api_token,
+        replay_saver,
+        requesters.ReplayRequester(cassette),
+        testing_token_manager,
+        stream_formats=["tcx"],
+        web_api_url=fake_api_caller.web_api_url,
+    )
+    replay_caller.register_multiple_endpoints(endpoints)
+    replay_caller.make_registered_requests_for_date(date)
+
+    for folder, file_name in [
+        ("get_sleep_by_date", "get_sleep_by_date"),
+        ("get_activity_tcx_by_id", "1_get_activity_tcx_by_id"),
+    ]:
+        extension = "tcx" if "tcx" in folder else "json"
+        with open(
+            tmp_path / folder / "20230118" / f"{file_name}_test_user.{extension}",
+            encoding="utf-8",
+        ) as file:
+            original = file.read()
+        with open(
+            tmp_path
+            / "replay"
+            / folder
+            / "20230118"
+            / f"{file_name}_USER1.{extension}",
+            encoding="utf-8",
+        ) as file:
+            assert file.read() == original
@@ -0,0 +1,51 @@
+import json
+import pytest
+from fitbit import serialization
+
+ROW = {"user_id": "ABC", "date_time": "2023-01-18 00:00:00", "value": 95.5, "tag": None}
+
+
+def test_stdlib_serializer() -> None:
+    """Test the stdlib serializer matches the json module output"""
+    serializer = serialization.StdlibSerializer()
+
+    assert serializer.dumps(ROW) == json.dumps(ROW).encode("utf-8")
+    assert serializer.dumps_line(ROW) == json.dumps(ROW).encode("utf-8") + b"\n"
+    assert serializer.loads(serializer.dumps(ROW)) == ROW
+    assert serializer.loads(json.dumps(ROW)) == ROW
+
+
+def test_orjson_serializer() -> None:
+    """Test the orjson serializer round trips the same values as the json module"""
+    pytest.importorskip("orjson")
+    serializer = serialization.OrjsonSerializer()
+
+    assert json.loads(serializer.dumps(ROW)) == ROW
+    assert serializer.dumps_line(ROW).endswith(b"}\n")
+    assert serializer.loads(json.dumps(ROW)) == ROW
+    assert serializer.loads(json.dumps(ROW).encode("utf-8")) == ROW
+
+
+def test_orjson_serializer_not_installed(monkeypatch) -> None:
+    """Test the default serializer falls back to the json module without orjson"""
+    monkeypatch.setattr(serialization, "orjson", None)
+
+    with pytest.raises(ImportError, match="requires the orjson package"):
+        serialization.OrjsonSerializer()
+    assert isinstance(
+        serialization.default_serializer(), serialization.StdlibSerializer
+    )
+
+
+def test_write_ndjson() -> None:
+    """Test write_ndjson writes a json line per row to a byte buffer"""
+    rows = [ROW, {"user_id": "ABC", "value": 96}]
+
+    file_obj = serialization.write_ndjson(rows, serialization.StdlibSerializer())
+
+    assert file_obj.read() == (
+        b'{"user_id": "ABC", "date_time": "2023-01-18 00:00:00", "value": 95.5, "tag": null}\n'
+        b'{"user_id": "ABC", "value": 96}\n'
+    )
+    default_file_obj = serialization.write_ndjson(rows)
+    assert [json.loads(line) for line in default_file_obj] == rows
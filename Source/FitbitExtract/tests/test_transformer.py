@@ -1,11 +1,17 @@
+import ast
+import json
+import os
 import re
+import time
 from datetime import datetime
 import pytest
-from tests.fixtures import transformer, loader, messenger
+from tests.fixtures import transformer, loader, messenger, local_fetch_manifest
+from tests.fixtures import local_object_index
 from tests.fixtures import test_data_path, test_data_path_tcx, session_temp
 from tests.fixtures import testing_data_dictionarys
 from fitbit.caller import EndpointParameters
-from fitbit import transformers
+from fitbit import constants, loaders, transformers, xmlparsing
+from fitbit.instrumentation import LocalMetricsSink
 
 
 def test_flattern_dictionary() -> None:
@@ -78,6 +84,20 @@ def test_get_details_from_path(transformer) -> None:
     assert transformer.date == datetime.strptime(date, "%Y%m%d").date()
 
 
+def test_get_details_from_path_compressed(transformer) -> None:
+    """Tests the get details from path method of FitBitETL class with a compressed file"""
+    user_id = "TEST123"
+    endpoint = "get_activity_tcx_by_id"
+    path = f"{endpoint}/20230118/53177087392_{endpoint}_{user_id}.tcx.gz"
+
+    transformer.get_details_from_path(path)
+
+    assert transformer.user_id == user_id
+    assert transformer.endpoint == endpoint
+    assert transformer.instance_id == 53177087392
+    assert transformer.path == path
+
+
 def test_get_details_from_path_bad_endpoint(transformer) -> None:
     """Tests the get details from path method of FitBitETL class for none valid endpoint string"""
     user_id = "TEST123"
@@ -176,33 +196,351 @@ def test_call_additional_endpoints(transformer, capsys) -> None:
     assert captured.out == expected_value
 
 
+def test_refresh_rollups(transformer, capsys) -> None:
+    """Tests the refresh_rollups method of the FitBitETL class"""
+    transformer.date = datetime.strptime("2023-01-18", "%Y-%m-%d").date()
+    transformer.user_id = "TESTUSER"
+    transformer.endpoint = "get_sleep_by_date"
+    transformer.refresh_rollups()
+    captured = capsys.readouterr()
+
+    assert captured.out == "refresh rollup daily_sleep for TESTUSER on ['2023-01-18']\n"
+
+
+def test_refresh_rollups_none(transformer, capsys) -> None:
+    """Tests the refresh_rollups method of the FitBitETL class for an endpoint without rollups"""
+    transformer.date = datetime.strptime("2023-01-18", "%Y-%m-%d").date()
+    transformer.user_id = "TESTUSER"
+    transformer.endpoint = "get_cardio_score_by_date"
+    transformer.refresh_rollups()
+    captured = capsys.readouterr()
+
+    assert captured.out == ""
+
+
+def test_deduplicate_additional_endpoints_no_manifest(transformer) -> None:
+    """Tests the deduplicate_additional_endpoints method of the FitBitETL class without a manifest"""
+    endpoints = [
+        EndpointParameters("get_activity_tcx_by_id", url_kwargs={"log_id": 1}),
+    ]
+    transformer.additional_api_calls = endpoints
+    transformer.deduplicate_additional_endpoints()
+
+    assert transformer.additional_api_calls == endpoints
+
+
+def test_deduplicate_additional_endpoints(transformer, local_fetch_manifest) -> None:
+    """Tests the deduplicate_additional_endpoints method of the FitBitETL class"""
+    transformer.fetch_manifest = local_fetch_manifest
+    transformer.user_id = "TESTUSER"
+    local_fetch_manifest.update(
+        "TESTUSER_1", {"last_modified": "2023-01-17T21:14:42.000Z", "fetched": True}
+    )
+    local_fetch_manifest.update(
+        "TESTUSER_2", {"last_modified": "2023-01-16T10:00:00.000Z", "fetched": True}
+    )
+    local_fetch_manifest.update(
+        "TESTUSER_3", {"last_modified": "2023-01-17T21:14:42.000Z", "fetched": False}
+    )
+    unchanged = EndpointParameters("get_activity_tcx_by_id", url_kwargs={"log_id": 1})
+    modified = EndpointParameters("get_activity_tcx_by_id", url_kwargs={"log_id": 2})
+    not_fetched = EndpointParameters("get_activity_tcx_by_id", url_kwargs={"log_id": 3})
+    missing = EndpointParameters("get_activity_tcx_by_id", url_kwargs={"log_id": 4})
+    other = EndpointParameters("get_heart_rate_by_date")
+    transformer.additional_api_calls = [
+        unchanged,
+        modified,
+        not_fetched,
+        missing,
+        other,
+    ]
+    transformer.activity_last_modified = {
+        1: "2023-01-17T21:14:42.000Z",
+        2: "2023-01-17T21:14:42.000Z",
+        3: "2023-01-17T21:14:42.000Z",
+        4: "2023-01-17T21:14:42.000Z",
+    }
+
+    transformer.deduplicate_additional_endpoints()
+
+    assert transformer.additional_api_calls == [modified, not_fetched, missing, other]
+    assert local_fetch_manifest.get("TESTUSER_4") == {
+        "last_modified": "2023-01-17T21:14:42.000Z",
+        "requested_date": "2023-02-03 12:31:38",
+        "fetched": False,
+    }
+    assert local_fetch_manifest.get("TESTUSER_2") == {
+        "last_modified": "2023-01-17T21:14:42.000Z",
+        "requested_date": "2023-02-03 12:31:38",
+        "fetched": True,
+    }
+
+    # The modified tcx is not requested again when it was unchanged and not transformed
+    transformer.additional_api_calls = [modified]
+    transformer.deduplicate_additional_endpoints()
+    assert transformer.additional_api_calls == []
+
+
+def parse_ledger_row(line: str) -> dict:
+    """Parses a run ledger row printed by the LocalDataLoader, the durations vary between
+    runs so are checked to be positive and removed"""
+    table_name, row = line.split(" ", 1)
+    assert table_name == "run_ledger"
+    row = ast.literal_eval(row)
+    assert row.pop("duration_seconds") > 0
+    return row
+
+
 def test_log_processing(transformer, capsys) -> None:
     """Tests the log_processing method of the FitBitETL class"""
     transformer.date = datetime.strptime("2023-01-01", "%Y-%m-%d").date()
     transformer.user_id = "TESTUSER"
     transformer.endpoint = "get_cardio_score_by_date"
     transformer.path = "20230101/get_cardio_score_by_date_TESTUSER.json"
+    transformer.metrics.timing("transform", 0.5)
+    transformer.metrics.increment("bytes_read", 100)
+    transformer.metrics.increment("rows", 3, {"table": "cardioscore"})
 
-    transformer.log_processing()
+    transformer.log_processing("success")
     captured = capsys.readouterr()
-    expected_value = """files_processed {'date': '2023-01-01', 'user_id': 'TESTUSER', 'processed_date': '2023-02-03 12:31:38', 'api_endpoint': 'get_cardio_score_by_date', 'data_source': None, 'file_processed': '20230101/get_cardio_score_by_date_TESTUSER.json'}
-"""
-    assert captured.out == expected_value
+
+    assert parse_ledger_row(captured.out) == {
+        "run_type": "transform",
+        "date": "2023-01-01",
+        "user_id": "TESTUSER",
+        "processed_date": "2023-02-03 12:31:38",
+        "api_endpoint": "get_cardio_score_by_date",
+        "data_source": None,
+        "file_path": "20230101/get_cardio_score_by_date_TESTUSER.json",
+        "outcome": "success",
+        "error": None,
+        "request_seconds": None,
+        "save_seconds": None,
+        "extract_seconds": None,
+        "transform_seconds": 0.5,
+        "load_seconds": None,
+        "refresh_rollup_seconds": None,
+        "publish_seconds": None,
+        "bytes_read": 100,
+        "retries": 0,
+        "rows_written": [{"table_name": "cardioscore", "row_count": 3}],
+    }
+
+
+def test_log_processing_run_ledger(transformer, capsys) -> None:
+    """Tests the ledger rows saved by the extract function are not logged themselves"""
+    transformer.endpoint = "get_run_ledger_by_date"
+    transformer.log_processing("success")
+    assert capsys.readouterr().out == ""
+
+
+def test_process_failed(transformer, capsys, tmp_path) -> None:
+    """Tests a file that fails to process is logged in the run ledger and raised"""
+    file_path = f"{tmp_path}/20230118/get_cardio_score_by_date_TESTUSER.json"
+    os.makedirs(os.path.dirname(file_path))
+    with open(file_path, "w", encoding="utf-8") as file:
+        file.write("{}")
+
+    with pytest.raises(KeyError, match="cardioScore"):
+        transformer.process(file_path)
+    row = parse_ledger_row(capsys.readouterr().out)
+
+    assert row["outcome"] == "failed"
+    assert "cardioScore" in row["error"]
+    assert row["file_path"] == file_path
+    assert row["bytes_read"] == 2
+    assert row["extract_seconds"] > 0
+    assert row["rows_written"] == []
+
+
+def test_process_load_workers(transformer, loader, messenger, capsys) -> None:
+    """Tests the tables of a file loaded at the same time are the same as loaded in turn
+    and the run is logged once every table is loaded"""
+    file_path = "Source/FitbitExtract/tests/testing_data_files/endpoint_data/get_activity_summary_by_date/20230118/get_activity_summary_by_date_TESTUSER.json"
+    transformer.process(file_path)
+    expected_lines = capsys.readouterr().out.splitlines()[:-1]
+
+    concurrent_transformer = transformers.FitbitETL(loader, messenger, load_workers=3)
+    concurrent_transformer.processing_datetime = transformer.processing_datetime
+    concurrent_transformer.process(file_path)
+    lines = capsys.readouterr().out.splitlines()
+
+    assert sorted(lines[:-1]) == sorted(expected_lines)
+    assert parse_ledger_row(lines[-1])["outcome"] == "success"
+
+
+def test_process_load_workers_failed(loader, messenger, capsys) -> None:
+    """Tests a failed load of one table fails the run after the other tables are loaded"""
+    file_path = "Source/FitbitExtract/tests/testing_data_files/endpoint_data/get_activity_summary_by_date/20230118/get_activity_summary_by_date_TESTUSER.json"
+    load = loader.load
+
+    def load_or_fail(data: list[dict], name: str) -> None:
+        if name == "goals":
+            raise ValueError("goals could not be loaded")
+        load(data, name)
+
+    loader.load = load_or_fail
+    concurrent_transformer = transformers.FitbitETL(loader, messenger, load_workers=3)
+
+    with pytest.raises(ValueError, match="goals could not be loaded"):
+        concurrent_transformer.process(file_path)
+    lines = capsys.readouterr().out.splitlines()
+    row = parse_ledger_row(lines[-1])
+
+    assert row["outcome"] == "failed"
+    assert "goals could not be loaded" in row["error"]
+    assert {line.split(" ", 1)[0] for line in lines[:-1]} == {"activity", "summary"}
+    assert not any(line.startswith("sending message") for line in lines)
+
+
+def test_transform_load_run_ledger_data(transformer, capsys) -> None:
+    """Tests the ledger rows saved by the extract function are loaded as they are"""
+    records = [{"run_type": "extract", "api_endpoint": "get_sleep_by_date"}]
+    transformer._transform_load_run_ledger_data({"records": records})
+    assert capsys.readouterr().out == (
+        "run_ledger {'run_type': 'extract', 'api_endpoint': 'get_sleep_by_date'}\n"
+    )
+    with pytest.raises(KeyError, match="Expected records to be in run ledger data"):
+        transformer._transform_load_run_ledger_data({})
 
 
 def test_process(transformer, capsys, test_data_path) -> None:
     """Tests the _transform_load_cardioscore_data method of the FitBitETL class"""
     file_path, _ = test_data_path
     transformer.process(file_path)
-    captured = capsys.readouterr()
-    data_value = "cardioscore {'date': '2023-01-18', 'vo2_max': '44-48', 'user_id': 'TESTUSER', 'processed_date': '2023-02-03 12:31:38'}\n"
-    log_value = (
-        "files_processed {'date': '2023-01-18', 'user_id': 'TESTUSER', 'processed_date': '2023-02-03 12:31:38', 'api_endpoint': 'get_cardio_score_by_date', 'data_source': None, 'file_processed': '"
-        + file_path
-        + "'}\n"
+    data_line, log_line = capsys.readouterr().out.splitlines()
+    data_value = "cardioscore {'date': '2023-01-18', 'vo2_max': '44-48', 'user_id': 'TESTUSER', 'processed_date': '2023-02-03 12:31:38'}"
+    assert data_line == data_value
+
+    log_row = parse_ledger_row(log_line)
+    assert log_row["file_path"] == file_path
+    assert log_row["api_endpoint"] == "get_cardio_score_by_date"
+    assert log_row["outcome"] == "success"
+    assert log_row["bytes_read"] == os.path.getsize(file_path)
+    assert log_row["rows_written"] == [{"table_name": "cardioscore", "row_count": 1}]
+    for stage in ["extract", "transform", "load", "publish"]:
+        assert log_row[f"{stage}_seconds"] > 0
+
+
+def test_process_bundle(transformer, capsys, tmp_path) -> None:
+    """Tests a bundle loads the same rows as processing each response file"""
+    data_directory = "Source/FitbitExtract/tests/testing_data_files/endpoint_data"
+    endpoint_files = [
+        ("get_cardio_score_by_date", "get_cardio_score_by_date_TESTUSER.json"),
+        ("get_sleep_by_date", "get_sleep_by_date_TESTUSER.json"),
+        ("get_activity_tcx_by_id", "53177087392_get_activity_tcx_by_id_TESTUSER.tcx"),
+    ]
+    records = []
+    expected_rows = []
+    for endpoint, file_name in endpoint_files:
+        file_path = f"{data_directory}/{endpoint}/20230118/{file_name}"
+        transformer.get_details_from_path(file_path)
+        transformer.transform_load_data(transformer.extract_data())
+        expected_rows.extend(capsys.readouterr().out.splitlines())
+
+        with open(file_path, "r", encoding="utf-8") as file:
+            records.append(
+                {
+                    "endpoint": endpoint,
+                    "instance": os.path.splitext(file_name)[0].replace("_TESTUSER", ""),
+                    "user_id": "TESTUSER",
+                    "date": "2023-01-18",
+                    "format": os.path.splitext(file_name)[1][1:],
+                    "data": file.read(),
+                }
+            )
+
+    bundle_path = f"{tmp_path}/20230118/99_get_bundle_by_date_TESTUSER.ndjson"
+    os.makedirs(os.path.dirname(bundle_path))
+    with open(bundle_path, "w", encoding="utf-8") as file:
+        file.write("\n".join(json.dumps(record) for record in records))
+
+    transformer.process(bundle_path)
+    rows = capsys.readouterr().out.splitlines()
+
+    loaded_rows = [row for row in rows if not row.startswith("refresh rollup")]
+    assert loaded_rows[:-1] == expected_rows
+    log_row = parse_ledger_row(loaded_rows[-1])
+    assert log_row["api_endpoint"] == "get_bundle_by_date"
+    assert log_row["file_path"] == bundle_path
+    assert [table["table_name"] for table in log_row["rows_written"]] == [
+        "cardioscore",
+        "sleep",
+        "sleep_detail",
+        "activity_detail",
+    ]
+    assert "refresh rollup daily_sleep for TESTUSER on ['2023-01-18']" in rows
+    assert transformer.endpoint == "get_bundle_by_date"
+    assert transformer.instance_id == 99
+
+
+def test_transform_load_bundle_data_wrong_user(transformer) -> None:
+    """Tests bundle records for a different user are rejected"""
+    transformer.user_id = "TESTUSER"
+    records = [
+        {
+            "endpoint": "get_cardio_score_by_date",
+            "instance": "get_cardio_score_by_date",
+            "user_id": "OTHERUSER",
+            "date": "2023-01-18",
+            "format": "json",
+            "data": "{}",
+        }
+    ]
+    with pytest.raises(ValueError, match="Bundle record for OTHERUSER"):
+        transformer._transform_load_bundle_data({"records": records})
+
+
+def test_process_object_index(transformer, capsys, test_data_path, local_object_index):
+    """Tests process marks the object as processed in the object index"""
+    file_path, _ = test_data_path
+    local_object_index.update(file_path, {"processed": False})
+    transformer.object_index = local_object_index
+
+    transformer.process(file_path)
+    capsys.readouterr()
+
+    assert local_object_index.get(file_path) == {
+        "processed": True,
+        "processed_date": "2023-02-03 12:31:38",
+    }
+
+
+def test_process_object_index_failed(
+    transformer, capsys, test_data_path, local_object_index, monkeypatch
+):
+    """Tests process does not fail after loading the data if the object index cannot be updated"""
+    file_path, _ = test_data_path
+
+    def failed_update(path: str, entry: dict) -> None:
+        raise ValueError("index unavailable")
+
+    monkeypatch.setattr(local_object_index, "update", failed_update)
+    transformer.object_index = local_object_index
+
+    transformer.process(file_path)
+
+    assert (
+        f"Could not record {file_path} as processed: index unavailable"
+        in capsys.readouterr().out
+    )
+
+
+def test_process_log_failed(transformer, capsys, test_data_path, monkeypatch):
+    """Tests process does not fail after loading the data if the run cannot be logged"""
+    file_path, _ = test_data_path
+
+    def failed_log(outcome: str, error: Exception = None, path: str = None) -> None:
+        raise ValueError("quota exceeded")
+
+    monkeypatch.setattr(transformer, "log_processing", failed_log)
+
+    transformer.process(file_path)
+
+    assert (
+        f"Could not log the run of {file_path}: quota exceeded"
+        in capsys.readouterr().out
     )
-    expected_value = data_value + log_value
-    assert captured.out.replace("\\\\", "\\") == expected_value
 
 
 #############################################
@@ -245,6 +583,70 @@ def test_transform_load_cardioscore_data_bad_input(transformer) -> None:
         transformer._transform_load_cardioscore_data({})
 
 
+def test_transform_load_heart_rate_intraday_data(
+    transformer, capsys, testing_data_dictionarys
+) -> None:
+    """Tests the _transform_load_heart_rate_intraday_data method of the FitBitETL class"""
+
+    endpoint = "get_heart_rate_intraday_by_date"
+    transform_test_helper(transformer, endpoint, testing_data_dictionarys)
+    captured = capsys.readouterr()
+    expected_value = """heart_rate_intraday {'user_id': 'TESTUSER', 'date': '2023-01-18', 'processed_date': '2023-02-03 12:31:38', 'date_time': '2023-01-18 00:00:00', 'heart_rate': 62}
+heart_rate_intraday {'user_id': 'TESTUSER', 'date': '2023-01-18', 'processed_date': '2023-02-03 12:31:38', 'date_time': '2023-01-18 00:00:01', 'heart_rate': 63}
+heart_rate_intraday {'user_id': 'TESTUSER', 'date': '2023-01-18', 'processed_date': '2023-02-03 12:31:38', 'date_time': '2023-01-18 00:00:06', 'heart_rate': 61}
+"""
+    assert captured.out == expected_value
+
+
+def test_transform_load_heart_rate_intraday_data_bad_input(transformer) -> None:
+    """Tests the _transform_load_heart_rate_intraday_data method of the FitBitETL class where missing dataset"""
+    with pytest.raises(
+        KeyError,
+        match="Expected activities-heart-intraday to be in heart intraday data dictionary",
+    ):
+        transformer._transform_load_heart_rate_intraday_data({})
+
+
+def test_transform_load_steps_intraday_data(
+    transformer, capsys, testing_data_dictionarys
+) -> None:
+    """Tests the _transform_load_steps_intraday_data method of the FitBitETL class"""
+
+    endpoint = "get_steps_intraday_by_date"
+    transform_test_helper(transformer, endpoint, testing_data_dictionarys)
+    captured = capsys.readouterr()
+    expected_value = """steps_intraday {'user_id': 'TESTUSER', 'date': '2023-01-18', 'processed_date': '2023-02-03 12:31:38', 'date_time': '2023-01-18 08:00:00', 'steps': 0}
+steps_intraday {'user_id': 'TESTUSER', 'date': '2023-01-18', 'processed_date': '2023-02-03 12:31:38', 'date_time': '2023-01-18 08:01:00', 'steps': 12}
+steps_intraday {'user_id': 'TESTUSER', 'date': '2023-01-18', 'processed_date': '2023-02-03 12:31:38', 'date_time': '2023-01-18 08:02:00', 'steps': 15}
+"""
+    assert captured.out == expected_value
+
+
+def test_transform_load_spo2_intraday_data(
+    transformer, capsys, testing_data_dictionarys
+) -> None:
+    """Tests the _transform_load_spo2_intraday_data method of the FitBitETL class"""
+
+    endpoint = "get_spo2_intraday_by_date"
+    transform_test_helper(transformer, endpoint, testing_data_dictionarys)
+    captured = capsys.readouterr()
+    expected_value = """spo2_intraday {'user_id': 'TESTUSER', 'date': '2023-01-18', 'processed_date': '2023-02-03 12:31:38', 'date_time': '2023-01-18 01:00:00', 'spo2': 95.7}
+spo2_intraday {'user_id': 'TESTUSER', 'date': '2023-01-18', 'processed_date': '2023-02-03 12:31:38', 'date_time': '2023-01-18 01:01:00', 'spo2': 97.5}
+"""
+    assert captured.out == expected_value
+
+
+def test_transform_load_spo2_intraday_data_no_readings(transformer, capsys) -> None:
+    """Tests the _transform_load_spo2_intraday_data method of the FitBitETL class for a day without readings"""
+    transformer.user_id = "TESTUSER"
+    transformer.endpoint = "get_spo2_intraday_by_date"
+    transformer.date = datetime.strptime("2023-01-18", "%Y-%m-%d").date()
+
+    transformer._transform_load_spo2_intraday_data({})
+
+    assert capsys.readouterr().out == ""
+
+
 def test_transform_load_body_weight_data(
     transformer, capsys, testing_data_dictionarys
 ) -> None:
@@ -402,6 +804,141 @@ activity_detail {'sport': 'Other', 'log_id': 53177087392, 'lap_number': 3, 'tota
     assert captured.out == expected_value
 
 
+def test_transform_load_activity_tcx_data_feed_size(
+    transformer, capsys, testing_data_dictionarys, monkeypatch
+) -> None:
+    """Tests the tcx rows are the same when the document is parsed in small slices"""
+    endpoint = "get_activity_tcx_by_id"
+    transform_test_helper(transformer, endpoint, testing_data_dictionarys)
+    expected_value = capsys.readouterr().out
+
+    monkeypatch.setattr(xmlparsing, "XML_FEED_CHARS", 7)
+    transform_test_helper(transformer, endpoint, testing_data_dictionarys)
+
+    assert capsys.readouterr().out == expected_value
+
+
+def test_transform_load_activity_tcx_data_xml_engines(
+    transformer, capsys, testing_data_dictionarys
+) -> None:
+    """Tests the tcx rows are the same when parsed with ElementTree and lxml"""
+    pytest.importorskip("lxml")
+    endpoint = "get_activity_tcx_by_id"
+    transformer.xml_engine = xmlparsing.ElementTreeEngine()
+    transform_test_helper(transformer, endpoint, testing_data_dictionarys)
+    expected_value = capsys.readouterr().out
+
+    transformer.xml_engine = xmlparsing.LxmlEngine()
+    transform_test_helper(transformer, endpoint, testing_data_dictionarys)
+
+    assert capsys.readouterr().out == expected_value
+
+
+class FakeBigQueryClient:
+    """Records the load jobs, queries and table deletes of a GCPDataLoader"""
+
+    def __init__(self, project: str = None) -> None:
+        self.calls = []
+
+    def get_table(self, table_name: str):
+        fields = constants.TABLE_NAME_METADATA_MAPPING[table_name.split(".")[-1]]
+        schema = [
+            loaders.bigquery.SchemaField(field["bq_name"], "STRING")
+            for field in fields.values()
+        ]
+        return loaders.bigquery.Table(table_name, schema=schema)
+
+    def load_table_from_file(self, file_obj, destination: str, job_config):
+        self.calls.append(("load", destination))
+        return FakeJob()
+
+    def query(self, query: str, job_config=None):
+        self.calls.append(("query", query.split()[0]))
+        return FakeJob()
+
+    def delete_table(self, table_name: str, not_found_ok: bool = False) -> None:
+        self.calls.append(("delete", table_name))
+
+
+class FakeJob:
+    """A BigQuery job that has already finished"""
+
+    def result(self) -> None:
+        return None
+
+
+@pytest.mark.parametrize("load_workers", [1, 2])
+def test_transform_load_activity_tcx_data_single_merge(
+    messenger, testing_data_dictionarys, monkeypatch, load_workers
+) -> None:
+    """Tests the streamed tcx rows reach the GCP loader as one staging table and MERGE"""
+    # The loader is built without its clients as only BigQuery is used by the loads
+    gcp_loader = loaders.GCPDataLoader.__new__(loaders.GCPDataLoader)
+    gcp_loader.project_id = "project"
+    gcp_loader.dataset_name = "dataset"
+    gcp_loader.serializer = None
+    gcp_loader.bigquery_client = FakeBigQueryClient()
+    # Every trackpoint is its own chunk so the stream has several loads
+    iter_column_batches = loaders.iter_column_batches
+    monkeypatch.setattr(
+        loaders,
+        "iter_column_batches",
+        lambda rows, chunk_rows: iter_column_batches(rows, 1),
+    )
+    transformer = transformers.FitbitETL(
+        gcp_loader, messenger, load_workers=load_workers
+    )
+
+    endpoint = "get_activity_tcx_by_id"
+    transform_test_helper(transformer, endpoint, testing_data_dictionarys)
+    transformer.data_loader.wait()
+
+    calls = gcp_loader.bigquery_client.calls
+    staging_tables = {name for call, name in calls if call in ["load", "delete"]}
+    assert len(staging_tables) == 1
+    assert staging_tables.pop().startswith("project.dataset.activity_detail_staging_")
+    assert [call for call, _ in calls] == ["load"] * 4 + ["query", "delete"]
+    assert calls[-2] == ("query", "MERGE")
+
+
+def test_transform_load_activity_tcx_data_manifest(
+    transformer, capsys, testing_data_dictionarys, local_fetch_manifest
+) -> None:
+    """Tests the _transform_load_activity_tcx_data method of the FitBitETL class marks the tcx as fetched"""
+    transformer.fetch_manifest = local_fetch_manifest
+    endpoint = "get_activity_tcx_by_id"
+    transform_test_helper(transformer, endpoint, testing_data_dictionarys)
+    capsys.readouterr()
+
+    assert local_fetch_manifest.get("TESTUSER_53177087392") == {
+        "fetched": True,
+        "fetched_date": "2023-02-03 12:31:38",
+    }
+
+
+def test_transform_load_summary_data_manifest(
+    transformer, capsys, testing_data_dictionarys, local_fetch_manifest
+) -> None:
+    """Tests the summary transform records activity last modified used to skip fetched tcx files"""
+    transformer.fetch_manifest = local_fetch_manifest
+    local_fetch_manifest.update(
+        "TESTUSER_53177087392",
+        {"last_modified": "2023-01-17T21:14:42.000Z", "fetched": True},
+    )
+    endpoint = "get_activity_summary_by_date"
+    transform_test_helper(transformer, endpoint, testing_data_dictionarys)
+    capsys.readouterr()
+
+    assert transformer.activity_last_modified == {
+        53177087392: "2023-01-17T21:14:42.000Z"
+    }
+    assert len(transformer.additional_api_calls) == 1
+
+    transformer.deduplicate_additional_endpoints()
+
+    assert transformer.additional_api_calls == []
+
+
 def test_transform_load_activity_tcx_data_no_instance_id(transformer) -> None:
     """Tests the _transform_load_activity_tcx_data method of the FitBitETL class where missing activities"""
     with pytest.raises(ValueError, match="Instance Id is not instantiated"):
@@ -411,3 +948,50 @@ def test_transform_load_activity_tcx_data_no_instance_id(transformer) -> None:
 
 
 # datetime.strptime("2023-02-03 12:31:38", "%Y-%m-%d %H:%M:%S")
+
+
+def test_process_metrics(loader, messenger, capsys, test_data_path) -> None:
+    """Tests the FitBitETL class records the time of each stage and the rows loaded"""
+    file_path, _ = test_data_path
+    metrics = LocalMetricsSink()
+    transformer = transformers.FitbitETL(loader, messenger, metrics=metrics)
+    transformer.process(file_path)
+    capsys.readouterr()
+
+    assert set(metrics.timings) == {
+        "extract",
+        "transform[endpoint=get_cardio_score_by_date]",
+        "load[table=cardioscore]",
+        "load[table=run_ledger]",
+        "publish",
+    }
+    assert metrics.counters == {
+        "rows[table=cardioscore]": 1,
+        "rows[table=run_ledger]": 1,
+        "bytes_read": os.path.getsize(file_path),
+    }
+
+
+@pytest.mark.parametrize("load_workers", [1, 2])
+def test_process_metrics_load_not_transform(
+    loader, messenger, capsys, test_data_path, load_workers
+) -> None:
+    """Tests the transform timing does not include the time spent loading the rows"""
+    file_path, _ = test_data_path
+    load = loader.load
+
+    def slow_load(data: list[dict], name: str) -> None:
+        time.sleep(0.2)
+        load(data, name)
+
+    loader.load = slow_load
+    metrics = LocalMetricsSink()
+    transformer = transformers.FitbitETL(
+        loader, messenger, metrics=metrics, load_workers=load_workers
+    )
+    transformer.process(file_path)
+    capsys.readouterr()
+
+    transform = metrics.timings["transform[endpoint=get_cardio_score_by_date]"]
+    assert transform["total"] < 0.1
+    assert metrics.timings["load[table=cardioscore]"]["total"] >= 0.2
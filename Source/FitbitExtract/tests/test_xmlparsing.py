@@ -0,0 +1,65 @@
+import pytest
+from fitbit import xmlparsing
+
+NAMESPACE = "{urn:test}"
+XML_DATA = """<?xml version="1.0" encoding="UTF-8"?>
+<Root xmlns="urn:test">
+    <!-- comment -->
+    <Lap><Value>1</Value><Other>2</Other></Lap>
+    <?instruction data?>
+    <Lap><Value>3</Value></Lap>
+</Root>"""
+EXPECTED_EVENTS = [
+    ("start", "Lap", "Root"),
+    ("start", "Value", "Lap"),
+    ("end", "Value", "Lap"),
+    ("end", "Lap", "Root"),
+    ("start", "Lap", "Root"),
+    ("start", "Value", "Lap"),
+    ("end", "Value", "Lap"),
+    ("end", "Lap", "Root"),
+]
+
+
+def read_events(engine: xmlparsing.XMLEngine) -> list[tuple]:
+    """Returns the events of the test document without the namespace"""
+    tags = [f"{NAMESPACE}Lap", f"{NAMESPACE}Value"]
+    return [
+        (
+            event,
+            element.tag.replace(NAMESPACE, ""),
+            parent.tag.replace(NAMESPACE, ""),
+        )
+        for event, element, parent in engine.iter_events(XML_DATA, tags)
+    ]
+
+
+@pytest.mark.parametrize("feed_chars", [7, xmlparsing.XML_FEED_CHARS])
+def test_element_tree_engine(monkeypatch, feed_chars) -> None:
+    """Test the ElementTree engine only yields the events of the tags with their parent"""
+    monkeypatch.setattr(xmlparsing, "XML_FEED_CHARS", feed_chars)
+
+    assert read_events(xmlparsing.ElementTreeEngine()) == EXPECTED_EVENTS
+
+
+@pytest.mark.parametrize("feed_chars", [7, xmlparsing.XML_FEED_CHARS])
+def test_lxml_engine(monkeypatch, feed_chars) -> None:
+    """Test the lxml engine yields the same events and drops comments and instructions"""
+    pytest.importorskip("lxml")
+    monkeypatch.setattr(xmlparsing, "XML_FEED_CHARS", feed_chars)
+    engine = xmlparsing.LxmlEngine()
+
+    assert read_events(engine) == EXPECTED_EVENTS
+    for event, element, _ in engine.iter_events(XML_DATA, [f"{NAMESPACE}Lap"]):
+        if event == "end":
+            assert [child.tag for child in element][0] == f"{NAMESPACE}Value"
+    assert isinstance(xmlparsing.default_xml_engine(), xmlparsing.LxmlEngine)
+
+
+def test_lxml_engine_not_installed(monkeypatch) -> None:
+    """Test the default xml engine falls back to ElementTree without lxml"""
+    monkeypatch.setattr(xmlparsing, "lxml_etree", None)
+
+    with pytest.raises(ImportError, match="requires the lxml package"):
+        xmlparsing.LxmlEngine()
+    assert isinstance(xmlparsing.default_xml_engine(), xmlparsing.ElementTreeEngine)